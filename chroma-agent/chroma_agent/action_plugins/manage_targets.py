@@ -22,7 +22,7 @@ from iml_common.lib.agent_rpc import agent_result_ok
 from iml_common.lib.agent_rpc import agent_ok_or_error
 from iml_common.lib.agent_rpc import agent_result_is_error
 from iml_common.lib.agent_rpc import agent_result_is_ok
-from chroma_agent.lib.pacemaker import cibadmin
+from chroma_agent.lib.pacemaker import cibadmin, crm_mon_snapshot
 from chroma_agent.action_plugins.manage_pacemaker import PreservePacemakerCorosyncState
 from iml_common.lib.util import platform_info
 
@@ -111,61 +111,42 @@ def get_resource_location(resource_name):
 
 
 @exceptionSandBox(console_log, None)
-def get_resource_locations():
-    # FIXME: this may break on non-english systems or new versions of pacemaker
-    """Parse `crm_mon -1` to identify where (if anywhere)
-       resources (i.e. targets) are running."""
+def get_resource_locations(max_age = 0):
+    """Parse `crm_mon --one-shot --inactive --as-xml` to identify where (if anywhere)
+       resources (i.e. targets) are running.
 
-    try:
-        rc, lines_text, stderr = AgentShell.run_old(["crm_mon", "-1", "-r"])
-    except OSError, e:
-        # ENOENT is fine here.  Pacemaker might not be installed yet.
-        if e.errno != errno.ENOENT:
-            raise
+       :param max_age: Accept a shared crm_mon snapshot up to this many seconds
+                       old, device plugin polls pass CrmMonSnapshot.MAX_AGE.
+    """
 
-    if rc != 0:
+    snapshot = crm_mon_snapshot.get(max_age)
+
+    if snapshot is None:
+        # Pacemaker not installed
+        return None
+
+    if snapshot.rc != 0 or snapshot.root is None:
         # Pacemaker not running, or no resources configured yet
-        return {"crm_mon_error": {"rc": rc,
-                                  "stdout": lines_text,
-                                  "stderr": stderr}}
+        return {"crm_mon_error": {"rc": snapshot.rc,
+                                  "stdout": snapshot.stdout,
+                                  "stderr": snapshot.stderr}}
+
+    # if we don't have a DC for this cluster yet, we can't really believe
+    # anything it says
+    current_dc = snapshot.root.find('summary/current_dc')
+    if current_dc is not None and current_dc.get('present') == 'false':
+        return {}
 
     locations = {}
-    before_resources = True
-    for line in lines_text.split("\n"):
-        # if we don't have a DC for this cluster yet, we can't really believe
-        # anything it says
-        if line == "Current DC: NONE":
-            return {}
-
-        # skip down to the resources part
-        if before_resources:
-            if line.startswith("Full list of resources:"):
-                before_resources = False
-            continue
 
-        # only interested in Target resources
-        if "(ocf::chroma:Target)" not in line:
+    # only interested in Target resources, including those in groups and
+    # clones, and a resource which is not running has no node
+    for resource in snapshot.root.findall('resources//resource'):
+        if resource.get('resource_agent') != 'ocf::chroma:Target':
             continue
 
-        # The line can have 3 - 5 arguments so pad it out to at least 5 and
-        # throw away any extra
-        # credit it goes to Aric Coady for this little trick
-        columns = (line.lstrip().split() + [None, None])[:5]
-
-        # In later pacemakers a new entry is added for stopped servers
-        # MGS_424f74	(ocf::chroma:Target):	(target-role:Stopped) Stopped
-        # and for started servers:
-        # MGS_424f74	(ocf::chroma:Target):	(target-role:Stopped) Started lotus-13vm6
-        # (target-role:Stopped) is new.
-        if "target-role" in columns[2]:
-            del columns[2]
-
-        # and even newer pacemakers add a "(disabled)" to the end of the line:
-        # MGS_e1321a	(ocf::chroma:Target):	Stopped (disabled)
-        if columns[3] == "(disabled)":
-            columns[3] = None
-
-        locations[columns[0]] = columns[3]
+        node = resource.find('node')
+        locations[resource.get('id')] = node.get('name') if node is not None else None
 
     return locations
 
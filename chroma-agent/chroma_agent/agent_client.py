@@ -25,10 +25,17 @@ MAX_SESSION_BACKOFF = datetime.timedelta(seconds = 60)
 
 GET_REQUEST_TIMEOUT = 60.0
 
+# How many POSTs HttpWriter may have waiting for the manager at once
+MAX_POSTS_IN_FLIGHT = 4
+
 # FIXME: this file needs a concurrency review pass
 
 
 class CryptoClient(object):
+    # Reuse TLS connections to the manager between requests. With this off every
+    # request pays for a new TCP connection and client certificate handshake.
+    KEEPALIVE = True
+
     def __init__(self, url, crypto, fqdn=None):
         self.url = url
         self._crypto = crypto
@@ -36,24 +43,84 @@ class CryptoClient(object):
         if not self.fqdn:
             self.fqdn = socket.getfqdn()
 
+        self._session = self._create_session()
+
+    def _create_session(self):
+        session = requests.Session()
+        # FIXME: set verify to true if we have a CA bundle
+        session.verify = False
+        session.headers.update({"Content-Type": "application/json"})
+
+        # Enough pooled connections for the long-poll GET and every POST in flight
+        adapter = requests.adapters.HTTPAdapter(pool_connections = 1, pool_maxsize = MAX_POSTS_IN_FLIGHT + 1)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        return session
+
     def get(self, **kwargs):
         kwargs['timeout'] = GET_REQUEST_TIMEOUT
         return self.request('get', **kwargs)
 
+    def get_stream(self, **kwargs):
+        """
+        Generator for a streaming GET: yields the decoded JSON object on each
+        line of the response as it arrives.  A non-streaming response (a single
+        JSON object) yields once.
+        """
+        kwargs['timeout'] = GET_REQUEST_TIMEOUT
+
+        # The response is read after _request returns, so a session of its own is closed here
+        session = self._session if self.KEEPALIVE else self._create_session()
+        try:
+            response = self._request('get', session = session, stream = True, **kwargs)
+
+            try:
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+            except (socket.error,
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.ReadTimeout,
+                    requests.exceptions.SSLError) as e:
+                daemon_log.error("Error reading from %s: %s" % (self.url, e))
+                raise HttpError()
+            except ValueError as e:
+                daemon_log.error("Malformed response from %s: %s" % (self.url, e))
+                raise HttpError()
+            finally:
+                response.close()
+        finally:
+            if session is not self._session:
+                session.close()
+
     def post(self, data, **kwargs):
         return self.request('post', data = json.dumps(data), **kwargs)
 
     def request(self, method, **kwargs):
+        response = self._request(method, **kwargs)
+
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def _request(self, method, session = None, **kwargs):
+        """
+        :param session: requests.Session to send the request with, which the caller closes
+                        if need be.  By default the shared one, or (without KEEPALIVE) one
+                        for this request alone.
+        """
         cert, key = self._crypto.certificate_file, self._crypto.private_key_file
         if cert:
             kwargs['cert'] = (cert, key)
 
+        own_session = session is None and not self.KEEPALIVE
+        if session is None:
+            session = self._create_session() if own_session else self._session
+
         try:
-            response = requests.request(method, self.url,
-                # FIXME: set verify to true if we have a CA bundle
-                verify = False,
-                headers = {"Content-Type": "application/json"},
-                **kwargs)
+            response = session.request(method, self.url, **kwargs)
         except (socket.error,
                 requests.exceptions.ConnectionError,
                 requests.exceptions.ReadTimeout,
@@ -70,16 +137,17 @@ class CryptoClient(object):
                 raise
 
             raise HttpError()
+        finally:
+            if own_session:
+                session.close()
 
         if not response.ok:
             daemon_log.error("Bad status %s from %s to %s" % (response.status_code, method, self.url))
             if response.status_code == 413:
                 daemon_log.error("Oversized request: %s" % json.dumps(kwargs, indent=2))
             raise HttpError()
-        try:
-            return response.json()
-        except ValueError:
-            return None
+
+        return response
 
 
 class AgentDaemonContext(object):
@@ -301,7 +369,12 @@ class ExceptionCatchingThread(threading.Thread):
 
 
 class HttpWriter(ExceptionCatchingThread):
-    """Send messages to the manager, and handle control messages received in response"""
+    """Send messages to the manager, and handle control messages received in response
+
+    Up to MAX_POSTS_IN_FLIGHT POSTs are sent concurrently.  Messages for a plugin
+    which already has a POST in flight are held back until it completes, so that
+    each session's messages still reach the manager in order.
+    """
 
     def __init__(self, client):
         super(HttpWriter, self).__init__()
@@ -312,6 +385,11 @@ class HttpWriter(ExceptionCatchingThread):
         self._messages = Queue.PriorityQueue()
         self._retry_messages = Queue.Queue()
 
+        self._post_slots = threading.Semaphore(MAX_POSTS_IN_FLIGHT)
+        # Plugin names with messages in a POST which has not completed yet
+        self._plugins_in_flight = set()
+        self._plugins_in_flight_lock = threading.Lock()
+
     def put(self, message):
         """Called from a different thread context than the main loop"""
         self._messages.put(message)
@@ -341,11 +419,25 @@ class HttpWriter(ExceptionCatchingThread):
 
         while not self._stopping.is_set():
             while not (self._messages.empty() and self._retry_messages.empty()):
-                self.send()
+                self._post_slots.acquire()
+                messages, completion_callbacks = self._get_messages()
+
+                if not messages:
+                    # Everything waiting is for plugins with a POST in flight, which
+                    # will set _messages_waiting when it completes.
+                    self._post_slots.release()
+                    break
+
+                threading.Thread(target = self._post_in_slot,
+                                 args = (messages, completion_callbacks)).start()
 
             self._messages_waiting.wait()
             self._messages_waiting.clear()
 
+        # Let any POSTs in flight finish
+        for _ in xrange(MAX_POSTS_IN_FLIGHT):
+            self._post_slots.acquire()
+
         ExceptionThrowingThread.wait_for_threads(threads)
 
     def stop(self):
@@ -354,32 +446,53 @@ class HttpWriter(ExceptionCatchingThread):
 
     def send(self):
         """Return True if the POST succeeds, else False"""
+        return self._post(*self._get_messages())
+
+    def _post_in_slot(self, messages, completion_callbacks):
+        try:
+            self._post(messages, completion_callbacks)
+        finally:
+            self._post_slots.release()
+            self._messages_waiting.set()
+
+    def _get_messages(self):
+        """
+        Take as many messages as fit in a POST from the queues, leaving any for
+        plugins with a POST in flight.
+
+        :return: (messages, completion_callbacks)
+        """
         messages = []
         completion_callbacks = []
 
-        post_envelope = {
-            'messages': [],
-            'server_boot_time': self._client.boot_time.isoformat() + "Z",
-            'client_start_time': self._client.start_time.isoformat() + "Z"
-        }
-
-        # Any message we drop will need its session killed
-        kill_sessions = set()
+        with self._plugins_in_flight_lock:
+            plugins_in_flight = set(self._plugins_in_flight)
 
-        messages_bytes = len(json.dumps(post_envelope))
+        # Messages to put back on the retry queue, in the order they were queued
+        held_back = []
+        retry_messages = []
         while True:
             try:
-                message = self._retry_messages.get_nowait()
-                daemon_log.debug("HttpWriter got message from retry queue")
+                retry_messages.append(self._retry_messages.get_nowait())
             except Queue.Empty:
+                break
+
+        messages_bytes = len(json.dumps(self._get_envelope()))
+        while True:
+            if retry_messages:
+                message = retry_messages.pop(0)
+                daemon_log.debug("HttpWriter got message from retry queue")
+            else:
                 try:
                     message = self._messages.get_nowait()
                     daemon_log.debug("HttpWriter got message from primary queue")
                 except Queue.Empty:
                     break
 
-            if message.callback:
-                completion_callbacks.append(message.callback)
+            if message.plugin_name in plugins_in_flight:
+                held_back.append(message)
+                continue
+
             message_length = len(json.dumps(message.dump(self._client._fqdn)))
 
             if message_length > MAX_BYTES_PER_POST:
@@ -392,12 +505,35 @@ class HttpWriter(ExceptionCatchingThread):
                     "messages), enqueuing" % (
                     message.dump(self._client._fqdn), message_length,
                     MAX_BYTES_PER_POST, len(messages)))
-                self._retry_messages.put(message)
+                held_back.append(message)
                 break
 
+            if message.callback:
+                completion_callbacks.append(message.callback)
             messages.append(message)
             messages_bytes += message_length
 
+        for message in held_back + retry_messages:
+            self._retry_messages.put(message)
+
+        with self._plugins_in_flight_lock:
+            self._plugins_in_flight.update(message.plugin_name for message in messages)
+
+        return messages, completion_callbacks
+
+    def _get_envelope(self):
+        return {
+            'messages': [],
+            'server_boot_time': self._client.boot_time.isoformat() + "Z",
+            'client_start_time': self._client.start_time.isoformat() + "Z"
+        }
+
+    def _post(self, messages, completion_callbacks):
+        post_envelope = self._get_envelope()
+
+        # Any message we drop will need its session killed
+        kill_sessions = set()
+
         daemon_log.debug("HttpWriter sending %s messages" % len(messages))
         try:
             post_envelope['messages'] = [m.dump(self._client._fqdn) for m in messages]
@@ -415,6 +551,9 @@ class HttpWriter(ExceptionCatchingThread):
         else:
             return True
         finally:
+            with self._plugins_in_flight_lock:
+                self._plugins_in_flight.difference_update(message.plugin_name for message in messages)
+
             for callback in completion_callbacks:
                 callback()
 
@@ -511,14 +650,21 @@ class HttpReader(ExceptionCatchingThread):
                 daemon_log.error("Plugin exception handling data message: %s" % backtrace)
 
     def _run(self):
+        # Ask for a streaming GET: the manager holds the connection open and
+        # writes each batch of messages as a line.  A manager that doesn't
+        # stream sends a single line and we simply reconnect.
         get_args = {
             'server_boot_time': self._client.boot_time.isoformat() + "Z",
-            'client_start_time': self._client.start_time.isoformat() + "Z"
+            'client_start_time': self._client.start_time.isoformat() + "Z",
+            'stream': 1
         }
         while not self._stopping.is_set():
             daemon_log.info("HttpReader: get")
             try:
-                body = self._client.get(params = get_args)
+                for body in self._client.get_stream(params = get_args):
+                    self._handle_messages(body['messages'])
+                    if self._stopping.is_set():
+                        break
             except HttpError:
                 daemon_log.warning("HttpReader: request failed")
                 # We potentially dropped TX messages if this happened, which could include
@@ -528,9 +674,6 @@ class HttpReader(ExceptionCatchingThread):
                 self._client.sessions.terminate_all()
 
                 self._stopping.wait(timeout = self.HTTP_RETRY_PERIOD)
-                continue
-            else:
-                self._handle_messages(body['messages'])
         daemon_log.info("HttpReader: stopping")
 
     def stop(self):
@@ -39,15 +39,30 @@ class ActionRunnerPlugin(DevicePlugin):
     the required ActionPlugin and handling concurrency.
     """
 
+    # Capabilities advertised to the manager at the start of a session, so that
+    # it knows which message types it may send us.
+    CAPABILITIES = ['action_batch']
+
+    # How many of the actions received in ACTION_BATCH_START messages may run at the
+    # same time, the rest wait for a slot.
+    MAX_CONCURRENT_BATCH_ACTIONS = 8
+
     def __init__(self, *args, **kwargs):
         self._running_actions_lock = threading.Lock()
         self._running_actions = {}
         self._tearing_down = False
+        self._batch_slots = threading.Semaphore(self.MAX_CONCURRENT_BATCH_ACTIONS)
         super(ActionRunnerPlugin, self).__init__(*args, **kwargs)
 
-    def run(self, id, cmd, args):
+    def start_session(self):
+        return {
+            'type': 'CAPABILITIES',
+            'capabilities': self.CAPABILITIES
+        }
+
+    def run(self, id, cmd, args, slots = None):
         daemon_log.info("ActionRunner.run %s" % id)
-        thread = ActionRunner(self, id, cmd, args)
+        thread = ActionRunner(self, id, cmd, args, slots = slots)
         with self._running_actions_lock:
             if not self._tearing_down:
                 self._running_actions[id] = thread
@@ -118,9 +133,21 @@ class ActionRunnerPlugin(DevicePlugin):
             else:
                 thread.stop()
 
+    def run_batch(self, actions):
+        """
+        Start a list of actions received in one message.  Each one completes (and
+        is responded to) independently, but at most MAX_CONCURRENT_BATCH_ACTIONS
+        run at once.
+        """
+        daemon_log.info("ActionRunner.run_batch %s" % [action['id'] for action in actions])
+        for action in actions:
+            self.run(action['id'], action['action'], action['args'], slots = self._batch_slots)
+
     def on_message(self, body):
         if body['type'] == 'ACTION_START':
             self.run(body['id'], body['action'], body['args'])
+        elif body['type'] == 'ACTION_BATCH_START':
+            self.run_batch(body['actions'])
         elif body['type'] == 'ACTION_CANCEL':
             self.cancel(body['id'])
         else:
@@ -128,7 +155,11 @@ class ActionRunnerPlugin(DevicePlugin):
 
 
 class ActionRunner(threading.Thread):
-    def __init__(self, manager, id, action, cmd_args, *args, **kwargs):
+    def __init__(self, manager, id, action, cmd_args, slots = None, *args, **kwargs):
+        """
+        :param slots: Optional semaphore which must be acquired before the action
+                      runs, to limit how many actions run concurrently.
+        """
         super(ActionRunner, self).__init__(*args, **kwargs)
 
         self.manager = manager
@@ -136,6 +167,7 @@ class ActionRunner(threading.Thread):
         self.action = action
         self.args = cmd_args
 
+        self._slots = slots
         self._subprocess_abort = None
         self._started = threading.Event()
 
@@ -155,6 +187,17 @@ class ActionRunner(threading.Thread):
         # We are now stoppable
         self._started.set()
 
+        if self._slots is None:
+            self._run()
+        else:
+            with self._slots:
+                # Cancelled or torn down while waiting for a slot
+                if self._subprocess_abort.is_set():
+                    self.manager.cancelled(self.id)
+                else:
+                    self._run()
+
+    def _run(self):
         daemon_log.info("%s.run: %s %s %s" % (self.__class__.__name__, self.id, self.action, self.args))
         try:
             AgentShell.thread_state.enable_save()
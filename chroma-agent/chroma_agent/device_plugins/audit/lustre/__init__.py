@@ -9,10 +9,10 @@ import heapq
 from collections import defaultdict
 from collections import namedtuple
 
-from tablib.packages import yaml
 from chroma_agent.utils import Mounts
 from chroma_agent.device_plugins.audit import BaseAudit
 from chroma_agent.device_plugins.audit.mixins import FileSystemMixin
+from chroma_agent.device_plugins.audit.lustre.parsers import parse_stats, parse_brw_stats, parse_job_stats
 
 
 # HYD-2307 workaround
@@ -87,50 +87,15 @@ class LustreAudit(BaseAudit, FileSystemMixin):
 
     def stats_dict_from_file(self, file):
         """Creates a dict from Lustre stats file contents."""
-        stats_re = re.compile(r"""
-        # e.g.
-        # create                    726 samples [reqs]
-        # cache_miss                21108 samples [pages] 1 1 21108
-        # obd_ping                  1108 samples [usec] 15 72 47014 2156132
-        ^
-        (?P<name>\w+)\s+(?P<count>\d+)\s+samples\s+\[(?P<units>\w+)\]
-        (?P<min_max_sum>\s+(?P<min>\d+)\s+(?P<max>\d+)\s+(?P<sum>\d+)
-        (?P<sumsq>\s+(?P<sumsquare>\d+))?)?
-        $
-        """, re.VERBOSE)
-
-        stats = {}
-
         # There is a potential race between the time that an OBD module
         # is loaded and the stats entry is created (HYD-389).  If we read
         # during that window, the audit will crash.  I'm not crazy about
         # excepting IOErrors as a general rule, but I suppose this is
         # the least-worst solution.
         try:
-            for line in self.read_lines(file):
-                match = re.match(stats_re, line)
-                if not match:
-                    continue
-
-                name = match.group('name')
-                stats[name] = {
-                    'count': int(match.group('count')),
-                    'units': match.group('units')
-                }
-                if match.group("min_max_sum") is not None:
-                    stats[name].update({
-                        'min': int(match.group('min')),
-                        'max': int(match.group('max')),
-                        'sum': int(match.group('sum'))
-                    })
-                if match.group("sumsq") is not None:
-                    stats[name].update({
-                        'sumsquare': int(match.group('sumsquare'))
-                    })
+            return parse_stats(self.read_lines(file))
         except IOError:
-            return stats
-
-        return stats
+            return {}
 
     def dict_from_file(self, file):
         """Creates a dict from simple dict-like (k\s+v) file contents."""
@@ -415,8 +380,6 @@ class ObdfilterAudit(TargetAudit):
 
     def read_brw_stats(self, target):
         """Return a dict representation of an OST's brw_stats histograms."""
-        histograms = {}
-
         # I know these hist names are fugly, but they match the names in the
         # Lustre source.  When possible, we should retain Lustre names
         # for things to make life easier for archaeologists.
@@ -430,64 +393,14 @@ class ObdfilterAudit(TargetAudit):
             'disk I/O size': 'disk_iosize'
         }
 
-        header_re = re.compile("""
-        # e.g.
-        # disk I/O size          ios   % cum % |  ios   % cum %
-        # discontiguous blocks   rpcs  % cum % |  rpcs  % cum %
-        ^(?P<name>.+?)\s+(?P<units>\w+)\s+%
-        """, re.VERBOSE)
-
-        bucket_re = re.compile("""
-        # e.g.
-        # 0:               187  87  87   | 13986  91  91
-        # 128K:            784  76 100   | 114654  82 100
-        ^
-        (?P<name>[\w]+):\s+
-        (?P<read_count>\d+)\s+(?P<read_pct>\d+)\s+(?P<read_cum_pct>\d+)
-        \s+\|\s+
-        (?P<write_count>\d+)\s+(?P<write_pct>\d+)\s+(?P<write_cum_pct>\d+)
-        $
-        """, re.VERBOSE)
-
         path = os.path.join(self.target_root, target, "brw_stats")
         try:
-            lines = self.read_lines(path)
+            return parse_brw_stats(self.read_lines(path), hist_map)
         except IOError:
-            return histograms
-
-        hist_key = None
-        for line in lines:
-            header = re.match(header_re, line)
-            if header is not None:
-                hist_key = hist_map[header.group('name')]
-                histograms[hist_key] = {}
-                histograms[hist_key]['units'] = header.group('units')
-                histograms[hist_key]['buckets'] = {}
-                continue
-
-            bucket = re.match(bucket_re, line)
-            if bucket is not None:
-                assert hist_key is not None
-
-                name = bucket.group('name')
-                bucket_vals = {
-                    'read': {
-                        'count': int(bucket.group('read_count')),
-                        'pct': int(bucket.group('read_pct')),
-                        'cum_pct': int(bucket.group('read_cum_pct'))
-                    },
-                    'write': {
-                        'count': int(bucket.group('write_count')),
-                        'pct': int(bucket.group('write_pct')),
-                        'cum_pct': int(bucket.group('write_cum_pct'))
-                    }
-                }
-                histograms[hist_key]['buckets'][name] = bucket_vals
-
-        return histograms
+            return {}
 
     def _read_job_stats_yaml_file(self, target_name):
-        """Given a path to a yaml file, read the file into a dict and return a value
+        """Given a path to a job_stats file, read the file into a list and return it
 
         return values will be an list or None.
         If an list, it will hold the parsed stats as a list from the job_stats file, could be an empty list
@@ -495,28 +408,20 @@ class ObdfilterAudit(TargetAudit):
 
         The main value of splitting this is so it can be mocked out in tests.
 
-        :param path  Full path to the yaml file (i.e. /proc/fs/lustre/obdfilter/lustre-OST0000/job_stats)
+        :param target_name  Name of the target (i.e. lustre-OST0000 for /proc/fs/lustre/obdfilter/lustre-OST0000/job_stats)
 
-        Sample Code showing the output when job stats is cleared.
-        $ lctl set_param obdfilter.*.job_stats=clear
-        >>> from tablib.packages import yaml
-        >>> f = open('/proc/fs/lustre/obdfilter/ldiskfs-OST0001/job_stats')
-        >>> d = yaml.load(f)
-        >>> d.items()
-        [('job_stats', None)]
+        The file is YAML, but only ever in the form Lustre writes it, so it is read line by line
+        with parse_job_stats rather than loaded by a YAML parser.  When job stats is cleared
+        ($ lctl set_param obdfilter.*.job_stats=clear) the file holds just 'job_stats:', which
+        gives [].
 
         """
-        path = self.abs(os.path.join(self.target_root, target_name, 'job_stats'))
+        path = os.path.join(self.target_root, target_name, 'job_stats')
         try:
-            with open(path) as yaml_file:
-                read_dict = yaml.load(yaml_file)
+            return parse_job_stats(self.read_lines(path))
         except IOError:
             # If job stats is NOT turned on, the file will not exist
             return None
-        else:
-            # job stats output should always have this key, but it will return None when there are not stats
-            # Instead this method should return [].  None means job stats is not turned on.
-            return read_dict.get("job_stats") or []
 
     def read_job_stats(self, target_name):
         """Try to read and return the contents of /proc/fs/lustre/obdfilter/<target>/job_stats
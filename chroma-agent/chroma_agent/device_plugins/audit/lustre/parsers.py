@@ -0,0 +1,153 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+"""
+Parsers for the text formats of Lustre's /proc stats files.
+
+These run on every audit, against files which can be large on busy servers, so
+they split lines on whitespace rather than matching regular expressions, and
+read job_stats line by line rather than loading it as YAML.
+"""
+
+
+def parse_stats(lines):
+    """Creates a dict from Lustre stats file lines, e.g.
+
+    create                    726 samples [reqs]
+    cache_miss                21108 samples [pages] 1 1 21108
+    obd_ping                  1108 samples [usec] 15 72 47014 2156132
+
+    Lines in any other form (such as snapshot_time, or those with the negative
+    values some Lustre versions report for lwp devices) are skipped.
+    """
+    stats = {}
+
+    for line in lines:
+        fields = line.split()
+
+        if len(fields) not in (4, 7, 8) or \
+                fields[2] != 'samples' or \
+                not fields[1].isdigit() or \
+                not (fields[3].startswith('[') and fields[3].endswith(']')) or \
+                not all(field.isdigit() for field in fields[4:]):
+            continue
+
+        stats[fields[0]] = stat = {
+            'count': int(fields[1]),
+            'units': fields[3][1:-1]
+        }
+        if len(fields) > 4:
+            stat['min'] = int(fields[4])
+            stat['max'] = int(fields[5])
+            stat['sum'] = int(fields[6])
+        if len(fields) > 7:
+            stat['sumsquare'] = int(fields[7])
+
+    return stats
+
+
+def parse_brw_stats(lines, hist_map):
+    """Creates a dict of histograms from brw_stats lines, e.g.
+
+                               read      |     write
+    disk I/O size          ios   % cum % |  ios   % cum %
+    4K:                      0   0   0   |    2  50  50
+    128K:                  784  76 100   | 114654  82 100
+
+    :param hist_map: Map of histogram titles to the names to return them as
+    """
+    histograms = {}
+    buckets = None
+
+    for line in lines:
+        fields = line.split()
+
+        # A bucket: name, then count/pct/cum_pct for read and then write
+        if len(fields) == 8 and fields[4] == '|' and fields[0].endswith(':'):
+            assert buckets is not None
+
+            if not all(field.isdigit() for field in fields[1:4] + fields[5:]):
+                continue
+
+            buckets[fields[0][:-1]] = {
+                'read': {
+                    'count': int(fields[1]),
+                    'pct': int(fields[2]),
+                    'cum_pct': int(fields[3])
+                },
+                'write': {
+                    'count': int(fields[5]),
+                    'pct': int(fields[6]),
+                    'cum_pct': int(fields[7])
+                }
+            }
+            continue
+
+        # A header: the histogram title and its units, then the column titles
+        title, percent, _ = line.partition('%')
+        if percent:
+            title = title.split()
+            if len(title) > 1:
+                buckets = {}
+                histograms[hist_map[' '.join(title[:-1])]] = {
+                    'units': title[-1],
+                    'buckets': buckets
+                }
+
+    return histograms
+
+
+def _parse_scalar(value):
+    """Convert a job_stats value the way a YAML loader would for the values Lustre writes"""
+    try:
+        return int(value)
+    except ValueError:
+        pass
+
+    if value.replace('.', '', 1).isdigit():
+        return float(value)
+
+    return value
+
+
+def parse_job_stats(lines):
+    """Parse the lines of a job_stats file, e.g.
+
+    job_stats:
+    - job_id:          dd.0
+      snapshot_time:   1381939640
+      read_bytes:      { samples:         662, unit: bytes, min:  106496, max: 1048576, sum:       671088640 }
+      setattr:         { samples:           1, unit:  reqs }
+
+    :return: list of a dict for each job, as loading the file as YAML would give
+             for 'job_stats'.
+    """
+    jobs = []
+    job = None
+
+    for line in lines:
+        line = line.strip()
+
+        if line.startswith('- '):
+            job = {}
+            jobs.append(job)
+            line = line[2:]
+        elif job is None:
+            # 'job_stats:', or blank lines
+            continue
+
+        key, colon, value = line.partition(':')
+        if not colon:
+            continue
+
+        value = value.strip()
+        if value.startswith('{'):
+            job[key] = dict((item_key.strip(), _parse_scalar(item_value.strip()))
+                            for item_key, _, item_value in
+                            (item.partition(':') for item in value.strip('{} ').split(',')))
+        else:
+            job[key] = _parse_scalar(value)
+
+    return jobs
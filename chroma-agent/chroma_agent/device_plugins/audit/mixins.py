@@ -4,6 +4,94 @@
 
 
 import os
+import errno
+import threading
+
+
+class ProcFileCache(object):
+    """Keeps Lustre's proc and sysfs files open between reads.
+
+    The audits read the same few hundred Lustre stats files on every poll, so rather than
+    paying for an open/close of each one every time, a descriptor is kept open
+    and rewound before each read, which makes the kernel regenerate the contents.
+    """
+    PREFIXES = ('/proc/fs/lustre/', '/sys/fs/lustre/')
+    MAX_FILES = 512
+    READ_SIZE = 65536
+
+    def __init__(self, prefixes=PREFIXES):
+        self._prefixes = prefixes
+        self._fds = {}
+        self._lock = threading.Lock()
+
+    def is_cacheable(self, path):
+        return path.startswith(self._prefixes)
+
+    def _open(self, path):
+        if len(self._fds) >= self.MAX_FILES:
+            self._close_all()
+
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError as e:
+            raise IOError(e.errno, e.strerror, path)
+
+        self._fds[path] = fd
+        return fd
+
+    def _close(self, path):
+        fd = self._fds.pop(path, None)
+        if fd is not None:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _close_all(self):
+        for path in self._fds.keys():
+            self._close(path)
+
+    def _read_fd(self, fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+
+        chunks = []
+        while True:
+            chunk = os.read(fd, self.READ_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+
+        return "".join(chunks)
+
+    def read(self, path):
+        """Return the whole contents of path, raising IOError if it cannot be read."""
+        with self._lock:
+            fd = self._fds.get(path)
+
+            if fd is not None:
+                try:
+                    content = self._read_fd(fd)
+                    # A proc entry which has gone away since it was opened reads as empty
+                    # or fails, so only trust a cached descriptor which returns something.
+                    if content:
+                        return content
+                except OSError:
+                    pass
+                self._close(path)
+
+            fd = self._open(path)
+            try:
+                return self._read_fd(fd)
+            except OSError as e:
+                self._close(path)
+                raise IOError(e.errno, e.strerror, path)
+
+    def clear(self):
+        with self._lock:
+            self._close_all()
+
+
+proc_file_cache = ProcFileCache()
 
 
 class FileSystemMixin(object):
@@ -37,6 +125,23 @@ class FileSystemMixin(object):
 
         filename = self.abs(filename)
 
+        if proc_file_cache.is_cacheable(filename):
+            try:
+                content = proc_file_cache.read(filename)
+            except IOError as e:
+                if e.errno != errno.ENOENT or "osd-ldiskfs" not in filename:
+                    raise
+                content = proc_file_cache.read(filename.replace("osd-ldiskfs", "osd-zfs"))
+
+            lines = content.split("\n")
+            if lines[-1] == "":
+                lines.pop()
+
+            for line in lines:
+                if filter_f is None or filter_f(line):
+                    yield line
+            return
+
         if (not os.path.isfile(filename)):
             filename = filename.replace("osd-ldiskfs", "osd-zfs")
 
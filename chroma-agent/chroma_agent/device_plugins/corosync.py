@@ -3,25 +3,13 @@
 # license that can be found in the LICENSE file.
 
 
-import xml.etree.ElementTree as xml
-import errno
-
-from chroma_agent.lib.shell import AgentShell
 from chroma_agent.log import daemon_log
 from chroma_agent.plugin_manager import DevicePlugin
 from iml_common.lib.exception_sandbox import exceptionSandBox
 from chroma_agent.lib.corosync import corosync_running
-from chroma_agent.lib.pacemaker import pacemaker_running
+from chroma_agent.lib.pacemaker import pacemaker_running, crm_mon_snapshot
 from iml_common.lib.date_time import IMLDateTime
 
-try:
-    # Python 2.7
-    from xml.etree.ElementTree import ParseError
-    ParseError  # silence pyflakes
-except ImportError:
-    # Python 2.6
-    from xml.parsers.expat import ExpatError as ParseError
-
 
 class CorosyncPlugin(DevicePlugin):
     """ Agent Plugin to read corosync node health status information
@@ -48,7 +36,7 @@ class CorosyncPlugin(DevicePlugin):
     COROSYNC_CONNECTION_FAILURE = ("Connection to cluster failed: "
                                    "connection failed")
 
-    def _parse_crm_as_xml(self, raw):
+    def _parse_crm_as_xml(self, snapshot):
         """ Parse the crm_mon response
 
         returns dict of nodes status or None if corosync is down
@@ -56,12 +44,11 @@ class CorosyncPlugin(DevicePlugin):
 
         return_dict = None
 
-        try:
-            root = xml.fromstring(raw)
-        except ParseError:
+        root = snapshot.root
+        if root is None:
             # not xml, might be a known error message
-            if CorosyncPlugin.COROSYNC_CONNECTION_FAILURE not in raw:
-                daemon_log.warning("Bad xml from corosync crm_mon:  %s" % raw)
+            if CorosyncPlugin.COROSYNC_CONNECTION_FAILURE not in snapshot.stdout:
+                daemon_log.warning("Bad xml from corosync crm_mon:  %s" % snapshot.stdout)
         else:
             return_dict = {}
 
@@ -89,35 +76,32 @@ class CorosyncPlugin(DevicePlugin):
         return return_dict
 
     def _read_crm_mon_as_xml(self):
-        """Run crm_mon --one-shot --as-xml, return raw output or None
+        """Get the shared crm_mon --one-shot --inactive --as-xml snapshot, or None
 
-        For expected return values (0, 10), return the stdout from output.
+        For expected return values (0, 10), return the snapshot.
         If the return value is unexpected, log a warning, and return None
         """
 
-        crm_command = ['crm_mon', '--one-shot', '--as-xml']
-        try:
-            rc, stdout, stderr = AgentShell.run_old(crm_command)
-        except OSError, e:
-            # ENOENT is fine here.  Pacemaker might not be installed yet.
-            if e.errno != errno.ENOENT:
-                raise
+        snapshot = crm_mon_snapshot.get()
+
+        if snapshot is None:
+            return None
 
-        if rc not in [0, 10]:  # 10 Corosync is not running on this node
+        if snapshot.rc not in [0, 10]:  # 10 Corosync is not running on this node
             daemon_log.warning("rc=%s running '%s': '%s' '%s'" %
-                               (rc, crm_command, stdout, stderr))
-            stdout = None
+                               (snapshot.rc, crm_mon_snapshot.COMMAND, snapshot.stdout, snapshot.stderr))
+            return None
 
-        return stdout
+        return snapshot
 
     def _scan(self):
         """Respond to poll.  Only return if has valid data"""
 
         result = {}
 
-        raw_output = self._read_crm_mon_as_xml()
-        if raw_output:
-            result['crm_info'] = self._parse_crm_as_xml(raw_output)
+        snapshot = self._read_crm_mon_as_xml()
+        if snapshot and snapshot.stdout:
+            result['crm_info'] = self._parse_crm_as_xml(snapshot)
         else:
             result['crm_info'] = None
 
@@ -19,6 +19,7 @@ from chroma_agent.device_plugins.linux import LinuxDevicePlugin
 from iml_common.lib.exception_sandbox import exceptionSandBox
 import chroma_agent.lib.normalize_device_path as ndp
 from chroma_agent.lib.yum_utils import yum_util
+from chroma_agent.lib.pacemaker import crm_mon_snapshot
 from iml_common.lib.date_time import IMLDateTime
 
 from iml_common.filesystems.filesystem import FileSystem
@@ -184,7 +185,7 @@ class LustrePlugin(DevicePlugin):
         # Only set resource_locations if we have the management package
         try:
             from chroma_agent.action_plugins import manage_targets
-            resource_locations = manage_targets.get_resource_locations()
+            resource_locations = manage_targets.get_resource_locations(max_age = crm_mon_snapshot.MAX_AGE)
         except ImportError:
             resource_locations = None
 
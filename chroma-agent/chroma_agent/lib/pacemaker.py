@@ -4,8 +4,18 @@
 
 
 import xml.etree.ElementTree as xml
-from xml.parsers.expat import ExpatError as ParseError
+import errno
 import socket
+import threading
+import time
+
+try:
+    # Python 2.7
+    from xml.etree.ElementTree import ParseError
+    ParseError  # silence pyflakes
+except ImportError:
+    # Python 2.6
+    from xml.parsers.expat import ExpatError as ParseError
 
 from chroma_agent.lib.shell import AgentShell
 from chroma_agent.lib import fence_agents
@@ -169,8 +179,11 @@ class PacemakerConfig(object):
 
     @property
     def nodes(self):
+        return self._nodes(self.root)
+
+    def _nodes(self, root):
         nodes = []
-        for node in self.configuration.find('nodes'):
+        for node in root.find('configuration').find('nodes'):
             nodeobj = PacemakerNode(node.get('uname'), node.get('id'))
             try:
                 i_attrs = node.find('instance_attributes')
@@ -194,11 +207,14 @@ class PacemakerConfig(object):
 
     @property
     def dc(self):
-        dc_uuid = self.root.get('dc-uuid')
+        return self._dc(self.root)
+
+    def _dc(self, root):
+        dc_uuid = root.get('dc-uuid')
 
         if dc_uuid:
             try:
-                return next(node.name for node in self.nodes if node.uuid == dc_uuid)
+                return next(node.name for node in self._nodes(root) if node.uuid == dc_uuid)
             except StopIteration:
                 pass
 
@@ -209,14 +225,19 @@ class PacemakerConfig(object):
         return [n for n in self.nodes if len(n.fence_agents) > 0]
 
     def get_node(self, node_name):
+        return self._get_node(self.nodes, node_name)
+
+    def _get_node(self, nodes, node_name):
         try:
-            return next(n for n in self.nodes if socket.getfqdn(n.name) == socket.getfqdn(node_name))
+            return next(n for n in nodes if socket.getfqdn(n.name) == socket.getfqdn(node_name))
         except IndexError:
             raise PacemakerError("%s does not exist in pacemaker" % node_name)
 
     @property
     def is_dc(self):
-        return self.dc == self.get_node(socket.gethostname()).name
+        # Query the CIB once for both the DC and the local node
+        root = self.root
+        return self._dc(root) == self._get_node(self._nodes(root), socket.gethostname()).name
 
     @property
     def configured(self):
@@ -266,17 +287,25 @@ def cibadmin(command_args, timeout=120):
         107: "Transport endpoint is not connected"
     }
 
+    # Anything but a query may change what crm_mon reports
+    writes = not set(command_args) & set(['--query', '-Q'])
+
     command_args.insert(0, 'cibadmin')
     # NB: This isn't a "true" timeout, in that it won't forcibly stop the
     # subprocess after a timeout. We'd need more invasive changes to
     # shell._run() for that.
-    for _ in util.wait(timeout):
-        result = AgentShell.run(command_args)
-
-        if result.rc == 0:
-            return result
-        elif result.rc not in RETRY_CODES:
-            break
+    try:
+        for _ in util.wait(timeout):
+            result = AgentShell.run(command_args)
+
+            if result.rc == 0:
+                return result
+            elif result.rc not in RETRY_CODES:
+                break
+    finally:
+        # Once the write is done: a snapshot read while it was running may be of the CIB before it
+        if writes:
+            crm_mon_snapshot.invalidate()
 
     # Add some harmless diagnostics which will be visible in the logs.
     AgentShell.run(['service', 'corosync', 'status'])
@@ -293,3 +322,66 @@ def pacemaker_running():
     result = AgentShell.run(['service', 'pacemaker', 'status'])
 
     return result.rc == 0
+
+
+class CrmMonSnapshot(object):
+    """
+    The output of `crm_mon --one-shot --inactive --as-xml`, parsed once and shared by everything in the
+    agent which reads it, in particular the device plugins which all read it in the same
+    poll cycle.
+
+    A snapshot older than MAX_AGE (or than the max_age asked for) is re-read. Device plugins
+    poll more than MAX_AGE apart, so each poll cycle sees a new one. Actions which are waiting for a change they have made ask for
+    max_age=0, and a write to the CIB through cibadmin() invalidates the snapshot.
+
+    --inactive includes the stopped resources, which get_resource_locations reports as
+    unmounted.
+    """
+
+    COMMAND = ['crm_mon', '--one-shot', '--inactive', '--as-xml']
+
+    # The device plugin poll period (agent_client.Session.POLL_PERIOD), so the plugins which poll
+    # at different moments of one cycle still share a snapshot
+    MAX_AGE = 10
+
+    class Snapshot(object):
+        def __init__(self, result):
+            self.rc = result.rc
+            self.stdout = result.stdout
+            self.stderr = result.stderr
+
+            try:
+                self.root = xml.fromstring(self.stdout)
+            except ParseError:
+                # Not xml, might be a known error message
+                self.root = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._taken_at = None
+
+    def get(self, max_age = MAX_AGE):
+        """
+        :return: a Snapshot with rc, stdout, stderr and the parsed root element (None if
+                 the output is not xml), or None if crm_mon is not installed.
+        """
+        with self._lock:
+            if self._taken_at is None or time.time() - self._taken_at >= max_age:
+                try:
+                    self._snapshot = self.Snapshot(AgentShell.run(self.COMMAND))
+                except OSError as e:
+                    # ENOENT is fine here.  Pacemaker might not be installed yet.
+                    if e.errno != errno.ENOENT:
+                        raise
+                    self._snapshot = None
+
+                self._taken_at = time.time()
+
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._taken_at = None
+
+crm_mon_snapshot = CrmMonSnapshot()
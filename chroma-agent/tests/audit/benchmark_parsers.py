@@ -0,0 +1,151 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+"""
+Time the Lustre stats parsers against the regular expression and YAML parsing they
+replaced, over the /proc files captured in tests/data.
+
+    python -m tests.audit.benchmark_parsers [--iterations N]
+"""
+
+import os
+import re
+import sys
+import time
+import glob
+import argparse
+
+from tablib.packages import yaml
+
+from chroma_agent.device_plugins.audit.lustre.parsers import parse_stats, parse_brw_stats, parse_job_stats
+
+
+DATA_ROOT = os.path.join(os.path.dirname(__file__), '..', 'data', 'lustre_versions')
+
+HIST_MAP = {
+    'pages per bulk r/w': 'pages',
+    'discontiguous pages': 'discont_pages',
+    'discontiguous blocks': 'discont_blocks',
+    'disk fragmented I/Os': 'dio_frags',
+    'disk I/Os in flight': 'rpc_hist',
+    'I/O time (1/1000s)': 'io_time',
+    'disk I/O size': 'disk_iosize'
+}
+
+stats_re = re.compile(r"""
+^
+(?P<name>\w+)\s+(?P<count>\d+)\s+samples\s+\[(?P<units>\w+)\]
+(?P<min_max_sum>\s+(?P<min>\d+)\s+(?P<max>\d+)\s+(?P<sum>\d+)
+(?P<sumsq>\s+(?P<sumsquare>\d+))?)?
+$
+""", re.VERBOSE)
+
+header_re = re.compile("""
+^(?P<name>.+?)\s+(?P<units>\w+)\s+%
+""", re.VERBOSE)
+
+bucket_re = re.compile("""
+^
+(?P<name>[\w]+):\s+
+(?P<read_count>\d+)\s+(?P<read_pct>\d+)\s+(?P<read_cum_pct>\d+)
+\s+\|\s+
+(?P<write_count>\d+)\s+(?P<write_pct>\d+)\s+(?P<write_cum_pct>\d+)
+$
+""", re.VERBOSE)
+
+
+def regex_stats(lines):
+    stats = {}
+    for line in lines:
+        match = re.match(stats_re, line)
+        if not match:
+            continue
+
+        stats[match.group('name')] = stat = {
+            'count': int(match.group('count')),
+            'units': match.group('units')
+        }
+        if match.group("min_max_sum") is not None:
+            stat.update({
+                'min': int(match.group('min')),
+                'max': int(match.group('max')),
+                'sum': int(match.group('sum'))
+            })
+        if match.group("sumsq") is not None:
+            stat['sumsquare'] = int(match.group('sumsquare'))
+
+    return stats
+
+
+def regex_brw_stats(lines, hist_map):
+    histograms = {}
+    hist_key = None
+    for line in lines:
+        header = re.match(header_re, line)
+        if header is not None:
+            hist_key = hist_map[header.group('name')]
+            histograms[hist_key] = {'units': header.group('units'), 'buckets': {}}
+            continue
+
+        bucket = re.match(bucket_re, line)
+        if bucket is not None:
+            histograms[hist_key]['buckets'][bucket.group('name')] = {
+                'read': {
+                    'count': int(bucket.group('read_count')),
+                    'pct': int(bucket.group('read_pct')),
+                    'cum_pct': int(bucket.group('read_cum_pct'))
+                },
+                'write': {
+                    'count': int(bucket.group('write_count')),
+                    'pct': int(bucket.group('write_pct')),
+                    'cum_pct': int(bucket.group('write_cum_pct'))
+                }
+            }
+
+    return histograms
+
+
+def yaml_job_stats(lines):
+    return yaml.load("\n".join(lines)).get('job_stats') or []
+
+
+def fixture_lines(name):
+    paths = glob.glob(os.path.join(DATA_ROOT, '*', '*', 'proc', 'fs', 'lustre', '*', '*', name))
+    return [(path, open(path).read().splitlines()) for path in sorted(paths)]
+
+
+def run(name, fixtures, old, new, iterations):
+    for path, lines in fixtures:
+        assert old(lines) == new(lines), "%s parsers disagree on %s" % (name, path)
+
+    timings = []
+    for parse in old, new:
+        start = time.time()
+        for _ in xrange(iterations):
+            for path, lines in fixtures:
+                parse(lines)
+        timings.append(time.time() - start)
+
+    print "%-10s %3d files  old %8.3fs  new %8.3fs  speedup %5.1fx" % (
+        name, len(fixtures), timings[0], timings[1], timings[0] / max(timings[1], 1e-9))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Lustre stats parsers against tests/data fixtures")
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    run('stats', fixture_lines('stats'), regex_stats, parse_stats, args.iterations)
+    run('brw_stats', fixture_lines('brw_stats'),
+        lambda lines: regex_brw_stats(lines, HIST_MAP),
+        lambda lines: parse_brw_stats(lines, HIST_MAP),
+        args.iterations)
+    run('job_stats', fixture_lines('job_stats'), yaml_job_stats, parse_job_stats, args.iterations)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tablib.packages import yaml
+
+from chroma_agent.device_plugins.audit.mixins import ProcFileCache
+from chroma_agent.device_plugins.audit.lustre.parsers import parse_stats, parse_brw_stats, parse_job_stats
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'data', 'lustre_versions')
+
+
+def fixture_lines(*path):
+    return open(os.path.join(FIXTURES, *path)).read().splitlines()
+
+
+class TestParseStats(unittest.TestCase):
+    def test_fixture(self):
+        stats = parse_stats(fixture_lines('2.9.58_86_g2383a62', 'oss', 'proc', 'fs', 'lustre', 'obdfilter',
+                                          'testfs-OST0000', 'stats'))
+
+        self.assertNotIn('snapshot_time', stats)
+        self.assertEqual(stats['write_bytes'], {'count': 2, 'units': 'bytes',
+                                                'min': 1234000, 'max': 1234000, 'sum': 2468000})
+        self.assertEqual(stats['create'], {'count': 2, 'units': 'reqs'})
+
+    def test_sumsquare(self):
+        stats = parse_stats(["obd_ping                  1108 samples [usec] 15 72 47014 2156132"])
+
+        self.assertEqual(stats['obd_ping'], {'count': 1108, 'units': 'usec',
+                                             'min': 15, 'max': 72, 'sum': 47014, 'sumsquare': 2156132})
+
+    def test_negative_values_skipped(self):
+        stats = parse_stats(["req_waittime              6184 samples [usec] -21700 0 -4686031 5209632949",
+                             "req_active                6184 samples [reqs] 1 1 6184 6184"])
+
+        self.assertEqual(stats.keys(), ['req_active'])
+
+
+class TestParseBrwStats(unittest.TestCase):
+    hist_map = {
+        'pages per bulk r/w': 'pages',
+        'discontiguous pages': 'discont_pages',
+        'discontiguous blocks': 'discont_blocks',
+        'disk fragmented I/Os': 'dio_frags',
+        'disk I/Os in flight': 'rpc_hist',
+        'I/O time (1/1000s)': 'io_time',
+        'disk I/O size': 'disk_iosize'
+    }
+
+    def test_fixture(self):
+        histograms = parse_brw_stats(fixture_lines('2.9.58_86_g2383a62', 'oss', 'proc', 'fs', 'lustre', 'obdfilter',
+                                                   'testfs-OST0000', 'brw_stats'), self.hist_map)
+
+        self.assertEqual(histograms['pages']['units'], 'rpcs')
+        self.assertEqual(histograms['pages']['buckets']['1'], {'read': {'count': 2, 'pct': 100, 'cum_pct': 100},
+                                                               'write': {'count': 0, 'pct': 0, 'cum_pct': 0}})
+        self.assertEqual(histograms['pages']['buckets']['512']['write'], {'count': 2, 'pct': 100, 'cum_pct': 100})
+        self.assertEqual(len(histograms['pages']['buckets']), 10)
+        self.assertEqual(histograms['dio_frags']['units'], 'ios')
+
+    def test_unknown_histogram(self):
+        with self.assertRaises(KeyError):
+            parse_brw_stats(["unheard of thing      ios   % cum % |  ios         % cum %"], self.hist_map)
+
+
+class TestParseJobStats(unittest.TestCase):
+    def test_fixtures_match_yaml(self):
+        """The line parser must give exactly what loading the file as YAML used to"""
+        for version, target in [('2.9.58_jobstats', 'lustre-OST0000'),
+                                ('2.9.58_jobstats', 'lustre-OST0001'),
+                                ('2.9.58_86_g2383a62', 'testfs-OST0000')]:
+            lines = fixture_lines(version, 'oss', 'proc', 'fs', 'lustre', 'obdfilter', target, 'job_stats')
+
+            self.assertEqual(parse_job_stats(lines), yaml.load("\n".join(lines)).get('job_stats') or [])
+
+    def test_jobs(self):
+        jobs = parse_job_stats(fixture_lines('2.9.58_jobstats', 'oss', 'proc', 'fs', 'lustre', 'obdfilter',
+                                             'lustre-OST0000', 'job_stats'))
+
+        self.assertEqual([job['job_id'] for job in jobs], ['cp.0', 'dd.0'])
+        self.assertEqual(jobs[1]['snapshot_time'], 1381939640)
+        self.assertEqual(jobs[1]['read_bytes'], {'samples': 662, 'unit': 'bytes',
+                                                 'min': 106496, 'max': 1048576, 'sum': 671088640})
+        self.assertEqual(jobs[1]['setattr'], {'samples': 1, 'unit': 'reqs'})
+
+    def test_cleared(self):
+        self.assertEqual(parse_job_stats(["job_stats:"]), [])
+
+
+class TestProcFileCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'stats')
+        self.cache = ProcFileCache(prefixes=(self.root,))
+
+    def tearDown(self):
+        self.cache.clear()
+        shutil.rmtree(self.root)
+
+    def _write(self, content):
+        with open(self.path, 'w') as f:
+            f.write(content)
+
+    def test_cacheable(self):
+        self.assertTrue(self.cache.is_cacheable(self.path))
+        self.assertFalse(self.cache.is_cacheable('/etc/hosts'))
+
+    def test_reuses_descriptor(self):
+        self._write("one\n")
+        self.assertEqual(self.cache.read(self.path), "one\n")
+        fd = self.cache._fds[self.path]
+
+        # Rewritten in place, as the kernel regenerates a proc file
+        self._write("two\n")
+        self.assertEqual(self.cache.read(self.path), "two\n")
+        self.assertEqual(self.cache._fds[self.path], fd)
+
+    def test_reopens_replaced_file(self):
+        self._write("one\n")
+        self.cache.read(self.path)
+
+        # A descriptor to a proc entry which has gone away reads as empty, so the path is opened afresh
+        self._write("")
+        os.unlink(self.path)
+        self._write("two\n")
+        self.assertEqual(self.cache.read(self.path), "two\n")
+
+    def test_missing_file(self):
+        with self.assertRaises(IOError):
+            self.cache.read(self.path)
+        self.assertNotIn(self.path, self.cache._fds)
+
+    def test_bounded(self):
+        self._write("one\n")
+        self.cache.MAX_FILES = 1
+        self.cache.read(self.path)
+
+        other_path = os.path.join(self.root, 'other')
+        with open(other_path, 'w') as f:
+            f.write("other\n")
+        self.assertEqual(self.cache.read(other_path), "other\n")
+        self.assertEqual(self.cache._fds.keys(), [other_path])
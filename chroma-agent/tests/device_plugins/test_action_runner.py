@@ -288,6 +288,33 @@ class TestActionRunnerPlugin(ActionRunnerPluginTestCase):
                     ])
 
 
+class TestActionRunnerPluginBatch(ActionRunnerPluginTestCase):
+
+    MOCK_SUBPROCESSES = subprocesses
+
+    def test_capabilities(self):
+        """The session's first message tells the manager that batches are accepted"""
+        self.assertEqual(self.action_runner.start_session(), {'type': 'CAPABILITIES',
+                                                              'capabilities': ['action_batch']})
+
+    def test_batch_start(self):
+        """All the actions in an ACTION_BATCH_START run, each with its own ACTION_COMPLETE"""
+        actions = 20
+
+        self.action_runner.on_message({
+            'type': 'ACTION_BATCH_START',
+            'actions': [{'id': "%s" % id,
+                         'action': 'action_one_no_context',
+                         'args': {'arg1': 'arg1_test'}} for id in xrange(0, actions)]
+        })
+
+        responses = self._get_responses(actions)
+        self.assertEqual(sorted(int(r['id']) for r in responses), range(0, actions))
+        for response in responses:
+            self.assertEqual(response['result'], ACTION_ONE_NO_CONTEXT_RETVAL)
+            self.assertIsNone(response['exception'])
+
+
 class TestActionRunnerPluginCancellation(ActionRunnerPluginTestCase):
     def test_teardown(self):
         """Test that tearing down ActionRunnerPlugin interrupts execution of
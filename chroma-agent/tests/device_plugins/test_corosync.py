@@ -5,13 +5,14 @@ import json
 
 
 from chroma_agent.device_plugins.corosync import CorosyncPlugin
+from chroma_agent.lib.pacemaker import crm_mon_snapshot
 from iml_common.test.command_capture_testcase import CommandCaptureTestCase, CommandCaptureCommand
 from iml_common.lib.date_time import IMLDateTime
 
 log = logging.getLogger(__name__)
 
 ONLINE, OFFLINE = 'true', 'false'
-CMD = ('crm_mon', '--one-shot', '--as-xml')
+CMD = ('crm_mon', '--one-shot', '--inactive', '--as-xml')
 
 
 class TestCorosync(CommandCaptureTestCase):
@@ -22,6 +23,12 @@ class TestCorosync(CommandCaptureTestCase):
     If the host is up and corosync is down, the return {'ERROR': reason }
     """
 
+    def setUp(self):
+        super(TestCorosync, self).setUp()
+
+        # Each test feeds crm_mon its own output
+        crm_mon_snapshot.invalidate()
+
     def test_corosync_up(self):
         """Check that getting status of corosync works
 
@@ -41,7 +48,7 @@ class TestCorosync(CommandCaptureTestCase):
         feed_local_datetime = "Fri Jan 11 11:04:07 2013"  # PST  (UTC-8)
         feed_utc_datetime = "2013-01-11T19:04:07+00:00"   # UTC
 
-        # crm_mon --one-shot --as-xml
+        # crm_mon --one-shot --inactive --as-xml
         # Simulating running this command for output
         # that has two nodes one online one offline.
         crm_one_shot_xml = """<?xml version="1.0"?>
@@ -25,7 +25,7 @@ class TestLustreAudit(unittest.TestCase):
     def mock_capabilities(self):
         return {'capabilities': TestLustreAudit.values['capabilities']}
 
-    def mock_get_resource_locations(self):
+    def mock_get_resource_locations(self, max_age = 0):
         return {'resource locations': TestLustreAudit.values['resource_locations']}
 
     def mock_scan_mounts(self):
@@ -1,4 +1,5 @@
 import logging
+import threading
 import time
 import json
 import datetime
@@ -6,7 +7,7 @@ import mock
 
 from django.utils import unittest
 
-from chroma_agent.agent_client import HttpWriter, Message, HttpReader, SessionTable, HttpError
+from chroma_agent.agent_client import CryptoClient, HttpWriter, Message, HttpReader, SessionTable, HttpError
 from chroma_agent.log import daemon_log
 from chroma_agent.plugin_manager import PRIO_LOW, DevicePluginMessage, PRIO_NORMAL, PRIO_HIGH
 from iml_common.lib.date_time import IMLDateTime
@@ -60,6 +61,61 @@ class TestHttpWriter(unittest.TestCase):
                 writer.stop()
                 writer.join()
 
+    def test_pipelined_posts(self):
+        """Test that POSTs for different plugins are in flight together, while a
+        plugin's later messages wait for its POST in flight to complete"""
+
+        client = mock.Mock()
+        client._fqdn = "test_server"
+        client.device_plugins.get_plugins = mock.Mock(return_value=[])
+        client.boot_time = IMLDateTime.utcnow()
+        client.start_time = IMLDateTime.utcnow()
+
+        release_posts = threading.Event()
+        posts_lock = threading.Lock()
+        posts = []
+        completed = []
+
+        def slow_post(envelope):
+            with posts_lock:
+                posts.append([(m['plugin'], m['session_seq']) for m in envelope['messages']])
+            release_posts.wait()
+            with posts_lock:
+                completed.extend((m['plugin'], m['session_seq']) for m in envelope['messages'])
+
+        client.post = mock.Mock(side_effect=slow_post)
+
+        def wait_for(condition):
+            for _ in xrange(20):
+                with posts_lock:
+                    if condition():
+                        return
+                time.sleep(0.1)
+            raise AssertionError("Timed out, posts: %s" % posts)
+
+        writer = HttpWriter(client)
+        writer.start()
+        try:
+            writer.put(Message("DATA", "plugin_foo", DevicePluginMessage({}, PRIO_NORMAL), "foo", 0))
+            wait_for(lambda: len(posts) == 1)
+            writer.put(Message("DATA", "plugin_bar", DevicePluginMessage({}, PRIO_NORMAL), "bar", 0))
+            writer.put(Message("DATA", "plugin_foo", DevicePluginMessage({}, PRIO_NORMAL), "foo", 1))
+
+            # plugin_bar goes out alongside plugin_foo's first POST, but plugin_foo's
+            # second message waits
+            wait_for(lambda: len(posts) == 2)
+            time.sleep(0.2)
+            self.assertEqual(posts, [[('plugin_foo', 0)], [('plugin_bar', 0)]])
+
+            release_posts.set()
+            wait_for(lambda: len(posts) == 3)
+            self.assertEqual(posts[2], [('plugin_foo', 1)])
+            self.assertLess(completed.index(('plugin_foo', 0)), completed.index(('plugin_foo', 1)))
+        finally:
+            release_posts.set()
+            writer.stop()
+            writer.join()
+
     def test_priorities(self):
         """
         Test that messages are consumed for POST based on the priority of the payload (data plane), or at the highest
@@ -348,3 +404,67 @@ class TestHttpReader(unittest.TestCase):
         session.teardown.assertCalledOnce()
         # Should have removed the session
         self.assertNotIn('test_plugin', client.sessions._sessions)
+
+
+class TestCryptoClient(unittest.TestCase):
+    def setUp(self):
+        crypto = mock.Mock()
+        crypto.certificate_file = None
+        self.client = CryptoClient("https://manager/agent/message/", crypto, fqdn = "test_server")
+
+    def test_keepalive(self):
+        """Test that requests share one session, and so its pooled connections"""
+        response = mock.Mock()
+        response.ok = True
+
+        with mock.patch.object(self.client._session, 'request', return_value=response) as request:
+            self.client.post({})
+            self.client.get()
+
+        self.assertEqual(request.call_count, 2)
+
+    def test_get_stream(self):
+        """Test that each line of a streaming GET is yielded as it is read"""
+        response = mock.Mock()
+        response.ok = True
+        response.iter_lines = mock.Mock(return_value=iter(['{"messages": []}', '', '{"messages": [{"type": "DATA"}]}']))
+
+        with mock.patch('requests.Session.request', return_value=response) as request:
+            bodies = list(self.client.get_stream(params={'stream': 1}))
+
+        self.assertEqual(bodies, [{'messages': []}, {'messages': [{'type': 'DATA'}]}])
+        self.assertTrue(request.call_args[1]['stream'])
+        response.close.assert_called_once_with()
+
+    def test_get_stream_broken(self):
+        """Test that a connection dropped mid-stream raises HttpError"""
+        import requests
+
+        def lines():
+            yield '{"messages": []}'
+            raise requests.exceptions.ConnectionError()
+
+        response = mock.Mock()
+        response.ok = True
+        response.iter_lines = mock.Mock(return_value=lines())
+
+        with mock.patch('requests.Session.request', return_value=response):
+            stream = self.client.get_stream()
+            self.assertEqual(next(stream), {'messages': []})
+            self.assertRaises(HttpError, next, stream)
+
+    def test_get_stream_no_keepalive(self):
+        """Test that without keepalive, the session of a streaming GET is closed once the stream is read"""
+        response = mock.Mock()
+        response.ok = True
+        response.iter_lines = mock.Mock(return_value=iter(['{"messages": []}']))
+
+        with mock.patch.object(CryptoClient, 'KEEPALIVE', False):
+            with mock.patch('requests.Session.request', return_value=response):
+                with mock.patch('requests.Session.close') as close:
+                    stream = self.client.get_stream()
+                    self.assertEqual(next(stream), {'messages': []})
+                    self.assertFalse(close.called)
+
+                    self.assertEqual(list(stream), [])
+                    close.assert_called_once_with()
@@ -0,0 +1,136 @@
+import mock
+
+from chroma_agent.action_plugins import manage_targets
+from chroma_agent.agent_client import Session
+from chroma_agent.lib.pacemaker import cibadmin, crm_mon_snapshot, CrmMonSnapshot
+from iml_common.test.command_capture_testcase import CommandCaptureTestCase, CommandCaptureCommand
+
+CMD = ('crm_mon', '--one-shot', '--inactive', '--as-xml')
+
+# The stopped OST is only listed because of --inactive
+crm_mon_xml = """<?xml version="1.0"?>
+<crm_mon version="1.1.12">
+  <summary>
+    <last_update time="Fri Jan 11 11:04:07 2013" />
+    <current_dc present="%s" name="node1" id="1" with_quorum="true" />
+  </summary>
+  <nodes>
+    <node name="node1" id="1" online="true" />
+    <node name="node2" id="2" online="true" />
+  </nodes>
+  <resources>
+    <resource id="st-fencing" resource_agent="stonith:fence_chroma" role="Started" active="true" nodes_running_on="1">
+      <node name="node1" id="1" cached="false"/>
+    </resource>
+    <resource id="MGS_424f74" resource_agent="ocf::chroma:Target" role="Started" active="true" nodes_running_on="1">
+      <node name="node2" id="2" cached="false"/>
+    </resource>
+    <resource id="testfs-OST0000_e1321a" resource_agent="ocf::chroma:Target" role="Stopped" active="false" nodes_running_on="0" />
+    <group id="group-testfs-OST0001_f3a2b1" number_resources="1">
+      <resource id="testfs-OST0001_f3a2b1" resource_agent="ocf::chroma:Target" role="Started" active="true" nodes_running_on="1">
+        <node name="node1" id="1" cached="false"/>
+      </resource>
+    </group>
+  </resources>
+</crm_mon>"""
+
+
+class TestCrmMonSnapshot(CommandCaptureTestCase):
+    def setUp(self):
+        super(TestCrmMonSnapshot, self).setUp()
+
+        crm_mon_snapshot.invalidate()
+        self.addCleanup(crm_mon_snapshot.invalidate)
+
+    def test_shared(self):
+        """Readers within MAX_AGE of each other share one crm_mon"""
+        self.single_commands(CommandCaptureCommand(CMD, stdout=crm_mon_xml % 'true'))
+
+        first = crm_mon_snapshot.get()
+        second = crm_mon_snapshot.get()
+
+        self.assertIs(first, second)
+        self.assertEqual(first.root.find('summary/current_dc').get('name'), 'node1')
+        self.assertEqual(self.commands_ran_count, 1)
+
+    def test_poll_period(self):
+        """A snapshot lasts a whole device plugin poll cycle"""
+        self.assertGreaterEqual(CrmMonSnapshot.MAX_AGE, Session.POLL_PERIOD)
+
+    def test_max_age(self):
+        """A reader which asks for max_age=0 always runs crm_mon"""
+        self.single_commands(CommandCaptureCommand(CMD, stdout=crm_mon_xml % 'true'),
+                             CommandCaptureCommand(CMD, stdout=crm_mon_xml % 'false'))
+
+        crm_mon_snapshot.get()
+        snapshot = crm_mon_snapshot.get(0)
+
+        self.assertEqual(snapshot.root.find('summary/current_dc').get('present'), 'false')
+        self.assertRanAllCommandsInOrder()
+
+    def test_invalidated_by_cib_write(self):
+        self.single_commands(CommandCaptureCommand(CMD, stdout=crm_mon_xml % 'true'),
+                             CommandCaptureCommand(('cibadmin', '--query', '--local')),
+                             CommandCaptureCommand(('cibadmin', '-D', '-X', '<primitive id="MGS_424f74">')),
+                             CommandCaptureCommand(CMD, stdout=crm_mon_xml % 'true'))
+
+        first = crm_mon_snapshot.get()
+        cibadmin(['--query', '--local'])
+        self.assertIs(crm_mon_snapshot.get(), first)
+
+        cibadmin(['-D', '-X', '<primitive id="MGS_424f74">'])
+        self.assertIsNot(crm_mon_snapshot.get(), first)
+        self.assertRanAllCommandsInOrder()
+
+    def test_read_during_cib_write(self):
+        """A snapshot read while a write to the CIB is running isn't kept once it's done"""
+        crm_mon_outputs = [crm_mon_xml % 'true', crm_mon_xml % 'false']
+
+        def run(args):
+            if args[0] == 'cibadmin':
+                # Another thread reads the CIB from before the write
+                self.during_write = crm_mon_snapshot.get()
+                return mock.Mock(rc=0, stdout='', stderr='')
+            return mock.Mock(rc=0, stdout=crm_mon_outputs.pop(0), stderr='')
+
+        with mock.patch('chroma_agent.lib.shell.AgentShell.run', side_effect=run):
+            crm_mon_snapshot.get(0)
+            cibadmin(['-D', '-X', '<primitive id="MGS_424f74">'])
+            snapshot = crm_mon_snapshot.get()
+
+        self.assertIsNot(snapshot, self.during_write)
+        self.assertEqual(snapshot.root.find('summary/current_dc').get('present'), 'false')
+
+    def test_not_installed(self):
+        with mock.patch('chroma_agent.lib.shell.AgentShell.run', side_effect=OSError(2, 'No such file or directory')):
+            self.assertIsNone(crm_mon_snapshot.get())
+
+
+class TestGetResourceLocations(CommandCaptureTestCase):
+    def setUp(self):
+        super(TestGetResourceLocations, self).setUp()
+
+        crm_mon_snapshot.invalidate()
+        self.addCleanup(crm_mon_snapshot.invalidate)
+
+    def test_locations(self):
+        self.add_commands(CommandCaptureCommand(CMD, stdout=crm_mon_xml % 'true'))
+
+        self.assertEqual(manage_targets.get_resource_locations(), {'MGS_424f74': 'node2',
+                                                                   'testfs-OST0000_e1321a': None,
+                                                                   'testfs-OST0001_f3a2b1': 'node1'})
+        self.assertRanAllCommandsInOrder()
+
+    def test_no_dc(self):
+        self.add_commands(CommandCaptureCommand(CMD, stdout=crm_mon_xml % 'false'))
+
+        self.assertEqual(manage_targets.get_resource_locations(), {})
+        self.assertRanAllCommandsInOrder()
+
+    def test_not_running(self):
+        self.add_commands(CommandCaptureCommand(CMD, rc=107, stderr='Connection refused'))
+
+        self.assertEqual(manage_targets.get_resource_locations(), {'crm_mon_error': {'rc': 107,
+                                                                                     'stdout': '',
+                                                                                     'stderr': 'Connection refused'}})
+        self.assertRanAllCommandsInOrder()
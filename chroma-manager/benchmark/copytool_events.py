@@ -0,0 +1,157 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import json
+import random
+import time
+from StringIO import StringIO
+
+from django.db import connection, reset_queries
+from django.test.client import Client
+from django.test.simple import DjangoTestSuiteRunner
+
+from chroma_core.models import ManagedHost, ManagedMgs, ManagedFilesystem, Volume
+from chroma_core.models.copytool import Copytool, CopytoolOperation, OP_STATES
+from benchmark.generic import GenericBenchmark
+
+
+SERIAL = 'benchmark_serial'
+
+
+class ViewClient(object):
+    """Stands in for the agent's CryptoClient, POSTing straight to the CopytoolEventView"""
+    def __init__(self, fqdn):
+        self.fqdn = fqdn
+        self._client = Client()
+        self.posts = 0
+        self.events = 0
+        self.queries = 0
+        self.seconds = 0.0
+
+    def post(self, envelope):
+        reset_queries()
+        started = time.time()
+        response = self._client.post('/agent/copytool_event/', data = json.dumps(envelope),
+                                     content_type = 'application/json',
+                                     HTTP_X_SSL_CLIENT_SERIAL = SERIAL, HTTP_X_SSL_CLIENT_NAME = self.fqdn)
+        self.seconds += time.time() - started
+        if response.status_code != 200:
+            raise RuntimeError("POST failed (%s): %s" % (response.status_code, response.content))
+
+        self.posts += 1
+        self.events += len(envelope['events'])
+        self.queries += len(connection.queries)
+
+        return json.loads(response.content)
+
+
+class FakeCopytoolWrapper(object):
+    """What cluster-sim's FakeHsmCopytoolThread needs of its FakeHsmCopytool"""
+    uuid = 'benchmark-uuid'
+
+    def __init__(self, copytool):
+        self.copytool = copytool
+
+
+class FakeCoordinator(object):
+    def start_request(self, agent_uuid, request):
+        pass
+
+    def finish_request(self, agent_uuid, request):
+        pass
+
+
+class CopytoolEventBenchmark(GenericBenchmark):
+    """
+    Times the ingestion of an archive storm by the copytool event endpoint.
+
+    cluster-sim's fake HSM copytool archives the files, a concurrent number
+    at a time, each taking a few progress intervals.  Its events are relayed
+    after each interval by the agent's CopytoolEventRelay, in the POSTs it
+    would make, to the CopytoolEventView of this process (so both cluster-sim
+    and chroma-agent must be importable).  The copytool is created in a test
+    database, already started.
+    """
+    def __init__(self, files, concurrency):
+        self.files = files
+        self.concurrency = concurrency
+        self.test_runner = DjangoTestSuiteRunner()
+
+    def prepare(self):
+        from south.management.commands import patch_for_test_db_setup
+
+        self.test_runner.setup_test_environment()
+        patch_for_test_db_setup()
+        self.old_db_config = self.test_runner.setup_databases()
+
+        host = ManagedHost.objects.create(address = 'worker', fqdn = 'worker', nodename = 'worker')
+        mgs = ManagedMgs.objects.create(volume = Volume.objects.create())
+        filesystem = ManagedFilesystem.objects.create(name = 'benchfs', mgs = mgs)
+        self.copytool = Copytool.objects.create(host = host, filesystem = filesystem,
+                                                bin_path = '/usr/sbin/lhsmtool_posix', state = 'started')
+
+        # The views can't be imported before the http_agent service, which imports them
+        from chroma_core.services.http_agent import ValidatedClientView
+        ValidatedClientView.valid_certs = {SERIAL: host.fqdn}
+
+        # Record the queries, to count them
+        connection.use_debug_cursor = True
+
+    def cleanup(self):
+        self.test_runner.teardown_databases(self.old_db_config)
+        self.test_runner.teardown_test_environment()
+
+    def run(self):
+        from chroma_agent.copytool_monitor import CopytoolEventRelay, Copytool as AgentCopytool
+        from cluster_sim.fake_hsm_coordinator import FakeHsmCoordinatorThread
+        from cluster_sim.fake_hsm_copytool import FakeHsmCopytoolThread, COPYTOOL_LOOP_INTERVAL
+
+        self.prepare()
+        try:
+            agent_copytool = AgentCopytool(id = self.copytool.id, index = self.copytool.index,
+                                           bin_path = self.copytool.bin_path, archive_number = self.copytool.archive,
+                                           filesystem = self.copytool.filesystem.name,
+                                           mountpoint = self.copytool.mountpoint, hsm_arguments = '')
+            client = ViewClient(self.copytool.host.fqdn)
+            relay = CopytoolEventRelay(agent_copytool, client)
+
+            fake_copytool = FakeHsmCopytoolThread(FakeCopytoolWrapper(agent_copytool), FakeCoordinator())
+            fake_copytool.fifo = StringIO()
+            requests = FakeHsmCoordinatorThread(None)
+
+            # Each file takes between one and three progress intervals of the copytool's bandwidth
+            interval_bytes = fake_copytool.max_bandwidth * COPYTOOL_LOOP_INTERVAL / self.concurrency
+
+            started = 0
+            while started < self.files or fake_copytool.active_requests:
+                while started < self.files and len(fake_copytool.active_requests) < self.concurrency:
+                    request = requests.get_random_action()
+                    request['action'] = 'ARCHIVE'
+                    request['total_bytes'] = interval_bytes * random.randint(1, 3)
+                    fake_copytool.start_request(request)
+                    started += 1
+
+                # Report the progress of every request
+                fake_copytool.last_progress_event = 0
+                fake_copytool.progress_active_requests()
+
+                for line in fake_copytool.fifo.getvalue().splitlines():
+                    relay.put(line)
+                fake_copytool.fifo.truncate(0)
+
+                while not (relay.send_queue.empty() and relay.retry_queue.empty()):
+                    relay.send()
+
+            finished = CopytoolOperation.objects.filter(copytool = self.copytool, state = OP_STATES.FINISHED).count()
+
+            print "Files: %s, concurrency: %s" % (self.files, self.concurrency)
+            print "Events: %s in %s POSTs" % (client.events, client.posts)
+            print "POST time: %.3fs (%.0f events/s)" % (client.seconds, client.events / client.seconds)
+            print "Queries: %s (%.1f per POST, %.2f per event)" % (client.queries,
+                                                                   client.queries / float(client.posts),
+                                                                   client.queries / float(client.events))
+            print "Finished operations: %s" % finished
+        finally:
+            self.cleanup()
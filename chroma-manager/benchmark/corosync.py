@@ -0,0 +1,120 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import datetime
+import random
+import time
+
+from django.db import connection, reset_queries
+from django.test.simple import DjangoTestSuiteRunner
+
+from chroma_core.models import ManagedHost, CorosyncConfiguration, PacemakerConfiguration, HostOfflineAlert
+from chroma_core.services.corosync import Service as CorosyncService
+from chroma_core.services.job_scheduler import job_scheduler_notify
+from benchmark.generic import GenericBenchmark
+
+
+class CorosyncBenchmark(GenericBenchmark):
+    """
+    Times the corosync service's handling of the reports of a large HA cluster, in which every
+    node reports the membership of the whole cluster every period, and a number of nodes go
+    offline or come back online each period.  The hosts are created in a test database, and the
+    job_scheduler notifications which the service would send are counted, and applied after each
+    report as the job_scheduler would.
+    """
+    def __init__(self, nodes, periods, churn):
+        self.nodes = nodes
+        self.periods = periods
+        self.churn = churn
+        self.test_runner = DjangoTestSuiteRunner()
+
+    def prepare(self):
+        from south.management.commands import patch_for_test_db_setup
+
+        self.test_runner.setup_test_environment()
+        patch_for_test_db_setup()
+        self.old_db_config = self.test_runner.setup_databases()
+
+        self.hosts = []
+        for n in range(self.nodes):
+            host = ManagedHost.objects.create(address = 'node%.3d' % n, fqdn = 'node%.3d.bench' % n, nodename = 'node%.3d' % n)
+            CorosyncConfiguration.objects.create(host = host, state = 'started')
+            PacemakerConfiguration.objects.create(host = host, state = 'started')
+            self.hosts.append(host)
+
+        # Record the queries, to count them
+        connection.use_debug_cursor = True
+
+    def cleanup(self):
+        self.test_runner.teardown_databases(self.old_db_config)
+        self.test_runner.teardown_test_environment()
+
+    def _report(self, online, reported_at):
+        return {'crm_info': {'nodes': dict((host.nodename, {'name': host.nodename,
+                                                            'online': 'true' if online[host.id] else 'false'})
+                                           for host in self.hosts),
+                             'datetime': reported_at.isoformat() + '+00:00',
+                             'options': {'stonith_enabled': True}},
+                'state': {'corosync': 'started', 'pacemaker': 'started'}}
+
+    def _apply(self, notifications):
+        for instance, update_attrs in notifications:
+            for attr, value in update_attrs.items():
+                if attr == 'ha_cluster_peers':
+                    ManagedHost.objects.get(id = instance.id).ha_cluster_peers = value
+                else:
+                    instance.__class__.objects.filter(id = instance.id).update(**{attr: value})
+
+    def run(self):
+        self.prepare()
+
+        notifications = []
+        original_notify = job_scheduler_notify.notify
+        job_scheduler_notify.notify = lambda instance, time, update_attrs, from_states = []: notifications.append((instance, update_attrs))
+        try:
+            service = CorosyncService()
+            online = dict((host.id, True) for host in self.hosts)
+
+            reports = 0
+            quiet_reports = 0
+            notified = 0
+            queries = 0
+            seconds = 0.0
+            for period in range(self.periods):
+                # The first period is everything coming up
+                if period:
+                    for host in random.sample(self.hosts, self.churn):
+                        online[host.id] = not online[host.id]
+
+                # Each node reports at its own time in the period
+                for n, host in enumerate(self.hosts):
+                    if not online[host.id]:
+                        continue
+
+                    report = self._report(online, datetime.datetime(2017, 1, 1) + datetime.timedelta(seconds = period * 10,
+                                                                                                     milliseconds = n))
+
+                    reset_queries()
+                    started = time.time()
+                    service.on_data(host.fqdn, report)
+                    seconds += time.time() - started
+                    queries += len(connection.queries)
+                    quiet_reports += not connection.queries
+                    reports += 1
+
+                    notified += len(notifications)
+                    self._apply(notifications)
+                    del notifications[:]
+
+            print "Nodes: %s, periods: %s, churn: %s per period" % (self.nodes, self.periods, self.churn)
+            print "Reports: %s in %.3fs (%.2fms per report)" % (reports, seconds, seconds * 1000 / reports)
+            print "Queries: %s (%.1f per report)" % (queries, queries / float(reports))
+            print "Reports without queries: %s" % quiet_reports
+            print "job_scheduler notifications: %s" % notified
+            print "HostOfflineAlerts: %s, active: %s" % (HostOfflineAlert.objects.count(),
+                                                         HostOfflineAlert.objects.filter(active = True).count())
+        finally:
+            job_scheduler_notify.notify = original_notify
+            self.cleanup()
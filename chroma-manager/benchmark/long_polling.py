@@ -0,0 +1,152 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import threading
+import time
+
+from chroma_core.lib import util
+from chroma_core.lib.long_polling import long_polling
+from chroma_core.services import ServiceThread
+from chroma_core.services.rpc import ServiceRpcInterface
+
+
+TABLE = 'chroma_core_benchmark_long_polling'
+
+
+class LongPollingRpc(ServiceRpcInterface):
+    """Long polling as the job scheduler served it before the notification hub, an RPC per change and per poll"""
+    methods = ['tables_changed', 'wait_table_change', 'table_timestamps']
+
+
+class RpcPath(object):
+    """Changes and polls as RPCs to a server in this process, which runs a thread for each one"""
+    name = 'rpc'
+
+    def __init__(self):
+        self._server = ServiceThread(LongPollingRpc(long_polling))
+
+    def start(self):
+        self._server.start()
+
+    def stop(self):
+        self._server.stop()
+        self._server.join()
+
+    def tables_changed(self, timestamp, changed_ids):
+        LongPollingRpc().tables_changed(timestamp, changed_ids.keys(), changed_ids)
+
+    def wait_table_change(self, table_timestamps, timeout):
+        return LongPollingRpc().wait_table_change(table_timestamps, [TABLE], timeout, False,
+                                                  rpc_timeout = timeout + 5)
+
+    def table_timestamps(self):
+        return LongPollingRpc().table_timestamps([TABLE])
+
+    def messages(self):
+        return None
+
+
+class HubPath(object):
+    """Changes sent to the notification_hub service, which must be running, and polls answered here"""
+    name = 'hub'
+
+    def __init__(self):
+        from chroma_core.services.notification_hub import client
+        self._client = client
+        self._listener = None
+        self._received = 0
+
+    def start(self):
+        self._listener = self._client.start_listening()
+        self._received = self._listener.received
+
+    def stop(self):
+        pass
+
+    def tables_changed(self, timestamp, changed_ids):
+        self._client.NotificationHubClient.tables_changed(timestamp, changed_ids)
+
+    def wait_table_change(self, table_timestamps, timeout):
+        return self._client.NotificationHubClient.wait_table_change(table_timestamps, [TABLE], timeout)
+
+    def table_timestamps(self):
+        return self._client.NotificationHubClient.table_timestamps([TABLE])
+
+    def messages(self):
+        return self._listener.received - self._received
+
+
+class LongPollingBenchmark(object):
+    """
+    Holds pollers long polls open on a table, as the API does for idle browsers, then commits a storm
+    of changes to it and measures how long it takes every poller to see the last of them.
+    """
+    def __init__(self, pollers, commits, path, timeout):
+        self.pollers = pollers
+        self.commits = commits
+        self.timeout = timeout
+        self.path = HubPath() if path == 'hub' else RpcPath()
+
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._wakes = 0
+
+    def _poll(self, n, cursor):
+        while not self._stopping.is_set():
+            table_timestamps = self.path.wait_table_change({'max_timestamp': cursor}, self.timeout)
+            if table_timestamps:
+                cursor = table_timestamps['max_timestamp']
+                with self._lock:
+                    self._wakes += 1
+                    self._seen[n] = (cursor, time.time())
+
+    def run(self):
+        self.path.start()
+        try:
+            cursor = self.path.table_timestamps()['max_timestamp']
+            idle_threads = threading.active_count()
+
+            threads = [threading.Thread(target = self._poll, args = (n, cursor)) for n in range(self.pollers)]
+            for thread in threads:
+                thread.daemon = True
+                thread.start()
+
+            # Let the polls settle into waiting before the storm
+            time.sleep(2)
+            waiting_threads = threading.active_count() - idle_threads - self.pollers
+
+            started = time.time()
+            last_timestamp = None
+            for pk in range(self.commits):
+                last_timestamp = int(time.time() * util.SECONDSTOMICROSECONDS)
+                self.path.tables_changed(last_timestamp, {TABLE: [pk]})
+            sent = time.time()
+
+            # Wait for every poller to have seen a timestamp from the last commit
+            deadline = sent + self.timeout
+            while time.time() < deadline:
+                with self._lock:
+                    caught_up = [at for timestamp, at in self._seen.values() if timestamp >= last_timestamp]
+                if len(caught_up) == self.pollers:
+                    break
+                time.sleep(0.01)
+
+            self._stopping.set()
+
+            print "Path: %s" % self.path.name
+            print "Pollers: %s, commits: %s" % (self.pollers, self.commits)
+            print "Extra threads while pollers wait: %s" % waiting_threads
+            print "Commits sent in: %.3fs" % (sent - started)
+            if len(caught_up) == self.pollers:
+                print "All pollers saw the last commit after: %.3fs" % (max(caught_up) - sent)
+            else:
+                print "Only %s of %s pollers saw the last commit within %ss" % (len(caught_up), self.pollers, self.timeout)
+            print "Wakes: %s (%.1f per poller)" % (self._wakes, self._wakes / float(self.pollers))
+            if self.path.messages() is not None:
+                print "Broadcasts received: %s" % self.path.messages()
+        finally:
+            self._stopping.set()
+            self.path.stop()
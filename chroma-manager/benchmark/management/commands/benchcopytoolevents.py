@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from benchmark.copytool_events import CopytoolEventBenchmark
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+            make_option("--files", type=int, default=10000,
+                help="number of files for cluster-sim's fake copytool to archive (default: 10000)"),
+            make_option("--concurrency", type=int, default=500,
+                help="number of files archived at a time (default: 500)"),
+    )
+    help = "Benchmark the ingestion of copytool events from cluster-sim's fake HSM copytool"
+
+    def handle(self, *args, **kwargs):
+        CopytoolEventBenchmark(kwargs['files'], kwargs['concurrency']).run()
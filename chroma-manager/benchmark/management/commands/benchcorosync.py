@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from benchmark.corosync import CorosyncBenchmark
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+            make_option("--nodes", type=int, default=32,
+                help="number of nodes in the HA cluster (default: 32)"),
+            make_option("--periods", type=int, default=20,
+                help="number of reporting periods (default: 20)"),
+            make_option("--churn", type=int, default=2,
+                help="number of nodes which go offline or come back online each period (default: 2)"),
+    )
+    help = "Benchmark the corosync service's handling of membership churn in a large HA cluster"
+
+    def handle(self, *args, **kwargs):
+        CorosyncBenchmark(kwargs['nodes'], kwargs['periods'], kwargs['churn']).run()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from benchmark.long_polling import LongPollingBenchmark
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+            make_option("--pollers", type=int, default=200,
+                help="number of idle long polls to hold open (default: 200)"),
+            make_option("--commits", type=int, default=1000,
+                help="number of table changes to commit in the storm (default: 1000)"),
+            make_option("--path", type="choice", choices=['hub', 'rpc'], default='hub',
+                help="'hub' to go through the notification_hub service (which must be running), "
+                     "or 'rpc' for an RPC per change and per poll as the job scheduler used to (default: hub)"),
+            make_option("--timeout", type=int, default=60,
+                help="long poll timeout, and how long to wait for the pollers to catch up (default: 60)"),
+    )
+    help = "Benchmark waking idle long polls with a storm of table changes"
+
+    def handle(self, *args, **kwargs):
+        LongPollingBenchmark(kwargs['pollers'], kwargs['commits'], kwargs['path'], kwargs['timeout']).run()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from benchmark.object_cache import ObjectCacheBenchmark
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+            make_option("--osts", type=int, default=10000,
+                help="number of OSTs in the filesystem (default: 10000)"),
+            make_option("--servers", type=int, default=100,
+                help="number of servers the OSTs are mounted on (default: 100)"),
+            make_option("--samples", type=int, default=100,
+                help="number of OSTs to time the lookups for (default: 100)"),
+    )
+    help = "Benchmark the ObjectCache lookups of the job scheduler against a filesystem of many OSTs"
+
+    def handle(self, *args, **kwargs):
+        ObjectCacheBenchmark(kwargs['osts'], kwargs['servers'], kwargs['samples']).run()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from benchmark.power_monitoring import PowerMonitoringBenchmark
+from chroma_core.services.power_control.monitor_daemon import MONITOR_WORKERS
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+            make_option("--pdus", type=int, default=100,
+                help="number of cluster-sim PDUs to monitor, which must be running (default: 100)"),
+            make_option("--outlets", type=int, default=24,
+                help="number of outlets per PDU (default: 24)"),
+            make_option("--workers", type=int, default=MONITOR_WORKERS,
+                help="number of monitor workers in pool mode (default: %s)" % MONITOR_WORKERS),
+            make_option("--mode", type="choice", choices=['pool', 'threads'], default='pool',
+                help="'pool' for the monitor daemon's workers, or 'threads' for a thread per device (default: pool)"),
+    )
+    help = "Benchmark a power device monitoring sweep against cluster-sim's simulated PDUs"
+
+    def handle(self, *args, **kwargs):
+        PowerMonitoringBenchmark(kwargs['pdus'], kwargs['outlets'], kwargs['workers'], kwargs['mode']).run()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from benchmark.stats_insert import StatsInsertBenchmark
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+            make_option("--series", type=int, default=2000,
+                help="number of series sampled each period (default: 2000)"),
+            make_option("--per_message", type=int, default=40,
+                help="number of samples in each queued message (default: 40)"),
+            make_option("--periods", type=int, default=30,
+                help="number of 10 second sampling periods (default: 30)"),
+            make_option("--batch_sizes", type=str, default="1,10,100",
+                help="comma separated numbers of messages inserted at once (default: 1,10,100)"),
+    )
+    help = "Benchmark the stats service's insertion of queued samples at several batch sizes"
+
+    def handle(self, *args, **kwargs):
+        batch_sizes = [int(size) for size in kwargs['batch_sizes'].split(',')]
+        StatsInsertBenchmark(kwargs['series'], kwargs['per_message'], kwargs['periods'], batch_sizes).run()
@@ -0,0 +1,112 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import random
+import sys
+import time
+
+from django.db import transaction
+from django.test.simple import DjangoTestSuiteRunner
+
+from chroma_core.lib.cache import ObjectCache
+from chroma_core.models import ManagedHost, ManagedMgs, ManagedMdt, ManagedOst, ManagedFilesystem, ManagedTarget
+from chroma_core.models import ManagedTargetMount, Volume, VolumeNode
+from benchmark.generic import GenericBenchmark
+
+
+class ObjectCacheBenchmark(GenericBenchmark):
+    """
+    Times the ObjectCache lookups which the job scheduler's dependency and state
+    calculations make, against a filesystem of many OSTs, each mounted on a
+    primary and a secondary server.  Each lookup is compared with the scan of
+    every cached object (or database query) which it used to be.
+    """
+    def __init__(self, osts, servers, samples):
+        self.osts = osts
+        self.servers = servers
+        self.samples = samples
+        self.test_runner = DjangoTestSuiteRunner()
+
+    def prepare(self):
+        from south.management.commands import patch_for_test_db_setup
+
+        self.test_runner.setup_test_environment()
+        patch_for_test_db_setup()
+        self.old_db_config = self.test_runner.setup_databases()
+
+        with transaction.commit_on_success():
+            self.hosts = [ManagedHost.objects.create(address = 'oss%.3d' % n, fqdn = 'oss%.3d' % n, nodename = 'oss%.3d' % n)
+                          for n in range(self.servers)]
+            volume = Volume.objects.create()
+            volume_nodes = [VolumeNode.objects.create(volume = volume, host = host, path = '/dev/sda') for host in self.hosts]
+
+            mgs = ManagedMgs.objects.create(volume = volume)
+            self.filesystem = ManagedFilesystem.objects.create(name = 'benchfs', mgs = mgs)
+            ManagedMdt.objects.create(volume = volume, filesystem = self.filesystem, index = 0)
+
+            # Targets are multi-table models, which can't be bulk created
+            self.targets = []
+            for n in range(self.osts):
+                self.targets.append(ManagedOst.objects.create(volume = volume, filesystem = self.filesystem, index = n))
+                if n % 1000 == 0:
+                    sys.stderr.write("\rCreating OSTs... (%d/%d)" % (n, self.osts))
+            sys.stderr.write("\rCreating OSTs... Done.          \n")
+
+            ManagedTargetMount.objects.bulk_create([ManagedTargetMount(target = target,
+                                                                       host = self.hosts[(n + secondary) % self.servers],
+                                                                       volume_node = volume_nodes[(n + secondary) % self.servers],
+                                                                       primary = not secondary)
+                                                    for n, target in enumerate(self.targets)
+                                                    for secondary in [0, 1]])
+
+    def cleanup(self):
+        self.test_runner.teardown_databases(self.old_db_config)
+        self.test_runner.teardown_test_environment()
+
+    def _time(self, fn, args):
+        started = time.time()
+        for arg in args:
+            fn(arg)
+        return (time.time() - started) / len(args)
+
+    def _compare(self, name, indexed, scan, args):
+        indexed_time = self._time(indexed, args)
+        scan_time = self._time(scan, args)
+        print "%-24s %10.1fus %10.1fus %8.0fx" % (name, indexed_time * 1000000, scan_time * 1000000, scan_time / indexed_time)
+
+    def run(self):
+        self.prepare()
+        try:
+            ObjectCache.clear()
+            started = time.time()
+            ObjectCache.getInstance()
+            print "OSTs: %s, servers: %s" % (self.osts, self.servers)
+            print "ObjectCache loaded in: %.3fs" % (time.time() - started)
+
+            targets = [ObjectCache.get_by_id(ManagedTarget, target.id) for target in random.sample(self.targets, self.samples)]
+            target_ids = [target.id for target in targets]
+            host_ids = [host.id for host in self.hosts]
+
+            print "%-24s %12s %12s %9s" % ("Lookup", "indexed", "scan", "speedup")
+            self._compare("target_mounts", ObjectCache.target_mounts,
+                          lambda target_id: ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target_id == target_id),
+                          target_ids)
+            self._compare("target_primary_server", ObjectCache.target_primary_server,
+                          lambda target: ObjectCache.get_one(ManagedTargetMount, lambda mtm: mtm.target_id == target.id and mtm.primary).host,
+                          targets)
+            self._compare("target_filesystem_id", ObjectCache.target_filesystem_id,
+                          lambda target: target.downcast().filesystem_id,
+                          targets)
+            self._compare("host_targets", ObjectCache.host_targets,
+                          lambda host_id: [ObjectCache.get_by_id(ManagedTarget, mtm.target_id)
+                                           for mtm in ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.host_id == host_id)],
+                          host_ids)
+            self._compare("get_targets_by_filesystem", ObjectCache.get_targets_by_filesystem,
+                          lambda filesystem_id: [ObjectCache.get_by_id(ManagedTarget, ost['id'])
+                                                 for ost in ManagedOst.objects.filter(filesystem = filesystem_id).values('id')],
+                          [self.filesystem.id])
+        finally:
+            ObjectCache.clear()
+            self.cleanup()
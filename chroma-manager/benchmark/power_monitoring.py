@@ -0,0 +1,107 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import threading
+import time
+
+from django.test.simple import DjangoTestSuiteRunner
+
+from chroma_core.models import PowerControlType, PowerControlDevice, PowerControlDeviceOutlet
+from chroma_core.services.power_control.manager import PowerControlManager
+from chroma_core.services.power_control.monitor_daemon import PowerMonitorDaemon
+from benchmark.generic import GenericBenchmark
+
+
+# Where cluster-sim's PDU simulators listen (see cluster_sim.fake_power_control)
+PDU_SERVER_ADDRESS = '127.0.0.1'
+BASE_PDU_SERVER_PORT = 2300
+
+
+class PowerMonitoringBenchmark(GenericBenchmark):
+    """
+    Times a monitoring sweep over the PDUs simulated by cluster-sim, which must be running with
+    at least as many (e.g. cluster-sim setup --psu_count).  The devices are created in a test
+    database, without the signals which would register them with the power_control service.
+
+    'pool' sweeps with the PowerMonitorDaemon's workers, 'threads' with a thread per device
+    which checks its device and then whether it still exists, as the monitors did before.
+    """
+    def __init__(self, pdus, outlets, workers, mode):
+        self.pdus = pdus
+        self.outlets = outlets
+        self.workers = workers
+        self.mode = mode
+        self.test_runner = DjangoTestSuiteRunner()
+
+    def prepare(self):
+        from south.management.commands import patch_for_test_db_setup
+
+        self.test_runner.setup_test_environment()
+        patch_for_test_db_setup()
+        self.old_db_config = self.test_runner.setup_databases()
+
+        device_type = PowerControlType.objects.create(agent = 'fence_apc', make = 'Simulated', model = 'PDU',
+                                                      max_outlets = self.outlets,
+                                                      default_username = 'apc', default_password = 'apc')
+        # bulk_create, so that the post_save receivers do not try to register them with the service
+        PowerControlDevice.objects.bulk_create([PowerControlDevice(device_type = device_type,
+                                                                   name = 'pdu%.3d' % n,
+                                                                   address = PDU_SERVER_ADDRESS,
+                                                                   port = BASE_PDU_SERVER_PORT + n,
+                                                                   username = 'apc', password = 'apc')
+                                                for n in range(self.pdus)])
+        PowerControlDeviceOutlet.objects.bulk_create([PowerControlDeviceOutlet(device = device, identifier = str(i + 1))
+                                                      for device in PowerControlDevice.objects.all()
+                                                      for i in range(self.outlets)])
+
+    def cleanup(self):
+        self.test_runner.teardown_databases(self.old_db_config)
+        self.test_runner.teardown_test_environment()
+
+    def _sweep_threads(self, manager):
+        def check(device):
+            available = manager.check_device_availability(device)
+            PowerControlDevice.objects.filter(id = device.id, not_deleted = True).exists()
+            return available
+
+        threads = [threading.Thread(target = check, args = (device,)) for device in manager.power_devices.values()]
+        for thread in threads:
+            thread.start()
+        peak_threads = threading.active_count()
+        for thread in threads:
+            thread.join()
+
+        return peak_threads
+
+    def _sweep_pool(self, manager):
+        daemon = PowerMonitorDaemon(manager, self.workers)
+        daemon_thread = threading.Thread(target = daemon.run)
+        daemon_thread.start()
+        try:
+            sweep = daemon.sweep()
+            peak_threads = threading.active_count()
+            sweep.complete.wait()
+        finally:
+            daemon.stop()
+            daemon_thread.join()
+
+        return peak_threads
+
+    def run(self):
+        self.prepare()
+        try:
+            manager = PowerControlManager()
+            idle_threads = threading.active_count()
+
+            started = time.time()
+            peak_threads = self._sweep_pool(manager) if self.mode == 'pool' else self._sweep_threads(manager)
+            elapsed = time.time() - started
+
+            print "Mode: %s" % self.mode
+            print "PDUs: %s, outlets: %s" % (self.pdus, self.pdus * self.outlets)
+            print "Sweep time: %.3fs" % elapsed
+            print "Threads (and so database connections) used: %s" % (peak_threads - idle_threads)
+        finally:
+            self.cleanup()
@@ -0,0 +1,88 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.db import connection, reset_queries
+from django.test.simple import DjangoTestSuiteRunner
+from django.utils.timezone import utc
+
+from chroma_core.lib.metrics import FilesystemAggregates
+from chroma_core.models import Stats
+from chroma_core.services.stats import Service as StatsService, StatsQueue
+from benchmark.generic import GenericBenchmark
+
+
+class StatsInsertBenchmark(GenericBenchmark):
+    """
+    Times the stats service's insertion of the samples queued by the audits of many servers
+    and targets, each message carrying the samples of one of them for one period, when the
+    service takes the waiting messages a batch at a time.  A batch size of one is the service
+    inserting each message as it arrives.  The samples are inserted in a test database, which
+    is emptied before each batch size is timed.
+    """
+    def __init__(self, series, per_message, periods, batch_sizes):
+        self.series = series
+        self.per_message = per_message
+        self.periods = periods
+        self.batch_sizes = batch_sizes
+        self.test_runner = DjangoTestSuiteRunner()
+
+    def prepare(self):
+        from south.management.commands import patch_for_test_db_setup
+
+        self.test_runner.setup_test_environment()
+        patch_for_test_db_setup()
+        self.old_db_config = self.test_runner.setup_databases()
+
+        # Record the queries, to count them
+        connection.use_debug_cursor = True
+
+    def cleanup(self):
+        self.test_runner.teardown_databases(self.old_db_config)
+        self.test_runner.teardown_test_environment()
+
+    def _messages(self):
+        # Recent enough that none of the samples are expired as they're inserted
+        start = datetime.now(utc).replace(microsecond = 0) - timedelta(seconds = self.periods * 10)
+        ids = range(1, self.series + 1)
+        for period in range(self.periods):
+            dt = StatsQueue.encode(start + timedelta(seconds = period * 10))
+            for n in range(0, self.series, self.per_message):
+                yield [(id, dt, random.random()) for id in ids[n:n + self.per_message]]
+
+    def _time(self, batch_size):
+        Stats.delete_all()
+        for model in Stats:
+            model.cache.clear()
+        service = StatsService()
+        service.aggregates = FilesystemAggregates()
+
+        messages = list(self._messages())
+        samples = queries = 0
+        seconds = 0.0
+        for n in range(0, len(messages), batch_size):
+            batch = messages[n:n + batch_size]
+            reset_queries()
+            started = time.time()
+            service.insert_batch(batch)
+            seconds += time.time() - started
+            queries += len(connection.queries)
+            samples += sum(map(len, batch))
+
+        print "%10s %12.0f %12.2f %12.3f" % (batch_size, samples / seconds,
+                                             queries / float(len(messages)), queries * 1000.0 / samples)
+
+    def run(self):
+        self.prepare()
+        try:
+            print "Series: %s, samples per message: %s, periods: %s" % (self.series, self.per_message, self.periods)
+            print "%10s %12s %12s %12s" % ("batch size", "samples/s", "queries/msg", "queries/ksample")
+            for batch_size in self.batch_sizes:
+                self._time(batch_size)
+        finally:
+            self.cleanup()
@@ -30,6 +30,10 @@ timeout = settings.LONG_POLL_TIMEOUT_SECONDS + 10
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
 
+# Send the changes the API makes to the job scheduler, for long polling and the response caches of all workers
+from chroma_core.lib.long_polling import enable_long_polling
+assert enable_long_polling    # Prevent pep8 warning
+
 
 def on_starting(server):
     from chroma_core.services.log import log_set_filename
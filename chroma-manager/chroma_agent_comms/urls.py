@@ -11,6 +11,7 @@ urlpatterns = patterns('',
     (r'^message/$', csrf_exempt(views.MessageView.as_view())),
     (r'^copytool_event/$', csrf_exempt(views.CopytoolEventView.as_view())),
     (r"^register/(\w+)/$", views.register),
+    (r"^register_many/(\w+)/$", views.register_many),
     (r"^setup/(\w+)/$", views.setup),
     (r"^reregister/$", views.reregister)
 )
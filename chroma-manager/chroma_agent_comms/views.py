@@ -7,8 +7,10 @@ import Queue
 import json
 import traceback
 import time
+from multiprocessing.pool import ThreadPool
 
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import F
 from django.http import HttpResponseNotAllowed, HttpResponse, HttpResponseBadRequest
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
@@ -17,6 +19,7 @@ import settings
 from os import path
 from tastypie.http import HttpForbidden
 
+from chroma_core.lib.util import CommandError
 from chroma_core.models import ManagedHost, ClientCertificate, RegistrationToken, ServerProfile, Bundle
 from chroma_core.models.copytool import Copytool, CopytoolEvent, CopytoolOperation, log as copytool_log, UNKNOWN_UUID
 from chroma_core.models.log import LogMessage, MessageClass
@@ -29,6 +32,12 @@ log = log_register('agent_views')
 import logging
 log.setLevel(logging.WARN)
 
+# The most servers which may be registered with one register_many request
+REGISTER_MANY_MAX_HOSTS = 500
+# The certificates of the servers registered by one register_many request are
+# signed by this many concurrent openssl processes
+REGISTER_MANY_SIGNING_WORKERS = 8
+
 
 def log_exception(f):
     @wraps(f)
@@ -81,68 +90,124 @@ class CopytoolEventView(ValidatedClientView):
 
         from chroma_core.services.job_scheduler.job_scheduler_client import JobSchedulerClient
 
+        # The events between (un)registrations are ingested as one batch.  A
+        # registration may cancel the copytool's operations, so the batch
+        # before it is written first.
         active_operations = {}
+        register_missed = copytool.state != 'started'
+        batch = []
         for event in sorted(events, key=lambda event: event.timestamp):
             copytool_log.debug(event)
 
             # These types aren't associated with active operations
             if event.type == 'UNREGISTER':
+                self._ingest(copytool, batch, active_operations)
+                batch = []
                 JobSchedulerClient.unregister_copytool(copytool.id)
                 continue
             elif event.type == 'REGISTER':
+                self._ingest(copytool, batch, active_operations)
+                batch = []
                 JobSchedulerClient.register_copytool(copytool.id, event.uuid)
+                register_missed = False
                 continue
-            elif event.type == 'LOG':
-                LogMessage.objects.create(fqdn = copytool.host.fqdn,
-                                          message = event.message,
-                                          severity = getattr(logging, event.level),
-                                          facility = 4,  # daemon
-                                          tag = str(copytool),
-                                          datetime = event.timestamp,
-                                          message_class = MessageClass.COPYTOOL_ERROR if event.level == 'ERROR' else MessageClass.COPYTOOL)
-                continue
-
-            # Fixup for times when the register event was missed
-            if copytool.state != 'started':
+            elif event.type != 'LOG' and register_missed:
+                # Fixup for times when the register event was missed
                 # FIXME: Figure out how to find the uuid after the fact. Maybe
                 # the solution is to send uuid with every event from the
                 # copytool, but that seems kludgy.
+                self._ingest(copytool, batch, active_operations)
+                batch = []
                 JobSchedulerClient.register_copytool(copytool.id, UNKNOWN_UUID)
+                register_missed = False
+
+            batch.append(event)
+
+        self._ingest(copytool, batch, active_operations)
+
+        try:
+            return HttpResponse(json.dumps({'active_operations': dict((fid, op.id) for fid, op in active_operations.items())}), mimetype="application/json")
+        except AttributeError:
+            return HttpResponse()
+
+    def _ingest(self, copytool, events, active_operations):
+        """
+        Apply a time ordered batch of operation and log events, with a constant
+        number of queries however many there are: the operations the events refer
+        to are fetched together, changed in memory and then written together.
+
+        :param active_operations: dict of data fid to the copytool's operations still
+                                  in progress, which is updated with those of the batch
+        """
+        if not events:
+            return
+
+        operations = CopytoolOperation.objects.in_bulk([event.active_operation for event in events
+                                                         if hasattr(event, 'active_operation')])
+        log_messages = []
+        created = []
+        changed = {}
+        for event in events:
+            if event.type == 'LOG':
+                log_messages.append(LogMessage(fqdn = copytool.host.fqdn,
+                                               message = event.message,
+                                               severity = getattr(logging, event.level),
+                                               facility = 4,  # daemon
+                                               tag = str(copytool),
+                                               datetime = event.timestamp,
+                                               message_class = MessageClass.COPYTOOL_ERROR if event.level == 'ERROR' else MessageClass.COPYTOOL))
+                continue
 
             try:
-                active_operations[event.data_fid] = CopytoolOperation.objects.get(id = event.active_operation)
+                operation = operations[event.active_operation]
             except AttributeError:
                 if event.state == 'START':
-                    kwargs = dict(
-                        start_time = event.timestamp,
-                        type = event.type,
-                        path = event.lustre_path,
-                        fid = event.data_fid
-                    )
-                    active_operations[event.data_fid] = copytool.create_operation(**kwargs)
+                    operation = copytool.new_operation(start_time = event.timestamp,
+                                                       type = event.type,
+                                                       path = event.lustre_path,
+                                                       fid = event.data_fid)
+                    if operation:
+                        created.append(operation)
+                        active_operations[event.data_fid] = operation
                     continue
                 elif event.source_fid in active_operations:
-                    active_operations[event.data_fid] = active_operations.pop(event.source_fid)
+                    operation = active_operations.pop(event.source_fid)
                 else:
                     copytool_log.error("%s on %s, received malformed non-START event: %s" % (copytool, copytool.host, event))
                     continue
-            except CopytoolOperation.DoesNotExist:
+            except KeyError:
                 copytool_log.error("%s on %s, received event for unknown operation: %s" % (copytool, copytool.host, event))
                 continue
 
+            active_operations[event.data_fid] = operation
+
             if event.state in ['FINISH', 'ERROR']:
-                active_operations[event.data_fid].finish(event.timestamp, event.state, event.error)
+                operation.finish(event.timestamp, event.state, event.error, save = False)
                 del active_operations[event.data_fid]
             elif event.state == 'RUNNING':
-                active_operations[event.data_fid].update(event.timestamp, event.current_bytes, event.total_bytes)
+                operation.update(event.timestamp, event.current_bytes, event.total_bytes, save = False)
             else:
                 copytool_log.error("%s on %s, received unknown event type: %s" % (copytool, copytool.host, event))
                 continue
 
-        try:
-            return HttpResponse(json.dumps({'active_operations': dict((fid, op.id) for fid, op in active_operations.items())}), mimetype="application/json")
-        except AttributeError:
-            return HttpResponse()
+            # Operations created in this batch are saved in their final state
+            if operation.id is not None:
+                changed[operation.id] = operation
+
+        with transaction.commit_on_success():
+            CopytoolOperation.objects.bulk_create(created)
+            CopytoolOperation.bulk_update(changed.values())
+            LogMessage.objects.bulk_create(log_messages)
+
+        # bulk_create doesn't set ids, which the monitor needs for the operations still in progress
+        unsaved = dict(((operation.fid, operation.started_at), operation)
+                       for operation in active_operations.values() if operation.id is None)
+        if unsaved:
+            saved = copytool.operations.filter(fid__in = set(fid for fid, started_at in unsaved),
+                                               started_at__in = set(started_at for fid, started_at in unsaved))
+            for id, fid, started_at in saved.order_by('id').values_list('id', 'fid', 'started_at'):
+                if (fid, started_at) in unsaved:
+                    unsaved[(fid, started_at)].id = id
 
 
 class MessageView(ValidatedClientView):
@@ -152,6 +217,14 @@ class MessageView(ValidatedClientView):
 
     LONG_POLL_TIMEOUT = 30
 
+    # Upper bounds on a single response (or a single line of a streaming
+    # response), anything beyond these waits on the TX queue for the next one.
+    MAX_MESSAGES_PER_RESPONSE = 256
+    MAX_BYTES_PER_RESPONSE = 8 * 1024 ** 2
+
+    # How long a streaming GET is held open before the agent has to reconnect
+    STREAM_DURATION = 600
+
     @log_exception
     def post(self, request):
         """
@@ -244,11 +317,115 @@ class MessageView(ValidatedClientView):
 
         return [m for m in messages if is_valid(m)]
 
+    def _receive_tx(self, fqdn, queues, client_start_time, timeout, reader):
+        """
+        Wait up to `timeout` seconds for a message on the host's TX queue, then take
+        whatever else is immediately available, up to MAX_MESSAGES_PER_RESPONSE
+        messages or MAX_BYTES_PER_RESPONSE bytes.  Messages that don't fit are
+        left on the queue for the next response.
+
+        Messages are only taken while `reader` (see HostQueues.new_reader) is the host's
+        current reader, and with queues.tx_lock held, because they are peeked before
+        they are consumed.  The lock is not held while waiting.
+
+        :return 2-tuple (<list of messages>, <True if the reader was superseded or a TX_BARRIER
+                for a different agent instance was received>)
+        """
+        try:
+            queues.tx.peek(block=True, timeout=timeout)
+        except Queue.Empty:
+            return [], False
+
+        with queues.tx_lock:
+            if queues.reader != reader:
+                log.warning("Cancelling GET from %s superseded by a newer one" % fqdn)
+                return [], True
+
+            try:
+                message = queues.tx.peek(block=False)
+            except Queue.Empty:
+                return [], False
+
+            return self._take_tx(fqdn, queues, client_start_time, message)
+
+    def _take_tx(self, fqdn, queues, client_start_time, message):
+        "Take messages from the TX queue, the first of which was peeked as `message`, for _receive_tx."
+        messages = []
+        response_bytes = 0
+
+        while True:
+            if message['type'] == 'TX_BARRIER':
+                queues.tx.get_nowait()
+                if message['client_start_time'] != client_start_time:
+                    log.warning("Cancelling GET due to barrier %s %s" % (message['client_start_time'], client_start_time))
+                    return [], True
+            else:
+                message_bytes = len(json.dumps(message))
+                if messages and (len(messages) >= self.MAX_MESSAGES_PER_RESPONSE or
+                                 response_bytes + message_bytes > self.MAX_BYTES_PER_RESPONSE):
+                    log.debug("MessageView: response to %s full at %s messages (%s bytes)" % (fqdn, len(messages), response_bytes))
+                    break
+
+                queues.tx.get_nowait()
+                messages.append(message)
+                response_bytes += message_bytes
+
+            try:
+                message = queues.tx.peek(block=False)
+            except Queue.Empty:
+                break
+
+        return messages, False
+
+    def _stream(self, fqdn, client_start_time, messages, reader):
+        """
+        Generator for the body of a streaming GET: one JSON envelope per line, written
+        as soon as messages are available.  An empty envelope is written after every
+        LONG_POLL_TIMEOUT without messages, which keeps the connection alive and
+        counts as contact from the host.  The stream ends after STREAM_DURATION,
+        when a newer GET from the host supersedes it, or when a barrier from a newer
+        agent instance arrives, and the agent reconnects.
+
+        This runs after get() has returned, outside log_exception and any middleware,
+        so it logs its own exceptions, only records contact in memory (get() having
+        updated the host's state), and closes the database connection it may have
+        opened once done.
+        """
+        try:
+            queues = self.queues.get(fqdn)
+
+            if messages:
+                yield json.dumps({'messages': self._filter_valid_messages(fqdn, messages)}) + "\n"
+
+            stream_until = time.time() + self.STREAM_DURATION
+            while queues.reader == reader:
+                remaining = stream_until - time.time()
+                if remaining <= 0:
+                    break
+
+                messages, cancelled = self._receive_tx(fqdn, queues, client_start_time, min(self.LONG_POLL_TIMEOUT, remaining), reader)
+                if cancelled:
+                    break
+
+                messages = self._filter_valid_messages(fqdn, messages)
+                log.debug("MessageView.get: streaming %s messages to %s" % (len(messages), fqdn))
+                yield json.dumps({'messages': messages}) + "\n"
+
+                self.hosts.contact(fqdn)
+        except Exception:
+            log.error(traceback.format_exc())
+            raise
+        finally:
+            connection.close()
+
     @log_exception
     def get(self, request):
         """
         Send messages TO the agent.
         Handle a long-polling GET for messages to the agent
+
+        If the `stream` parameter is set, the response is instead a stream of
+        newline-separated JSON envelopes which stays open for STREAM_DURATION.
         """
 
         fqdn = self.valid_fqdn(request)
@@ -280,38 +457,22 @@ class MessageView(ValidatedClientView):
                 'body': None
             })
 
-        log.debug("MessageView.get: composing messages for %s" % fqdn)
+        # This GET supersedes any other from the host still waiting on its TX queue: one
+        # left behind by a dropped connection or a dead agent instance would take messages
+        # only to write them to a dead socket.
         queues = self.queues.get(fqdn)
+        reader = queues.new_reader()
 
-        # If this handler is sitting on the TX queue, draining messages, then
-        # when a new session starts, *before* sending any TX messages, we have to
-        # make sure it has been disconnected, to avoid the TX messages being sent
-        # to an 'old' session (old session meaning TCP connection from a now-dead agent)
+        if request.GET.get('stream'):
+            log.debug("MessageView.get: streaming messages to %s" % fqdn)
+            return HttpResponse(self._stream(fqdn, request.GET['client_start_time'], messages, reader), mimetype = "application/json")
 
-        with queues.tx_lock:
-            try:
-                first_message = queues.tx.get(block=True, timeout=self.LONG_POLL_TIMEOUT)
-                if first_message['type'] == 'TX_BARRIER':
-                    if first_message['client_start_time'] != request.GET['client_start_time']:
-                        log.warning("Cancelling GET due to barrier %s %s" % (first_message['client_start_time'], request.GET['client_start_time']))
-                        return HttpResponse(json.dumps({'messages': []}), mimetype="application/json")
-                else:
-                    messages.append(first_message)
-            except Queue.Empty:
-                pass
-            else:
-                # TODO: limit number of messages per response
-                while True:
-                    try:
-                        message = queues.tx.get(block=False)
-                        if message['type'] == 'TX_BARRIER':
-                            if message['client_start_time'] != request.GET['client_start_time']:
-                                log.warning("Cancelling GET due to barrier %s %s" % (message['client_start_time'], request.GET['client_start_time']))
-                                return HttpResponse(json.dumps({'messages': []}), mimetype="application/json")
-                        else:
-                            messages.append(message)
-                    except Queue.Empty:
-                        break
+        log.debug("MessageView.get: composing messages for %s" % fqdn)
+
+        tx_messages, cancelled = self._receive_tx(fqdn, queues, request.GET['client_start_time'], self.LONG_POLL_TIMEOUT, reader)
+        if cancelled:
+            return HttpResponse(json.dumps({'messages': []}), mimetype="application/json")
+        messages.extend(tx_messages)
 
         messages = self._filter_valid_messages(fqdn, messages)
 
@@ -323,7 +484,7 @@ def validate_token(key, credits=1):
     """
     Validate that a token is valid to authorize a setup/register operation:
      * Check it's not expired
-     * Check it has some credits
+     * Check it has some credits (at least as many as will be decremented)
 
     :param credits: number of credits to decrement if valid
     :return 2-tuple (<http response if error, else None>, <registration token if valid, else None>)
@@ -331,7 +492,7 @@ def validate_token(key, credits=1):
     try:
         with transaction.commit_on_success():
             token = RegistrationToken.objects.get(secret = key)
-            if not token.credits:
+            if not token.credits or token.credits < credits:
                 log.warning("Attempt to register with exhausted token %s" % key)
                 return HttpForbidden(), None
             else:
@@ -431,10 +592,8 @@ def register(request, key):
     host_attributes = json.loads(request.body)
 
     # Fail at the first if the version of the agent on the server is incorrect
-    manager, agent = Version(settings.VERSION), Version(host_attributes['version'])
-    if manager and agent and not (manager.major == agent.major and manager.minor >= agent.minor):
-        err = "Version incompatibility between manager {0} and agent {1}".format(manager, agent)
-        log.error(err)
+    err = _version_error(host_attributes['version'])
+    if err:
         return HttpResponse(status = 400, content = err)
 
     # Fulfil the registering server's request for a certificate authenticating
@@ -443,10 +602,8 @@ def register(request, key):
 
     # Check that the commonName in the CSR is the same as that in host_attributes
     # (prevent registering as one host and getting a certificate to impersonate another)
-    csr_fqdn = Crypto().get_common_name(csr)
-    if csr_fqdn != host_attributes['fqdn']:
+    if not _csr_fqdn_matches(csr, host_attributes['fqdn'], request):
         # Terse response to attacker
-        log.error("FQDN mismatch '%s' vs. '%s' from %s" % (csr_fqdn, host_attributes['fqdn'], request.META['HTTP_X_FORWARDED_FOR']))
         return HttpResponse(status = 400, content = "")
 
     with transaction.commit_on_success():
@@ -499,6 +656,151 @@ def register(request, key):
     }), mimetype = "application/json")
 
 
+def _version_error(agent_version):
+    """
+    :return: An error message if the agent version is incompatible with the manager's, else None
+    """
+    manager, agent = Version(settings.VERSION), Version(agent_version)
+    if manager and agent and not (manager.major == agent.major and manager.minor >= agent.minor):
+        err = "Version incompatibility between manager {0} and agent {1}".format(manager, agent)
+        log.error(err)
+        return err
+
+
+def _csr_fqdn_matches(csr, fqdn, request):
+    csr_fqdn = Crypto().get_common_name(csr)
+    if csr_fqdn != fqdn:
+        log.error("FQDN mismatch '%s' vs. '%s' from %s" % (csr_fqdn, fqdn, request.META.get('HTTP_X_FORWARDED_FOR')))
+        return False
+    return True
+
+
+@csrf_exempt
+@log_exception
+def register_many(request, key):
+    """
+    Register many servers at once, as register does one, e.g. when a whole rack of servers is
+    provisioned.  The body is {'hosts': [<the host attributes POSTed to register>, ...]}, and the
+    token must have a credit for every host.
+
+    The servers' certificates are signed concurrently, and the hosts are created with a single
+    call to the job scheduler.  The response has the outcome of each server, in the order
+    POSTed: {'hosts': [{'fqdn':, 'command_id':, 'host_id':, 'certificate':} or {'fqdn':, 'error':}, ...]}
+    Only the credits of the servers which are registered are used up.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(['POST'])
+
+    try:
+        hosts_attributes = json.loads(request.body)['hosts']
+    except (ValueError, KeyError, TypeError):
+        return HttpResponseBadRequest("Expected {'hosts': [...]}")
+
+    if not hosts_attributes:
+        return HttpResponseBadRequest("No hosts to register")
+    if len(hosts_attributes) > REGISTER_MANY_MAX_HOSTS:
+        return HttpResponseBadRequest("Too many hosts to register (%s), the limit is %s" %
+                                      (len(hosts_attributes), REGISTER_MANY_MAX_HOSTS))
+
+    token_error, registration_token = validate_token(key, credits=len(hosts_attributes))
+    if token_error:
+        return token_error
+
+    results = [{'fqdn': host_attributes['fqdn']} for host_attributes in hosts_attributes]
+    try:
+        _register_many(request, hosts_attributes, results, registration_token)
+    finally:
+        # A credit was taken for every host: give back those of the hosts which weren't registered
+        unregistered = len([result for result in results if 'host_id' not in result])
+        if unregistered:
+            with transaction.commit_on_success():
+                RegistrationToken.objects.filter(id = registration_token.id).update(credits = F('credits') + unregistered)
+
+    failed = [result for result in results if 'error' in result]
+    if failed:
+        log.warning("Failed to register %s of %s servers: %s" % (len(failed), len(results),
+                                                                ", ".join(result['fqdn'] for result in failed)))
+
+    return HttpResponse(status = 201, content = json.dumps({'hosts': results}), mimetype = "application/json")
+
+
+def _register_many(request, hosts_attributes, results, registration_token):
+    for result, host_attributes in zip(results, hosts_attributes):
+        err = _version_error(host_attributes['version'])
+        if err:
+            result['error'] = err
+    seen = set()
+    for result in results:
+        if result['fqdn'] in seen:
+            result.setdefault('error', "FQDN repeated")
+        seen.add(result['fqdn'])
+
+    with transaction.commit_on_success():
+        # As in register, a friendly pre-check enforced again by the job scheduler
+        in_use = set(ManagedHost.objects.filter(fqdn__in = seen).exclude(state = 'undeployed').values_list('fqdn', flat = True))
+    for result in results:
+        if result['fqdn'] in in_use:
+            result.setdefault('error', "FQDN in use")
+
+    def sign(index):
+        host_attributes = hosts_attributes[index]
+        try:
+            if not _csr_fqdn_matches(host_attributes['csr'], host_attributes['fqdn'], request):
+                # Terse response to attacker, as in register
+                return index, None, ""
+            certificate_str = Crypto().sign(host_attributes['csr'])
+            return index, certificate_str, Crypto().get_serial(certificate_str)
+        except CommandError as e:
+            log.error("Failed to sign certificate for %s: %s" % (host_attributes['fqdn'], e))
+            return index, None, "Failed to sign certificate"
+
+    # Create the authority's key and certificate now if they don't exist, rather than have
+    # every signing worker race to create them
+    Crypto().authority_cert
+
+    signing = [index for index, result in enumerate(results) if 'error' not in result]
+    pool = ThreadPool(min(REGISTER_MANY_SIGNING_WORKERS, len(signing) or 1))
+    try:
+        signed = pool.map(sign, signing)
+    finally:
+        pool.close()
+
+    registering = []
+    for index, certificate_str, serial_or_error in signed:
+        if certificate_str is None:
+            results[index]['error'] = serial_or_error
+        else:
+            log.info("Generated certificate %s:%s" % (results[index]['fqdn'], serial_or_error))
+            registering.append((index, certificate_str, serial_or_error))
+
+    if not registering:
+        return
+
+    from chroma_core.services.job_scheduler.job_scheduler_client import JobSchedulerClient
+
+    hosts = JobSchedulerClient.create_hosts([hosts_attributes[index] for index, certificate_str, serial in registering],
+                                            server_profile_id = registration_token.profile.pk)
+
+    created = []
+    for (index, certificate_str, serial), (host, command) in zip(registering, hosts):
+        if host is None:
+            # command is the error of a host which couldn't be created
+            results[index]['error'] = command
+        else:
+            # Recorded at once, so that its credit is used up whatever happens next
+            results[index].update({'host_id': host.id, 'command_id': command.id})
+            created.append((index, certificate_str, serial, host))
+
+    with transaction.commit_on_success():
+        ClientCertificate.objects.bulk_create([ClientCertificate(host = host, serial = serial)
+                                               for index, certificate_str, serial, host in created])
+
+    for n, (index, certificate_str, serial, host) in enumerate(created):
+        ValidatedClientView.valid_certs[serial] = host.fqdn
+        results[index]['certificate'] = certificate_str
+        log.info("Registered %s (%s/%s): host %s, command %s" % (host.fqdn, n + 1, len(created), host.id, results[index]['command_id']))
+
+
 @csrf_exempt
 @log_exception
 def reregister(request):
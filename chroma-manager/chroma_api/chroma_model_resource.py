@@ -6,6 +6,7 @@ from tastypie.exceptions import ImmediateHttpResponse
 from tastypie.resources import ModelResource
 from tastypie import fields
 
+from chroma_api.response_cache import response_cache
 from chroma_core.services import log_register
 
 log = log_register(__name__)
@@ -22,6 +23,19 @@ class ChromaModelResource(ModelResource):
     ALL_FILTER_ENUMERATION = ['exact', 'contains', 'startswith', 'endswith', 'in']
     ALL_FILTER_BOOL = ['exact']
 
+    # Models from whose tables the representation of the resource is derived: if set, GET responses
+    # are cached until one of them changes (see ResponseCache), and for at most cache_max_age seconds
+    # if that is set too, for representations which include values not stored in any model's table.
+    cache_tables = None
+    cache_max_age = None
+    # Fields whose values depend on more than cache_tables, which are brought up to date in each
+    # response taken from the cache by refresh_cached_fields.
+    cache_refreshed_fields = None
+
+    def refresh_cached_fields(self, objects):
+        """Set cache_refreshed_fields in the deserialized objects of a cached response."""
+        raise NotImplementedError()
+
     # Add the enumeration type to the schema info.
     def build_schema(self):
         """
@@ -40,6 +54,24 @@ class ChromaModelResource(ModelResource):
 
         return data
 
+    def get_list(self, request, **kwargs):
+        return response_cache.get(self, request,
+                                  lambda: super(ChromaModelResource, self).get_list(request, **kwargs))
+
+    def get_detail(self, request, **kwargs):
+        return response_cache.get(self, request,
+                                  lambda: super(ChromaModelResource, self).get_detail(request, **kwargs))
+
+    def get_object_list(self, request):
+        objects = super(ChromaModelResource, self).get_object_list(request)
+
+        # A long polling request for only the objects which changed (see LongPollingAPI)
+        changed_ids = getattr(request, 'long_polling_changed_ids', None)
+        if changed_ids is not None:
+            objects = objects.filter(pk__in=changed_ids)
+
+        return objects
+
     def obj_update(self, bundle, **kwargs):
         self.is_valid(bundle)
 
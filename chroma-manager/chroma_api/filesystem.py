@@ -11,6 +11,8 @@ from chroma_core.models import ManagedFilesystem, ManagedTarget
 from chroma_core.models import ManagedOst, ManagedMdt, ManagedMgs
 from chroma_core.models import Volume, VolumeNode
 from chroma_core.models import Command
+from chroma_core.models import ManagedHost, ManagedTargetMount
+from chroma_core.models import FilesystemClientConfParam, FilesystemGlobalConfParam, MdtConfParam, OstConfParam
 from chroma_core.models.filesystem import HSM_CONTROL_KEY, HSM_CONTROL_PARAMS
 
 import tastypie.http as http
@@ -298,7 +300,23 @@ class FilesystemResource(MetricResource, ConfParamResource):
     mgt = fields.ToOneField('chroma_api.target.TargetResource', attribute = 'mgs', full = True,
                             help_text = "The MGT on which this file system is registered")
 
+    cache_tables = [ManagedFilesystem, ManagedTarget, ManagedMgs, ManagedMdt, ManagedOst, ManagedTargetMount,
+                    ManagedHost, Volume, VolumeNode, FilesystemClientConfParam, FilesystemGlobalConfParam,
+                    MdtConfParam, OstConfParam]
+    # The capacity and client count come from stats, which are sampled every 10 seconds
+    cache_max_age = 10
+
     def _get_stat_simple(self, bundle, klass, stat_name, factor = 1.0):
+        # The stats service keeps the sums over the filesystem's targets up to date, so
+        # all four capacity fields are read from one row.  Until it has stored them (e.g.
+        # just after an upgrade) fall back to summing each target's latest value.
+        if not hasattr(bundle, 'aggregates'):
+            bundle.aggregates = bundle.obj.metrics.fetch_aggregates()
+        try:
+            return bundle.aggregates[stat_name] * factor
+        except KeyError:
+            pass
+
         try:
             return bundle.obj.metrics.fetch_last(klass, fetch_metrics=[stat_name])[1][stat_name] * factor
         except (KeyError, IndexError, TypeError):
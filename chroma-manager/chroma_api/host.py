@@ -16,6 +16,7 @@ import json
 
 from chroma_core.models import ManagedHost, Nid, ManagedFilesystem, ServerProfile, LustreClientMount, Command
 from chroma_core.models import LNetConfiguration, NetworkInterface
+from chroma_core.models import ManagedTarget, ManagedMgs, ManagedMdt, ManagedOst, ManagedTargetMount
 from long_polling_api import LongPollingAPI
 
 from django.shortcuts import get_object_or_404
@@ -185,6 +186,9 @@ class HostResource(MetricResource, StatefulModelResource, BulkResourceOperation,
     # Long polling should return when any of the tables below changes or has changed.
     long_polling_tables = [LNetConfiguration, NetworkInterface, ServerProfile, ManagedFilesystem, ManagedHost]
 
+    cache_tables = long_polling_tables + [Nid, LustreClientMount, ManagedTarget, ManagedMgs, ManagedMdt, ManagedOst,
+                                          ManagedTargetMount]
+
     def dispatch(self, request_type, request, **kwargs):
         return self.handle_long_polling_dispatch(request_type, request, **kwargs)
 
@@ -3,6 +3,9 @@
 # license that can be found in the LICENSE file.
 
 
+import json
+from collections import defaultdict
+
 from chroma_core.lib.util import normalize_nid
 
 from tastypie import fields
@@ -34,8 +37,10 @@ class LogResource(ChromaModelResource):
     """
     syslog messages collected by the manager server.
 
-
-
+    As well as the filters described in the schema, messages may be filtered by
+    ``message__search`` (words which must all occur in the message, which unlike
+    ``message__contains`` is answered from an index) and ``substitution_key``
+    (a NID or target name mentioned in the message).
     """
     substitutions = fields.ListField(null = True,
                                      help_text = "List of dictionaries describing substrings which "
@@ -84,34 +89,62 @@ class LogResource(ChromaModelResource):
         if 'message_class' in filters:
             filters['message_class'] = MessageClass.from_string(filters['message_class'])
 
+        # Handled in apply_filters
+        for name in ['message__search', 'substitution_key']:
+            filters.pop(name, None)
+
         return super(LogResource, self).build_filters(filters)
 
+    def apply_filters(self, request, applicable_filters):
+        objects = super(LogResource, self).apply_filters(request, applicable_filters)
+
+        # Both of these are answered from indexes (see migration 0037) rather than by scanning messages
+        search = request.GET.get('message__search')
+        if search:
+            objects = objects.extra(where = ["to_tsvector('simple', chroma_core_logmessage.message) @@ plainto_tsquery('simple', %s)"],
+                                    params = [search])
+
+        key = request.GET.get('substitution_key')
+        if key:
+            objects = objects.extra(where = ["string_to_array(chroma_core_logmessage.substitution_keys, ' ') @> ARRAY[%s]"],
+                                    params = [normalize_nid(key) if '@' in key else key])
+
+        return objects
+
+    def alter_list_data_to_serialize(self, request, data):
+        self._resolve_substitutions(data['objects'])
+        return data
+
+    def alter_detail_data_to_serialize(self, request, data):
+        self._resolve_substitutions([data])
+        return data
+
     def _substitutions(self, obj):
-        message = obj.message
+        """Return the [kind, key, start, end] substitutions of a message, as found when it was stored"""
+        if obj.substitutions is not None:
+            return json.loads(obj.substitutions)
+        else:
+            # Stored before substitutions were found on ingest
+            return LogMessage.find_substitutions(obj.message)
+
+    def _resolve_substitutions(self, bundles):
+        """Replace the keys in the substitutions of dehydrated bundles with links to the objects they
+        refer to, looking up each distinct NID and target name once for all of the bundles"""
         from chroma_api import api_log
         from chroma_api.urls import api
 
         from chroma_core.models import ManagedHost, ManagedTarget
-        import re
-
-        substitutions = []
-
-        def substitute(obj, match, group = 1):
-            resource_uri = api.get_resource_uri(obj)
-            substitutions.append({
-                'start': match.start(group),
-                'end': match.end(group),
-                'label': obj.get_label(),
-                'resource_uri': resource_uri})
-
-        # TODO: detect other NID types (cray?)
-        nid_regex = re.compile("(\d{1,3}\.){3}\d{1,3}@(tcp|ib)(_\d+)?")
-        target_regex = re.compile("[^\w](\w{1,8}-(MDT|OST)[\da-f]{4})")
-        for match in nid_regex.finditer(message):
-            nid = match.group(0)
-            nid = normalize_nid(nid)
+        from chroma_core.lib.host_resolver import host_resolver
+
+        keys = defaultdict(set)
+        for bundle in bundles:
+            for kind, key, start, end in bundle.data['substitutions'] or []:
+                keys[kind].add(key)
+
+        objects = {}
+        for nid in keys['nid']:
             try:
-                host = ManagedHost.get_by_nid(nid)
+                host = host_resolver.get_by_nid(nid)
             except ManagedHost.DoesNotExist:
                 api_log.warn("No host has NID %s" % nid)
                 continue
@@ -119,11 +152,20 @@ class LogResource(ChromaModelResource):
                 api_log.warn("Multiple hosts have NID %s" % nid)
                 continue
             if host.state != 'removed':
-                substitute(host, match, 0)
-
-        for match in target_regex.finditer(message):
-            target_name = match.group(1)
-            for target in ManagedTarget.objects.filter(name=target_name)[:1]:
-                substitute(target, match)
-
-        return sorted(substitutions, key=lambda sub: sub['start'])
+                objects['nid', nid] = host
+
+        if keys['target']:
+            for target in ManagedTarget.objects.filter(name__in = keys['target']).order_by('id'):
+                objects.setdefault(('target', target.name), target)
+
+        for bundle in bundles:
+            substitutions = []
+            for kind, key, start, end in bundle.data['substitutions'] or []:
+                if (kind, key) in objects:
+                    obj = objects[kind, key]
+                    substitutions.append({
+                        'start': start,
+                        'end': end,
+                        'label': obj.get_label(),
+                        'resource_uri': api.get_resource_uri(obj)})
+            bundle.data['substitutions'] = sorted(substitutions, key = lambda sub: sub['start'])
@@ -7,7 +7,7 @@ import json
 from tastypie.exceptions import ImmediateHttpResponse
 from tastypie.http import HttpNotModified
 
-from chroma_core.services.job_scheduler.job_scheduler_client import JobSchedulerClient
+from chroma_core.services.notification_hub.client import NotificationHubClient
 from chroma_core.services import log_register
 
 import settings
@@ -16,8 +16,28 @@ log = log_register(__name__)
 
 
 class LongPollingAPI(object):
+    """
+    Long polling for resources: a GET with an If-None-Match header (or last_modified parameter) of the
+    ETag of a previous response waits until one of long_polling_tables changes, or times out with a 304.
+
+    A list GET which also has the parameter delta=true returns only the objects which changed since that
+    previous response, with their ids in meta.changed_ids so that those which are missing from the objects
+    are known to have been removed.  The full list is returned as usual (without meta.changed_ids) when
+    this is not possible: the changes are no longer recorded, or include a change to a table other than
+    that of the resource itself.
+    """
     long_polling_tables = None                  # The caller must declare a set of long polling tables.
 
+    def _long_polling_changed_ids(self, changed_ids):
+        """The ids of the objects of this resource which are all that changed, or None"""
+        resource_table = self._meta.object_class._meta.db_table
+
+        for table, ids in changed_ids.items():
+            if table != resource_table and ids != []:
+                return None
+
+        return changed_ids.get(resource_table)
+
     def handle_long_polling_dispatch(self, request_type, request, **kwargs):
         table_timestamps = None
 
@@ -38,20 +58,33 @@ class LongPollingAPI(object):
             else:
                 table_timestamps = json.loads(table_timestamps)
 
-            table_timestamps = JobSchedulerClient.wait_table_change(table_timestamps,
-                                                                    [table._meta.db_table for table in self.long_polling_tables],
-                                                                    settings.LONG_POLL_TIMEOUT_SECONDS)
+            delta = request_type == 'list' and request.GET.get('delta', 'false').lower() == 'true'
+
+            table_timestamps = NotificationHubClient.wait_table_change(table_timestamps,
+                                                                       [table._meta.db_table for table in self.long_polling_tables],
+                                                                       settings.LONG_POLL_TIMEOUT_SECONDS,
+                                                                       changed_ids = delta)
 
             if table_timestamps:
+                changed_ids = None
+                if delta:
+                    changed_ids = self._long_polling_changed_ids(table_timestamps.pop('changed_ids'))
+
+                # Read by ChromaModelResource.get_object_list, to limit the query to the changed objects.
+                request.long_polling_changed_ids = changed_ids
+
                 # We want the super of the thing that called us, because it might have other overloads
                 response = super(self.__class__, self).dispatch(request_type, request, **kwargs)
 
-                if request.GET.get('last_modified') is not None:
+                if request.GET.get('last_modified') is not None or changed_ids is not None:
                     # Expensive but reliable method, this is only used when a user types from a browser
-                    # and only works for json, but that is all we support and the real method is the ETag
-                    # take out the spaces because it makes copy-paste debug easier.
+                    # (or for a delta, which is small) and only works for json, but that is all we support
+                    # and the real method is the ETag. Take out the spaces because it makes copy-paste debug easier.
                     content_data = json.loads(response.content)
-                    content_data['meta']['last_modified'] = json.dumps(table_timestamps).replace(' ', '')
+                    if request.GET.get('last_modified') is not None:
+                        content_data['meta']['last_modified'] = json.dumps(table_timestamps).replace(' ', '')
+                    if changed_ids is not None:
+                        content_data['meta']['changed_ids'] = changed_ids
                     response.content = json.dumps(content_data)
 
                 response['ETag'] = json.dumps(table_timestamps)
@@ -0,0 +1,149 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.db.models.signals import post_save, post_delete
+from django.http import HttpResponse
+from tastypie.http import HttpNotModified
+
+from chroma_core.services.notification_hub.client import NotificationHubClient
+from chroma_core.services import log_register
+
+log = log_register(__name__)
+
+
+def _etag(content):
+    return '"%s"' % hashlib.md5(content).hexdigest()
+
+
+class ResponseCacheEntry(object):
+    def __init__(self, tables, timestamps, response):
+        self.tables = tables
+        self.timestamps = timestamps
+        self.created_at = time.time()
+        self.content = response.content
+        self.content_type = response['Content-Type']
+        self.etag = _etag(self.content)
+
+    def response(self, resource, request):
+        """
+        :return: 2-tuple of the content and ETag of the entry, with the cache_refreshed_fields
+                 of its objects (if any) brought up to date.
+        """
+        if not resource.cache_refreshed_fields:
+            return self.content, self.etag
+
+        data = json.loads(self.content)
+        resource.refresh_cached_fields(data['objects'] if 'objects' in data else [data])
+        content = resource.serialize(request, data, 'application/json')
+        return content, _etag(content)
+
+
+class ResponseCache(object):
+    """
+    Caches the responses to GETs of resources which declare cache_tables (see ChromaModelResource),
+    keyed by the request (path, parameters and format) and the user, so that users whose groups allow
+    them to see different things do not share entries.
+
+    An entry is used for as long as the timestamps which long polling keeps (from the notification hub)
+    for each of cache_tables are those from before it was created, and it is younger than the cache_max_age
+    of its resource (if any), so it is up to each resource to declare every table its representation
+    is derived from.  Changes saved in this process remove the entries for their tables directly, as
+    they may not yet have come back from the notification hub.  Fields which depend on more than
+    tables (cache_refreshed_fields, such as the available actions of stateful objects) are brought up
+    to date in each response taken from the cache, which is only done for JSON.
+
+    Responses carry an ETag, and a GET with an If-None-Match of the current one returns 304 without
+    the response being built.  Resources which use If-None-Match for long polling (LongPollingAPI) are
+    cached but do not have ETags of this kind.
+    """
+    MAX_ENTRIES = 512
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        post_save.connect(self._changed)
+        post_delete.connect(self._changed)
+
+    def _changed(self, sender, **kwargs):
+        table = sender._meta.db_table
+
+        with self._lock:
+            for key, entry in self._entries.items():
+                if table in entry.tables:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _key(self, resource, request):
+        # By user rather than by their groups, which would take a query of its own
+        return (resource._meta.resource_name,
+                request.path,
+                tuple(sorted((key, tuple(values)) for key, values in request.GET.lists())),
+                request.META.get('HTTP_ACCEPT'),
+                request.user.id)
+
+    def get(self, resource, request, get_response):
+        """
+        Return the response to a GET of resource, from the cache or by calling get_response.
+        """
+        # Deltas depend on the long polling request (see LongPollingAPI), not just the parameters
+        if resource.cache_tables is None or getattr(request, 'long_polling_changed_ids', None) is not None:
+            return get_response()
+
+        if resource.cache_refreshed_fields and resource.determine_format(request) != 'application/json':
+            return get_response()
+
+        tables = [model._meta.db_table for model in resource.cache_tables]
+        try:
+            timestamps = NotificationHubClient.table_timestamps(tables)
+        except Exception, e:
+            log.warning("Not caching %s, table timestamps not available: %s" % (request.path, e))
+            return get_response()
+        timestamps.pop('max_timestamp')
+
+        key = self._key(resource, request)
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is None or \
+                entry.timestamps != timestamps or \
+                (resource.cache_max_age is not None and time.time() - entry.created_at > resource.cache_max_age):
+            response = get_response()
+            if response.status_code != 200:
+                return response
+
+            entry = ResponseCacheEntry(tables, timestamps, response)
+            with self._lock:
+                self._entries.pop(key, None)
+                self._entries[key] = entry
+                while len(self._entries) > self.MAX_ENTRIES:
+                    self._entries.popitem(last = False)
+            etag = entry.etag
+        else:
+            content, etag = entry.response(resource, request)
+            response = HttpResponse(content = content, content_type = entry.content_type)
+
+        long_polling = getattr(resource, 'long_polling_tables', None) is not None
+
+        if not long_polling and request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            not_modified = HttpNotModified()
+            not_modified['ETag'] = etag
+            return not_modified
+
+        if not long_polling:
+            response['ETag'] = etag
+        return response
+
+
+response_cache = ResponseCache()
@@ -15,6 +15,7 @@ from django.db.models import Q
 from django.contrib.contenttypes.models import ContentType
 
 from chroma_core.models import ManagedOst, ManagedMdt, ManagedMgs, ManagedTarget, ManagedFilesystem
+from chroma_core.models import ManagedHost, ManagedTargetMount, MdtConfParam, OstConfParam, StorageResourceRecord
 
 import tastypie.http as http
 from tastypie import fields
@@ -23,6 +24,7 @@ from tastypie.utils import dict_strip_unicode_keys
 from tastypie.validation import Validation
 from tastypie.resources import BadRequest, ImmediateHttpResponse
 from chroma_api.authentication import AnonymousAuthentication
+from chroma_api.response_cache import response_cache
 from chroma_api.utils import custom_response, ConfParamResource, MetricResource, dehydrate_command
 from chroma_api.validation_utils import validate
 
@@ -130,6 +132,87 @@ class TargetValidation(Validation):
             return {}
 
 
+class TargetRelations(object):
+    """
+    The objects related to a page of targets which are needed to dehydrate them: their
+    concrete classes, mounts and hosts, volumes and volume nodes, file systems and conf params.
+
+    These are loaded in bulk, in a number of queries which does not depend on the number
+    of targets, rather than by each target as it is dehydrated.
+    """
+
+    def __init__(self, targets):
+        targets = list(targets)
+        target_ids = [target.id for target in targets]
+
+        # Concrete targets, only querying for those which are not already downcast
+        self.concrete = dict((target.id, target) for target in targets if type(target) != ManagedTarget)
+        content_type_ids = set(target.content_type_id for target in targets if target.id not in self.concrete)
+        for klass in KIND_TO_KLASS.values():
+            if ContentType.objects.get_for_model(klass).id in content_type_ids:
+                self.concrete.update((target.id, target) for target in
+                                     klass._base_manager.filter(id__in = target_ids).select_related('content_type'))
+
+        self.mounts = defaultdict(list)
+        for mount in ManagedTargetMount.objects.filter(target__in = target_ids).select_related('host'):
+            self.mounts[mount.target_id].append(mount)
+
+        # As ManagedTarget.full_volume, for all the targets
+        self.volumes = dict((volume.id, volume) for volume in Volume._base_manager.filter(
+            id__in = set(target.volume_id for target in targets)).select_related(
+            'storage_resource',
+            'storage_resource__resource_class',
+            'storage_resource__resource_class__storage_plugin'
+        ).prefetch_related('volumenode_set', 'volumenode_set__host'))
+
+        filesystem_ids = set(target.filesystem_id for target in self.concrete.values() if target.filesystem_member)
+        self.filesystems = {}
+        if filesystem_ids:
+            self.filesystems = dict((fs.id, fs) for fs in ManagedFilesystem._base_manager.filter(id__in = filesystem_ids))
+
+        mgs_ids = [target.id for target in self.concrete.values() if type(target) == ManagedMgs]
+        self.mgs_filesystems = defaultdict(list)
+        if mgs_ids:
+            for fs in ManagedFilesystem.objects.filter(mgs__in = mgs_ids):
+                self.mgs_filesystems[fs.mgs_id].append(fs)
+
+        self.conf_params = defaultdict(list)
+        for klass, conf_param_klass, target_field in [(ManagedOst, OstConfParam, 'ost'), (ManagedMdt, MdtConfParam, 'mdt')]:
+            ids = [target.id for target in self.concrete.values() if type(target) == klass]
+            if ids:
+                for conf_param in conf_param_klass.objects.filter(**{'%s__in' % target_field: ids}):
+                    self.conf_params[getattr(conf_param, '%s_id' % target_field)].append(conf_param)
+
+    def primary_host(self, target):
+        try:
+            return next(mount.host for mount in self.mounts[target.id] if mount.primary)
+        except StopIteration:
+            raise RuntimeError("No primary host found for ManagedTarget %s" % target.name)
+
+    def failover_hosts(self, target):
+        return [mount.host for mount in self.mounts[target.id] if not mount.primary]
+
+    def active_host(self, target):
+        if target.active_mount_id is None:
+            return None
+
+        for mount in self.mounts[target.id]:
+            if mount.id == target.active_mount_id:
+                return mount.host
+        return target.active_mount.host
+
+    def filesystem(self, target):
+        """The file system of an OST or MDT"""
+        target = self.concrete[target.id]
+        if not target.filesystem_member:
+            raise NotAFileSystemMember(type(target))
+
+        try:
+            return self.filesystems[target.filesystem_id]
+        except KeyError:
+            return target.filesystem
+
+
 class TargetResource(MetricResource, ConfParamResource):
     """
     A Lustre target.
@@ -167,7 +250,8 @@ class TargetResource(MetricResource, ConfParamResource):
     volume_name = fields.CharField(attribute = 'volume__label',
             help_text = "The ``label`` attribute of the volume on which this target exists")
 
-    primary_server = fields.ToOneField('chroma_api.host.HostResource', 'primary_host', full=False)
+    primary_server = fields.ToOneField('chroma_api.host.HostResource',
+                                       lambda bundle: bundle.target_relations.primary_host(bundle.obj), full=False)
     primary_server_name = fields.CharField(help_text = "Human\
             readable label for the primary server for this target")
     failover_servers = fields.ListField(null=True)
@@ -176,13 +260,18 @@ class TargetResource(MetricResource, ConfParamResource):
 
     active_host_name = fields.CharField(help_text = "Human \
         readable label for the host on which this target is currently started")
-    active_host = fields.ToOneField('chroma_api.host.HostResource', 'active_host',
+    active_host = fields.ToOneField('chroma_api.host.HostResource',
+        lambda bundle: bundle.target_relations.active_host(bundle.obj),
         null = True, help_text = "The server on which this target is currently started, or null if "
                                  "the target is not currently started")
 
-    volume = fields.ToOneField('chroma_api.volume.VolumeResource', 'full_volume', full = True, help_text = "\
+    volume = fields.ToOneField('chroma_api.volume.VolumeResource',
+                               lambda bundle: bundle.target_relations.volumes[bundle.obj.volume_id], full = True, help_text = "\
                              The volume on which this target is stored.")
 
+    cache_tables = [ManagedTarget, ManagedMgs, ManagedMdt, ManagedOst, ManagedTargetMount, ManagedFilesystem,
+                    ManagedHost, Volume, VolumeNode, StorageResourceRecord, MdtConfParam, OstConfParam]
+
     def content_type_id_to_kind(self, id):
         if not hasattr(self, 'CONTENT_TYPE_ID_TO_KIND'):
             self.CONTENT_TYPE_ID_TO_KIND = dict([(ContentType.objects.get_for_model(v).id, k) for k, v in KIND_TO_KLASS.items()])
@@ -193,13 +282,41 @@ class TargetResource(MetricResource, ConfParamResource):
         """The first call in the dehydrate cycle.
 
         The ui, calls this directly, in addition to calling through the
-        normal api path.  So, use it to initialize the fs cache.
+        normal api path.  So, load the related objects of the target unless
+        get_list has already done so for the whole page.
         """
 
-        self._init_cached_fs()
+        if not hasattr(bundle, 'target_relations'):
+            bundle.target_relations = TargetRelations([bundle.obj])
 
         return super(TargetResource, self).full_dehydrate(bundle, for_list)
 
+    def get_list(self, request, **kwargs):
+        return response_cache.get(self, request, lambda: self._get_list(request, **kwargs))
+
+    def _get_list(self, request, **kwargs):
+        """As ModelResource.get_list, loading the related objects of the page of targets
+        in bulk before they are dehydrated (see TargetRelations)"""
+        base_bundle = self.build_bundle(request=request)
+        objects = self.obj_get_list(bundle=base_bundle, **self.remove_api_resource_names(kwargs))
+        sorted_objects = self.apply_sorting(objects, options=request.GET)
+
+        paginator = self._meta.paginator_class(request.GET, sorted_objects, resource_uri=self.get_resource_uri(), limit=self._meta.limit, max_limit=self._meta.max_limit, collection_name=self._meta.collection_name)
+        to_be_serialized = paginator.page()
+
+        targets = list(to_be_serialized[self._meta.collection_name])
+        relations = TargetRelations(targets)
+
+        bundles = []
+        for obj in targets:
+            bundle = self.build_bundle(obj=obj, request=request)
+            bundle.target_relations = relations
+            bundles.append(self.full_dehydrate(bundle, for_list=True))
+
+        to_be_serialized[self._meta.collection_name] = bundles
+        to_be_serialized = self.alter_list_data_to_serialize(request, to_be_serialized)
+        return self.create_response(request, to_be_serialized)
+
     class Meta:
         # ManagedTarget is a Polymorphic Model which gets related
         # to content_type in the __metaclass__
@@ -207,9 +324,7 @@ class TargetResource(MetricResource, ConfParamResource):
             'content_type', 'volume',
             'volume__storage_resource__resource_class',
             'volume__storage_resource__resource_class__storage_plugin',
-            'managedost', 'managedmdt', 'managedmgs').prefetch_related(
-            'managedtargetmount_set', 'managedtargetmount_set__host',
-            'managedtargetmount_set__host__lnet_configuration')
+            'managedost', 'managedmdt', 'managedmgs')
         resource_name = 'target'
         excludes = ['not_deleted', 'bytes_per_inode', 'reformat']
         filtering = {'kind': ['exact'], 'filesystem_id': ['exact'], 'host_id': ['exact'], 'id': ['exact', 'in'], 'immutable_state': ['exact'], 'name': ['exact']}
@@ -237,11 +352,10 @@ class TargetResource(MetricResource, ConfParamResource):
         return urls
 
     def dehydrate_filesystems(self, bundle):
-        #  Limit this to one db hit per mgs, caching might help
-        target = bundle.obj.downcast()
+        target = bundle.target_relations.concrete[bundle.obj.id]
         if type(target) == ManagedMgs:
             return [{'id': fs.id, 'name': fs.name} for fs in
-                    bundle.obj.managedmgs.managedfilesystem_set.all()]
+                    bundle.target_relations.mgs_filesystems[target.id]]
         else:
             return None
 
@@ -249,7 +363,7 @@ class TargetResource(MetricResource, ConfParamResource):
         return self.content_type_id_to_kind(bundle.obj.content_type_id)
 
     def dehydrate_index(self, bundle):
-        target = bundle.obj.downcast()
+        target = bundle.target_relations.concrete[bundle.obj.id]
 
         if target.filesystem_member:
             return target.index
@@ -257,36 +371,7 @@ class TargetResource(MetricResource, ConfParamResource):
             return None
 
     def dehydrate_filesystem_id(self, bundle):
-
-        #  The ID is free - no db hit
-        return getattr(bundle.obj.downcast(), 'filesystem_id', None)
-
-    def _init_cached_fs(self):
-
-        # Object to hold seen filesystems, to preventing multiple
-        # db hits for the same filesystem.
-        self._fs_cache = defaultdict(ManagedFilesystem)
-
-    def _get_cached_fs(self, bundle):
-        """Cache the ManagedFilesystem as they are seen.
-
-        The ManageFile can be accessed many times.  Use this method to get
-        it and the number of DB hits is reduced.
-
-        """
-
-        #  Only OST and MDT are FS members.  Those subclass are joined in above
-        #  So this lookup is free accept for initial ManageFilesystem lookup
-        managed_target = bundle.obj.downcast()
-        if managed_target.filesystem_member:
-            val = getattr(managed_target, 'filesystem_id', None)
-            if val not in self._fs_cache:
-                #  Only DB hit in this method.
-                self._fs_cache[val] = managed_target.filesystem
-
-            return self._fs_cache[val]  # a ManagedFilesystem
-        else:
-            raise NotAFileSystemMember(type(managed_target))
+        return getattr(bundle.target_relations.concrete[bundle.obj.id], 'filesystem_id', None)
 
     def dehydrate_filesystem(self, bundle):
         """Get the URL to load a ManagedFileSystem"""
@@ -294,7 +379,7 @@ class TargetResource(MetricResource, ConfParamResource):
         try:
             from chroma_api.filesystem import FilesystemResource
 
-            filesystem = self._get_cached_fs(bundle)
+            filesystem = bundle.target_relations.filesystem(bundle.obj)
             return FilesystemResource().get_resource_uri(filesystem)
         except NotAFileSystemMember:
             return None
@@ -302,34 +387,43 @@ class TargetResource(MetricResource, ConfParamResource):
     def dehydrate_filesystem_name(self, bundle):
 
         try:
-            filesystem = self._get_cached_fs(bundle)
+            filesystem = bundle.target_relations.filesystem(bundle.obj)
             return filesystem.name
         except NotAFileSystemMember:
             return None
 
+    def dehydrate_conf_params(self, bundle):
+        target = bundle.target_relations.concrete[bundle.obj.id]
+        try:
+            return chroma_core.lib.conf_param.get_conf_params(target, bundle.target_relations.conf_params[target.id])
+        except NotImplementedError:
+            return None
+
     def dehydrate_primary_server_name(self, bundle):
-        return bundle.obj.primary_host.get_label()
+        return bundle.target_relations.primary_host(bundle.obj).get_label()
 
     def dehydrate_failover_servers(self, bundle):
         from chroma_api.urls import api
-        return [api.get_resource_uri(host) for host in bundle.obj.failover_hosts]
+        return [api.get_resource_uri(host) for host in bundle.target_relations.failover_hosts(bundle.obj)]
 
     def dehydrate_failover_server_name(self, bundle):
         try:
-            return bundle.obj.failover_hosts[0].get_label()
+            return bundle.target_relations.failover_hosts(bundle.obj)[0].get_label()
         except IndexError:
             return "---"
 
     def dehydrate_active_host_name(self, bundle):
-        if bundle.obj.active_mount:
-            return bundle.obj.active_mount.host.get_label()
+        active_host = bundle.target_relations.active_host(bundle.obj)
+        if active_host:
+            return active_host.get_label()
         else:
             return "---"
 
     def dehydrate_active_host_uri(self, bundle):
-        if bundle.obj.active_mount:
+        active_host = bundle.target_relations.active_host(bundle.obj)
+        if active_host:
             from chroma_api.host import HostResource
-            return HostResource().get_resource_uri(bundle.obj.active_mount.host)
+            return HostResource().get_resource_uri(active_host)
         else:
             return None
 
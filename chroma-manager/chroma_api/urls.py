@@ -4,8 +4,11 @@
 
 
 from django.conf.urls.defaults import patterns, include
+from django.http import HttpResponseNotModified
 from tastypie.api import Api
 
+import settings
+
 
 class ChromaApi(Api):
     def __init__(self, *args, **kwargs):
@@ -28,6 +31,21 @@ class ChromaApi(Api):
 
         return None
 
+    def top_level(self, request, api_name = None):
+        """The schemas of the API only change with the version of the manager, so tag
+        them with it for clients which cache them (such as the CLI)."""
+        if settings.VERSION == 'dev':
+            # Not a build, so the schemas may change at any time
+            return super(ChromaApi, self).top_level(request, api_name)
+
+        etag = '"%s-%s"' % (settings.VERSION, settings.BUILD)
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return HttpResponseNotModified()
+
+        response = super(ChromaApi, self).top_level(request, api_name)
+        response['ETag'] = etag
+        return response
+
 api = ChromaApi(api_name = 'api')
 
 import chroma_api.alert
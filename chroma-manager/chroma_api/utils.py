@@ -172,6 +172,10 @@ class StatefulModelResource(CustomModelResource):
     label = fields.CharField()
     locks = fields.DictField(help_text= "Lists of locked job ids for this object")
 
+    # Which transitions and jobs are available depends on the states of other objects and on
+    # the job scheduler, not just on the tables of the resource
+    cache_refreshed_fields = ['available_transitions', 'available_jobs', 'available_actions']
+
     class Meta:
         readonly = ['id', 'immutable_state', 'state', 'content_type_id', 'available_transitions', 'available_jobs', 'label', 'state_modified_at', 'locks']
 
@@ -241,32 +245,41 @@ class StatefulModelResource(CustomModelResource):
         Returns an updated copy of the input dict.
         """
 
-        batch = []
-        for bundle in to_be_serialized['objects']:
-            so_ct_key = ContentType.objects.get_for_model(bundle.obj.downcast()).natural_key()
-            batch.append((so_ct_key, bundle.obj.id,))
+        self._set_available_actions([(ContentType.objects.get_for_model(bundle.obj.downcast()).natural_key(),
+                                      bundle.obj.id,
+                                      bundle.data) for bundle in to_be_serialized['objects']])
+
+        return to_be_serialized
+
+    def refresh_cached_fields(self, objects):
+        self._set_available_actions([(ContentType.objects.get_for_id(data['content_type_id']).natural_key(),
+                                      int(data['id']),
+                                      data) for data in objects])
 
-        computed_transitions = JobSchedulerClient.available_transitions(batch)
-        computed_jobs = JobSchedulerClient.available_jobs(batch)
+    def _set_available_actions(self, batch):
+        """
+        Set the available_* fields of each in a list of (content type natural key, id, data dict),
+        in two batched calls to the job scheduler.
+        """
+        computed_transitions = JobSchedulerClient.available_transitions([(so_ct_key, id) for so_ct_key, id, data in batch])
+        computed_jobs = JobSchedulerClient.available_jobs([(so_ct_key, id) for so_ct_key, id, data in batch])
 
         #  decorate the transition lists with verbs
-        #  and install in the bundle for return
-        for idx, bundle in enumerate(to_be_serialized['objects']):
-            obj_transitions_states_and_verbs = computed_transitions[str(bundle.obj.id)]
+        #  and install in the data for return
+        for so_ct_key, id, data in batch:
+            obj_transitions_states_and_verbs = computed_transitions[str(id)]
 
-            obj_jobs = computed_jobs[str(bundle.obj.id)]
+            obj_jobs = computed_jobs[str(id)]
 
             # TODO: available_transitions is deprecated, use available_actions
-            bundle.data['available_transitions'] = obj_transitions_states_and_verbs
+            data['available_transitions'] = obj_transitions_states_and_verbs
 
             # TODO: available_jobs is deprecated, use available_actions
-            bundle.data['available_jobs'] = obj_jobs
+            data['available_jobs'] = obj_jobs
 
             available_actions = sorted(obj_transitions_states_and_verbs + obj_jobs,
                                        key=lambda action: action['display_order'])
-            bundle.data['available_actions'] = available_actions
-
-        return to_be_serialized
+            data['available_actions'] = available_actions
 
     # PUT handler for accepting {'state': 'foo', 'dry_run': <true|false>}
     def obj_update(self, bundle, **kwargs):
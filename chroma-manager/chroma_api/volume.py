@@ -4,6 +4,8 @@
 
 
 from chroma_core.models import Volume, ManagedFilesystem, HaCluster, ManagedHost
+from chroma_core.models import VolumeNode, StorageResourceRecord
+from chroma_core.models import ManagedTarget, ManagedMgs, ManagedMdt, ManagedOst, ManagedTargetMount
 
 from tastypie.exceptions import ImmediateHttpResponse
 from tastypie.http import HttpBadRequest
@@ -44,6 +46,11 @@ class WrappedAll(object):
         return self
 
     def all(self):
+        # Volume nodes which were prefetched with their hosts (see TargetRelations)
+        # would only be queried again by select_related
+        if 'volumenode' in getattr(self.bundle.obj, '_prefetched_objects_cache', {}):
+            return self.bundle.obj.volumenode_set.all()
+
         return self.bundle.obj.volumenode_set.all().select_related('host')
 
     def __bool__(self):
@@ -100,6 +107,9 @@ class VolumeResource(ChromaModelResource):
         help_text = "The `storage_resource` corresponding to the "
                     "device which this Volume represents")
 
+    cache_tables = [Volume, VolumeNode, ManagedHost, StorageResourceRecord, ManagedTarget, ManagedMgs, ManagedMdt,
+                    ManagedOst, ManagedTargetMount]
+
     def dehydrate_kind(self, bundle):
         #  Kind comes from the related storage_resource.
         return bundle.obj.get_kind()
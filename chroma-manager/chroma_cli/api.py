@@ -3,6 +3,7 @@
 # license that can be found in the LICENSE file.
 
 
+import os
 import json
 import time
 import re
@@ -15,6 +16,31 @@ from chroma_cli.exceptions import InvalidApiResource, UnsupportedFormat, NotFoun
 DEFAULT_API_URL = "https://localhost/api/"
 
 
+def _read_json_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _write_json_file(path, data):
+    """Write data to path readable only by the user, as it may hold session credentials"""
+    tmp_path = "%s.%s" % (path, os.getpid())
+    try:
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        # Only an optimization, so carry on without it
+        pass
+
+
+def _response_header(response, header):
+    """Return a header of a requests response, or None (including for responses from clients without headers)"""
+    return getattr(response, 'headers', {}).get(header)
+
+
 class JsonSerializer(object):
     """
     Simple JSON serializer which implements the important parts of TastyPie's Serializer API.
@@ -45,9 +71,16 @@ class JsonSerializer(object):
 
 
 class ChromaSessionClient(object):
+    """
+    An HTTP session with the API, which is kept alive for all of the requests made
+    through it, and saved in SESSION_FILE (keyed by API URL) so that later invocations
+    can carry on with it rather than logging in again.
+    """
+    SESSION_FILE = "~/.chroma_session"
+
     def __init__(self):
         self.is_authenticated = False
-        self.api_uri = DEFAULT_API_URL
+        self.session_file = os.path.expanduser(self.SESSION_FILE) if self.SESSION_FILE else None
 
         import requests
         self.session = requests.session()
@@ -56,33 +89,75 @@ class ChromaSessionClient(object):
         # FIXME?: Should we be doing CA verification in the CLI?
         self.session.verify = False
 
+        self.session_cookies = {}
+        # The user whose saved session may be carried on with
+        self.username = None
+        self._api_uri = None
+        self.api_uri = DEFAULT_API_URL
+
     def __getattr__(self, method):
         return getattr(self.session, method)
 
+    @property
+    def api_uri(self):
+        return self._api_uri
+
+    @api_uri.setter
+    def api_uri(self, api_uri):
+        self._api_uri = api_uri
+        self._restore_session()
+
     @property
     def session_uri(self):
         return urljoin(self.api_uri, "session/")
 
+    def _set_session(self, csrftoken, sessionid):
+        self.session.headers['X-CSRFToken'] = csrftoken
+        self.session_cookies = {'csrftoken': csrftoken, 'sessionid': sessionid}
+        for name, value in self.session_cookies.items():
+            # Replace rather than add to any cookie of the same name set by a response
+            if name in self.session.cookies:
+                del self.session.cookies[name]
+            self.session.cookies[name] = value
+
+    def _restore_session(self):
+        saved = _read_json_file(self.session_file).get(self.api_uri) if self.session_file else None
+        if saved and saved.get('username') == self.username:
+            self._set_session(str(saved['cookies']['csrftoken']), str(saved['cookies']['sessionid']))
+            # If the session has since expired, requests will be refused and login() called again
+            self.is_authenticated = True
+
+    def _save_session(self):
+        if self.session_file:
+            sessions = _read_json_file(self.session_file)
+            if self.is_authenticated:
+                sessions[self.api_uri] = {'username': self.username, 'cookies': self.session_cookies}
+            else:
+                sessions.pop(self.api_uri, None)
+            _write_json_file(self.session_file, sessions)
+
     def start_session(self):
         r = self.get(self.session_uri)
         if not 200 <= r.status_code < 300:
             raise RuntimeError("No session (status: %s, text: %s)" %
                                (r.status_code, r.content))
 
-        self.session.headers['X-CSRFToken'] = r.cookies['csrftoken']
-        self.session.cookies['csrftoken'] = r.cookies['csrftoken']
-        self.session.cookies['sessionid'] = r.cookies['sessionid']
+        self._set_session(r.cookies['csrftoken'], r.cookies['sessionid'])
 
     def login(self, **credentials):
         if not self.is_authenticated:
-            if 'sessionid' not in self.session.cookies:
+            if 'sessionid' not in self.session_cookies:
                 self.start_session()
 
             r = self.post(self.session_uri, data=json.dumps(credentials))
             if not 200 <= r.status_code < 300:
                 raise AuthenticationFailure()
             else:
+                # Logging in starts a new session
+                self._set_session(r.cookies.get('csrftoken', self.session_cookies['csrftoken']),
+                                  r.cookies.get('sessionid', self.session_cookies['sessionid']))
                 self.is_authenticated = True
+                self._save_session()
 
         return self.is_authenticated
 
@@ -90,6 +165,7 @@ class ChromaSessionClient(object):
         if self.is_authenticated:
             self.delete(self.session_uri)
             self.is_authenticated = False
+            self._save_session()
 
 
 class ApiClient(object):
@@ -107,6 +183,7 @@ class ApiClient(object):
     def get(self, uri, format="json", data=None, authentication=None, **kwargs):
         content_type = self.get_content_type(format)
         headers = {'Content-Type': content_type, 'Accept': content_type}
+        headers.update(kwargs.get('headers', {}))
 
         if authentication and not self.client.is_authenticated:
             self.client.login(**authentication)
@@ -116,6 +193,7 @@ class ApiClient(object):
     def post(self, uri, format="json", data=None, authentication=None, **kwargs):
         content_type = self.get_content_type(format)
         headers = {'Content-Type': content_type, 'Accept': content_type}
+        headers.update(kwargs.get('headers', {}))
 
         if authentication and not self.client.is_authenticated:
             self.client.login(**authentication)
@@ -126,6 +204,7 @@ class ApiClient(object):
     def put(self, uri, format="json", data=None, authentication=None, **kwargs):
         content_type = self.get_content_type(format)
         headers = {'Content-Type': content_type, 'Accept': content_type}
+        headers.update(kwargs.get('headers', {}))
 
         if authentication and not self.client.is_authenticated:
             self.client.login(**authentication)
@@ -136,6 +215,7 @@ class ApiClient(object):
     def delete(self, uri, format="json", data=None, authentication=None, **kwargs):
         content_type = self.get_content_type(format)
         headers = {'Content-Type': content_type, 'Accept': content_type}
+        headers.update(kwargs.get('headers', {}))
 
         if authentication and not self.client.is_authenticated:
             self.client.login(**authentication)
@@ -147,10 +227,24 @@ class CommandMonitor(object):
     def __init__(self, api, cmd):
         self.api = api
         self.cmd = cmd
+        # Timestamps of the command table as last returned by the long polling API ('0' to start)
+        self._last_modified = '0'
 
     def update(self, pause=1):
-        time.sleep(pause)
-        self.cmd = self.api.endpoints['command'].show(self.cmd['id'])
+        """
+        Refresh the command once it (or another command) has changed, using the
+        long polling API, or after pause seconds if the API does not support it.
+        """
+        if self._last_modified is None:
+            time.sleep(pause)
+
+        endpoint = self.api.endpoints['command']
+        r = self.api.send("get", endpoint.resource_uri(self.cmd['id']),
+                          headers={'If-None-Match': self._last_modified or '0'})
+
+        if r.status_code != 304:
+            self.cmd = endpoint.resource_klass(**self.api.decode(r))
+            self._last_modified = _response_header(r, 'ETag')
 
     def wait_complete(self):
         '''
@@ -186,13 +280,12 @@ class CommandMonitor(object):
             else:
                 return None
 
-        incomplete = []
-        for job_id in [_job_id(j_uri) for j_uri in self.cmd['jobs']]:
-            job = self.api.endpoints['job'].show(job_id)
-            if job['state'] != "complete":
-                incomplete.append(int(job_id))
+        job_ids = [_job_id(j_uri) for j_uri in self.cmd['jobs']]
+        if not job_ids:
+            return []
 
-        return incomplete
+        jobs = self.api.endpoints['job'].list(id__in=",".join(job_ids), limit=0)
+        return sorted(int(job['id']) for job in jobs if job['state'] != "complete")
 
 
 class ApiHandle(object):
@@ -201,8 +294,14 @@ class ApiHandle(object):
     # ApiClient which uses Django's Client under the hood.
     ApiClient = ApiClient
 
+    # Where the API schemas are kept between invocations, keyed by API URL
+    SCHEMA_CACHE_FILE = "~/.chroma_schema"
+
     def __init__(self, api_uri=None, authentication=None):
         self.__schema = None
+        self.schema_cache_file = os.path.expanduser(self.SCHEMA_CACHE_FILE) if self.SCHEMA_CACHE_FILE else None
+        # The schemas cached for this API, while they are those of the manager's version
+        self._schema_cache = None
         self.base_url = self._fix_base_uri(api_uri)
         if not self.base_url:
             self.base_url = DEFAULT_API_URL
@@ -211,6 +310,7 @@ class ApiHandle(object):
         self.serializer = JsonSerializer()
         self.api_client = self.ApiClient()
         # Ugh. Least-worst option, I think.
+        self.api_client.client.username = (authentication or {}).get('username')
         self.api_client.client.api_uri = self.base_url
         self.command_monitor = lambda cmd: CommandMonitor(self, cmd)
 
@@ -244,31 +344,81 @@ class ApiHandle(object):
     @property
     def schema(self):
         if not self.__schema:
-            self.__schema = self.send_and_decode("get", "")
+            self.__schema = self._load_schema()
 
         return self.__schema
 
+    def _load_schema(self):
+        """
+        Get the top level schema of the API.  The manager tags it with its version,
+        so the schemas cached by an earlier invocation are used for as long as the
+        manager says they are current.
+        """
+        cached = None
+        if self.schema_cache_file:
+            cached = _read_json_file(self.schema_cache_file).get(self.base_url)
+
+        r = self.send("get", "", headers={'If-None-Match': cached['etag']} if cached else {})
+        if cached and r.status_code == 304:
+            self._schema_cache = cached
+            return cached['schema']
+
+        schema = self.decode(r)
+        etag = _response_header(r, 'ETag')
+        if self.schema_cache_file and etag:
+            self._schema_cache = {'etag': etag, 'schema': schema, 'endpoints': {}}
+            self._save_schema_cache()
+
+        return schema
+
+    def _save_schema_cache(self):
+        schemas = _read_json_file(self.schema_cache_file)
+        schemas[self.base_url] = self._schema_cache
+        _write_json_file(self.schema_cache_file, schemas)
+
+    def endpoint_schema(self, name):
+        """Get the schema of an endpoint, from the cache if it is current"""
+        if self._schema_cache and name in self._schema_cache['endpoints']:
+            return self._schema_cache['endpoints'][name]
+
+        schema = self.send_and_decode("get", self.schema[name]['schema'])
+        if self._schema_cache:
+            self._schema_cache['endpoints'][name] = schema
+            self._save_schema_cache()
+
+        return schema
+
     def data_or_text(self, content):
         try:
             return self.serializer.deserialize(content)
         except ValueError:
             return content
 
-    def send_and_decode(self, method_name, relative_url, data=None):
+    def send(self, method_name, relative_url, data=None, headers=None):
+        """Send a request, logging in if required, and return the response"""
         full_url = urljoin(self.base_url, relative_url)
+        headers = dict(headers or {})
 
         from requests import ConnectionError
         method = getattr(self.api_client, method_name)
         try:
-            r = method(full_url, data=data)
+            r = method(full_url, data=data, headers=headers)
+
+            if r.status_code == 401:
+                # Try logging in (again, if a saved session has expired) and retry the request
+                self.api_client.client.is_authenticated = False
+                self.api_client.client.login(**self.authentication)
+                r = method(full_url, data=data, headers=headers)
         except ConnectionError:
             raise ApiConnectionError(self.base_url)
 
-        if r.status_code == 401:
-            # Try logging in and retry the request
-            self.api_client.client.login(**self.authentication)
-            r = method(full_url, data=data)
+        return r
+
+    def send_and_decode(self, method_name, relative_url, data=None):
+        return self.decode(self.send(method_name, relative_url, data=data))
 
+    def decode(self, r):
+        """Decode a response, raising the exception for an error status"""
         decoded = self.data_or_text(r.content)
         if 200 <= r.status_code < 304:
             return decoded
@@ -350,8 +500,7 @@ class ApiEndpoint(object):
     @property
     def schema(self):
         if not self.__schema:
-            schema_url = self.api_handle.schema[self.name]['schema']
-            self.__schema = self.api_handle.send_and_decode("get", schema_url)
+            self.__schema = self.api_handle.endpoint_schema(self.name)
 
         return self.__schema
 
@@ -5,6 +5,8 @@
 
 from argparse import REMAINDER, SUPPRESS
 import sys
+import copy
+import shlex
 import traceback
 
 from chroma_cli.parser import ResettableArgumentParser
@@ -25,10 +27,8 @@ def detect_proxies():
     return proxies
 
 
-def standard_cli(args=None, config=None):
-    config = config
-    if not config:
-        config = Configuration()
+def _parse_args(args, config):
+    """Parse a command line, updating config with the options given in it"""
     parser = ResettableArgumentParser(description="Chroma CLI", add_help=False)
     dispatcher = Dispatcher()
 
@@ -43,6 +43,8 @@ def standard_cli(args=None, config=None):
                         action="store_true")
     parser.add_argument("--force", "-f", help="Ignore validation errors and proceed anyway",
                         action="store_true")
+    parser.add_argument("--batch", "-b", help="Run the commands read from stdin, one per line, over one connection",
+                        action="store_true")
     parser.clear_resets()
 
     # fake-y help arg to allow it to pass through to the real one
@@ -50,41 +52,40 @@ def standard_cli(args=None, config=None):
                         default=SUPPRESS, action='store_true')
     parser.add_argument("args", nargs=REMAINDER)
     ns = parser.parse_args(args)
-    parser.reset()
 
-    parser.add_argument("--help", "-h", help="show this help message and exit",
-                        default=SUPPRESS, action='help')
-    subparsers = parser.add_subparsers()
-    dispatcher.add_subparsers(subparsers, ns)
+    if not ns.batch or ns.args:
+        parser.reset()
 
-    if 'noun' in ns and 'verb' in ns:
-        args = [ns.noun, ns.verb] + ns.args
-    ns = parser.parse_args(args, ns)
+        parser.add_argument("--help", "-h", help="show this help message and exit",
+                            default=SUPPRESS, action='help')
+        subparsers = parser.add_subparsers()
+        dispatcher.add_subparsers(subparsers, ns)
+
+        if 'noun' in ns and 'verb' in ns:
+            args = [ns.noun, ns.verb] + ns.args
+        ns = parser.parse_args(args, ns)
 
     # Allow CLI options to override defaults/.chroma config values
     config.update(dict([[key, val] for key, val in ns.__dict__.items()
                                 if val
                                 and key not in ["primary_action", "options"]]))
 
-    authentication = {'username': config.username,
-                      'password': config.password}
-    api = ApiHandle(api_uri=config.api_url,
-                    authentication=authentication)
+    return parser, ns, args
 
-    formatter = StandardFormatter(format=config.output, nowait=config.nowait, command_monitor=api.command_monitor)
 
-    proxies = detect_proxies()
-    if proxies and config.noproxy:
-        import os
-        for proxy in proxies:
-            del os.environ[proxy]
-    elif proxies:
-        sys.stderr.write("WARNING: Detected the following proxy variables: %s (--noproxy to disable them)\n" % ", ".join(proxies))
+def _run(api, config, parser, ns, args, batch=False):
+    """Run the command parsed from a command line, returning the exit status"""
+    formatter = StandardFormatter(format=config.output, nowait=config.nowait, command_monitor=api.command_monitor)
 
     try:
         ns.handler(api=api, formatter=formatter)(parser=parser, args=args, ns=ns)
     except UserConfirmationRequired, e:
         print e
+        if batch:
+            # stdin is the commands to run, so can't be asked
+            print "Not proceeding (--%s to avoid prompt)" % e.skip_argument
+            return 1
+
         response = ""
         while response not in ['yes', 'no']:
             response = raw_input("Do you want to proceed (--%s to avoid prompt)? (yes/no) " % e.skip_argument).lower()
@@ -94,7 +95,7 @@ def standard_cli(args=None, config=None):
             ns.handler(api=api, formatter=formatter)(parser=parser, args=args, ns=ns)
     except (AbnormalCommandCompletion, ApiException), e:
         print e
-        sys.exit(1)
+        return 1
     except Exception, e:
         exc_info = sys.exc_info()
         trace = '\n'.join(traceback.format_exception(*(exc_info or sys.exc_info())))
@@ -104,9 +105,61 @@ def standard_cli(args=None, config=None):
             if 'verb' in ns:
                 handler += ".%s" % ns.verb
         print "Internal client error from handler '%s': %s" % (handler, trace)
-        sys.exit(1)
+        return 1
+
+    return 0
+
+
+def _run_batch(api, config, lines):
+    """
+    Run each command line in lines (with any options of the batch as defaults) with
+    the same API session, so that they share its connection, login and schemas.
+    Carries on after a command fails, and returns 1 if any did.
+    """
+    status = 0
+    for line in lines:
+        args = shlex.split(line, comments=True)
+        if not args:
+            continue
+
+        print "$ %s" % line.strip()
+        line_config = copy.copy(config)
+        try:
+            parser, ns, args = _parse_args(args, line_config)
+        except SystemExit, e:
+            # argparse has printed the error
+            status = status or e.code
+            continue
+
+        status = _run(api, line_config, parser, ns, args, batch=True) or status
+
+    return status
+
+
+def standard_cli(args=None, config=None):
+    config = config
+    if not config:
+        config = Configuration()
+
+    parser, ns, args = _parse_args(args, config)
+
+    authentication = {'username': config.username,
+                      'password': config.password}
+    api = ApiHandle(api_uri=config.api_url,
+                    authentication=authentication)
+
+    proxies = detect_proxies()
+    if proxies and config.noproxy:
+        import os
+        for proxy in proxies:
+            del os.environ[proxy]
+    elif proxies:
+        sys.stderr.write("WARNING: Detected the following proxy variables: %s (--noproxy to disable them)\n" % ", ".join(proxies))
 
-    sys.exit(0)
+    if ns.batch and not ns.args:
+        sys.exit(_run_batch(api, config, sys.stdin))
+    else:
+        sys.exit(_run(api, config, parser, ns, args))
 
 if __name__ == '__main__':
     standard_cli()
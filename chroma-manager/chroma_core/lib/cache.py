@@ -4,6 +4,7 @@
 
 
 from collections import defaultdict
+from operator import attrgetter
 from chroma_core.services import log_register
 
 
@@ -18,6 +19,7 @@ class ObjectCache(object):
         from chroma_core.models import PacemakerConfiguration, CorosyncConfiguration, Corosync2Configuration
         from chroma_core.models import NTPConfiguration
         from chroma_core.models.target import ManagedTarget, ManagedTargetMount
+        from chroma_core.models.target import ManagedMdt, ManagedOst
         from chroma_core.models.copytool import Copytool
         self.objects = defaultdict(dict)
         filter_args = {
@@ -30,17 +32,81 @@ class ObjectCache(object):
                                Copytool, PacemakerConfiguration, CorosyncConfiguration,
                                Corosync2Configuration, NTPConfiguration]
 
+        # The keys by which the instances of a class are indexed, so that the lookups below
+        # don't scan every instance of the class.  The indexes are kept up to date by _add,
+        # _update and purge.
+        host_id = attrgetter('host_id')
+        self._index_keys = {
+            ManagedTarget: {'mdt_filesystem_id': lambda t: self._target_membership(t, ManagedMdt),
+                            'ost_filesystem_id': lambda t: self._target_membership(t, ManagedOst)},
+            ManagedFilesystem: {'mgs_id': attrgetter('mgs_id')},
+            ManagedTargetMount: {'host_id': host_id, 'target_id': attrgetter('target_id')},
+            LustreClientMount: {'host_id': host_id, 'filesystem_id': attrgetter('filesystem_id')},
+            Copytool: {'host_id': host_id},
+            LNetConfiguration: {'host_id': host_id},
+            PacemakerConfiguration: {'host_id': host_id}
+        }
+        self._indexes = defaultdict(lambda: defaultdict(set))
+        self._indexed_values = {}
+
+        # Only the MDT and OST rows know their filesystem, so fetch it for them all up front
+        self._target_members = {}
+        for klass in [ManagedMdt, ManagedOst]:
+            for target_id, filesystem_id in klass.objects.values_list('id', 'filesystem_id'):
+                self._target_members[target_id] = (klass, filesystem_id)
+
         for klass in self._cached_models:
             args = filter_args.get(klass, {})
             for obj in klass.objects.filter(**args):
                 self._add(klass, obj)
 
+    def _target_member(self, target):
+        """The class and filesystem id of an MDT or OST, or (None, None) for an MGS"""
+        from chroma_core.models import FilesystemMember
+
+        try:
+            return self._target_members[target.pk]
+        except KeyError:
+            klass = target.downcast_class
+            if issubclass(klass, FilesystemMember):
+                member = (klass, klass.objects.filter(pk = target.pk).values_list('filesystem_id', flat = True)[0])
+            else:
+                member = (None, None)
+            self._target_members[target.pk] = member
+            return member
+
+    def _target_membership(self, target, member_class):
+        """The filesystem id of a target which is a member_class, otherwise None"""
+        klass, filesystem_id = self._target_member(target)
+        return filesystem_id if klass is member_class else None
+
+    def _index(self, klass, instance):
+        values = dict((key, get_value(instance)) for key, get_value in self._index_keys.get(klass, {}).items())
+        for key, value in values.items():
+            self._indexes[(klass, key)][value].add(instance.pk)
+
+        # What it was indexed by, in case the instance is changed before it is unindexed
+        self._indexed_values[(klass, instance.pk)] = values
+
+    def _unindex(self, klass, instance):
+        for key, value in self._indexed_values.pop((klass, instance.pk), {}).items():
+            pks = self._indexes[(klass, key)][value]
+            pks.discard(instance.pk)
+            if not pks:
+                del self._indexes[(klass, key)][value]
+
+    def _get_by(self, klass, key, value):
+        objects = self.objects[klass]
+        return [objects[pk] for pk in sorted(self._indexes[(klass, key)].get(value, []))]
+
     def _add(self, klass, instance):
         assert instance.__class__ in self._cached_models
 
         log.debug("_add %s %s %s" % (instance.__class__, instance.id, id(instance)))
 
+        self._unindex(klass, instance)
         self.objects[klass][instance.pk] = instance
+        self._index(klass, instance)
 
     @classmethod
     def add(cls, klass, instance):
@@ -51,6 +117,15 @@ class ObjectCache(object):
         assert klass in cls.getInstance()._cached_models
         return [o for o in cls.getInstance().objects[klass].values() if not filter or filter(o)]
 
+    @classmethod
+    def get_by(cls, klass, key, value):
+        """
+        The instances of klass with the value for one of its indexed keys (see __init__),
+        in order of id.
+        """
+        assert key in cls.getInstance()._index_keys[klass]
+        return cls.getInstance()._get_by(klass, key, value)
+
     @classmethod
     def get_by_id(cls, klass, instance_id):
         assert klass in cls.getInstance()._cached_models
@@ -65,29 +140,42 @@ class ObjectCache(object):
 
     @classmethod
     def fs_targets(cls, fs_id):
-        from chroma_core.models import ManagedMgs
-        targets = cls.getInstance()._get_targets_by_filesystem(fs_id)
-        targets = [t for t in targets if not issubclass(t.downcast_class, ManagedMgs)]
+        # Everything but the MGS, which comes first
+        targets = cls.getInstance()._get_targets_by_filesystem(fs_id)[1:]
         #log.debug("fs_targets: %s" % targets)
         return targets
 
     def _get_targets_by_filesystem(self, filesystem_id):
-        from chroma_core.models import ManagedTarget, ManagedMdt, ManagedOst, ManagedFilesystem
+        from chroma_core.models import ManagedTarget, ManagedFilesystem
 
-        # FIXME: This is reasonably efficient but could be improved further by caching the filesystem membership of targets.
-        targets = []
+        # The MGS, then the MDTs, then the OSTs
         mgs_id = self.objects[ManagedFilesystem][filesystem_id].mgs_id
-        targets.append(self.objects[ManagedTarget][mgs_id])
+        return ([self.objects[ManagedTarget][mgs_id]] +
+                self._get_by(ManagedTarget, 'mdt_filesystem_id', filesystem_id) +
+                self._get_by(ManagedTarget, 'ost_filesystem_id', filesystem_id))
 
-        targets.extend([self.objects[ManagedTarget][mdt['id']] for mdt in ManagedMdt.objects.filter(filesystem = filesystem_id).values('id')])
-        targets.extend([self.objects[ManagedTarget][ost['id']] for ost in ManagedOst.objects.filter(filesystem = filesystem_id).values('id')])
+    @classmethod
+    def target_filesystem_id(cls, target):
+        """The id of a target's filesystem, or None for an MGS"""
+        return cls.getInstance()._target_member(target)[1]
 
-        return targets
+    @classmethod
+    def target_mounts(cls, target_id):
+        from chroma_core.models.target import ManagedTargetMount
+        return cls.get_by(ManagedTargetMount, 'target_id', target_id)
 
     @classmethod
     def get_one(cls, klass, filter = None):
         assert klass in cls.getInstance()._cached_models
-        r = [o for o in cls.getInstance().objects[klass].values() if not filter or filter(o)]
+        return cls._one(klass, [o for o in cls.getInstance().objects[klass].values() if not filter or filter(o)])
+
+    @classmethod
+    def get_one_by(cls, klass, key, value, filter = None):
+        """Like get_one, of the instances of klass with the value for one of its indexed keys"""
+        return cls._one(klass, [o for o in cls.get_by(klass, key, value) if not filter or filter(o)])
+
+    @classmethod
+    def _one(cls, klass, r):
         if len(r) > 1:
             raise klass.MultipleObjectsReturned
         elif not r:
@@ -98,7 +186,7 @@ class ObjectCache(object):
     @classmethod
     def target_primary_server(cls, target):
         from chroma_core.models.target import ManagedTargetMount
-        primary_mtm = cls.get_one(ManagedTargetMount, lambda mtm: mtm.target.id == target.id and mtm.primary == True)
+        primary_mtm = cls.get_one_by(ManagedTargetMount, 'target_id', target.id, lambda mtm: mtm.primary == True)
         return primary_mtm.host
 
     @classmethod
@@ -115,36 +203,39 @@ class ObjectCache(object):
     @classmethod
     def host_client_mounts(cls, host_id):
         from chroma_core.models.client_mount import LustreClientMount
-        return cls.get(LustreClientMount, lambda hcm: hcm.host_id == host_id)
+        return cls.get_by(LustreClientMount, 'host_id', host_id)
 
     @classmethod
     def filesystem_client_mounts(cls, fs_id):
         from chroma_core.models.client_mount import LustreClientMount
-        return cls.get(LustreClientMount, lambda fcm: fcm.filesystem_id == fs_id)
+        return cls.get_by(LustreClientMount, 'filesystem_id', fs_id)
 
     @classmethod
     def client_mount_copytools(cls, cm_id):
         from chroma_core.models.client_mount import LustreClientMount
         from chroma_core.models.copytool import Copytool
         try:
-            client_mount = cls.get_one(LustreClientMount, lambda ccm: ccm.id == cm_id)
-            return cls.get(Copytool, lambda ct: (client_mount.host_id == ct.host_id and client_mount.mountpoint == ct.mountpoint))
+            client_mount = cls.get_by_id(LustreClientMount, cm_id)
+            return [ct for ct in cls.get_by(Copytool, 'host_id', client_mount.host_id) if ct.mountpoint == client_mount.mountpoint]
         except LustreClientMount.DoesNotExist:
             return []
 
     @classmethod
     def host_targets(cls, host_id):
         from chroma_core.models.target import ManagedTargetMount, ManagedTarget
-        mtms = cls.get(ManagedTargetMount, lambda mtm: mtm.host_id == host_id)
+        mtms = cls.get_by(ManagedTargetMount, 'host_id', host_id)
 
         # FIXME: We have to explicitly restrict to non-deleted targets because ManagedTargetMount
         # instances aren't cleaned up on target deletion.
-        target_ids = set([mtm.target_id for mtm in mtms]) & set(cls.getInstance().objects[ManagedTarget].keys())
-        return [cls.getInstance().objects[ManagedTarget][i] for i in target_ids]
+        targets = cls.getInstance().objects[ManagedTarget]
+        return [targets[i] for i in set([mtm.target_id for mtm in mtms]) if i in targets]
 
     @classmethod
     def purge(cls, klass, filter):
-        cls.getInstance().objects[klass] = dict([(o.pk, o) for o in cls.getInstance().objects[klass].values() if not filter(o)])
+        instance = cls.getInstance()
+        for o in [o for o in instance.objects[klass].values() if filter(o)]:
+            instance._unindex(klass, o)
+            del instance.objects[klass][o.pk]
 
     def _update(self, obj):
         log.debug("update: %s %s" % (obj.__class__, obj.id))
@@ -156,7 +247,9 @@ class ObjectCache(object):
             except obj.__class__.DoesNotExist:
                 return None
             else:
+                self._unindex(obj.__class__, fresh_instance)
                 class_collection[obj.pk] = fresh_instance
+                self._index(obj.__class__, fresh_instance)
             return fresh_instance
 
     @classmethod
@@ -166,5 +259,8 @@ class ObjectCache(object):
     @classmethod
     def mtm_targets(cls, mtm_id):
         from chroma_core.models.target import ManagedTargetMount, ManagedTarget
-        mtms = cls.get(ManagedTargetMount, lambda mtm: mtm.id == mtm_id)
-        return [cls.getInstance().objects[ManagedTarget][mtm.target_id] for mtm in mtms]
+        try:
+            mtm = cls.get_by_id(ManagedTargetMount, mtm_id)
+        except ManagedTargetMount.DoesNotExist:
+            return []
+        return [cls.getInstance().objects[ManagedTarget][mtm.target_id]]
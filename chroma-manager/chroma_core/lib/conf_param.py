@@ -276,12 +276,19 @@ def get_possible_conf_params(klass):
         return result
 
 
-def get_conf_params(obj):
+def get_conf_params(obj, conf_params = None):
+    """
+    :param conf_params: The ConfParams of obj if they have already been loaded, e.g. for many objects at once
+    """
     from chroma_core.models import ManagedOst, ManagedMdt, ManagedFilesystem
     if hasattr(obj, 'content_type'):
         obj = obj.downcast()
 
-    if isinstance(obj, ManagedOst):
+    if conf_params is not None:
+        if not isinstance(obj, (ManagedOst, ManagedMdt, ManagedFilesystem)):
+            raise NotImplementedError()
+        conf_params_query = conf_params
+    elif isinstance(obj, ManagedOst):
         conf_params_query = obj.ostconfparam_set.all()
     elif isinstance(obj, ManagedMdt):
         conf_params_query = obj.mdtconfparam_set.all()
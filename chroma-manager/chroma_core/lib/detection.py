@@ -12,6 +12,7 @@ from chroma_core.models.filesystem import ManagedFilesystem
 from chroma_core.models.host import ManagedHost, VolumeNode
 from chroma_core.models.target import ManagedMgs, ManagedTargetMount, ManagedTarget, FilesystemMember, ManagedMdt, ManagedOst
 from chroma_core.lib.cache import ObjectCache
+from chroma_core.lib.host_resolver import host_resolver
 from chroma_help.help import help_text
 import re
 
@@ -118,7 +119,7 @@ class DetectScan(object):
 
         for nid_string in nid_strings:
             try:
-                hosts.add(ManagedHost.get_by_nid(nid_string))
+                hosts.add(host_resolver.get_by_nid(nid_string))
             except ManagedHost.DoesNotExist:
                 pass
 
@@ -0,0 +1,154 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import copy
+import time
+import threading
+from collections import defaultdict
+
+from django.db.models.signals import post_save, post_delete
+
+from chroma_core.lib.long_polling import long_polling
+from chroma_core.services import log_register
+
+
+log = log_register(__name__)
+
+
+class HostResolver(object):
+    """
+    Resolves host IDs, FQDNs, nodenames and NIDs to not-deleted ManagedHosts from
+    an in-memory copy of the host and network interface tables, so that code which
+    resolves many names (log messages, syslog events, detection) does not query
+    the database for each one.
+
+    The copy is loaded in bulk on first use, and again after either table changes:
+    changes saved by this process invalidate it directly, and changes notified
+    through long polling (which in processes listening to the notification hub,
+    such as the job scheduler, includes those of all other processes) invalidate it
+    by table timestamp.  Elsewhere changes made by other processes are seen after at
+    most MAX_AGE seconds.
+
+    Each lookup returns a copy of the host, so that what a caller does with it can't
+    affect the copies of others, but as its fields may be that old it is for reading:
+    a caller which saves a host must fetch it from the database to do so.
+    """
+    MAX_AGE = 60
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._table_names = None
+        self._loaded_at = None
+        self._timestamps = None
+        self._by_id = {}
+        self._by_fqdn = {}
+        self._by_nodename = {}
+        self._by_nid = {}
+
+        post_save.connect(self._changed)
+        post_delete.connect(self._changed)
+
+    @property
+    def _tables(self):
+        if self._table_names is None:
+            from chroma_core.models import ManagedHost, NetworkInterface
+
+            self._table_names = [ManagedHost._meta.db_table, NetworkInterface._meta.db_table]
+        return self._table_names
+
+    def _changed(self, sender, **kwargs):
+        if sender._meta.db_table in self._tables:
+            self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _table_timestamps(self):
+        with long_polling.operation_lock:
+            return [long_polling.timestamps[table] for table in self._tables]
+
+    def _load(self):
+        from chroma_core.models import ManagedHost, NetworkInterface
+
+        timestamps = self._table_timestamps()
+        self._by_id = dict((host.id, host) for host in ManagedHost.objects.all())
+
+        by_fqdn = defaultdict(set)
+        by_nodename = defaultdict(set)
+        for host in self._by_id.values():
+            by_fqdn[host.fqdn].add(host.id)
+            by_nodename[host.nodename].add(host.id)
+
+        by_nid = defaultdict(set)
+        for address, lnd_type, host_id in NetworkInterface.objects.filter(host__not_deleted = True) \
+                .values_list('inet4_address', 'type', 'host_id'):
+            by_nid[address, lnd_type].add(host_id)
+
+        self._by_fqdn = dict(by_fqdn)
+        self._by_nodename = dict(by_nodename)
+        self._by_nid = dict(by_nid)
+        self._timestamps = timestamps
+        self._loaded_at = time.time()
+
+        log.debug("Loaded %s hosts and %s NIDs" % (len(self._by_id), len(self._by_nid)))
+
+    def _refresh(self):
+        if self._loaded_at is None or \
+                time.time() - self._loaded_at > self.MAX_AGE or \
+                self._table_timestamps() != self._timestamps:
+            self._load()
+
+    def _lookup(self, index, key):
+        """Return the host with key in index, raising DoesNotExist or MultipleObjectsReturned
+        as a query for it would."""
+        from chroma_core.models import ManagedHost
+
+        with self._lock:
+            self._refresh()
+
+            host_ids = getattr(self, index).get(key, ())
+            if not host_ids:
+                raise ManagedHost.DoesNotExist()
+            elif len(host_ids) > 1:
+                raise ManagedHost.MultipleObjectsReturned()
+            else:
+                return self._copy(self._by_id[iter(host_ids).next()])
+
+    def _copy(self, host):
+        host = copy.copy(host)
+        host._state = copy.copy(host._state)
+        return host
+
+    def get(self, host_id):
+        from chroma_core.models import ManagedHost
+
+        with self._lock:
+            self._refresh()
+
+            try:
+                return self._copy(self._by_id[host_id])
+            except KeyError:
+                raise ManagedHost.DoesNotExist()
+
+    def get_by_fqdn(self, fqdn):
+        return self._lookup('_by_fqdn', fqdn)
+
+    def get_by_nodename(self, nodename):
+        return self._lookup('_by_nodename', nodename)
+
+    def get_by_nid(self, nid_string):
+        """Resolve a NID string to the one not-deleted host with an interface of its
+        address and type, in the manner of ManagedHost.get_by_nid"""
+        from chroma_core.models import ManagedHost, Nid
+
+        if "@" not in nid_string:
+            raise ManagedHost.DoesNotExist()
+
+        nid = Nid.split_nid_string(nid_string)
+        return self._lookup('_by_nid', (nid.nid_address, nid.lnd_type))
+
+
+host_resolver = HostResolver()
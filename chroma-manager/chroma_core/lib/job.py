@@ -184,10 +184,31 @@ class Step(object):
             self._log_subprocesses(e.subprocesses)
             raise
 
+    def invoke_agent_many(self, calls):
+        """
+        Wrapper around AgentRpc.call_many which provides logging: runs a list of
+        (host, command, args) concurrently and waits for all of them.
+
+        :return: list of completed actions in the order of `calls`, call .get_result() on each
+                 to get its result or raise its AgentException.
+        """
+        from chroma_core.services.job_scheduler.agent_rpc import AgentRpc
+
+        for host, command, args in calls:
+            job_log.info("invoke_agent_many on agent %s %s %s" % (host, command, args))
+
+        rpcs = AgentRpc.call_many([(host.fqdn, command, args) for host, command, args in calls], self._cancel_event)
+
+        for rpc in rpcs:
+            self._log_subprocesses(rpc.subprocesses)
+
+        return rpcs
+
     def invoke_agent_expect_result(self, host, command, args = {}):
-        from chroma_core.services.job_scheduler.agent_rpc import AgentException
+        return self._expect_result(host, command, args, self.invoke_agent(host, command, args))
 
-        result = self.invoke_agent(host, command, args)
+    def _expect_result(self, host, command, args, result):
+        from chroma_core.services.job_scheduler.agent_rpc import AgentException
 
         # This case is to deal with upgrades, once every installation is using the new protocol then we should not allow this.
         # Once everything is 3.0 or later we will also have version information in the wrapper header.
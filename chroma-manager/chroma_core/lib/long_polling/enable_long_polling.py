@@ -5,7 +5,6 @@
 
 import time
 import threading
-import sys
 from threading import Thread
 from collections import defaultdict
 
@@ -15,10 +14,11 @@ from django.dispatch import receiver
 from django.db import transaction
 
 from chroma_core.lib import util
+from chroma_core.lib.long_polling import long_polling
+from chroma_core.services.job_scheduler import lock_cache
+from chroma_core.services.notification_hub import client
 from chroma_core.services.log import log_register
 
-is_job_scheduler = ('job_scheduler' in sys.argv)
-
 log = log_register(__name__.split('.')[-1])
 
 
@@ -27,29 +27,102 @@ operation_lock = threading.RLock()
 
 
 class DatabaseChangedThread(Thread):
-    def __init__(self, timestamp, tablenames):
+    """
+    Sends the table changes of this process to the notification hub.
+
+    A single thread sends them all, one message at a time, combining those which are
+    made while a message is being sent into the next one.  Once stopped it sends any
+    changes still waiting, then exits.
+    """
+    def __init__(self):
         super(DatabaseChangedThread, self).__init__()
-        self.timestamp = timestamp
-        self.tablenames = tablenames
-
-        log.debug('Starting DatabaseChangedThead for %s time %s' % (self.tablenames, self.timestamp))
+        self.daemon = True
+        self._changed = threading.Condition()
+        self._stopping = False
+        self._timestamp = None
+        self._changed_ids = {}
+
+    def add(self, timestamp, changed_ids):
+        with self._changed:
+            self._timestamp = max(self._timestamp, timestamp)
+            for table_name, ids in changed_ids.items():
+                long_polling.add_changed_ids(self._changed_ids, table_name, ids)
+            self._changed.notify()
+
+    def stop(self):
+        with self._changed:
+            self._stopping = True
+            self._changed.notify()
 
     def run(self):
-        from chroma_core.services.job_scheduler.job_scheduler_client import JobSchedulerClient
-        JobSchedulerClient.tables_changed(self.timestamp, self.tablenames)
+        from chroma_core.services.notification_hub.client import NotificationHubClient
+
+        while True:
+            with self._changed:
+                while not self._changed_ids and not self._stopping:
+                    self._changed.wait()
+
+                if not self._changed_ids:
+                    return
+
+                timestamp, changed_ids = self._timestamp, self._changed_ids
+                self._timestamp, self._changed_ids = None, {}
+
+            log.debug('Sending table changes for %s time %s' % (changed_ids.keys(), timestamp))
+
+            try:
+                NotificationHubClient.tables_changed(timestamp,
+                                                     dict((table_name, None if ids is None else list(ids))
+                                                          for table_name, ids in changed_ids.items()))
+            except Exception, e:
+                log.error('Error sending table changes for %s: %s' % (changed_ids.keys(), e))
+
+
+_database_changed_thread = None
+
 
+def _propagate_table_change(table_names, changed_ids = None):
+    """
+    :param changed_ids: dict of table name to the set of primary keys of the rows which changed,
+                        or None where these are not known.
+    """
+    global _database_changed_thread
 
-def _propagate_table_change(table_names):
     timestamp = int(time.time() * util.SECONDSTOMICROSECONDS)
+    changed_ids = dict((table_name, (changed_ids or {}).get(table_name)) for table_name in table_names)
+
+    # Record the change in this process as well, for caches of the tables here (e.g. HostResolver), unless
+    # it listens to the notification hub, which records it for all processes and so will send it back.
+    if not client.listening():
+        long_polling.tables_changed(timestamp, table_names, changed_ids)
+
+    with operation_lock:
+        if _database_changed_thread is None:
+            _database_changed_thread = DatabaseChangedThread()
+            _database_changed_thread.start()
+
+    _database_changed_thread.add(timestamp, changed_ids)
+
+
+def stop():
+    """Send the table changes still waiting and stop the thread sending them, which starts again on the next change"""
+    global _database_changed_thread
+
+    with operation_lock:
+        thread, _database_changed_thread = _database_changed_thread, None
+
+    if thread is not None:
+        thread.stop()
+        thread.join()
+
 
-    if is_job_scheduler:
-        import long_polling
-        long_polling.tables_changed(timestamp, table_names)
-    else:
-        DatabaseChangedThread(timestamp, table_names).start()
+@lock_cache.lock_change_receiver()
+def lock_change_receiver(lock, add_remove):
+    _propagate_table_change([lock.locked_item._meta.db_table])
 
 
 _pending_table_changes = defaultdict(set)
+_pending_changed_ids = defaultdict(dict)
 
 
 def _transaction_commit_rollback(using,
@@ -64,12 +137,13 @@ def _transaction_commit_rollback(using,
         if commit:
             log.debug('Flushing pending changes for %s' % using)
             transaction.connections[using].commit()
-            _propagate_table_change(list(_pending_table_changes[using]))
+            _propagate_table_change(list(_pending_table_changes[using]), _pending_changed_ids[using])
         else:
             log.debug('Rollback pending changes for %s' % using)
             transaction.connections[using].rollback()
 
         del _pending_table_changes[using]
+        _pending_changed_ids.pop(using, None)
 
 
 @receiver(post_save)
@@ -79,10 +153,12 @@ def database_changed(sender, **kwargs):
 
     if table_name.startswith('chroma_core'):                    # We are only interested in our tables, not the django ones.
         using = kwargs.pop('using', DEFAULT_DB_ALIAS)
+        pk = getattr(kwargs.get('instance'), 'pk', None)
+        ids = None if pk is None else set([pk])
 
         if transaction.is_managed(using) is False:              # Not a managed transaction so the change has occurred
             log.debug('Propagating tablechange for %s' % table_name)
-            _propagate_table_change([table_name])
+            _propagate_table_change([table_name], {table_name: ids})
         else:                                                   # This is a transaction and until it commits it has not happened
             with operation_lock:
                 if using not in _pending_table_changes:
@@ -103,3 +179,4 @@ def database_changed(sender, **kwargs):
 
                 log.debug('Adding pending change %s using %s' % (table_name, using))
                 _pending_table_changes[using].add(table_name)
+                long_polling.add_changed_ids(_pending_changed_ids[using], table_name, ids)
@@ -8,10 +8,9 @@ import time
 
 from django import db
 
-from collections import defaultdict
+from collections import defaultdict, deque
 
 from chroma_core.lib import util
-from chroma_core.services.job_scheduler import lock_cache
 
 # table_name: list events
 # When waiting for a table to change a semaphore is added to the list this is trigger when that table changes
@@ -21,34 +20,132 @@ events = defaultdict(list)
 # If we don't have a timestamp then default to it changing 1 hour ago.
 timestamps = defaultdict(lambda: int(util.SECONDSTOMICROSECONDS * (time.time() - (60 * 60))))
 
+# The latest of timestamps, which every change moves on (see tables_changed)
+latest_timestamp = 0
+
+# table_name: ring of (timestamp, primary key) for the most recent changes to each table, a primary key
+# of None meaning that the rows changed are not known.  Entries are in timestamp order, which is unique per table.
+CHANGE_RING_SIZE = 1000
+changes = defaultdict(lambda: deque(maxlen=CHANGE_RING_SIZE))
+
+# The ring of each table holds every change made after this timestamp, which is when this process
+# started until changes begin to fall out of the ring.
+started = int(util.SECONDSTOMICROSECONDS * time.time())
+complete_since = defaultdict(lambda: started)
+
 # Semaphore for operations
 operation_lock = threading.RLock()
 
 
-@lock_cache.lock_change_receiver()
-def lock_change_receiver(lock, add_remove):
-    tables_changed(int(time.time() * util.SECONDSTOMICROSECONDS), [lock.locked_item._meta.db_table])
+def add_changed_ids(changed_ids, table, ids):
+    """
+    Add ids (primary keys, or None if not known) to those of table in changed_ids, a dict
+    of table name to a set of primary keys (or None), as changes are combined for sending.
+    """
+    if ids is None or changed_ids.get(table, set()) is None:
+        changed_ids[table] = None
+    else:
+        changed_ids[table] = changed_ids.get(table, set()) | set(ids)
+
+        # More than can be recorded, so they would not be known anyway
+        if len(changed_ids[table]) > CHANGE_RING_SIZE:
+            changed_ids[table] = None
+
 
+def tables_changed(timestamp, tables, changed_ids=None):
+    """
+    Record a change to tables, waking anything waiting for them.
 
-def tables_changed(timestamp, tables):
+    :param changed_ids: dict of table name to list of the primary keys of the rows which
+                        changed, or None for a table where they are not known.  Tables not
+                        in the dict are treated as the latter.
+    """
     assert type(timestamp) == int
 
+    global latest_timestamp
+
+    changed_ids = changed_ids or {}
+
     with operation_lock:
+        # Each change moves the timestamps of its tables on past those of every table, even when it arrives
+        # from another process after a later one, so that it can never be hidden behind a cursor already given
+        # out: a cursor is the max_timestamp of the tables it was given for, which may not include these.
+        timestamp = max([latest_timestamp + 1, timestamp] + [timestamps[table] + 1 for table in tables])
+        latest_timestamp = timestamp
+
         for table in tables:
-            timestamps[table] = max(timestamps[table], timestamp)
+            timestamps[table] = timestamp
+
+            ids = changed_ids.get(table)
+            if ids is None or len(ids) > CHANGE_RING_SIZE:
+                ids = [None]
+            for pk in ids:
+                if len(changes[table]) == CHANGE_RING_SIZE:
+                    complete_since[table] = max(complete_since[table], changes[table][0][0])
+                changes[table].append((timestamps[table], pk))
 
             for event in events[table]:
                 event.set()
 
 
-def wait_table_change(table_timestamps, tables_list, timeout):
+def catch_up(table_timestamps):
+    """
+    Bring the timestamps of tables up to those of another process (the notification hub) which
+    has recorded changes that this one has not, waking anything waiting for the tables which moved.
+
+    What those changes were is not known, so changed_since is None for any timestamp before them.
+    """
+    global latest_timestamp
+
+    with operation_lock:
+        for table, timestamp in table_timestamps.items():
+            if timestamp > timestamps[table]:
+                timestamps[table] = timestamp
+                latest_timestamp = max(latest_timestamp, timestamp)
+                complete_since[table] = max(complete_since[table], timestamp)
+
+                for event in events[table]:
+                    event.set()
+
+
+def changed_since(table, timestamp):
+    """
+    Return the set of primary keys of the rows of table which changed after timestamp, or None
+    if that is not known, because the changes are no longer (or never were) held in its ring or
+    a change was recorded without its primary keys.
+    """
+    with operation_lock:
+        if timestamp < complete_since[table]:
+            return None
+
+        ids = set()
+        for change_timestamp, pk in reversed(changes[table]):
+            if change_timestamp <= timestamp:
+                break
+            elif pk is None:
+                return None
+            ids.add(pk)
+
+        return ids
+
+
+def wait_table_change(table_timestamps, tables_list, timeout, changed_ids=False):
+    """
+    Wait for any of tables_list to change after the max_timestamp of table_timestamps, which
+    are those returned by an earlier call (or {'max_timestamp': 0} for the first).
+
+    :param changed_ids: If True, include in the result 'changed_ids', a dict of table name to a list
+                        of the primary keys which changed since table_timestamps (or None where these are
+                        not known, see changed_since) for each of tables_list.
+    :return: dict of table name to timestamp of its last change, and 'max_timestamp', or 0 on timeout
+    """
     with operation_lock:
         last_change_timestamp = int(table_timestamps['max_timestamp'])
 
         # First see if the table has already changed, we get rounding errors hence the maths.
         for table in tables_list:
             if timestamps[table] > last_change_timestamp:
-                return _table_timestamps(tables_list)
+                return _table_timestamps(tables_list, last_change_timestamp if changed_ids else None)
 
         # So now setup the semaphore
         event = threading.Event()
@@ -65,12 +162,18 @@ def wait_table_change(table_timestamps, tables_list, timeout):
             events[table].remove(event)
 
         if event.isSet():
-            return _table_timestamps(tables_list)
+            return _table_timestamps(tables_list, last_change_timestamp if changed_ids else None)
         else:
             return 0
 
 
-def _table_timestamps(tables_list):
+def table_timestamps(tables_list):
+    """Return a dict of table name to timestamp of its last change, and 'max_timestamp', for tables_list"""
+    with operation_lock:
+        return _table_timestamps(tables_list)
+
+
+def _table_timestamps(tables_list, changed_since_timestamp=None):
     max_timestamp = 0
     table_timestamps = {}
 
@@ -81,4 +184,10 @@ def _table_timestamps(tables_list):
 
     table_timestamps['max_timestamp'] = max_timestamp
 
+    if changed_since_timestamp is not None:
+        table_timestamps['changed_ids'] = {}
+        for table in tables_list:
+            ids = changed_since(table, changed_since_timestamp)
+            table_timestamps['changed_ids'][table] = None if ids is None else sorted(ids)
+
     return table_timestamps
@@ -5,13 +5,18 @@
 
 import time
 import heapq
+import threading
 import collections
-from datetime import datetime
+from datetime import datetime, timedelta
 from chroma_core.services import log_register
+from django.contrib.contenttypes.models import ContentType
 from django.utils.timezone import utc
-from chroma_core.models import Point, Series, Stats, ManagedHost, ManagedTarget, ManagedFilesystem
+from chroma_core.models import Point, Series, Stats, ManagedHost, ManagedTarget, ManagedFilesystem, ManagedOst, ManagedMdt
 from chroma_core.lib.storage_plugin.api import statistics
 from chroma_core.lib import scheduler
+from chroma_core.lib.util import chroma_settings
+
+settings = chroma_settings()
 
 metrics_log = log_register('metrics')
 
@@ -91,9 +96,11 @@ class MetricStore(object):
         end = Stats[0].floor(end)  # exclude points from a partial sample
         series_ids = Series.filter(self.measured_object, name__startswith='job_' + metric).values('id')
         series_ids = Stats[0].objects.filter(id__in=series_ids, dt__gte=begin).values('id').distinct('id')
-        for series in Series.filter(self.measured_object, id__in=series_ids):
+        series_list = list(Series.filter(self.measured_object, id__in=series_ids))
+        points = Stats.select_many([series.id for series in series_list], begin, end, rate=True, maxlen=max_points, fixed=num_points)
+        for series in series_list:
             types.add(series.type)
-            for point in Stats.select(series.id, begin, end, rate=True, maxlen=max_points, fixed=num_points):
+            for point in points[series.id]:
                 result[point.dt][series.name.split('_', 3)[-1]] = point
         assert types.issubset(Series.JOB_TYPES)
         # translate job ids into metadata
@@ -186,8 +193,59 @@ class HostMetricStore(MetricStore):
 class TargetMetricStore(MetricStore):
     """
     Wrapper class for Lustre Target metrics.
+
+    Only the JOB_STATS_LIMIT most active jobs of each update are stored, so the job samples of
+    any interval are bounded whatever the number of jobs.  The most granular samples of jobs which
+    have had none for STATS_JOB_EXPIRATION are deleted by expire_jobs, and so are the series
+    themselves, with their coarser rollups, once they have had no samples at any resolution for
+    STATS_JOB_ROLLUP_EXPIRATION, so that the series of short-lived jobs don't accumulate.  Job ids
+    recur, so a series which has been serialized since the last expiry is kept: its samples may
+    still be queued for the stats service.
     """
     JOB_STATS_LIMIT = 10  # only store the most active jobs
+    job_expiration = timedelta(**settings.STATS_JOB_EXPIRATION)
+    job_rollup_expiration = timedelta(**settings.STATS_JOB_ROLLUP_EXPIRATION)
+    next_job_expiry = datetime.fromtimestamp(0, utc)
+    serialized_jobs = set()
+    jobs_lock = threading.Lock()
+
+    @staticmethod
+    def _cold_jobs(models, since):
+        "Return the ids of job series without samples since the given time in any of the given Stats models."
+        # probes the (id, dt) index of each model's samples for each job series
+        cold = Series.objects.filter(type__in=Series.JOB_TYPES)
+        for model in models:
+            cold = cold.extra(where=['NOT EXISTS (SELECT 1 FROM {0} WHERE {0}.id = {1}.id AND {0}.dt >= %s)'.format(model._meta.db_table, Series._meta.db_table)],
+                              params=[since])
+        return set(cold.values_list('id', flat=True))
+
+    @classmethod
+    def expire_jobs(cls):
+        """
+        Delete the most granular samples of jobs without recent ones, and the series of jobs
+        without any samples for longer, at most every flush interval.  Return the ids of the
+        deleted series.
+        """
+        now = datetime.now(utc)
+        if now < cls.next_job_expiry:
+            return []
+        cls.next_job_expiry = now + cls.job_expiration / settings.STATS_FLUSH_RATE
+
+        with cls.jobs_lock:
+            idle = cls._cold_jobs(Stats[:1], now - cls.job_expiration) - cls.serialized_jobs
+            ids = cls._cold_jobs(Stats, now - cls.job_rollup_expiration) - cls.serialized_jobs
+            cls.serialized_jobs = set()
+            if idle - ids:
+                Stats[0].delete(id__in=idle - ids)
+            if ids:
+                for model in Stats:
+                    model.delete(id__in=ids)
+                Series.objects.filter(id__in=ids).delete()
+                for key, series in Series.cache.items():
+                    if series.id in ids:
+                        del Series.cache[key]
+                metrics_log.info("Deleted %s inactive job series", len(ids))
+        return sorted(ids)
 
     def serialize(self, metrics, update_time=None, jobid_var='disable'):
         "Return serialized samples (id, dt, value) suitable for bulk stats insertion."
@@ -241,6 +299,11 @@ class TargetMetricStore(MetricStore):
                     update['job_{0}_bytes_{1}'.format(key, stat['job_id'])] = {'value': stat[key]['sum'], 'type': jobid_var}
                     update['job_{0}_iops_{1}'.format(key, stat['job_id'])] = {'value': stat[key]['samples'], 'type': jobid_var}
 
+            # the series of the jobs are got (and cached for serializing) under the lock, so none are expired meanwhile
+            with self.jobs_lock:
+                self.serialized_jobs.update(Series.get(self.measured_object, name, jobid_var).id
+                                            for name in update if name.startswith('job_'))
+
         for group in hsm_stats:
             for stat in hsm_stats[group]:
                 ds_name = "hsm_%s_%s" % (group, stat)
@@ -253,18 +316,33 @@ class TargetMetricStore(MetricStore):
 class FilesystemMetricStore(MetricStore):
     """
     Wrapper class for Filesystem-level aggregate metrics.  Read-only.
+
+    The AGGREGATES metrics are summed over the filesystem's targets by the stats service
+    (see FilesystemAggregates) and stored as series of the filesystem itself.
     """
+    # aggregate metric name: class of the targets it is summed over
+    AGGREGATES = {'kbytesfree': ManagedOst,
+                  'kbytestotal': ManagedOst,
+                  'filesfree': ManagedMdt,
+                  'filestotal': ManagedMdt}
+
     def __init__(self, managed_object, *args, **kwargs):
-        # Override the parent __init__(), as we don't need an R3D for
-        # a Filesystem.
-        self.filesystem = managed_object
+        super(FilesystemMetricStore, self).__init__(managed_object)
+        self.filesystem = self.measured_object
 
     def serialize(self, *args, **kwargs):
         """Don't use this -- will raise a NotImplementedError!"""
         raise NotImplementedError("Filesystem-level serialize() not supported!")
 
-    def fetch(self, cfname, query_class, **kwargs):
-        raise NotImplementedError("Filesystem-level fetch() not supported!")
+    def fetch_aggregates(self):
+        """
+        Return dict of the latest value of each AGGREGATES metric which has been stored,
+        read in a single query.
+        """
+        series = Series.filter(self.filesystem, name__in=self.AGGREGATES)
+        names = dict(series.values_list('id', 'name'))
+        latest = Stats[0].objects.filter(id__in=series.values('id')).order_by('id', '-dt').distinct('id')
+        return dict((names[id], Point(dt, sum, len).mean) for id, dt, sum, len in latest.values_list('id', *Point._fields))
 
     def fetch_last(self, target_class, fetch_metrics):
         """
@@ -279,3 +357,128 @@ class FilesystemMetricStore(MetricStore):
             counter.update(data)
             latest = max(latest, dt)
         return latest, dict(counter)
+
+
+class FilesystemAggregates(object):
+    """
+    Maintains the FilesystemMetricStore.AGGREGATES series of each filesystem from the
+    samples of its targets, as they pass through the stats service.
+
+    The latest value of every contributing target series is kept in memory, so each
+    update costs a sum rather than a query per target.  A filesystem's values are loaded
+    from the database when it is first seen and reloaded every REFRESH_INTERVAL, which
+    drops targets which have since been removed.
+
+    Aggregate series only accept increasing timestamps, so a change from a target whose
+    host's clock lags behind the others waits for a later sample to carry it.  Should none
+    come within FLUSH_INTERVAL, the change is written a second after the latest aggregates.
+    """
+    REFRESH_INTERVAL = timedelta(minutes=5)
+    FLUSH_INTERVAL = timedelta(seconds=30)
+    IGNORED_SIZE = 1e5
+
+    def __init__(self):
+        self._inputs = {}       # target series id: (filesystem id, name)
+        self._ignored = set()   # series ids which don't contribute to any aggregate
+        self._filesystems = {}  # filesystem id: state dict
+
+    def _add_inputs(self, series):
+        "Record contributing series, given (series id, content type id, target id, name) tuples."
+        target_ids = collections.defaultdict(set)
+        for id, content_type_id, object_id, name in series:
+            target_ids[content_type_id].add(object_id)
+
+        filesystem_ids = {}
+        for content_type_id, object_ids in target_ids.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            if model in (ManagedOst, ManagedMdt):
+                filesystem_ids[content_type_id] = dict(model.objects.filter(id__in=object_ids).values_list('id', 'filesystem_id'))
+
+        for id, content_type_id, object_id, name in series:
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            filesystem_id = filesystem_ids.get(content_type_id, {}).get(object_id)
+            if model is FilesystemMetricStore.AGGREGATES[name] and filesystem_id is not None:
+                self._inputs[id] = filesystem_id, name
+
+    def _resolve(self, ids):
+        "Look up any series ids not seen before."
+        unknown = set(ids).difference(self._inputs, self._ignored)
+        if not unknown:
+            return
+        series = Series.objects.filter(id__in=unknown, name__in=FilesystemMetricStore.AGGREGATES)
+        self._add_inputs(series.values_list('id', 'content_type_id', 'object_id', 'name'))
+        if len(self._ignored) > self.IGNORED_SIZE:
+            self._ignored.clear()
+        self._ignored.update(unknown.difference(self._inputs))
+
+    def _load(self, filesystem_id, now):
+        "Load the latest value of each series contributing to a filesystem's aggregates."
+        for id, (input_filesystem_id, name) in self._inputs.items():
+            if input_filesystem_id == filesystem_id:
+                del self._inputs[id]
+
+        filesystem = ManagedFilesystem.objects.get(id=filesystem_id)
+        series = []
+        for model in set(FilesystemMetricStore.AGGREGATES.values()):
+            content_type = ContentType.objects.get_for_model(model)
+            names = [name for name in FilesystemMetricStore.AGGREGATES if FilesystemMetricStore.AGGREGATES[name] is model]
+            target_ids = model.objects.filter(filesystem_id=filesystem_id).values('id')
+            series += Series.objects.filter(content_type=content_type, object_id__in=target_ids, name__in=names).values_list('id', 'content_type_id', 'object_id', 'name')
+        self._add_inputs(series)
+
+        values = dict((name, {}) for name in FilesystemMetricStore.AGGREGATES)
+        latest = Stats[0].objects.filter(id__in=[item[0] for item in series]).order_by('id', '-dt').distinct('id')
+        for id, dt, sum, len in latest.values_list('id', *Point._fields):
+            if id in self._inputs:
+                values[self._inputs[id][1]][id] = Point(dt, sum, len)
+
+        aggregate_ids = dict((name, Series.get(filesystem, name, 'Gauge').id) for name in FilesystemMetricStore.AGGREGATES)
+        state = self._filesystems[filesystem_id] = {
+            'loaded': now,
+            'values': values,
+            'series': aggregate_ids,
+            'latest': max(Stats[0].latest(id).dt for id in aggregate_ids.values()),
+            'flush_at': None
+        }
+        return state
+
+    def update(self, samples):
+        "Return samples (id, dt, value) for the aggregates affected by the given samples."
+        self._resolve(id for id, dt, value in samples)
+
+        now = datetime.now(utc)
+        changed = {}
+        for id, dt, value in samples:
+            try:
+                filesystem_id, name = self._inputs[id]
+            except KeyError:
+                continue
+            state = self._filesystems.get(filesystem_id)
+            if state is None or now - state['loaded'] > self.REFRESH_INTERVAL:
+                state = self._load(filesystem_id, now)
+                if id not in self._inputs:  # the target has since been removed
+                    continue
+            current = state['values'][name].get(id)
+            if current is None or dt > current.dt:
+                state['values'][name][id] = Point(dt, value, 1)
+            changed[filesystem_id] = max(dt, changed.get(filesystem_id, dt))
+
+        aggregates = []
+        for filesystem_id, state in self._filesystems.items():
+            dt = changed.get(filesystem_id)
+            # aggregate series only accept increasing timestamps; a later sample will carry this update
+            if dt is not None and dt <= state['latest']:
+                dt = None
+                if state['flush_at'] is None:
+                    state['flush_at'] = now + self.FLUSH_INTERVAL
+            # unless none comes in time
+            if dt is None and state['flush_at'] is not None and now >= state['flush_at']:
+                dt = state['latest'] + timedelta(seconds=1)
+            if dt is None:
+                continue
+            state['latest'] = dt
+            state['flush_at'] = None
+            for name, values in state['values'].items():
+                if values:
+                    aggregates.append((state['series'][name], dt, sum(point.mean for point in values.values())))
+        return aggregates
@@ -13,6 +13,8 @@ Plugins should also document the available metadata fields.
 """
 
 import importlib
+import threading
+import time
 from chroma_core.services import log_register
 
 FIELDS = 'id',
@@ -22,23 +24,93 @@ log = log_register('metrics')
 def fetch(ids):
     """Given an iterable of job ids, return an interable of associated metadata dicts.
     Ids will be unique and requested in batch whenever possible.
-    Plugins are responsible for any caching necessary for performance.
+    Results are cached by the MetadataCache, so plugins needn't cache them.
     """
     for id in ids:
         yield {'id': id}
 
 
-def metadata(jobid_var, field, job_ids):
-    """Dispatch set of job_ids to the appropriate plugin.
-    Return mapping of job_ids to the requested field.
+class MetadataCache(object):
     """
-    job_ids = set(job_ids)
+    Metadata of job ids by plugin, fetched a batch of the ids not already cached at a time,
+    and kept for at most MAX_AGE seconds.  Ids for which a plugin has no metadata are cached
+    too, so that the job ids of a dashboard refreshing its top jobs aren't fetched again on
+    every request, known or not.  Lookups are counted, for the hit rate.
+    """
+    MAX_AGE = 300
+    SIZE = 1e5
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return lookups and float(self.hits) / lookups
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def get(self, module, job_ids):
+        "Return mapping of job_ids to metadata dicts (None for unknown ids), fetching those not cached."
+        now = time.time()
+        result, missing = {}, []
+        with self._lock:
+            for job_id in job_ids:
+                entry = self._entries.get((module.__name__, job_id))
+                if entry is not None and now - entry[0] < self.MAX_AGE:
+                    result[job_id] = entry[1]
+                else:
+                    missing.append(job_id)
+            self.hits += len(result)
+            self.misses += len(missing)
+
+        if missing:
+            fetched = dict(zip(missing, module.fetch(missing)))
+            with self._lock:
+                if len(self._entries) + len(missing) > self.SIZE:
+                    self._entries.clear()
+                for job_id in missing:
+                    result[job_id] = fetched.get(job_id)
+                    self._entries[module.__name__, job_id] = now, result[job_id]
+
+        log.debug("Scheduler metadata cache: %s hits, %s misses (%.0f%% hit rate)",
+                  self.hits, self.misses, self.hit_rate * 100)
+        return result
+
+cache = MetadataCache()
+
+# plugin modules by jobid_var, or None where there isn't one
+_plugins = {}
+
+
+def _plugin(jobid_var):
+    try:
+        return _plugins[jobid_var]
+    except KeyError:
+        pass
     try:
         module = importlib.import_module('.' + jobid_var.lower(), __package__)
     except ImportError:
         log.warn("Scheduler module %s not found", jobid_var)
+        module = None
+    _plugins[jobid_var] = module
+    return module
+
+
+def metadata(jobid_var, field, job_ids):
+    """Dispatch set of job_ids to the appropriate plugin.
+    Return mapping of job_ids to the requested field.
+    """
+    module = _plugin(jobid_var)
+    if module is None:
         return {}
     if hasattr(module, 'FIELDS') and field not in module.FIELDS:
         log.warn("Scheduler module %s doesn't support field %s", jobid_var, field)
-    values = getattr(module, 'fetch')(job_ids)
-    return dict((job_id, value[field]) for job_id, value in zip(job_ids, values) if field in value)
+    values = cache.get(module, set(job_ids))
+    return dict((job_id, value[field]) for job_id, value in values.items() if value and field in value)
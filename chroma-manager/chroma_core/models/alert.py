@@ -4,8 +4,12 @@
 
 
 import logging
+from collections import defaultdict, OrderedDict
 
 from django.db import models
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.generic import GenericForeignKey
@@ -13,6 +17,7 @@ from django.utils import timezone
 from django.db import IntegrityError
 
 from chroma_core.models.sparse_model import SparseModel
+from polymorphic.models import nested_commit_on_success
 from chroma_core.models.utils import STR_TO_SEVERITY
 from chroma_core.lib.job import job_log
 
@@ -259,6 +264,131 @@ class AlertStateBase(SparseModel):
 
         return alert_state
 
+    @classmethod
+    def notify_many(cls, notifications):
+        """
+        Notify alerts of this class for many alert items at once, as notify() would for each of the
+        (alert_item, active) pairs in turn, but in a fixed number of queries: the alerts already
+        active are found in one, and those raised, those lowered and their end events are written
+        in bulk, in one transaction.  Where an alert item appears more than once its last
+        notification is the one which counts.
+        """
+        notified = OrderedDict()
+        for alert_item, active in notifications:
+            if hasattr(alert_item, 'content_type'):
+                alert_item = alert_item.downcast()
+
+            key = (ContentType.objects.get_for_model(alert_item).id, alert_item.pk)
+            notified.pop(key, None)
+            notified[key] = (alert_item, active)
+
+        if not notified:
+            return
+
+        active_alerts = cls._active_by_item(notified.keys())
+
+        raised = []
+        lowered = []
+        for key, (alert_item, active) in notified.items():
+            if active:
+                if key in active_alerts or (hasattr(alert_item, 'not_deleted') and alert_item.not_deleted != True):
+                    continue
+
+                alert_state = cls(active = True,
+                                  dismissed = False,  # Users dismiss, not the software
+                                  alert_item = alert_item,
+                                  alert_type = cls.__name__,
+                                  severity = cls.default_severity)
+                # The constructor doesn't cache the alert item, which alert_message() will want
+                alert_state.alert_item = alert_item
+                alert_state._message = alert_state.alert_message()
+                raised.append(alert_state)
+            elif key in active_alerts:
+                alert_state = active_alerts[key]
+                alert_state.alert_item = alert_item
+                lowered.append(alert_state)
+
+        # Within the caller's transaction, if it has one (e.g. the corosync service's)
+        @nested_commit_on_success
+        def write():
+            if raised:
+                cls._raise_many(raised)
+            if lowered:
+                cls._lower_many(lowered)
+        write()
+
+    @classmethod
+    def _active_by_item(cls, keys):
+        """The active alerts of this class for some (alert item type id, alert item id) keys, by key"""
+        item_ids = defaultdict(list)
+        for alert_item_type_id, alert_item_id in keys:
+            item_ids[alert_item_type_id].append(alert_item_id)
+
+        query = Q()
+        for alert_item_type_id, alert_item_ids in item_ids.items():
+            query |= Q(alert_item_type = alert_item_type_id, alert_item_id__in = alert_item_ids)
+
+        return dict(((alert_state.alert_item_type_id, alert_state.alert_item_id), alert_state)
+                    for alert_state in cls.objects.filter(query, active = True))
+
+    @classmethod
+    def _raise_many(cls, alert_states):
+        sid = transaction.savepoint()
+        try:
+            cls.objects.bulk_create(alert_states)
+            transaction.savepoint_commit(sid)
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+
+            # Some were raised concurrently: save the others one at a time, dropping the colliding
+            # inserts as high() does.
+            for alert_state in alert_states:
+                sid = transaction.savepoint()
+                try:
+                    alert_state.save()
+                    transaction.savepoint_commit(sid)
+                except IntegrityError, e:
+                    transaction.savepoint_rollback(sid)
+                    job_log.warning("AlertState: IntegrityError %s saving %s : %s" % (e, cls.__name__, alert_state.alert_item))
+                else:
+                    job_log.info("AlertState: Raised %s on %s "
+                                 "at severity %s" % (cls, alert_state.alert_item, alert_state.severity))
+            return
+
+        # bulk_create neither sets the ids nor sends post_save, so read the ids back to send it with them
+        alert_items = dict(((alert_state.alert_item_type_id, alert_state.alert_item_id), alert_state.alert_item)
+                           for alert_state in alert_states)
+        for key, alert_state in cls._active_by_item(alert_items.keys()).items():
+            job_log.info("AlertState: Raised %s on %s "
+                         "at severity %s" % (cls, alert_items[key], alert_state.severity))
+            post_save.send(sender = cls, instance = alert_state, created = True, raw = False, using = cls.objects.db)
+
+    @classmethod
+    def _lower_many(cls, alert_states):
+        end_time = timezone.now()
+        cls.objects.filter(id__in = [alert_state.id for alert_state in alert_states]).update(end = end_time, active = None)
+
+        end_events = defaultdict(list)
+        for alert_state in alert_states:
+            alert_state.end = end_time
+            alert_state.active = None
+            post_save.send(sender = cls, instance = alert_state, created = False, raw = False, using = cls.objects.db)
+
+            # As low() would register it, an event being an alert which is raised and lowered at once
+            end_event = alert_state.end_event()
+            if end_event:
+                end_event.active = None
+                end_event.dismissed = False
+                end_event.alert_type = end_event.__class__.__name__
+                end_event.end = end_event.begin
+                end_event._message = end_event.alert_message()
+                end_events[end_event.__class__].append(end_event)
+
+        for event_class, events in end_events.items():
+            event_class.objects.bulk_create(events)
+            for event in events:
+                post_save.send(sender = event_class, instance = event, created = True, raw = False, using = event_class.objects.db)
+
     @classmethod
     def register_event(cls, alert_item, **kwargs):
         # Events are Alerts with no duration, so just go high/low.
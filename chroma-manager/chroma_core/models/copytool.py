@@ -7,7 +7,7 @@ import os
 import uuid
 from collections import namedtuple
 
-from django.db import models
+from django.db import connection, models
 from django.utils.timezone import now as tznow
 
 from chroma_core.services import log_register
@@ -97,27 +97,59 @@ class CopytoolOperation(models.Model):
         return "%s %s" % (self.STATE_CHOICES[self.state][1],
                           self.TYPE_CHOICES[self.type][1] % self.path)
 
-    def update(self, updated_at, current_bytes, total_bytes):
+    def update(self, updated_at, current_bytes, total_bytes, save=True):
         self.updated_at = updated_at
         self.state = OP_STATES.RUNNING
         self.total_bytes = total_bytes
         self.processed_bytes = current_bytes
-        self.save()
+        if save:
+            self.save()
 
-    def finish(self, finished_at=None, event_state=None, event_error=None):
+    def finish(self, finished_at=None, event_state=None, event_error=None, save=True):
         if not finished_at:
             self.finished_at = tznow()
             self.state = OP_STATES.ERRORED
+        else:
+            self.finished_at = finished_at
+            if event_state == 'FINISH':
+                self.state = OP_STATES.FINISHED
+            else:
+                self.state = OP_STATES.ERRORED
+                self.info = event_error
+        if save:
             self.save()
+
+    # The fields which update() and finish() change
+    PROGRESS_FIELDS = ['state', 'updated_at', 'finished_at', 'processed_bytes', 'total_bytes', 'info']
+
+    @classmethod
+    def bulk_update(cls, operations):
+        """
+        Save the progress of many operations in a single query, for those
+        updated or finished with save=False.
+        """
+        if not operations:
             return
 
-        self.finished_at = finished_at
-        if event_state == 'FINISH':
-            self.state = OP_STATES.FINISHED
-        else:
-            self.state = OP_STATES.ERRORED
-            self.info = event_error
-        self.save()
+        fields = [cls._meta.get_field(name) for name in cls.PROGRESS_FIELDS]
+        quote = connection.ops.quote_name
+
+        # Each value is cast, as the column types can't be inferred from a VALUES list
+        row = "(%%s::integer, %s)" % ", ".join("%%s::%s" % field.db_type(connection) for field in fields)
+        params = []
+        for operation in operations:
+            params.append(operation.id)
+            params.extend(field.get_db_prep_save(getattr(operation, field.attname), connection) for field in fields)
+
+        table = quote(cls._meta.db_table)
+        sql = "UPDATE %s SET %s FROM (VALUES %s) AS v(id, %s) WHERE %s.id = v.id" % (
+            table,
+            ", ".join("%s = v.%s" % (quote(field.column), quote(field.column)) for field in fields),
+            ", ".join([row] * len(operations)),
+            ", ".join(quote(field.column) for field in fields),
+            table)
+
+        connection.cursor().execute(sql, params)
 
     class Meta:
         app_label = 'chroma_core'
@@ -211,15 +243,23 @@ class Copytool(StatefulObject, MeasuredEntity):
         self.set_state('stopped')
         self.save()
 
-    def create_operation(self, start_time, type, path, fid):
+    def new_operation(self, start_time, type, path, fid):
+        """Return an unsaved operation, e.g. for CopytoolOperation.objects.bulk_create"""
         try:
-            return self.operations.create(started_at = start_time,
-                                          state = OP_STATES.STARTED,
-                                          type = resolve_value('type', type),
-                                          path = path, fid = fid)
+            return CopytoolOperation(copytool = self,
+                                     started_at = start_time,
+                                     state = OP_STATES.STARTED,
+                                     type = resolve_value('type', type),
+                                     path = path, fid = fid)
         except KeyError:
             log.error("Unknown operation type: %s" % type)
 
+    def create_operation(self, start_time, type, path, fid):
+        operation = self.new_operation(start_time, type, path, fid)
+        if operation:
+            operation.save()
+        return operation
+
     @property
     def current_operations(self):
         return self.operations.exclude(state__in=[OP_STATES.FINISHED,
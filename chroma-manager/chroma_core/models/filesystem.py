@@ -103,7 +103,7 @@ class ManagedFilesystem(StatefulObject, MeasuredEntity):
 
         deps = []
 
-        mgs = ObjectCache.get_one(ManagedTarget, lambda t: t.id == self.mgs_id)
+        mgs = ObjectCache.get_by_id(ManagedTarget, self.mgs_id)
 
         remove_state = 'forgotten' if self.immutable_state else 'removed'
 
@@ -118,10 +118,12 @@ class ManagedFilesystem(StatefulObject, MeasuredEntity):
     @classmethod
     def filter_by_target(cls, target):
         if issubclass(target.downcast_class, ManagedMgs):
-            result = ObjectCache.get(ManagedFilesystem, lambda mfs: mfs.mgs_id == target.id)
-            return result
+            return ObjectCache.get_by(ManagedFilesystem, 'mgs_id', target.id)
         elif issubclass(target.downcast_class, FilesystemMember):
-            return ObjectCache.get(ManagedFilesystem, lambda mfs: mfs.id == target.downcast().filesystem_id)
+            try:
+                return [ObjectCache.get_by_id(ManagedFilesystem, ObjectCache.target_filesystem_id(target))]
+            except ManagedFilesystem.DoesNotExist:
+                return []
         else:
             raise NotImplementedError(target.__class__)
 
@@ -182,7 +184,7 @@ class RemoveFilesystemJob(StateChangeJob):
     def get_deps(self):
         deps = []
 
-        mgs_target = ObjectCache.get_one(ManagedTarget, lambda t: t.id == self.filesystem.mgs_id)
+        mgs_target = ObjectCache.get_by_id(ManagedTarget, self.filesystem.mgs_id)
 
         # Can't start a MGT that hasn't made it past formatting.
         if mgs_target.state not in ['unformatted', 'formatted']:
@@ -194,7 +196,7 @@ class RemoveFilesystemJob(StateChangeJob):
     def get_steps(self):
         steps = []
 
-        mgs_target = ObjectCache.get_one(ManagedTarget, lambda t: t.id == self.filesystem.mgs_id)
+        mgs_target = ObjectCache.get_by_id(ManagedTarget, self.filesystem.mgs_id)
 
         # Only try to purge filesystem from MGT if the MGT has made it past
         # being formatted (case where a filesystem was created but is being
@@ -357,20 +357,26 @@ class Volume(models.Model):
         (or any device moved to the same path) then that would be presented as an unused target when actually the 'path'
         and so effectively the 'target' is in use.
 
-        For this reason we build a list of (host,paths) for all the current ManagedTargetMount's then build a list of all
-        Volumes that match this (host:path) and exclude them from the result. This might be possible as a straight
-        query but it is probably as quick, easier to read to issue the query to get the list.
+        For this reason we exclude all Volumes with a VolumeNode at the (host, path) of any current ManagedTargetMount.
+        This is done in the database as a single query, as there may be tens of thousands of VolumeNodes.
         """
 
         from chroma_core.models import ManagedTargetMount
 
         # There is an existing behaviour(!) that ManagedTargetMounts are not deleted when a Target is deleted and so we must
         # filter ManagedTargetMount by undeleted Targets.
-        mtm_host_paths = [(mtm.host.id, mtm.volume_node.path) for mtm in ManagedTargetMount.objects.filter(managedtarget__not_deleted=True)]
-        volume_node_ids = [volume_node.volume_id for volume_node in VolumeNode.objects.all() if ((volume_node.host.id,
-                                                                                                  volume_node.path)) in mtm_host_paths]
-
-        queryset = queryset.filter(usable_for_lustre=True).exclude(id__in=volume_node_ids)
+        mtm_host_paths, params = ManagedTargetMount.objects.filter(managedtarget__not_deleted=True)\
+                                                           .order_by()\
+                                                           .values_list('host_id', 'volume_node__path')\
+                                                           .query.sql_with_params()
+        used = """NOT EXISTS (SELECT 1 FROM %(volumenode)s
+                              WHERE %(volumenode)s.volume_id = %(volume)s.id AND %(volumenode)s.not_deleted AND
+                                    (%(volumenode)s.host_id, %(volumenode)s.path) IN (%(mtm_host_paths)s))""" % {
+            'volume': cls._meta.db_table,
+            'volumenode': VolumeNode._meta.db_table,
+            'mtm_host_paths': mtm_host_paths}
+
+        queryset = queryset.filter(usable_for_lustre=True).extra(where = [used], params = params)
 
         return queryset
 
@@ -507,29 +513,23 @@ class UpdateDevicesStep(Step):
     # Require database to talk to plugin_manager
     database = True
 
-    def update_devices(self, host, plugin_data):
-        from chroma_core.services.job_scheduler.agent_rpc import AgentException
-
-        from chroma_core.lib.storage_plugin.manager import storage_plugin_manager
-        for plugin in storage_plugin_manager.loaded_plugin_names:
-            try:
-                plugin_data[plugin] = self.invoke_agent(host, 'device_plugin', {'plugin': plugin})[plugin]
-            except AgentException as e:
-                self.log("No data for plugin %s from host %s due to exception %s" % (plugin, host, e))
-
     def run(self, kwargs):
         from chroma_core.services.plugin_runner.agent_daemon_interface import AgentDaemonRpcInterface
+        from chroma_core.services.job_scheduler.agent_rpc import AgentException
+        from chroma_core.lib.storage_plugin.manager import storage_plugin_manager
 
-        threads = []
         plugins_data = defaultdict(dict)
 
-        for host in kwargs['hosts']:
-            thread = ExceptionThrowingThread(target=self.update_devices,
-                                             args=(host, plugins_data[host]))
-            thread.start()
-            threads.append(thread)
+        calls = [(host, 'device_plugin', {'plugin': plugin})
+                 for host in kwargs['hosts']
+                 for plugin in storage_plugin_manager.loaded_plugin_names]
 
-        ExceptionThrowingThread.wait_for_threads(threads)               # This will raise an exception if any of the threads raise an exception
+        for (host, command, args), rpc in zip(calls, self.invoke_agent_many(calls)):
+            plugin = args['plugin']
+            try:
+                plugins_data[host][plugin] = rpc.get_result()[plugin]
+            except AgentException as e:
+                self.log("No data for plugin %s from host %s due to exception %s" % (plugin, host, e))
 
         for host, plugin_data in plugins_data.items():
             # This enables services tests to run see - _handle_action_respond in test_agent_rpc.py for more info
@@ -540,19 +540,13 @@ class UpdateDevicesStep(Step):
 class TriggerPluginUpdatesStep(Step):
     idempotent = True
 
-    def trigger_plugin_updates(self, host, plugin_names):
-        self.invoke_agent_expect_result(host, 'trigger_plugin_update', {'plugin_names': plugin_names})
-
     def run(self, kwargs):
-        threads = []
-
-        for host in kwargs['hosts']:
-            thread = ExceptionThrowingThread(target=self.trigger_plugin_updates,
-                                             args=(host, kwargs['plugin_names']))
-            thread.start()
-            threads.append(thread)
+        calls = [(host, 'trigger_plugin_update', {'plugin_names': kwargs['plugin_names']})
+                 for host in kwargs['hosts']]
 
-        ExceptionThrowingThread.wait_for_threads(threads)               # This will raise an exception if any of the threads raise an exception
+        # All hosts are triggered before any result is checked, get_result raises if any of them failed
+        for (host, command, args), rpc in zip(calls, self.invoke_agent_many(calls)):
+            self._expect_result(host, command, args, rpc.get_result())
 
 
 class DeployStep(Step):
@@ -53,15 +53,39 @@ class LogMessage(models.Model):
     tag = models.CharField(max_length = 63)
     message = models.TextField()
     message_class = models.SmallIntegerField()
+    # Found by find_substitutions when the message is stored, so that NIDs and targets can
+    # be searched for through an index and linked to without parsing the message again.
+    substitutions = models.TextField(null = True,
+                                     help_text = "JSON list of [kind, key, start, end] for the NIDs and target "
+                                                 "names in the message")
+    substitution_keys = models.TextField(null = True,
+                                         help_text = "Space separated keys of the substitutions")
+
+    # TODO: detect other NID types (cray?)
+    NID_REGEX = re.compile("(\d{1,3}\.){3}\d{1,3}@(tcp|ib)(_\d+)?")
+    TARGET_REGEX = re.compile("[^\w](\w{1,8}-(MDT|OST)[\da-f]{4})")
 
     @classmethod
-    def get_message_class(cls, message):
-        log_match = '(\[[\d\.]*\])? ?%s:'
+    def find_substitutions(cls, message):
+        """Return a list of [kind, key, start, end] for each NID and target name in a message"""
+        from chroma_core.lib.util import normalize_nid
+
+        substitutions = [['nid', normalize_nid(match.group(0)), match.start(0), match.end(0)]
+                         for match in cls.NID_REGEX.finditer(message)]
+        substitutions += [['target', match.group(1), match.start(1), match.end(1)]
+                          for match in cls.TARGET_REGEX.finditer(message)]
+        return substitutions
 
-        if re.match(log_match % 'LustreError', message):
-            return MessageClass.LUSTRE_ERROR
-        elif re.match(log_match % 'Lustre', message):
-            return MessageClass.LUSTRE
+    # An optional kernel timestamp, then the Lustre prefix which classifies the message
+    MESSAGE_CLASS_REGEX = re.compile("(\[[\d\.]*\])? ?(LustreError|Lustre):")
+    MESSAGE_CLASSES = {'LustreError': MessageClass.LUSTRE_ERROR,
+                       'Lustre': MessageClass.LUSTRE}
+
+    @classmethod
+    def get_message_class(cls, message):
+        match = cls.MESSAGE_CLASS_REGEX.match(message)
+        if match:
+            return cls.MESSAGE_CLASSES[match.group(2)]
         else:
             return MessageClass.NORMAL
 
@@ -8,8 +8,13 @@ import collections
 import calendar
 import operator
 import functools
+import sys
+import time
+from cStringIO import StringIO
 from datetime import datetime, timedelta
-from django.db import models
+import psycopg2
+from django.db import connection, models, transaction, IntegrityError
+from django.db.backends.util import CursorDebugWrapper
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.utils.timezone import utc
@@ -142,10 +147,27 @@ class Sample(models.Model):
         return (cls.cache[id] or list(cls.select(id, order_by='-dt', limit=1)) or [Point.zero])[-1]
 
     @classmethod
-    def start(cls, id):
-        "Return earliest datetime that should be stored for series."
+    def latest_many(cls, ids):
+        "Return mapping of series ids to most recent data points, with a single query for those not cached."
+        latest = dict((id, cls.cache[id][-1]) for id in ids if cls.cache[id])
+        missing = set(ids).difference(latest)
+        if missing:
+            query = cls.objects.filter(id__in=missing).order_by('id', '-dt').distinct('id')
+            latest.update((row[0], Point(*row[1:])) for row in query.values_list('id', *Point._fields))
+        return dict((id, latest.get(id, Point.zero)) for id in ids)
+
+    @classmethod
+    def prime(cls, ids):
+        "Cache most recent data points of the uncached series with a single query, including those with none."
+        ids = [id for id in ids if not cls.cache[id]]
+        for id, point in cls.latest_many(ids).items():
+            cls.cache[id].append(point)
+
+    @classmethod
+    def start(cls, id, latest=None):
+        "Return earliest datetime that should be stored for series, optionally given its most recent data point."
         try:
-            return cls.latest(id).dt - cls.expiration_time
+            return (latest or cls.latest(id)).dt - cls.expiration_time
         except OverflowError:
             return epoch
 
@@ -166,11 +188,32 @@ class Sample(models.Model):
         query = cls.objects.filter(id=id, **filters).order_by(order_by)[:limit]
         return itertools.starmap(Point, query.values_list(*Point._fields))
 
+    @classmethod
+    def copy(cls, rows):
+        "Bulk load rows of (id, dt, sum, len) with COPY, which postgres parses much faster than INSERT."
+        buffer = StringIO()
+        for id, dt, sum, len in rows:
+            buffer.write('{0:d}\t{1}\t{2!r}\t{3:d}\n'.format(id, dt.isoformat(), float(sum), len))
+        buffer.seek(0)
+        columns = ', '.join(map(connection.ops.quote_name, ('id',) + Point._fields))
+        sql = 'COPY {0} ({1}) FROM STDIN'.format(connection.ops.quote_name(cls._meta.db_table), columns)
+        cursor = connection.cursor()
+        started = time.time()
+        try:
+            cursor.copy_expert(sql, buffer)
+        except psycopg2.IntegrityError, e:
+            # as the backend's cursor wrapper would for execute
+            raise IntegrityError, IntegrityError(*tuple(e)), sys.exc_info()[2]
+        # the debug cursor only records execute, so record the COPY as it would
+        if isinstance(cursor, CursorDebugWrapper):
+            connection.queries.append({'sql': sql, 'time': '{0:.3f}'.format(time.time() - started)})
+        transaction.commit_unless_managed()
+
     @classmethod
     def insert(cls, stats):
         "Bulk insert mapping of series ids to points."
-        if stats:
-            cls.objects.bulk_create(cls(id, *point) for id in stats for point in stats[id])
+        if any(stats.values()):
+            cls.copy((id,) + point for id in stats for point in stats[id])
         for id in stats:
             cls.cache[id] += sorted(stats[id])
 
@@ -210,18 +253,22 @@ class Stats(list):
             self.append(type('Sample_{0:d}'.format(sample.sample_rate), (Sample,), namespace))
 
     def insert(self, samples):
-        "Bulk insert new samples (id, dt, value).  Skip and return outdated samples."
-        # keep stats as Points grouped by id
-        outdated, stats = [], collections.defaultdict(list)
+        "Bulk insert new samples (id, dt, value).  Skip and return outdated and duplicate samples."
+        # keep stats as Points grouped by id, keeping the first of any samples at the same time
+        outdated, stats, inserted = [], collections.defaultdict(list), set()
+        samples = list(samples)
+        self[0].prime(set(id for id, dt, value in samples))
         for id, dt, value in samples:
-            if dt > self[0].latest(id).dt:
+            if dt > self[0].latest(id).dt and (id, dt) not in inserted:
                 stats[id].append(Point(dt, value, 1))
+                inserted.add((id, dt))
             else:
                 outdated.append((id, dt, value))
         # insert stats into first Sample and check the rest
         self[0].insert(stats)
         for previous, model in zip(self, self[1:]):
             step = timedelta(seconds=model.step)
+            model.prime(stats)
             for id in list(stats):
                 start = model.latest(id).dt + step
                 stop = model.floor(max(stats.pop(id)).dt)
@@ -251,7 +298,36 @@ class Stats(list):
             if start >= model.start(id) and model.step >= minstep:
                 break
         points = model.select(id, dt__gte=start, dt__lt=stop)
-        points = list(points if index else model.reduce(points))
+        return self._shape(list(points if index else model.reduce(points)), start, stop, rate, fixed)
+
+    def select_many(self, ids, start, stop, rate=False, maxlen=float('inf'), fixed=0):
+        """Return mapping of series ids to points, as select would for each of them.
+        Uses a query for the latest points and one for the points of each Sample considered,
+        rather than queries for each series.
+        """
+        minstep = total_seconds(stop - start) / maxlen
+        remaining, result = set(ids), {}
+        for index, model in enumerate(self):
+            if not remaining:
+                break
+            if model is self[-1]:
+                selected = remaining
+            elif model.step >= minstep:
+                selected = set(id for id, point in model.latest_many(remaining).items() if start >= model.start(id, point))
+            else:
+                continue
+            remaining = remaining.difference(selected)
+            points = dict((id, []) for id in selected)
+            if selected:
+                query = model.objects.filter(id__in=selected, dt__gte=start, dt__lt=stop).order_by('id', 'dt')
+                for id, rows in itertools.groupby(query.values_list('id', *Point._fields), key=operator.itemgetter(0)):
+                    points[id] = [Point(*row[1:]) for row in rows]
+            for id in selected:
+                result[id] = self._shape(points[id] if index else list(model.reduce(points[id])), start, stop, rate, fixed)
+        return result
+
+    def _shape(self, points, start, stop, rate, fixed):
+        "Optionally derive the rate of change of points, and return fixed intervals."
         if rate:
             points = map(operator.sub, points[1:], points[:-1])
         if fixed:
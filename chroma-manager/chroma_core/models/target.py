@@ -125,7 +125,7 @@ class ManagedTarget(StatefulObject):
 
         try:
             job_log.debug("Started %s on %s" % (self.ha_label, started_on))
-            target_mount = ObjectCache.get_one(ManagedTargetMount, lambda mtm: mtm.target_id == self.id and mtm.host_id == started_on.id)
+            target_mount = ObjectCache.get_one_by(ManagedTargetMount, 'target_id', self.id, lambda mtm: mtm.host_id == started_on.id)
             self.active_mount = target_mount
         except ManagedTargetMount.DoesNotExist:
             job_log.error("Target %s (%s) found on host %s (%s), which has no ManagedTargetMount for this self" % (self, self.id, started_on, started_on.pk))
@@ -183,7 +183,7 @@ class ManagedTarget(StatefulObject):
         """
         :return: A host which is available for actions, preferably the primary.
         """
-        mounts = ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target.id == self.id)
+        mounts = ObjectCache.target_mounts(self.id)
         for mount in sorted(mounts, lambda a, b: cmp(b.primary, a.primary)):
             if HostContactAlert.filter_by_item(mount.host).count() == 0:
                 return mount.host
@@ -226,7 +226,7 @@ class ManagedTarget(StatefulObject):
             # Depend on the active mount's host having LNet up, so that if
             # LNet is stopped on that host this target will be stopped first.
             target_mount = self.active_mount
-            host = ObjectCache.get_one(ManagedHost, lambda mh: mh.id == target_mount.host_id)
+            host = ObjectCache.get_by_id(ManagedHost, target_mount.host_id)
 
             lnet_configuration = ObjectCache.get_by_id(LNetConfiguration, host.lnet_configuration.id)
             deps.append(DependOn(lnet_configuration, 'lnet_up', fix_state='unmounted'))
@@ -240,8 +240,7 @@ class ManagedTarget(StatefulObject):
         if issubclass(self.downcast_class, FilesystemMember) and state not in ['removed', 'forgotten']:
             # Make sure I follow if filesystem goes to 'removed'
             # or 'forgotten'
-            # FIXME: should get filesystem membership from objectcache
-            filesystem_id = self.downcast().filesystem_id
+            filesystem_id = ObjectCache.target_filesystem_id(self)
             filesystem = ObjectCache.get_by_id(ManagedFilesystem, filesystem_id)
             deps.append(DependOn(filesystem, 'available',
                                  acceptable_states = filesystem.not_states(['forgotten', 'removed']), fix_state=lambda s: s))
@@ -249,7 +248,7 @@ class ManagedTarget(StatefulObject):
         if state not in ['removed', 'forgotten']:
             from chroma_core.models import LNetConfiguration
 
-            target_mounts = ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target_id == self.id)
+            target_mounts = ObjectCache.target_mounts(self.id)
             for tm in target_mounts:
                 host = ObjectCache.get_by_id(ManagedHost, tm.host_id)
                 fix_state = 'forgotten' if self.immutable_state else 'removed'
@@ -952,7 +951,7 @@ class ConfigureTargetJob(StateChangeJob):
     def get_deps(self):
         deps = []
 
-        prim_mtm = ObjectCache.get_one(ManagedTargetMount, lambda mtm: mtm.primary is True and mtm.target_id == self.target.id)
+        prim_mtm = ObjectCache.get_one_by(ManagedTargetMount, 'target_id', self.target.id, lambda mtm: mtm.primary is True)
         deps.append(DependOn(prim_mtm.host.lnet_configuration, 'lnet_up'))
 
         for target_mount in self.target.managedtargetmount_set.all().order_by('-primary'):
@@ -1021,21 +1020,20 @@ class RegisterTargetJob(StateChangeJob):
         return steps
 
     def get_deps(self):
+        from chroma_core.models import ManagedFilesystem
+
         deps = []
 
         deps.append(DependOn(ObjectCache.target_primary_server(self.target).lnet_configuration, 'lnet_up'))
 
         if issubclass(self.target.downcast_class, FilesystemMember):
-            # FIXME: spurious downcast, should cache filesystem associaton in objectcache
-            mgs = ObjectCache.get_by_id(ManagedTarget, self.target.downcast().filesystem.mgs_id)
+            filesystem = ObjectCache.get_by_id(ManagedFilesystem, ObjectCache.target_filesystem_id(self.target))
+            mgs = ObjectCache.get_by_id(ManagedTarget, filesystem.mgs_id)
 
             deps.append(DependOn(mgs, "mounted"))
 
         if issubclass(self.target.downcast_class, ManagedOst):
-            # FIXME: spurious downcast, should cache filesystem associaton in objectcache
-            filesystem_id = self.target.downcast().filesystem_id
-            mdts = ObjectCache.get(ManagedTarget, lambda target: issubclass(target.downcast_class,
-                                                                            ManagedMdt) and target.downcast().filesystem_id == filesystem_id)
+            mdts = ObjectCache.get_by(ManagedTarget, 'mdt_filesystem_id', ObjectCache.target_filesystem_id(self.target))
 
             for mdt in mdts:
                 deps.append(DependOn(mdt, "mounted"))
@@ -1075,14 +1073,14 @@ class StartTargetJob(StateChangeJob):
     def get_deps(self):
         deps = []
         # Depend on at least one targetmount having lnet up
-        mtms = ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target_id == self.target_id)
+        mtms = ObjectCache.target_mounts(self.target_id)
         for target_mount in mtms:
             from chroma_core.models import LNetConfiguration
 
-            lnet_configuration = ObjectCache.get_one(LNetConfiguration, lambda l: l.host_id == target_mount.host_id)
+            lnet_configuration = ObjectCache.get_one_by(LNetConfiguration, 'host_id', target_mount.host_id)
             deps.append(DependOn(lnet_configuration, 'lnet_up', fix_state = 'unmounted'))
 
-            pacemaker_configuration = ObjectCache.get_one(PacemakerConfiguration, lambda pm: pm.host_id == target_mount.host_id)
+            pacemaker_configuration = ObjectCache.get_one_by(PacemakerConfiguration, 'host_id', target_mount.host_id)
             deps.append(DependOn(pacemaker_configuration, 'started', fix_state = 'unmounted'))
 
         return DependAny(deps)
@@ -1319,20 +1317,18 @@ class FormatTargetJob(StateChangeJob):
         deps = []
 
         hosts = set()
-        for tm in ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target_id == self.target_id):
+        for tm in ObjectCache.target_mounts(self.target_id):
             hosts.add(tm.host)
 
         for host in hosts:
             deps.append(DependOn(host.lnet_configuration, 'lnet_up'))
 
         if issubclass(self.target.downcast_class, FilesystemMember):
-            # FIXME: spurious downcast, should use ObjectCache to remember which targets are in
-            # which filesystem
-            filesystem = ObjectCache.get_by_id(ManagedFilesystem, self.target.downcast().filesystem_id)
+            filesystem = ObjectCache.get_by_id(ManagedFilesystem, ObjectCache.target_filesystem_id(self.target))
             mgt_id = filesystem.mgs_id
 
             mgs_hosts = set()
-            for tm in ObjectCache.get(ManagedTargetMount, lambda mtm: mtm.target_id == mgt_id):
+            for tm in ObjectCache.target_mounts(mgt_id):
                 mgs_hosts.add(tm.host)
 
             for host in mgs_hosts:
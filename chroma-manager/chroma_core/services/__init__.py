@@ -38,7 +38,8 @@ class ChromaService(object):
         assert enable_long_polling    # Prevent pep8 warning
 
     def stop(self):
-        pass
+        from chroma_core.lib.long_polling import enable_long_polling
+        enable_long_polling.stop()
 
 
 class ServiceThread(threading.Thread):
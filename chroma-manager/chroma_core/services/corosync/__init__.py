@@ -3,13 +3,15 @@
 # license that can be found in the LICENSE file.
 
 
+import time
 from collections import namedtuple, defaultdict
 
 from django.db import transaction
 from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
 from django.utils import timezone
 
-from chroma_core.models import ManagedHost, HostOfflineAlert
+from chroma_core.models import ManagedHost, HostOfflineAlert, CorosyncConfiguration
 from chroma_core.services import ChromaService, log_register
 from chroma_core.services.queue import AgentRxQueue
 from chroma_core.services.job_scheduler import job_scheduler_notify
@@ -37,14 +39,60 @@ class Service(ChromaService):
     #  a HostStatus object is created for each host that is reported
     HostStatus = namedtuple('HostStatus', ['status', 'datetime'])
 
+    #  Class to store the last report processed from each host: what it reported of its
+    #  state, its stonith option and its cluster's membership, the node identifiers of
+    #  the peers it reported which were considered, and when it was processed.
+    ReportSnapshot = namedtuple('ReportSnapshot', ['report', 'peers', 'taken_at'])
+
+    #  Each host's reports are processed in full at least this often (seconds), so that
+    #  the database is brought back in line with them if it changes (e.g. in another
+    #  process) while they don't.  Changes saved by this process clear the snapshots.
+    SNAPSHOT_MAX_AGE = 300
+
     def __init__(self):
         super(Service, self).__init__()
 
         #  Holds each host seen as a key with a HostStatus value last set
         self._host_status = defaultdict(self.HostStatus)
 
+        #  Holds a ReportSnapshot for each host whose peers were last considered
+        self._report_snapshots = {}
+
+        post_save.connect(self._changed)
+        post_delete.connect(self._changed)
+
         self._queue = AgentRxQueue(Service.PLUGIN_NAME)
 
+    def _is_new(self, peer_node_identifier, dt):
+        return (peer_node_identifier not in self._host_status or
+                self._host_status[peer_node_identifier].datetime < dt)
+
+    def _changed(self, sender, **kwargs):
+        if issubclass(sender, (ManagedHost, CorosyncConfiguration)):
+            self._report_snapshots.clear()
+
+    def _unchanged(self, fqdn, report, nodes, dt):
+        """Whether a report would change nothing known of its cluster.
+
+        Every node of a cluster reports the same membership every period, which is
+        usually what is known already: the same as this host's last report, with
+        each peer's status as last reported by whichever node.  The peers' times are
+        moved on as the report would have moved them.
+        """
+        snapshot = self._report_snapshots.get(fqdn)
+        if snapshot is None or snapshot.report != report or time.time() - snapshot.taken_at >= self.SNAPSHOT_MAX_AGE:
+            return False
+
+        new_peers = [peer for peer in snapshot.peers if self._is_new(peer, dt)]
+        for peer in new_peers:
+            if self._host_status[peer].status != (nodes[peer]['online'] == 'true'):
+                return False
+
+        for peer in new_peers:
+            self._host_status[peer] = self.HostStatus(status = self._host_status[peer].status, datetime = dt)
+
+        return True
+
     # Using transaction decorator to ensure that subsequent calls
     # see fresh data when polling the ManagedHost model.
     @transaction.commit_on_success()
@@ -54,12 +102,40 @@ class Service(ChromaService):
         Request to have the status changed for an instance.  If the current
         state determines that a host is offline, then raise that alert.
 
-        old messages should not be processed.
+        old messages should not be processed, nor should those which change
+        nothing (see _unchanged), so that only the transitions of a cluster
+        reach the database, job_scheduler and alerts.
 
         datetime is in UTC of the node's localtime in the standard
         ISO string format
         """
 
+        nodes = {}
+        dt = None
+        stonith_enabled = None
+        if body.get('crm_info'):
+            nodes = body['crm_info']['nodes']
+            dt = body['crm_info']['datetime']
+
+            options = body['crm_info'].get('options', {
+                'stonith_enabled': None
+            })
+            stonith_enabled = options['stonith_enabled']
+
+            try:
+                dt = IMLDateTime.parse(dt)
+            except ValueError:
+                if dt != '':
+                    log.warning("Invalid date or tz string from corosync plugin: %s" % dt)
+                    raise
+
+        report = (body.get('state'), stonith_enabled, sorted(nodes.keys()))
+        if self._unchanged(fqdn, report, nodes, dt):
+            return
+
+        # Until its peers are considered below
+        self._report_snapshots.pop(fqdn, None)
+
         try:
             host = ManagedHost.objects.get(fqdn=fqdn)
         except ManagedHost.DoesNotExist:
@@ -89,33 +165,13 @@ class Service(ChromaService):
                 return
 
         if body.get('crm_info'):
-            nodes = body['crm_info']['nodes']
-            dt = body['crm_info']['datetime']
-
-            options = body['crm_info'].get('options', {
-                'stonith_enabled': None
-            })
-            stonith_enabled = options['stonith_enabled']
-
-            try:
-                dt = IMLDateTime.parse(dt)
-            except ValueError:
-                if dt != '':
-                    log.warning("Invalid date or tz string from corosync plugin: %s" % dt)
-                    raise
-
-            def is_new(peer_node_identifier):
-                return (peer_node_identifier not in self._host_status or
-                        self._host_status[peer_node_identifier].datetime < dt)
-
             peers_str = "; ".join(["%s: online=%s, new=%s" %
-                                   (peer_node_identifier, data['online'], is_new(peer_node_identifier))
+                                   (peer_node_identifier, data['online'], self._is_new(peer_node_identifier, dt))
                                    for peer_node_identifier, data in nodes.items()])
             log.debug("Incoming peer report from %s:  %s" % (fqdn, peers_str))
 
             # NB: This will ignore any unknown peers in the report.
-            cluster_nodes = ManagedHost.objects.select_related('ha_cluster_peers').filter(Q(nodename__in=nodes.keys()) |
-                                                                                          Q(fqdn__in=nodes.keys()))
+            cluster_nodes = ManagedHost.objects.filter(Q(nodename__in=nodes.keys()) | Q(fqdn__in=nodes.keys()))
 
             unknown_nodes = set(nodes.keys()) - set([h.nodename for h in cluster_nodes]) - set([h.fqdn for h in cluster_nodes])
 
@@ -131,7 +187,19 @@ class Service(ChromaService):
             CorosyncNoPeersAlert.notify(host.corosync_configuration, len(cluster_nodes) == 1)
             # CorosyncToManyPeersAlert.notify(host.corosync_configuration, len(cluster_nodes) > 2)
 
+            #  The peers' configurations and their own peers, for all of them at once.  The configurations
+            #  are iterated without being downcast (a query each), as host.corosync_configuration would be.
+            corosync_configurations = dict((configuration.host_id, configuration) for configuration in
+                                           CorosyncConfiguration.objects.filter(host__in=cluster_nodes).exclude(state='removed').iterator())
+            host_peer_keys = defaultdict(list)
+            for from_id, to_id in ManagedHost.ha_cluster_peers.through.objects.filter(
+                    from_managedhost__in=cluster_nodes,
+                    to_managedhost__not_deleted=True).values_list('from_managedhost_id', 'to_managedhost_id'):
+                host_peer_keys[from_id].append(to_id)
+
             #  Consider all nodes in the peer group for this reporting agent
+            considered_peers = []
+            offline_notifications = []
             for host in cluster_nodes:
                 try:
                     data = nodes[host.nodename]
@@ -142,28 +210,31 @@ class Service(ChromaService):
 
                 cluster_peer_keys = sorted([node.pk for node in cluster_nodes if node is not host])
 
-                if is_new(node_identifier) and host.corosync_configuration:
+                corosync_configuration = corosync_configurations.get(host.pk)
+                if corosync_configuration:
+                    considered_peers.append(node_identifier)
+
+                if self._is_new(node_identifier, dt) and corosync_configuration:
                     host_reported_online = data['online'] == 'true'
 
                     log.debug("Corosync processing "
                               "peer %s of %s " % (host.fqdn, fqdn))
 
-                    #  Raise an Alert - system suppresses duplicates
+                    #  Raise an Alert (with the others below) - system suppresses duplicates
                     log.debug("Alert notify on %s: active=%s" % (host, not host_reported_online))
-                    HostOfflineAlert.notify(host, not host_reported_online)
+                    offline_notifications.append((host, not host_reported_online))
                     if host_reported_online == False:
                         log.debug("Host %s offline" % host.fqdn)
                     else:
                         log.debug("Host %s online" % host.fqdn)
 
                     #  Attempt to save the state.
-                    if host.corosync_configuration.corosync_reported_up != host_reported_online:
-                        job_scheduler_notify.notify(host.corosync_configuration,
+                    if corosync_configuration.corosync_reported_up != host_reported_online:
+                        job_scheduler_notify.notify(corosync_configuration,
                                                     timezone.now(),
                                                     {'corosync_reported_up': host_reported_online})
 
-                    peer_host_peer_keys = sorted([h.pk for h in
-                                                  host.ha_cluster_peers.all()])
+                    peer_host_peer_keys = sorted(host_peer_keys[host.pk])
                     if peer_host_peer_keys != cluster_peer_keys:
                         job_scheduler_notify.notify(host,
                                                     timezone.now(),
@@ -173,6 +244,10 @@ class Service(ChromaService):
                     self._host_status[node_identifier] = self.HostStatus(status=host_reported_online,
                                                                          datetime=dt)
 
+            HostOfflineAlert.notify_many(offline_notifications)
+
+            self._report_snapshots[fqdn] = self.ReportSnapshot(report=report, peers=considered_peers, taken_at=time.time())
+
     def run(self):
         super(Service, self).run()
 
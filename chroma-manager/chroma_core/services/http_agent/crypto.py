@@ -5,6 +5,7 @@
 
 import urlparse
 import os
+import random
 import re
 import tempfile
 
@@ -33,6 +34,18 @@ class Crypto(CommandLine):
 
     log = log_register('crypto')
 
+    _random = random.SystemRandom()
+
+    def _serial(self):
+        """
+        A random serial number for a new certificate, passed to openssl x509 with -set_serial
+        rather than having it allocate one with -CAcreateserial: that reads, increments and
+        rewrites the serial file without a lock, so concurrent signings (e.g. by
+        register_many, or in different processes) fail or are given the same serial.
+        63 bits, so that it fits in the 16 hex digits of ClientCertificate.serial.
+        """
+        return str(self._random.getrandbits(63) | 1)
+
     def _get_or_create_private_key(self, filename):
         if not os.path.exists(filename):
             self.log.info("Generating manager key file")
@@ -100,7 +113,7 @@ subjectAltName = DNS:%s
                 "-sha256", "-days", self.CERTIFICATE_DAYS,
                 "-extfile", tmp_path,
                 "-extensions", "v3_req",
-                "-CA", self.authority_cert, "-CAcreateserial",
+                "-CA", self.authority_cert, "-set_serial", self._serial(),
                 "-CAkey", self.authority_key,
                 "-out", self.MANAGER_CERT_FILE], stdin_text=csr)
 
@@ -114,7 +127,7 @@ subjectAltName = DNS:%s
     def sign(self, csr_string):
         self.log.info("Signing")
 
-        rc, out, err = self.try_shell(["openssl", "x509", "-req", "-days", self.CERTIFICATE_DAYS, "-CAkey", self.authority_key, "-CA", self.authority_cert, "-CAcreateserial", "-sha256"], stdin_text = csr_string)
+        rc, out, err = self.try_shell(["openssl", "x509", "-req", "-days", self.CERTIFICATE_DAYS, "-CAkey", self.authority_key, "-CA", self.authority_cert, "-set_serial", self._serial(), "-sha256"], stdin_text = csr_string)
         return out.strip()
 
     def get_serial(self, cert_str):
@@ -98,6 +98,16 @@ class HostStateCollection(object):
 
         return state.update(boot_time, client_start_time)
 
+    def contact(self, fqdn):
+        """
+        Record contact from a host which has already been update()d, without touching
+        the database, for a streaming GET to call as it goes.
+        """
+        try:
+            self._hosts[fqdn].last_contact = IMLDateTime.utcnow()
+        except KeyError:
+            pass
+
     def items(self):
         return self._hosts.items()
 
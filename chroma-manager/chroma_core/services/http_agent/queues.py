@@ -3,8 +3,11 @@
 # license that can be found in the LICENSE file.
 
 
-import Queue
 import threading
+
+import gevent.lock
+import gevent.queue
+
 from chroma_core.services import _amqp_connection, log_register
 from chroma_core.services.queue import ServiceQueue
 
@@ -22,9 +25,9 @@ class HostQueueCollection(object):
 
         # A queue for all plugin RX messages, will be fanned
         # out to an AMQP queue per plugin
-        self.plugin_rx_queue = Queue.Queue()
+        self.plugin_rx_queue = gevent.queue.Queue()
 
-        self._lock = threading.Lock()
+        self._lock = gevent.lock.Semaphore()
 
     def get(self, fqdn):
         with self._lock:
@@ -48,12 +51,27 @@ class HostQueueCollection(object):
 
 
 class HostQueues(object):
-    """Both directions of messages for a single host"""
+    """
+    Both directions of messages for a single host.
+
+    These are gevent primitives rather than Queue/threading ones: the http_agent
+    service runs under gevent, and every connected agent has a GET parked on
+    its TX queue, so waiting must cost a greenlet rather than a thread.
+    """
     def __init__(self, fqdn):
         self.fqdn = fqdn
-        self.rx = Queue.Queue()
-        self.tx = Queue.Queue()
-        self.tx_lock = threading.Lock()
+        self.rx = gevent.queue.Queue()
+        self.tx = gevent.queue.Queue()
+        self.tx_lock = gevent.lock.Semaphore()
+        self.reader = 0
+
+    def new_reader(self):
+        """
+        Make the caller the only GET which may take messages from the TX queue, superseding
+        any other (such as one left behind by a dropped connection), and return its token.
+        """
+        self.reader += 1
+        return self.reader
 
 
 class AmqpRxForwarder(object):
@@ -66,7 +84,7 @@ class AmqpRxForwarder(object):
             while not self._stopping.is_set():
                 try:
                     msg = self._queue_collection.plugin_rx_queue.get(block = True, timeout = 1)
-                except Queue.Empty:
+                except gevent.queue.Empty:
                     pass
                 else:
                     plugin_name = msg['plugin']
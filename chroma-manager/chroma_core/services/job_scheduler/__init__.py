@@ -82,9 +82,13 @@ class Service(ChromaService):
         from chroma_core.services.job_scheduler.job_scheduler import JobScheduler
         from chroma_core.services.job_scheduler.job_scheduler_client import JobSchedulerRpc
         from chroma_core.services.job_scheduler.agent_rpc import AgentRpc
+        from chroma_core.services.notification_hub.client import start_listening
 
         super(Service, self).run()
 
+        # So that the table changes of other processes invalidate the caches here (e.g. HostResolver)
+        start_listening()
+
         # Cancel anything that's left behind from a previous run
         for command in Command.objects.filter(complete=False):
             command.completed(True, True)
@@ -53,6 +53,34 @@ class ActionInFlight(object):
             }
         }
 
+    @classmethod
+    def get_batch_request(cls, rpcs):
+        """Request to start several actions on the same host and session with one message"""
+        return {
+            'fqdn': rpcs[0].fqdn,
+            'type': 'DATA',
+            'plugin': AgentRpcMessenger.PLUGIN_NAME,
+            'session_id': rpcs[0].session_id,
+            'session_seq': None,
+            'body': {
+                'type': 'ACTION_BATCH_START',
+                'actions': [{
+                    'id': rpc.id,
+                    'action': rpc.action,
+                    'args': rpc.args
+                } for rpc in rpcs]
+            }
+        }
+
+    def get_result(self):
+        """
+        For a completed action, return its result or raise the AgentException it failed with
+        """
+        if self.exception:
+            raise AgentException(self.fqdn, self.action, self.args, self.exception, subprocesses = self.subprocesses)
+        else:
+            return self.result
+
     def get_cancellation(self):
         return {
             'fqdn': self.fqdn,
@@ -88,6 +116,9 @@ class AgentRpcMessenger(object):
     # an action, wait this long for one to show up
     SESSION_WAIT_TIMEOUT = 30
 
+    # Advertised by agents which accept several actions in one ACTION_BATCH_START message
+    BATCH_CAPABILITY = 'action_batch'
+
     def __init__(self):
         super(AgentRpcMessenger, self).__init__()
 
@@ -96,6 +127,10 @@ class AgentRpcMessenger(object):
 
         # FQDN to session
         self._sessions = {}
+
+        # session to list of capabilities advertised by the agent
+        self._session_capabilities = {}
+
         self._cancelled_rpcs = ExpiringList(10 * 60)
 
         self._action_runner_rx_queue = AgentRxQueue(AgentRpcMessenger.PLUGIN_NAME)
@@ -138,6 +173,7 @@ class AgentRpcMessenger(object):
     def _abort_session(self, fqdn, message, old_session_id, new_session_id=None):
         log.warning("AgentRpcMessenger.on_rx: aborting session %s because %s" % (old_session_id, message))
         old_rpcs = self._session_rpcs[old_session_id]
+        self._session_capabilities.pop(old_session_id, None)
 
         if new_session_id is not None:
             self._sessions[fqdn] = new_session_id
@@ -217,7 +253,12 @@ class AgentRpcMessenger(object):
                     self._abort_session(fqdn, "all sessions terminated", session)
             else:
                 rpc_response = message['body']
-                if rpc_response['type'] != 'ACTION_COMPLETE':
+                if rpc_response['type'] == 'CAPABILITIES':
+                    if self._sessions.get(fqdn) == session_id:
+                        log.info("AgentRpcMessenger.on_rx: %s/%s capabilities %s" % (fqdn, session_id, rpc_response['capabilities']))
+                        self._session_capabilities[session_id] = rpc_response['capabilities']
+                    return
+                elif rpc_response['type'] != 'ACTION_COMPLETE':
                     log.error("Unexpected type '%s'" % rpc_response['type'])
                     return
 
@@ -253,12 +294,21 @@ class AgentRpcMessenger(object):
         AgentTxQueue().put(rpc.get_request())
 
     def _send_request(self, fqdn, action, args):
-        wait_count = 0
+        return self._send_requests(fqdn, [(action, args)])[0]
 
-        if not self.await_session(fqdn, AgentRpcMessenger.SESSION_WAIT_TIMEOUT):
-            log.error("No %s session for %s after %s seconds" % (AgentRpcMessenger.PLUGIN_NAME, fqdn, wait_count))
-            raise AgentException(fqdn, action, args, "%s %s no session after %s seconds" %
-                                 (self.COULD_NOT_CONTACT_TAG, fqdn, AgentRpcMessenger.SESSION_WAIT_TIMEOUT))
+    def _send_requests(self, fqdn, actions, session_timeout = SESSION_WAIT_TIMEOUT):
+        """
+        Start a list of (action, args) on a host.  If the agent supports it they go in
+        a single ACTION_BATCH_START message, otherwise one ACTION_START each.
+
+        :return: list of ActionInFlight in the order of `actions`
+        """
+        first_action, first_args = actions[0]
+
+        if not self.await_session(fqdn, session_timeout):
+            log.error("No %s session for %s after %s seconds" % (AgentRpcMessenger.PLUGIN_NAME, fqdn, session_timeout))
+            raise AgentException(fqdn, first_action, first_args, "%s %s no session after %s seconds" %
+                                 (self.COULD_NOT_CONTACT_TAG, fqdn, session_timeout))
 
         with self._lock:
             try:
@@ -266,15 +316,21 @@ class AgentRpcMessenger(object):
             except KeyError:
                 # This could happen in spite of the earlier check, as that was outside the lock.
                 log.warning("AgentRpcMessenger._send: no session for %s" % fqdn)
-                raise AgentException(fqdn, action, args, "%s %s" % (self.COULD_NOT_CONTACT_TAG, fqdn))
+                raise AgentException(fqdn, first_action, first_args, "%s %s" % (self.COULD_NOT_CONTACT_TAG, fqdn))
 
             log.debug("AgentRpcMessenger._send: using session %s" % session_id)
 
-            rpc = ActionInFlight(session_id, fqdn, action, args)
+            rpcs = [ActionInFlight(session_id, fqdn, action, args) for action, args in actions]
+            for rpc in rpcs:
+                self._session_rpcs[session_id][rpc.id] = rpc
+
+            if len(rpcs) > 1 and self.BATCH_CAPABILITY in self._session_capabilities.get(session_id, []):
+                AgentTxQueue().put(ActionInFlight.get_batch_request(rpcs))
+            else:
+                for rpc in rpcs:
+                    AgentTxQueue().put(rpc.get_request())
 
-            self._session_rpcs[session_id][rpc.id] = rpc
-            AgentTxQueue().put(rpc.get_request())
-            return rpc
+            return rpcs
 
     def _send_cancellation(self, rpc):
         with self._lock:
@@ -308,11 +364,68 @@ class AgentRpcMessenger(object):
         else:
             return rpc.result
 
+    def _complete_many(self, rpcs, cancel_event):
+        log.info("AgentRpcMessenger._complete_many: starting wait for %s rpcs" % len(rpcs))
+
+        # Wait for every rpc.complete, waking up every second to
+        # check cancel_event
+        while True:
+            incomplete = [rpc for rpc in rpcs if not rpc.complete.is_set()]
+
+            if cancel_event.is_set():
+                for rpc in incomplete:
+                    self._send_cancellation(rpc)
+                    self._cancelled_rpcs.append(rpc.id)
+                raise AgentCancellation()
+            elif not incomplete:
+                break
+            else:
+                incomplete[0].complete.wait(timeout = 1.0)
+
+        log.info("AgentRpcMessenger._complete_many: completed wait for %s rpcs" % len(rpcs))
+
     def call(self, fqdn, action, args, cancel_event):
         log.debug("AgentRpcMessenger.call: %s %s" % (fqdn, action))
         rpc = self._send_request(fqdn, action, args)
         return self._complete(rpc, cancel_event), rpc
 
+    def call_many(self, calls, cancel_event):
+        """
+        Start many actions, on one or more hosts, and wait for all of them to complete: the
+        wait is as long as the slowest host rather than the sum of all of them.  The actions
+        for each host are sent to it together.
+
+        :param calls: list of (fqdn, action, args)
+        :return: list of completed ActionInFlight in the order of `calls`, call .get_result() on each
+        """
+        log.debug("AgentRpcMessenger.call_many: %s actions" % len(calls))
+
+        host_calls = defaultdict(list)
+        for index, (fqdn, action, args) in enumerate(calls):
+            host_calls[fqdn].append((index, action, args))
+
+        # One deadline for session waits, rather than SESSION_WAIT_TIMEOUT per host
+        session_deadline = time.time() + AgentRpcMessenger.SESSION_WAIT_TIMEOUT
+
+        rpcs = [None] * len(calls)
+        for fqdn, indexed_actions in host_calls.items():
+            actions = [(action, args) for index, action, args in indexed_actions]
+            try:
+                host_rpcs = self._send_requests(fqdn, actions, max(1, int(session_deadline - time.time())))
+            except AgentException as e:
+                host_rpcs = []
+                for action, args in actions:
+                    rpc = ActionInFlight(None, fqdn, action, args)
+                    rpc.exception = e.backtrace
+                    rpc.complete.set()
+                    host_rpcs.append(rpc)
+
+            for (index, action, args), rpc in zip(indexed_actions, host_rpcs):
+                rpcs[index] = rpc
+
+        self._complete_many(rpcs, cancel_event)
+        return rpcs
+
     def await_session(self, fqdn, timeout):
         '''
         Wait for the agent to connect back to the manager and hence be ready to accept commands
@@ -356,6 +469,10 @@ class AgentRpc(object):
     def call(cls, fqdn, action, args, cancel_event):
         return cls._messenger.call(fqdn, action, args, cancel_event)
 
+    @classmethod
+    def call_many(cls, calls, cancel_event):
+        return cls._messenger.call_many(calls, cancel_event)
+
     @classmethod
     def remove(cls, fqdn):
         return cls._messenger.remove(fqdn)
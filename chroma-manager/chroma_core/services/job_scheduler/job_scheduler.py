@@ -55,7 +55,6 @@ from iml_common.lib.date_time import IMLDateTime
 from chroma_help.help import help_text
 
 import chroma_core.lib.conf_param
-from chroma_core.lib.long_polling import long_polling
 
 log = log_register(__name__.split('.')[-1])
 
@@ -1303,38 +1302,76 @@ class JobScheduler(object):
 
         with self._lock:
             with transaction.commit_on_success():
-                try:
-                    # If there is already a host record (SSH-assisted host addition) then
-                    # update it
-                    host = ManagedHost.objects.get(fqdn=fqdn, state='undeployed')
-                    # host.fqdn = fqdn
-                    # host.nodename = nodename
-                    # host.save()
-                    job = DeployHostJob.objects.filter(~Q(state='complete'), managed_host=host)
-                    command = Command.objects.filter(jobs=job)[0]
-
-                except ManagedHost.DoesNotExist:
-                    # Else create a new one
-                    host = ManagedHost.objects.create(
-                        fqdn=fqdn,
-                        nodename=nodename,
-                        immutable_state=not server_profile.managed,
-                        address=address,
-                        server_profile=server_profile,
-                        install_method = ManagedHost.INSTALL_MANUAL)
-                    lnet_configuration = LNetConfiguration.objects.create(host=host)
+                host, command = self._create_host(fqdn, nodename, address, server_profile)
+
+        self.progress.advance()
 
-                    ObjectCache.add(LNetConfiguration, lnet_configuration)
-                    ObjectCache.add(ManagedHost, host)
+        return host.id, command.id
 
+    def create_hosts(self, hosts, server_profile_id):
+        """
+        Create many new hosts, as create_host does each one, taking the lock once for them all
+        rather than once per host.  Each host is created in a transaction of its own, so one
+        which fails leaves the others created.
+
+        :param hosts: List of dicts of the fqdn, nodename and address of each host
+        :return: List of {'host_id':, 'command_id':} or {'error':} of each host
+        """
+        server_profile = ServerProfile.objects.get(pk=server_profile_id)
+
+        results = []
+        with self._lock:
+            for host in hosts:
+                try:
                     with transaction.commit_on_success():
-                        command = self.CommandPlan.command_set_state(
-                            [(ContentType.objects.get_for_model(host).natural_key(), host.id, server_profile.initial_state)],
-                            help_text["deploying_host"] % host)
+                        created, command = self._create_host(host['fqdn'], host['nodename'], host['address'], server_profile)
+                except Exception, e:
+                    log.error("Failed to create host %s: %s" % (host['fqdn'], traceback.format_exc()))
+                    results.append({'error': "Failed to create host: %s" % e})
+                else:
+                    results.append({'host_id': created.id, 'command_id': command.id})
 
         self.progress.advance()
 
-        return host.id, command.id
+        return results
+
+    def _create_host(self, fqdn, nodename, address, server_profile):
+        try:
+            # If there is already a host record (SSH-assisted host addition) then
+            # update it
+            host = ManagedHost.objects.get(fqdn=fqdn, state='undeployed')
+            # host.fqdn = fqdn
+            # host.nodename = nodename
+            # host.save()
+            job = DeployHostJob.objects.filter(~Q(state='complete'), managed_host=host)
+            command = Command.objects.filter(jobs=job)[0]
+
+        except ManagedHost.DoesNotExist:
+            # Else create a new one
+            host = ManagedHost.objects.create(
+                fqdn=fqdn,
+                nodename=nodename,
+                immutable_state=not server_profile.managed,
+                address=address,
+                server_profile=server_profile,
+                install_method = ManagedHost.INSTALL_MANUAL)
+            lnet_configuration = LNetConfiguration.objects.create(host=host)
+
+            ObjectCache.add(LNetConfiguration, lnet_configuration)
+            ObjectCache.add(ManagedHost, host)
+
+            try:
+                with transaction.commit_on_success():
+                    command = self.CommandPlan.command_set_state(
+                        [(ContentType.objects.get_for_model(host).natural_key(), host.id, server_profile.initial_state)],
+                        help_text["deploying_host"] % host)
+            except:
+                # The host and its LNet configuration are rolled back with the command
+                ObjectCache.purge(LNetConfiguration, lambda lc: lc.id == lnet_configuration.id)
+                ObjectCache.purge(ManagedHost, lambda mh: mh.id == host.id)
+                raise
+
+        return host, command
 
     @staticmethod
     def _retrieve_stateful_object(obj_content_type_natural_key, object_id):
@@ -1595,9 +1632,3 @@ class JobScheduler(object):
     @property
     def CommandPlan(self):
         return CommandPlan(self._lock_cache, self._job_collection)
-
-    def tables_changed(self, timestamp, tables):
-        return long_polling.tables_changed(timestamp, tables)
-
-    def wait_table_change(self, last_change_time, tables_list, timeout):
-        return long_polling.wait_table_change(last_change_time, tables_list, timeout)
@@ -11,7 +11,6 @@ non-remote functionality is wrapped in JobSchedulerClient.
 
 """
 
-from django import db
 
 from chroma_core.services import log_register
 from chroma_core.services.rpc import ServiceRpcInterface
@@ -36,15 +35,14 @@ class JobSchedulerRpc(ServiceRpcInterface):
                'trigger_plugin_update',
                'update_lnet_configuration',
                'create_host',
+               'create_hosts',
                'set_host_profile',
                'create_targets',
                'available_transitions',
                'available_jobs',
                'get_locks',
                'update_corosync_configuration',
-               'get_transition_consequences',
-               'tables_changed',
-               'wait_table_change'
+               'get_transition_consequences'
                ]
 
 
@@ -188,20 +186,6 @@ class JobSchedulerClient(object):
 
         return JobSchedulerRpc().trigger_plugin_update(include_host_ids, exclude_host_ids, plugin_names)
 
-    @classmethod
-    def tables_changed(cls, timestamp, tables):
-        return JobSchedulerRpc().tables_changed(timestamp, tables)
-
-    @classmethod
-    def wait_table_change(cls, last_timestamp, tables_list, timeout):
-        # This can be a long time so we don't want to hang onto any database connection
-        db.connection.close()
-
-        return JobSchedulerRpc().wait_table_change(last_timestamp,
-                                                   tables_list,
-                                                   timeout,
-                                                   rpc_timeout=timeout + 5)
-
     @classmethod
     def update_lnet_configuration(cls, lnet_configuration_list):
         return JobSchedulerRpc().update_lnet_configuration(lnet_configuration_list)
@@ -219,6 +203,28 @@ class JobSchedulerClient(object):
 
         return ManagedHost.objects.get(pk = host_id), Command.objects.get(pk = command_id)
 
+    @classmethod
+    def create_hosts(cls, hosts, server_profile_id):
+        """
+        Create many hosts with a single call to the job scheduler
+
+        :param hosts: List of dicts of the fqdn, nodename and address (defaulting to the fqdn, as
+         for create_host) of each host
+        :return: List of (<ManagedHost instance>, <Command instance>) of each host, or (None, <error message>)
+         for a host which could not be created
+        """
+        hosts = [{'fqdn': host['fqdn'],
+                  'nodename': host['nodename'],
+                  'address': host['address'] if host.get('address') is not None else host['fqdn']} for host in hosts]
+
+        results = JobSchedulerRpc().create_hosts(hosts, server_profile_id)
+
+        created = [result for result in results if 'error' not in result]
+        host_objects = ManagedHost.objects.in_bulk([result['host_id'] for result in created])
+        commands = Command.objects.in_bulk([result['command_id'] for result in created])
+        return [(None, result['error']) if 'error' in result else
+                (host_objects[result['host_id']], commands[result['command_id']]) for result in results]
+
     @classmethod
     def set_host_profile(cls, host_id, server_profile_id):
         '''
@@ -20,6 +20,7 @@ from chroma_core.models import ManagedTargetMount
 from iml_common.lib.date_time import IMLDateTime
 import chroma_core.models.package
 from chroma_core.services.stats import StatsQueue
+from chroma_core.lib.metrics import TargetMetricStore
 
 
 log = log_register(__name__)
@@ -269,6 +270,9 @@ class UpdateScan(object):
         self.jobid_var = raw_metrics.get('lustre', {}).get('jobid_var', 'disable')
         samples = []
 
+        # Before serializing, so that the series of the jobs in this update are got again if expired
+        TargetMetricStore.expire_jobs()
+
         try:
             node_metrics = raw_metrics['node']
             try:
@@ -0,0 +1,52 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import threading
+from chroma_core.services import ChromaService, ServiceThread
+
+
+class Service(ChromaService):
+    """
+    Collects the table changes of every process and broadcasts them to those which long poll
+    (see NotificationHub), so that the job scheduler does not have to.
+    """
+    def __init__(self):
+        super(Service, self).__init__()
+        self._children_started = threading.Event()
+        self._complete = threading.Event()
+
+    def run(self):
+        from chroma_core.services.notification_hub.hub import NotificationHub, NotificationHubRpc
+
+        super(Service, self).run()
+
+        hub = NotificationHub()
+
+        self._hub_thread = ServiceThread(hub)
+        self._rpc_thread = ServiceThread(NotificationHubRpc(hub))
+
+        self._hub_thread.start()
+        self._rpc_thread.start()
+
+        self._children_started.set()
+        self._complete.wait()
+
+    def stop(self):
+        super(Service, self).stop()
+
+        # Guard against trying to stop after child threads are created, but before they are started.
+        self._children_started.wait()
+
+        self.log.info("Stopping...")
+        self._rpc_thread.stop()
+        self._hub_thread.stop()
+
+        self.log.info("Joining...")
+        self._rpc_thread.join()
+        self._hub_thread.join()
+
+        self.log.info("Complete.")
+
+        self._complete.set()
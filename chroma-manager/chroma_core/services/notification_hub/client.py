@@ -0,0 +1,140 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import os
+import socket
+import threading
+import time
+
+import kombu.messaging
+
+from chroma_core.lib.long_polling import long_polling
+from chroma_core.services import _amqp_connection, _amqp_exchange, log_register
+from chroma_core.services.notification_hub.hub import TableChangesQueue, NotificationHubRpc, TABLE_CHANGES_ROUTING_KEY
+
+
+log = log_register(__name__)
+
+
+class TableChangeListener(threading.Thread):
+    """
+    Keeps the long polling state of this process (see long_polling) a copy of that of the notification
+    hub, from the table changes it broadcasts, so that long polls and table timestamps are answered here.
+
+    On (re)connecting the timestamps are caught up with those of the hub, as any changes broadcast while
+    not connected are missed.
+    """
+    RECONNECT_INTERVAL = 10
+    CONNECT_TIMEOUT = 10
+
+    def __init__(self):
+        super(TableChangeListener, self).__init__()
+        self.daemon = True
+        self.connected = threading.Event()
+        self.received = 0
+        self._routing_key = "%s_%s_%s" % (TABLE_CHANGES_ROUTING_KEY, os.uname()[1], os.getpid())
+
+    def _receive(self, body, message):
+        self.received += 1
+        try:
+            with long_polling.operation_lock:
+                # The tables of a broadcast share the timestamp of the hub, so are recorded together to keep it
+                changes = {}
+                for table, (timestamp, ids) in body['changes'].items():
+                    # Already caught up with when connecting
+                    if timestamp > long_polling.timestamps[table]:
+                        changes.setdefault(timestamp, {})[table] = ids
+
+                for timestamp, changed_ids in sorted(changes.items()):
+                    long_polling.tables_changed(timestamp, changed_ids.keys(), changed_ids)
+        except (KeyError, TypeError, ValueError), e:
+            log.warning("Malformed table changes %s: %s" % (body, e))
+        finally:
+            message.ack()
+
+    def run(self):
+        while True:
+            try:
+                with _amqp_connection() as connection:
+                    with connection.Consumer(
+                        queues = [kombu.messaging.Queue(self._routing_key,
+                                                        _amqp_exchange(),
+                                                        routing_key = TABLE_CHANGES_ROUTING_KEY,
+                                                        auto_delete = True,
+                                                        durable = False)],
+                            callbacks = [self._receive]):
+
+                        long_polling.catch_up(NotificationHubRpc().table_timestamps())
+                        self.connected.set()
+
+                        while True:
+                            try:
+                                connection.drain_events(timeout = 1)
+                            except socket.timeout:
+                                pass
+            except Exception, e:
+                log.error("Lost table changes from the notification hub: %s" % e)
+
+            self.connected.clear()
+            time.sleep(self.RECONNECT_INTERVAL)
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def listening():
+    """Whether this process receives table changes from the notification hub"""
+    return _listener is not None
+
+
+def start_listening(timeout = TableChangeListener.CONNECT_TIMEOUT):
+    """
+    Start receiving table changes from the notification hub, if not already, and return the listener,
+    having waited up to timeout seconds for it to connect when starting it.
+
+    Started on first use rather than on import, as processes such as the API patch threading after importing.
+    """
+    global _listener
+
+    with _listener_lock:
+        if _listener is not None:
+            return _listener
+
+        _listener = TableChangeListener()
+        _listener.start()
+
+    _listener.connected.wait(timeout)
+    return _listener
+
+
+class NotificationHubClient(object):
+    # How long the first request waits for the listener to connect, as it holds up the response
+    FIRST_CONNECT_TIMEOUT = 1
+
+    @classmethod
+    def _connected(cls):
+        if not start_listening(cls.FIRST_CONNECT_TIMEOUT).connected.is_set():
+            raise RuntimeError("Not connected to the notification hub")
+
+    @classmethod
+    def tables_changed(cls, timestamp, changed_ids):
+        """
+        :param changed_ids: dict of table name to list of the primary keys of the rows which changed,
+                            or None where these are not known.
+        """
+        TableChangesQueue().put({'timestamp': timestamp, 'changed_ids': changed_ids})
+
+    @classmethod
+    def wait_table_change(cls, last_timestamp, tables_list, timeout, changed_ids = False):
+        cls._connected()
+
+        return long_polling.wait_table_change(last_timestamp, tables_list, timeout, changed_ids)
+
+    @classmethod
+    def table_timestamps(cls, tables_list):
+        cls._connected()
+
+        return long_polling.table_timestamps(tables_list)
@@ -0,0 +1,77 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+from kombu.common import maybe_declare
+from kombu.messaging import Producer
+
+from chroma_core.lib.long_polling import long_polling
+from chroma_core.services import _amqp_connection, _amqp_exchange, log_register
+from chroma_core.services.queue import ServiceQueue
+from chroma_core.services.rpc import ServiceRpcInterface
+
+
+log = log_register(__name__)
+
+# Routing key on which the hub broadcasts the table changes it records to every listening process
+TABLE_CHANGES_ROUTING_KEY = "notification_hub.table_changes"
+
+
+class TableChangesQueue(ServiceQueue):
+    """
+    Table changes committed by any process, as {'timestamp': <microseconds>,
+    'changed_ids': {<table name>: <list of primary keys, or None if not known>}}
+    """
+    name = 'table_changes'
+
+
+class NotificationHub(object):
+    """
+    Records the table changes of all processes for long polling, in place of the job scheduler.
+
+    A single dispatcher takes the changes waiting in the TableChangesQueue as a batch, records
+    them together (see long_polling.tables_changed) and broadcasts the result in one message, from
+    which each listening process (see TableChangeListener) keeps its own copy of the timestamps and
+    changes of long polling.  Long polls are then answered by the process which receives them, without
+    a message to or thread in any other.
+    """
+    def __init__(self):
+        self._queue = TableChangesQueue()
+
+    def run(self):
+        self._queue.serve_batches(callback = self.dispatch)
+
+    def stop(self):
+        self._queue.stop()
+
+    def dispatch(self, messages):
+        timestamp = 0
+        changed_ids = {}
+        for message in messages:
+            timestamp = max(timestamp, message['timestamp'])
+            for table, ids in message['changed_ids'].items():
+                long_polling.add_changed_ids(changed_ids, table, ids)
+
+        changed_ids = dict((table, None if ids is None else sorted(ids)) for table, ids in changed_ids.items())
+
+        with long_polling.operation_lock:
+            long_polling.tables_changed(timestamp, changed_ids.keys(), changed_ids)
+            changes = dict((table, [long_polling.timestamps[table], ids]) for table, ids in changed_ids.items())
+
+        log.debug("Broadcasting %s changes to %s" % (len(messages), changes.keys()))
+
+        with _amqp_connection() as connection:
+            with Producer(connection) as producer:
+                maybe_declare(_amqp_exchange(), producer.channel)
+                producer.publish({'changes': changes}, serializer = "json",
+                                 routing_key = TABLE_CHANGES_ROUTING_KEY, delivery_mode = 1)
+
+    def table_timestamps(self):
+        """The timestamps of all the tables which have changed, from which a process starts listening"""
+        with long_polling.operation_lock:
+            return dict(long_polling.timestamps)
+
+
+class NotificationHubRpc(ServiceRpcInterface):
+    methods = ['table_timestamps']
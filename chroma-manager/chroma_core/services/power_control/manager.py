@@ -4,7 +4,10 @@
 
 
 from collections import defaultdict
+import subprocess
+import tempfile
 import threading
+import time
 from Queue import Queue
 
 from django.db import transaction
@@ -16,6 +19,12 @@ from chroma_core.models import PowerControlDevice, PowerControlDeviceOutlet
 
 log = log_register(__name__.split('.')[-1])
 
+# Time, in seconds, that a device has to answer all of its monitor commands
+MONITOR_TIMEOUT = 20
+
+# Maximum number of monitor commands to run at once for a single device
+MAX_CONCURRENT_PROBES = 16
+
 
 class PowerControlManager(CommandLine):
     def __init__(self):
@@ -52,6 +61,12 @@ class PowerControlManager(CommandLine):
         with self._lock:
             self.monitor_task_queue[sockaddr].put(task)
 
+    def prune_monitor_tasks(self, sockaddr):
+        """Forget the task queue of a device which has been unregistered, once it is empty."""
+        with self._lock:
+            if sockaddr not in self._power_devices and self.monitor_task_queue[sockaddr].empty():
+                del self.monitor_task_queue[sockaddr]
+
     def register_device(self, device_id):
         device = PowerControlDevice.objects.get(pk = device_id)
         sockaddr = device.sockaddr
@@ -106,22 +121,64 @@ class PowerControlManager(CommandLine):
 
         raise RuntimeError("Attempt to re-register unregistered device: %s" % device_id)
 
+    def probe(self, cmdlines, timeout = MONITOR_TIMEOUT):
+        """
+        Run cmdlines concurrently, at most MAX_CONCURRENT_PROBES at a time, and return a list of
+        (rc, stdout, stderr) for each, or None for those which had not finished within timeout
+        seconds of starting (these are killed).
+        """
+        deadline = time.time() + timeout
+        results = [None] * len(cmdlines)
+        waiting = list(enumerate(cmdlines))
+        running = {}
+
+        try:
+            while waiting or running:
+                while waiting and len(running) < MAX_CONCURRENT_PROBES:
+                    index, cmdline = waiting.pop(0)
+                    # Output to files rather than pipes, so that a command can't block on a full pipe while we poll it
+                    stdout, stderr = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+                    running[index] = (subprocess.Popen(cmdline, stdout = stdout, stderr = stderr), stdout, stderr)
+
+                for index, (process, stdout, stderr) in running.items():
+                    if process.poll() is not None:
+                        stdout.seek(0)
+                        stderr.seek(0)
+                        results[index] = (process.returncode, stdout.read(), stderr.read())
+                        del running[index]
+
+                if time.time() > deadline:
+                    break
+                elif running:
+                    time.sleep(0.05)
+        finally:
+            for process, stdout, stderr in running.values():
+                process.kill()
+                process.wait()
+
+        return results
+
     def check_bmc_availability(self, device):
         if not device.is_ipmi:
             raise RuntimeError("Can't check BMC status on non-IPMI device: %s" % device)
 
-        if not device.all_outlets_known:
+        outlets = list(device.outlets.all())
+
+        if not all(outlet.has_power in [True, False] for outlet in outlets):
             log.info("Scheduling query on %s:%s to resolve unknown outlet states." % device.sockaddr)
             self.add_monitor_task(device.sockaddr, ('query_device_outlets', {'device_id': device.id}))
 
         with self._device_locks[device.sockaddr]:
             bmc_states = {}
-            for outlet in device.outlets.all():
-                rc, out, err = self.shell(device.monitor_command(outlet.identifier))
-                if rc == 0:
+            results = self.probe([device.monitor_command(outlet.identifier) for outlet in outlets])
+            for outlet, result in zip(outlets, results):
+                if result is None:
+                    log.error("BMC %s did not respond to monitor within %ss" % (outlet.identifier, MONITOR_TIMEOUT))
+                    bmc_states[outlet] = False
+                elif result[0] == 0:
                     bmc_states[outlet] = True
                 else:
-                    log.error("BMC %s did not respond to monitor: %s %s" % (outlet.identifier, out, err))
+                    log.error("BMC %s did not respond to monitor: %s %s" % (outlet.identifier, result[1], result[2]))
                     bmc_states[outlet] = False
 
             return bmc_states
@@ -135,10 +192,13 @@ class PowerControlManager(CommandLine):
             self.add_monitor_task(device.sockaddr, ('query_device_outlets', {'device_id': device.id}))
 
         with self._device_locks[device.sockaddr]:
-            try:
-                self.try_shell(device.monitor_command())
-            except CommandError, e:
-                log.error("Device %s did not respond to monitor: %s" % (device, e))
+            cmdline = device.monitor_command()
+            result = self.probe([cmdline])[0]
+            if result is None:
+                log.error("Device %s did not respond to monitor within %ss" % (device, MONITOR_TIMEOUT))
+                return False
+            elif result[0] != 0:
+                log.error("Device %s did not respond to monitor: %s" % (device, CommandError(cmdline, *result)))
                 return False
             return True
 
@@ -5,6 +5,7 @@
 
 import traceback
 import threading
+import time
 import Queue
 
 from chroma_core.services.log import log_register
@@ -17,143 +18,191 @@ log = log_register(__name__.split('.')[-1])
 # time, in seconds, between PDU monitor operations
 MONITORING_INTERVAL = 30
 
+# number of threads which monitor and run tasks for all of the power devices
+MONITOR_WORKERS = 8
 
-class PowerDeviceMonitor(threading.Thread):
+
+class MonitorSweep(object):
     """
-    Instances of this class do double-duty: Their primary mission in life is
-    to watch an assigned PDU and raise Alerts if the PDU becomes unmonitorable.
-    As a secondary duty, they handle asynchronous tasks for the manager:
-    slowish, fiddly things like querying a PDU's outlet states, etc.
+    The checks of one monitoring interval over a set of devices.  Each device is
+    checked on its own (see PowerControlManager.check_*_availability), and its
+    alerts are raised or cleared as soon as its check is done, so a slow device
+    does not hold back the alerts of the others.
     """
-    def __init__(self, device, power_control_manager):
-        super(PowerDeviceMonitor, self).__init__()
-        self.device = device
-        self._manager = power_control_manager
-        self._stopping = threading.Event()
-        self._interval_ctr = 0
+    def __init__(self, devices):
+        self._lock = threading.Lock()
+        self._pending = len(devices)
+        self.complete = threading.Event()
+
+        if not devices:
+            self.complete.set()
+
+    def check(self, manager, device):
+        try:
+            try:
+                if device.is_ipmi:
+                    # Check to see if we can log into each BMC and that they're
+                    # responsive to commands.
+                    result = manager.check_bmc_availability(device)
+                else:
+                    # Check to see if we can log into the PDU and that it's
+                    # responsive to commands.
+                    result = manager.check_device_availability(device)
+                    log.debug("Checked on %s:%s: %s" % (device.sockaddr + tuple(["available" if result else "unavailable"])))
+            except Exception:
+                log.error("Failed to check %s: %s" % (device, traceback.format_exc()))
+            else:
+                self.notify(device, result)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                if self._pending == 0:
+                    self.complete.set()
+
+    def notify(self, device, result):
+        # The device may have been deleted while it was being checked
+        not_deleted = PowerControlDevice.objects.filter(id = device.id, not_deleted = True).exists()
+
+        if device.is_ipmi:
+            if not_deleted:
+                IpmiBmcUnavailableAlert.notify_many([(bmc, not available) for bmc, available in result.items()])
+        elif result or not_deleted:
+            PowerControlDeviceUnavailableAlert.notify_many([(device, not result)])
+
+
+class PowerMonitorWorker(threading.Thread):
+    """
+    Runs the work which the PowerMonitorDaemon schedules, for whichever device it is.
+    """
+    def __init__(self, daemon):
+        super(PowerMonitorWorker, self).__init__()
+        self._daemon = daemon
 
     def run(self):
         try:
-            self._run()
+            while not self._daemon.stopping.is_set():
+                try:
+                    sockaddr, fn, args = self._daemon.work.get(timeout = 1)
+                except Queue.Empty:
+                    continue
+
+                try:
+                    fn(*args)
+                except Exception:
+                    log.error("Failed to run %s for %s:%s: %s" % ((fn.__name__,) + sockaddr + (traceback.format_exc(),)))
+                finally:
+                    self._daemon.done(sockaddr)
         finally:
             # Make sure we always clean up.
-            # HYD-1918: Refactor this kludgy mess so that these threads don't
-            # get DB access and therefore don't need to clean up.
             import django.db
             if django.db.connection.connection:
                 django.db.connection.close()
 
-    def _run_manager_tasks(self):
-        try:
-            task, kwargs = self._manager.get_monitor_tasks(self.device.sockaddr).get_nowait()
-            log.debug("Found task for %s:%s: %s" % (self.device.sockaddr + tuple([task])))
-            if task == "stop":
-                self.stop()
-            else:
-                getattr(self._manager, task)(**kwargs)
-            log.debug("Ran %s for %s:%s" % (tuple([task]) + self.device.sockaddr))
-        except Queue.Empty:
-            pass
-        except PowerControlDevice.DoesNotExist:
-            log.error("Attempted to run %s on %s, but it no longer exists" % (task, self.device))
-            self.stop()
-        except Exception, e:
-            log.error("Caught and re-raising exception: %s" % traceback.format_exc())
-            raise e
-
-    def _check_monitored_device(self):
-        if DISABLE_POWER_CONTROL_DEVICE_MONITORING:
-            return
-
-        if self.device.is_ipmi:
-            # Check to see if we can log into each BMC and that they're
-            # responsive to commands.
-            bmc_states = self._manager.check_bmc_availability(self.device)
-            for bmc in bmc_states:
-                if PowerControlDevice.objects.filter(id=self.device.id, not_deleted=True).exists():
-                    IpmiBmcUnavailableAlert.notify(bmc, not bmc_states[bmc])
-        else:
-            # Check to see if we can log into the PDU and that it's
-            # responsive to commands.
-            available = self._manager.check_device_availability(self.device)
-            if available or PowerControlDevice.objects.filter(id=self.device.id, not_deleted=True).exists():
-                PowerControlDeviceUnavailableAlert.notify(self.device, not available)
-            log.debug("Checked on %s:%s: %s" % (self.device.sockaddr + tuple(["available" if available else "unavailable"])))
-
-    def _run(self):
-        log.info("Starting monitor for %s" % self.device)
-
-        while not self._stopping.is_set():
-            # Check to see if the manager has scheduled something for
-            # us to do besides monitoring.
-            self._run_manager_tasks()
 
-            if self._interval_ctr >= MONITORING_INTERVAL:
-                self._interval_ctr = 0
-                self._check_monitored_device()
+class PowerMonitorDaemon(object):
+    """
+    Watches every power device, raising Alerts if a PDU or BMC becomes
+    unmonitorable, and as a secondary duty runs the asynchronous tasks the
+    manager schedules for devices: slowish, fiddly things like querying a
+    PDU's outlet states, etc.
+
+    A single scheduler (run) hands this work to a fixed set of MONITOR_WORKERS
+    threads, so the threads and database connections used do not grow with the
+    number of devices.  Work for a device is never run concurrently with other
+    work for that device.
+    """
+    def __init__(self, power_control_manager, workers = MONITOR_WORKERS):
+        self._manager = power_control_manager
+        self.stopping = threading.Event()
 
-            self._interval_ctr += 1
-            self._stopping.wait(timeout = 1)
+        self.work = Queue.Queue()
+        self._busy_lock = threading.Lock()
+        self._busy = set()
 
-    def stop(self):
-        log.info("Stopping monitor for %s" % self.device)
-        self._stopping.set()
+        self.workers = [PowerMonitorWorker(self) for _ in range(workers)]
 
+        log.info("Found %d power devices to monitor" % len(self._manager.power_devices))
 
-class PowerMonitorDaemon(object):
-    def __init__(self, power_control_manager):
-        self._manager = power_control_manager
-        self._stopping = threading.Event()
+    def _submit(self, sockaddr, fn, *args):
+        with self._busy_lock:
+            self._busy.add(sockaddr)
+        self.work.put((sockaddr, fn, args))
+
+    def busy(self, sockaddr):
+        with self._busy_lock:
+            return sockaddr in self._busy
 
-        self.device_monitors = {}
+    def done(self, sockaddr):
+        with self._busy_lock:
+            self._busy.discard(sockaddr)
 
-        for sockaddr, device in self._manager.power_devices.items():
-            self.device_monitors[sockaddr] = PowerDeviceMonitor(device,
-                                                                self._manager)
+    def _run_manager_tasks(self):
+        # Unregistered devices too, for the tasks scheduled when they were removed
+        for sockaddr in set(self._manager.power_devices.keys()) | set(self._manager.monitor_task_queue.keys()):
+            if self.busy(sockaddr):
+                continue
+
+            try:
+                task, kwargs = self._manager.get_monitor_tasks(sockaddr).get_nowait()
+            except Queue.Empty:
+                self._manager.prune_monitor_tasks(sockaddr)
+                continue
+
+            log.debug("Found task for %s:%s: %s" % (sockaddr + tuple([task])))
+            if task == "stop":
+                # Nothing runs for a device between tasks, so there is nothing to stop
+                continue
 
-        log.info("Found %d power devices to monitor" % len(self.device_monitors))
+            self._submit(sockaddr, self._run_manager_task, sockaddr, task, kwargs)
+
+    def _run_manager_task(self, sockaddr, task, kwargs):
+        try:
+            getattr(self._manager, task)(**kwargs)
+            log.debug("Ran %s for %s:%s" % (tuple([task]) + sockaddr))
+        except PowerControlDevice.DoesNotExist:
+            log.error("Attempted to run %s on %s:%s, but it no longer exists" % (tuple([task]) + sockaddr))
+
+    def sweep(self):
+        """Start checking every device, returning the MonitorSweep"""
+        # A device still busy from the last interval is checked in the next one
+        devices = [device for sockaddr, device in self._manager.power_devices.items() if not self.busy(sockaddr)]
+        log.debug("Checking %d power devices" % len(devices))
+
+        sweep = MonitorSweep(devices)
+        for device in devices:
+            self._submit(device.sockaddr, sweep.check, self._manager, device)
+
+        return sweep
 
     def run(self):
         log.info("entering main loop")
 
-        for monitor in self.device_monitors.values():
-            monitor.start()
-
-        while not self._stopping.is_set():
-            # Check for new devices to monitor, or dead threads. A thread
-            # may suicide if the manager has enqueued a 'stop' task.
-            for sockaddr, device in self._manager.power_devices.items():
-                if (sockaddr in self.device_monitors
-                        and not self.device_monitors[sockaddr].is_alive()):
-                    log.warn("Monitor for %s:%s died, restarting" % sockaddr)
-                elif not sockaddr in self.device_monitors:
-                    log.info("Found new power device: %s:%s" % sockaddr)
-                else:
-                    continue
-                monitor = PowerDeviceMonitor(device, self._manager)
-                self.device_monitors[sockaddr] = monitor
-                monitor.start()
+        for worker in self.workers:
+            worker.start()
+
+        last_sweep = time.time()
+        while not self.stopping.is_set():
+            # Check to see if the manager has scheduled something for
+            # us to do besides monitoring.
+            self._run_manager_tasks()
 
-            # Check for old devices to stop monitoring
-            for sockaddr, monitor in self.device_monitors.items():
-                if sockaddr not in self._manager.power_devices:
-                    log.info("Reaping monitor for old power device: %s:%s" % sockaddr)
-                    monitor.stop()
-                    monitor.join()
-                    del self.device_monitors[sockaddr]
+            if time.time() - last_sweep >= MONITORING_INTERVAL:
+                last_sweep = time.time()
+                if not DISABLE_POWER_CONTROL_DEVICE_MONITORING:
+                    self.sweep()
 
-            self._stopping.wait(timeout = 1)
+            self.stopping.wait(timeout = 1)
 
-        for monitor in self.device_monitors.values():
-            monitor.stop()
+        self.join()
 
         log.info("leaving main loop")
 
     def stop(self):
         log.info("Stopping...")
-        self._stopping.set()
+        self.stopping.set()
 
     def join(self):
         log.info("Joining...")
-        for monitor in self.device_monitors.values():
-            monitor.join()
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.join()
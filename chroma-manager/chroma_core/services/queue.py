@@ -8,6 +8,7 @@ around an AMQP queue."""
 
 
 import threading
+import traceback
 
 from chroma_core.services import _amqp_connection
 from chroma_core.services.log import log_register
@@ -71,6 +72,43 @@ class ServiceQueue(object):
                 except QueueEmpty:
                     pass
 
+    def serve_batches(self, callback, max_batch_size = 1000):
+        """As serve, but calling back with a list of all the messages which are waiting (at least
+        one, at most max_batch_size) rather than with each one, so that a receiver which falls
+        behind catches up in fewer, larger steps.
+
+        Should the callback fail for a batch, it is called again for each of its messages in turn."""
+        from Queue import Empty as QueueEmpty
+        with _amqp_connection() as conn:
+            q = conn.SimpleQueue(self.name, serializer = 'json',
+                                 exchange_opts={'durable': False}, queue_opts={'durable': False})
+            while not self._stopping.is_set():
+                try:
+                    messages = [q.get(timeout = 1)]
+                except QueueEmpty:
+                    continue
+
+                while len(messages) < max_batch_size:
+                    try:
+                        messages.append(q.get_nowait())
+                    except QueueEmpty:
+                        break
+
+                try:
+                    callback([message.decode() for message in messages])
+                except Exception:
+                    # Retry the messages one by one, so that only those which can't be handled are lost
+                    log.error("Error handling %s messages from '%s', retrying each: %s" % (len(messages), self.name, traceback.format_exc()))
+                    for message in messages:
+                        try:
+                            callback([message.decode()])
+                        except Exception:
+                            log.error("Dropping message from '%s': %s" % (self.name, traceback.format_exc()))
+
+                # Acknowledged only once handled, so that those of a receiver which dies meanwhile are redelivered
+                for message in messages:
+                    message.ack()
+
 
 class AgentRxQueue(ServiceQueue):
     def __route_message(self, message):
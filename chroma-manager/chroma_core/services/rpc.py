@@ -106,7 +106,7 @@ class RunOneRpc(threading.Thread):
 
     def run(self):
         # We do not throttle rpcs that do not hit the database.
-        rpc_throttle = self.body['method'] not in ['wait_table_change']
+        rpc_throttle = self.body['method'] not in ['wait_table_change', 'table_timestamps']
 
         try:
             if rpc_throttle:
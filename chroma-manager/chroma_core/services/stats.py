@@ -4,9 +4,10 @@
 
 
 import traceback
+from datetime import timedelta
 from django import db
-from django.utils import dateparse
 from chroma_core.models import Stats
+from chroma_core.models.stats import epoch, timestamp
 from chroma_core.services import ChromaService, log_register, queue
 
 
@@ -14,31 +15,66 @@ log = log_register(__name__)
 
 
 class StatsQueue(queue.ServiceQueue):
+    """Samples are sent with their times as integer microseconds since the epoch,
+    which are smaller than datetime strings and much quicker to parse."""
     name = 'stats'
 
+    @staticmethod
+    def encode(dt):
+        return timestamp(dt) * 1000000 + dt.microsecond
+
+    @staticmethod
+    def decode(us):
+        return epoch + timedelta(microseconds=us)
+
     def put(self, samples):
-        queue.ServiceQueue.put(self, [(id, str(dt), value) for id, dt, value in samples])
+        queue.ServiceQueue.put(self, [(id, self.encode(dt), value) for id, dt, value in samples])
 
 
 class Service(ChromaService):
     def run(self):
         super(Service, self).run()
 
+        from chroma_core.lib.metrics import FilesystemAggregates
+        self.aggregates = FilesystemAggregates()
         self.queue = StatsQueue()
         self.queue.purge()
-        self.queue.serve(callback=self.insert)
+        self.queue.serve_batches(callback=self.insert_batch)
+
+    def insert_batch(self, messages):
+        "Insert the samples of all the waiting messages at once, or should that fail, one by one."
+        samples = [sample for samples in messages for sample in samples]
+        if not self.insert(samples) and len(samples) > 1:
+            # so that only the samples which can't be inserted are lost
+            for sample in samples:
+                self.insert([sample])
 
     def insert(self, samples):
+        "Insert samples, then the filesystem aggregates they update, returning whether the samples were inserted."
         try:
-            outdated = Stats.insert((id, dateparse.parse_datetime(dt), value) for id, dt, value in samples)
+            samples = [(id, StatsQueue.decode(us), value) for id, us, value in samples]
+            outdated = Stats.insert(samples)
         except db.IntegrityError:
-            log.error("Duplicate stats insert: " + db.connection.queries[-1]['sql'])
+            log.error("Duplicate stats insert: " + traceback.format_exc())
             db.transaction.rollback()  # allow future stats to still work
+            return False
         except:
             log.error("Error handling stats insert: " + traceback.format_exc())
-        else:
-            if outdated:
-                log.warn("Outdated samples ignored: {0}".format(outdated))
+            db.transaction.rollback()
+            return False
+
+        if outdated:
+            log.warn("Outdated samples ignored: {0}".format(outdated))
+
+        # Only once the samples are in, as updating the aggregates records them as counted,
+        # and samples retried one by one after their batch failed must be counted then
+        try:
+            Stats.insert(self.aggregates.update(samples))
+        except:
+            log.error("Error handling aggregate stats insert: " + traceback.format_exc())
+            db.transaction.rollback()
+
+        return True
 
     def stop(self):
         super(Service, self).stop()
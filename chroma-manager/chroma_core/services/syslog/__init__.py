@@ -3,23 +3,52 @@
 # license that can be found in the LICENSE file.
 
 
-import os
-import dse
+import json
+import threading
+from datetime import timedelta
 
+import django.db
 from django.db import transaction
 
 from chroma_core.services.syslog.parser import LogMessageParser
+from chroma_core.services.syslog.partitions import LogMessagePartitions
 from chroma_core.models.log import LogMessage
-from chroma_core.services import ChromaService, log_register
+from chroma_core.services import ChromaService, ServiceThread, log_register
 from chroma_core.services.queue import AgentRxQueue
 from iml_common.lib.date_time import IMLDateTime
 
-import settings
-
 
 log = log_register('systemd_journal')
 
 
+class LogExpiry(object):
+    """
+    Applies the retention policy to stored log messages every EXPIRE_INTERVAL, apart
+    from the thread which stores them so that archiving doesn't hold up ingest.
+    """
+    EXPIRE_INTERVAL = timedelta(minutes=10)
+
+    def __init__(self):
+        self.stopping = threading.Event()
+        self._partitions = LogMessagePartitions()
+
+    def run(self):
+        try:
+            while not self.stopping.is_set():
+                try:
+                    self._partitions.expire()
+                except Exception, e:
+                    log.error("Error expiring log messages: %s" % e)
+
+                self.stopping.wait(self.EXPIRE_INTERVAL.total_seconds())
+        finally:
+            if django.db.connection.connection:
+                django.db.connection.close()
+
+    def stop(self):
+        self.stopping.set()
+
+
 class Service(ChromaService):
     PLUGIN_NAME = 'systemd_journal'
 
@@ -27,71 +56,53 @@ class Service(ChromaService):
         super(Service, self).__init__()
         self._queue = AgentRxQueue(Service.PLUGIN_NAME)
         self._queue.purge()
-        self._table_size = LogMessage.objects.count()
+        self._partitions = LogMessagePartitions()
         self._parser = LogMessageParser()
-
-        dse.patch_models()
-
-    def _check_size(self):
-        """Apply a size limit to the table of log messages"""
-        MAX_ROWS_PER_TRANSACTION = 10000
-        removed_num_entries = 0
-        overflow_filename = os.path.join(settings.LOG_PATH, "db_log")
-
-        if self._table_size > settings.DBLOG_HW:
-            remove_num_entries = self._table_size - settings.DBLOG_LW
-
-            trans_size = min(MAX_ROWS_PER_TRANSACTION, remove_num_entries)
-            with transaction.commit_on_success():
-                while remove_num_entries > 0:
-                    removed_entries = LogMessage.objects.all().order_by('id')[0:trans_size]
-                    self.log.debug("writing %s batch of entries" % trans_size)
-                    try:
-                        f = open(overflow_filename, "a")
-                        for line in removed_entries:
-                            f.write("%s\n" % line.__str__())
-                        LogMessage.objects.filter(id__lte = removed_entries[-1].id).delete()
-                    except Exception, e:
-                        self.log.error("error opening/writing/closing the db_log: %s" % e)
-                    finally:
-                        f.close()
-
-                    remove_num_entries -= trans_size
-                    removed_num_entries += trans_size
-                    if remove_num_entries < trans_size:
-                        trans_size = remove_num_entries
-
-        self._table_size -= removed_num_entries
-        self.log.info("Wrote %s DB log entries to %s" % (removed_num_entries, overflow_filename))
-
-        return removed_num_entries
+        self._expiry = LogExpiry()
+        self._expiry_thread = ServiceThread(self._expiry)
+
+    def _log_message(self, fqdn, msg):
+        substitutions = LogMessage.find_substitutions(msg['message'])
+        return dict(
+            fqdn = fqdn,
+            message = msg['message'],
+            severity = msg['severity'],
+            facility = msg['facility'],
+            tag = msg['source'],
+            datetime = IMLDateTime.parse(msg['datetime']).as_datetime,
+            message_class = LogMessage.get_message_class(msg['message']),
+            substitutions = json.dumps(substitutions),
+            substitution_keys = " ".join(set(key for kind, key, start, end in substitutions)) or None
+        )
 
     def on_data(self, fqdn, body):
-        with transaction.commit_on_success():
-            with LogMessage.delayed as log_messages:
-                for msg in body['log_lines']:
-                    try:
-                        log_messages.insert(dict(
-                            fqdn = fqdn,
-                            message = msg['message'],
-                            severity = msg['severity'],
-                            facility = msg['facility'],
-                            tag = msg['source'],
-                            datetime = IMLDateTime.parse(msg['datetime']).as_datetime,
-                            message_class = LogMessage.get_message_class(msg['message'])
-                        ))
-                        self._table_size += 1
-
-                        self._parser.parse(fqdn, msg)
-                    except Exception, e:
-                        self.log.error("Error %s ingesting systemd-journal entry: %s" % (e, msg))
+        log_messages = []
+        for msg in body['log_lines']:
+            try:
+                log_messages.append(self._log_message(fqdn, msg))
+            except Exception, e:
+                self.log.error("Error %s ingesting systemd-journal entry: %s" % (e, msg))
+
+        # The messages and any events raised from them are stored in one transaction per batch
+        try:
+            with transaction.commit_on_success():
+                self._partitions.insert(log_messages)
+                self._parser.parse_batch(fqdn, body['log_lines'])
+        except Exception:
+            # Any partition created for the batch was rolled back with it
+            self._partitions.reset()
+            raise
 
     def run(self):
         super(Service, self).run()
 
+        self._expiry_thread.start()
         self._queue.serve(data_callback = self.on_data)
 
     def stop(self):
         super(Service, self).stop()
 
         self._queue.stop()
+        self._expiry.stop()
+        if self._expiry_thread.is_alive():
+            self._expiry_thread.join()
@@ -5,42 +5,13 @@
 
 from chroma_core.services import log_register
 from chroma_core.models import SyslogEvent, ClientConnectEvent, ManagedHost
+from chroma_core.lib.host_resolver import host_resolver
 from django.db import transaction
 import logging
 import re
 
 syslog_events_log = log_register('syslog_events')
 
-_re_cache = {}
-
-
-def _re_find_one_in_many(haystack, needles):
-    """Find the first instance of any of 'needles' in haystack"""
-    if not isinstance(needles, tuple):
-        needles = tuple(needles)
-
-    try:
-        expr = _re_cache[needles]
-    except:
-        expr = re.compile("|".join([re.escape(n) for n in needles]))
-        _re_cache[needles] = expr
-
-    result = expr.search(haystack)
-    if result:
-        return result.group(0)
-    else:
-        return None
-
-
-def _plain_find_one_in_many(haystack, needles):
-    for n in needles:
-        if haystack.find(n) != -1:
-            return n
-
-# use the plain version for now
-# in the future, we can switch to REs or a combination
-find_one_in_many = _plain_find_one_in_many
-
 
 def _get_word_after(string, after):
     s = string.find(after) + len(after)
@@ -131,42 +102,53 @@ def client_eviction_handler(message, host):
 
 
 class LogMessageParser(object):
-    selectors = {"Can't start acceptor on port": port_used_handler,
-                 "Can't create socket:": port_used_handler,
-                 ": connection from ": client_connection_handler,
-                 ": select flavor ": server_security_flavor_handler,
-                 ": obd_export_evict_by_uuid()": admin_client_eviction_handler,
-                 ": evicting client at ": client_eviction_handler,
-                }
-
-    def __init__(self):
-        self._hosts = {}
-
-    # FIXME: need to update this cache of hosts when a host is removed
+    # In order of precedence: a message which contains more than one selector is handled by the first
+    selectors = [(": evicting client at ", client_eviction_handler),
+                 (": obd_export_evict_by_uuid()", admin_client_eviction_handler),
+                 (": select flavor ", server_security_flavor_handler),
+                 (": connection from ", client_connection_handler),
+                 ("Can't start acceptor on port", port_used_handler),
+                 ("Can't create socket:", port_used_handler)]
+    # One pattern matching any selector, so that a message is searched once rather than once per
+    # selector.  It finds the leftmost selector rather than the first, so only tells whether there are any.
+    selector_regex = re.compile("|".join([re.escape(selector) for selector, handler in selectors]))
+
     def get_host(self, fqdn):
         try:
-            return self._hosts[fqdn]
-        except KeyError:
+            return host_resolver.get_by_fqdn(fqdn)
+        except (ManagedHost.DoesNotExist, ManagedHost.MultipleObjectsReturned):
+            return None
+
+    def _handler(self, message):
+        "Return the handler of the first selector in message."
+        for selector, handler in self.selectors:
+            if selector in message:
+                return handler
+
+    def parse_batch(self, fqdn, messages):
+        """
+        Run the handler for each of a batch of messages from a host which matches a
+        selector.  Must be called within a transaction: each handler runs in a savepoint
+        of it, so one which fails does not affect the others.
+        """
+        hits = []
+        for message in messages:
+            if self.selector_regex.search(message['message']):
+                hits.append((self._handler(message['message']), message['message']))
+
+        if not hits:
+            return
+
+        h = self.get_host(fqdn)
+        if h is None:
+            return
+
+        for fn, message in hits:
+            sid = transaction.savepoint()
             try:
-                host = ManagedHost.objects.get(fqdn = fqdn)
-                self._hosts[fqdn] = host
-                return host
-            except ManagedHost.DoesNotExist:
-                return None
-
-    def parse(self, fqdn, message):
-        hit = find_one_in_many(message['message'], self.selectors.keys())
-        if hit:
-            h = self.get_host(fqdn)
-            if h is None:
-                return
-
-            fn = self.selectors[hit]
-            with transaction.commit_manually():
-                try:
-                    fn(message['message'], h)
-                except Exception, e:
-                    syslog_events_log.error("Failed to parse log line '%s' using handler %s: %s" % (message['message'], fn, e))
-                    transaction.rollback()
-                else:
-                    transaction.commit()
+                fn(message, h)
+            except Exception, e:
+                syslog_events_log.error("Failed to parse log line '%s' using handler %s: %s" % (message, fn, e))
+                transaction.savepoint_rollback(sid)
+            else:
+                transaction.savepoint_commit(sid)
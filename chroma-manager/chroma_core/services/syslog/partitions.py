@@ -0,0 +1,219 @@
+# Copyright (c) 2017 Intel Corporation. All rights reserved.
+# Use of this source code is governed by a MIT-style
+# license that can be found in the LICENSE file.
+
+
+import os
+import re
+import gzip
+import calendar
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction
+from django.utils.timezone import utc
+
+from chroma_core.models.log import LogMessage
+from chroma_core.services import log_register
+
+import settings
+
+
+log = log_register('log_partitions')
+
+
+class LogMessagePartitions(object):
+    """
+    Stores LogMessage rows in child tables of the LogMessage table, one per
+    DBLOG_PARTITION interval of message time.
+
+    Each partition has a CHECK constraint on its datetime range, so PostgreSQL's
+    constraint exclusion skips partitions outside the range of a query on the
+    LogMessage table filtered by datetime.  Retention drops whole partitions once
+    they are older than DBLOG_RETENTION, after writing each one out to a compressed
+    archive in LOG_PATH, so neither inserting nor ageing out messages gets more
+    expensive as history grows.  Archives are deleted once they are older than
+    DBLOG_ARCHIVE_RETENTION.
+
+    Rows inserted into the LogMessage table itself (rather than through this class)
+    are still visible to queries, and are aged out by a DELETE on the same schedule.
+    So are messages which are already past retention when they are inserted, rather
+    than creating partitions which are about to be dropped.
+    """
+    COLUMNS = ('datetime', 'fqdn', 'severity', 'facility', 'tag', 'message', 'message_class',
+               'substitutions', 'substitution_keys')
+    # Columns written to archives, in the format of LogMessage.__str__
+    ARCHIVE_COLUMNS = ('datetime', 'fqdn', 'severity', 'facility', 'tag', 'message')
+    # Indexes of the LogMessage table (see migration 0037) which each partition needs its own copy of
+    GIN_INDEXES = [('message_search', "to_tsvector('simple', message)"),
+                   ('substitution_keys', "string_to_array(substitution_keys, ' ')")]
+    SUFFIX_FORMAT = '%Y%m%d%H'
+    ARCHIVE_PATTERN = re.compile(r'^db_log-.+\.gz$')
+    # Messages timestamped further ahead of the time they are inserted than this are
+    # stored as of that time, rather than in a partition which would outlive retention
+    MAX_CLOCK_SKEW = timedelta(hours=1)
+
+    def __init__(self, partition_size=None, retention=None, archive_path=None, archive_retention=None):
+        self.table = LogMessage._meta.db_table
+        self.partition_size = partition_size or timedelta(**settings.DBLOG_PARTITION)
+        self.retention = retention or timedelta(**settings.DBLOG_RETENTION)
+        self.archive_retention = archive_retention or timedelta(**settings.DBLOG_ARCHIVE_RETENTION)
+        self.archive_path = archive_path if archive_path is not None else settings.LOG_PATH
+        self._partitions = None
+
+        assert self.partition_size >= timedelta(hours=1), "Partitions are named by the hour"
+
+    def _start(self, dt):
+        "Return the start of the partition which holds dt."
+        size = int(self.partition_size.total_seconds())
+        seconds = calendar.timegm(dt.utctimetuple())
+        return datetime.fromtimestamp(seconds - seconds % size, utc)
+
+    def _name(self, start):
+        return "%s_p%s" % (self.table, start.strftime(self.SUFFIX_FORMAT))
+
+    def _parse_name(self, name):
+        return datetime.strptime(name[len(self.table) + 2:], self.SUFFIX_FORMAT).replace(tzinfo=utc)
+
+    @property
+    def partitions(self):
+        "Dict of partition start datetime to table name, loaded from the database on first use."
+        if self._partitions is None:
+            cursor = connection.cursor()
+            cursor.execute("""SELECT child.relname FROM pg_inherits
+                              JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+                              JOIN pg_class AS parent ON parent.oid = pg_inherits.inhparent
+                              WHERE parent.relname = %s""", [self.table])
+            self._partitions = dict((self._parse_name(name), name) for name, in cursor.fetchall())
+        return self._partitions
+
+    def reset(self):
+        """
+        Forget the partitions, to load them from the database again on next use.  Must be
+        called when a transaction which created or dropped partitions is rolled back, as that
+        undoes the tables but not the record of them here.
+        """
+        self._partitions = None
+
+    def _create(self, start):
+        name = self._name(start)
+        end = start + self.partition_size
+        cursor = connection.cursor()
+        cursor.execute("CREATE TABLE %s (CHECK (datetime >= %%s AND datetime < %%s)) INHERITS (%s)" % (name, self.table),
+                       [start, end])
+        cursor.execute("ALTER TABLE %s ADD PRIMARY KEY (id)" % name)
+        cursor.execute("CREATE INDEX %s_datetime ON %s (datetime)" % (name, name))
+        for index, expression in self.GIN_INDEXES:
+            cursor.execute("CREATE INDEX %s_%s ON %s USING gin (%s)" % (name, index, name, expression))
+        self.partitions[start] = name
+        log.info("Created log partition %s" % name)
+        return name
+
+    def insert(self, rows, now=None):
+        """
+        Insert dicts of COLUMNS (substitutions being optional) into the partitions for
+        their datetimes, creating partitions as required.  Must be called within a transaction,
+        which if rolled back must be followed by a reset().
+        """
+        now = now or datetime.now(utc)
+        cutoff = now - self.retention
+        by_partition = {}
+        for row in rows:
+            if row['datetime'] > now + self.MAX_CLOCK_SKEW:
+                log.warning("Log message from %s dated %s is in the future, storing it as of %s" % (row['fqdn'], row['datetime'], now))
+                row = dict(row, datetime=now)
+            by_partition.setdefault(self._start(row['datetime']), []).append(row)
+
+        cursor = connection.cursor()
+        placeholders = "(%s)" % ", ".join(["%s"] * len(self.COLUMNS))
+        for start, partition_rows in by_partition.items():
+            if start + self.partition_size <= cutoff:
+                # Left for the next expire() to archive along with other unpartitioned rows
+                name = self.table
+            else:
+                name = self.partitions.get(start) or self._create(start)
+            cursor.execute("INSERT INTO %s (%s) VALUES %s" % (name, ", ".join(self.COLUMNS), ", ".join([placeholders] * len(partition_rows))),
+                           [row.get(column) for row in partition_rows for column in self.COLUMNS])
+
+    def _archive(self, suffix, source, params=()):
+        """Write rows, in order, as lines of text to a compressed archive of their own."""
+        filename = os.path.join(self.archive_path, "db_log-%s.gz" % suffix)
+
+        # A named cursor is held on the server, so only one batch of a partition
+        # at a time is held in memory here
+        cursor = connection.connection.cursor(name='log_archive')
+        try:
+            cursor.execute("SELECT %s FROM %s ORDER BY id" % (", ".join(self.ARCHIVE_COLUMNS), source), params)
+
+            archive = gzip.open(filename + ".tmp", 'wb')
+            try:
+                while True:
+                    rows = cursor.fetchmany(10000)
+                    if not rows:
+                        break
+                    archive.writelines((u"%s %s %s %s %s %s\n" % row).encode('utf-8') for row in rows)
+            finally:
+                archive.close()
+        finally:
+            cursor.close()
+        os.rename(filename + ".tmp", filename)
+        return filename
+
+    def _prune_archives(self, now):
+        """Delete archives last written before the archive retention period."""
+        cutoff = calendar.timegm((now - self.archive_retention).utctimetuple())
+        for filename in os.listdir(self.archive_path):
+            path = os.path.join(self.archive_path, filename)
+            if self.ARCHIVE_PATTERN.match(filename) and os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+                log.info("Deleted log archive %s" % path)
+
+    def expire(self, now=None):
+        """
+        Archive and drop partitions entirely older than the retention period, and
+        delete any rows stored outside a partition which are older than it.  Archives
+        older than the archive retention period are deleted.
+
+        :return: list of names of dropped partitions
+        """
+        try:
+            return self._expire(now)
+        except Exception:
+            self.reset()
+            raise
+
+    @transaction.commit_on_success
+    def _expire(self, now):
+        now = now or datetime.now(utc)
+        cutoff = now - self.retention
+        cursor = connection.cursor()
+        dropped = []
+
+        for start, name in sorted(self.partitions.items()):
+            if start + self.partition_size > cutoff:
+                break
+            try:
+                filename = self._archive(name[len(self.table) + 1:], name)
+            except (IOError, OSError), e:
+                # Keep the partition rather than lose messages which could not be archived
+                log.error("Error archiving log partition %s: %s" % (name, e))
+                break
+            cursor.execute("DROP TABLE %s" % name)
+            del self.partitions[start]
+            dropped.append(name)
+            log.info("Archived log partition %s to %s" % (name, filename))
+
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM ONLY %s WHERE datetime < %%s)" % self.table, [cutoff])
+        if cursor.fetchone()[0]:
+            try:
+                self._archive(cutoff.strftime('%Y%m%d%H%M%S'), "ONLY %s WHERE datetime < %%s" % self.table, [cutoff])
+            except (IOError, OSError), e:
+                log.error("Error archiving log messages: %s" % e)
+            else:
+                cursor.execute("DELETE FROM ONLY %s WHERE datetime < %%s" % self.table, [cutoff])
+
+        try:
+            self._prune_archives(now)
+        except (IOError, OSError), e:
+            log.error("Error deleting log archives: %s" % e)
+
+        return dropped
@@ -237,6 +237,8 @@ STATS_1_MINUTE_EXPIRATION = {'days': 3}     # Expiration must be multiple of 1 m
 STATS_5_MINUTE_EXPIRATION = {'days': 7}     # Expiration must be multiple of 5 minute.
 STATS_1_HOUR_EXPIRATION = {'days': 30}      # Expiration must be multiple of 1 hour.
 STATS_1_DAY_EXPIRATION = {'weeks': 10000}   # Expiration must be multiple of 1 day
+STATS_JOB_EXPIRATION = {'days': 1}          # Job series without samples for this long lose their 10 second samples; must not exceed STATS_10_SECOND_EXPIRATION.
+STATS_JOB_ROLLUP_EXPIRATION = {'days': 30}  # Job series without samples at any resolution for this long are deleted, with their rollups.
 STATS_FLUSH_RATE = 20                       # Flush 20 times per expiration interval - for 10 seconds sample flush every 1day/20.
 
 # When agent sends VPD 0x80 and 0x83 serial numbers, which do we prefer to use
@@ -275,12 +277,14 @@ LONG_POLL_TIMEOUT_SECONDS = (60 * 5)
 # Realtime service
 SESSION_COOKIE_HTTPONLY = False
 
-# The value at which log entries in the database will be aged out to a
-# flat text file in /var/log/chroma/db_log
-DBLOG_HW = 1200000
-# The value at which we stop aging database log entries out to a flat
-# text file
-DBLOG_LW = 1000000
+# Log entries in the database are stored in tables partitioned by this
+# interval of message time (a whole number of hours)
+DBLOG_PARTITION = {'days': 1}
+# Partitions older than this are aged out to compressed flat text files,
+# /var/log/chroma/db_log-<partition>.gz, and dropped from the database
+DBLOG_RETENTION = {'days': 30}
+# Those archives are deleted once they are older than this
+DBLOG_ARCHIVE_RETENTION = {'days': 365}
 
 # In development, where to serve repos from
 DEV_REPO_PATH = os.path.join(os.path.dirname(os.path.abspath(sys.modules['settings'].__file__)), 'repo')
@@ -63,6 +63,10 @@ if nose_installed:
         start = time.time()
         test(result)
         stop = time.time()
+
+        # Stop the threads which the code tested starts on first use
+        from chroma_core.lib.long_polling import enable_long_polling
+        enable_long_polling.stop()
         result.printErrors()
         result.printSummary(start, stop)
         self.config.plugins.finalize(result)
@@ -3,8 +3,11 @@
 # Copyright (c) 2012 Whamcloud, Inc.  All rights reserved.
 # ========================================================
 
+import os
 import json
 import mock
+import shutil
+import tempfile
 
 from chroma_core.lib.util import chroma_settings
 from iml_common.lib.name_value_list import NameValueList
@@ -142,11 +145,18 @@ def before_feature(context, feature):
         return command_id
     JobSchedulerClient.command_run_jobs = mock.Mock(side_effect = command_run_jobs)
 
-    from chroma_cli.api import ApiHandle
+    from chroma_cli.api import ApiHandle, ChromaSessionClient
     context.old_api_client = ApiHandle.ApiClient
     from tests.unit.chroma_api.tastypie_test import TestApiClient
     ApiHandle.ApiClient = TestApiClient
 
+    # Keep the sessions and schemas of the CLI away from those of the user running the tests
+    context.cli_folder = tempfile.mkdtemp()
+    context.old_schema_cache_file = ApiHandle.SCHEMA_CACHE_FILE
+    ApiHandle.SCHEMA_CACHE_FILE = os.path.join(context.cli_folder, 'chroma_schema')
+    context.old_session_file = ChromaSessionClient.SESSION_FILE
+    ChromaSessionClient.SESSION_FILE = os.path.join(context.cli_folder, 'chroma_session')
+
     from chroma_api.authentication import CsrfAuthentication
     context.old_is_authenticated = CsrfAuthentication.is_authenticated
     CsrfAuthentication.is_authenticated = mock.Mock(return_value = True)
@@ -189,8 +199,11 @@ def after_feature(context, feature):
     for connection, old_name, destroy in context.old_db_config[0]:
         connection.settings_dict['NAME'] = old_name
 
-    from chroma_cli.api import ApiHandle
+    from chroma_cli.api import ApiHandle, ChromaSessionClient
     ApiHandle.ApiClient = context.old_api_client
+    ApiHandle.SCHEMA_CACHE_FILE = context.old_schema_cache_file
+    ChromaSessionClient.SESSION_FILE = context.old_session_file
+    shutil.rmtree(context.cli_folder)
 
     from chroma_api.authentication import CsrfAuthentication
     CsrfAuthentication.is_authenticated = context.old_is_authenticated
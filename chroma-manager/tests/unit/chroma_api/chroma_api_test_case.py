@@ -72,6 +72,22 @@ class ChromaApiTestCase(ResourceTestCase):
         self.old_get_locks = job_scheduler_client.JobSchedulerClient.get_locks
         job_scheduler_client.JobSchedulerClient.get_locks = fake_get_locks
 
+        #  Cached responses are invalidated by the table timestamps from the notification
+        #  hub, so take them from this process's own long polling without connecting to it.
+        from chroma_core.services.notification_hub import client
+
+        @classmethod
+        def fake_table_timestamps(cls, tables_list):
+            from chroma_core.lib.long_polling import long_polling
+            return long_polling.table_timestamps(tables_list)
+
+        self.old_table_timestamps = client.NotificationHubClient.table_timestamps
+        client.NotificationHubClient.table_timestamps = fake_table_timestamps
+
+        # The database is rolled back between tests without any table changes being recorded
+        from chroma_api.response_cache import response_cache
+        response_cache.clear()
+
     def tearDown(self):
         from chroma_api.authentication import CsrfAuthentication
         CsrfAuthentication.is_authenticated = self.old_is_authenticated
@@ -81,6 +97,9 @@ class ChromaApiTestCase(ResourceTestCase):
         job_scheduler_client.JobSchedulerClient.available_transitions = self.old_available_transitions
         job_scheduler_client.JobSchedulerClient.available_jobs = self.old_available_jobs
 
+        from chroma_core.services.notification_hub import client
+        client.NotificationHubClient.table_timestamps = self.old_table_timestamps
+
         ObjectCache.clear()
 
     def api_set_state_full(self, uri, state):
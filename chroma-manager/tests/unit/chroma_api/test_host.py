@@ -544,3 +544,79 @@ class TestCreateHostAPI(ChromaApiTestCase):
                    "pkey": sample_private_key,
                    "pkey_pw": 'secret_key_pw'}
             )
+
+
+class TestHostLongPolling(ChromaApiTestCase):
+    RESOURCE_PATH = "/api/host/"
+
+    def setUp(self):
+        super(TestHostLongPolling, self).setUp()
+
+        from chroma_core.lib.long_polling import long_polling
+
+        self.tables_changed = long_polling.tables_changed
+
+        def wait_table_change(table_timestamps, tables_list, timeout, changed_ids = False):
+            return long_polling.wait_table_change(table_timestamps, tables_list, 0, changed_ids)
+
+        mock.patch('chroma_core.services.notification_hub.client.NotificationHubClient.wait_table_change',
+                   mock.Mock(side_effect = wait_table_change)).start()
+        self.addCleanup(mock.patch.stopall)
+
+        # Changes are only known from when long polling started, so the hosts are created since then
+        self.hosts = [synthetic_host(address) for address in ['myserver0', 'myserver1', 'myserver2']]
+        self._changed(ManagedHost, [host.id for host in self.hosts])
+
+        # A fresh poll, which returns the full list and the ETag for the next
+        response = self.api_client.get(self.RESOURCE_PATH, HTTP_IF_NONE_MATCH = '0')
+        self.assertHttpOK(response)
+        self.assertEqual(len(self.deserialize(response)['objects']), 3)
+        self.etag = response['ETag']
+
+    def _changed(self, model, ids):
+        import time
+        from chroma_core.lib import util
+
+        self.tables_changed(int(time.time() * util.SECONDSTOMICROSECONDS), [model._meta.db_table], {model._meta.db_table: ids})
+
+    def _poll(self, delta = True):
+        return self.api_client.get(self.RESOURCE_PATH,
+                                   data = {'delta': 'true'} if delta else {},
+                                   HTTP_IF_NONE_MATCH = self.etag)
+
+    def test_timeout(self):
+        self.assertHttpNotModified(self._poll())
+
+    def test_delta(self):
+        """Only the changed hosts are returned for a delta, including the ids of those which have gone"""
+        self._changed(ManagedHost, [self.hosts[1].id, self.hosts[2].id])
+        self.hosts[2].mark_deleted()
+
+        response = self._poll()
+        self.assertHttpOK(response)
+        data = self.deserialize(response)
+        self.assertEqual([host['id'] for host in data['objects']], [self.hosts[1].id])
+        self.assertEqual(data['meta']['changed_ids'], [self.hosts[1].id, self.hosts[2].id])
+
+        # The ETag is the cursor for the next poll, and nothing has changed since
+        self.etag = response['ETag']
+        self.assertNotIn('changed_ids', json.loads(self.etag))
+        self.assertHttpNotModified(self._poll())
+
+    def test_delta_not_requested(self):
+        self._changed(ManagedHost, [self.hosts[1].id])
+
+        data = self.deserialize(self._poll(delta = False))
+        self.assertEqual(len(data['objects']), 3)
+        self.assertNotIn('changed_ids', data['meta'])
+
+    def test_delta_unknown(self):
+        """The full list is returned when a change is not to known hosts alone"""
+        from chroma_core.models import NetworkInterface
+
+        self._changed(ManagedHost, [self.hosts[1].id])
+        self._changed(NetworkInterface, [1])
+
+        data = self.deserialize(self._poll())
+        self.assertEqual(len(data['objects']), 3)
+        self.assertNotIn('changed_ids', data['meta'])
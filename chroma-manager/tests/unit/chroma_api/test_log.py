@@ -1,8 +1,14 @@
+import json
+
+import mock
 from django.contrib.auth.models import User, Group
 
+from chroma_core.models import LogMessage, Nid
+from chroma_core.services.syslog import Service
+from iml_common.lib.date_time import IMLDateTime
 from tests.unit.chroma_api.tastypie_test import TestApiClient
 from tests.unit.chroma_api.chroma_api_test_case import ChromaApiTestCase
-from tests.unit.chroma_core.helpers import fake_log_message
+from tests.unit.chroma_core.helpers import fake_log_message, synthetic_host
 
 
 class TestLogResource(ChromaApiTestCase):
@@ -45,3 +51,60 @@ class TestLogResource(ChromaApiTestCase):
             client = self.clients[client_key]
             log_entries = [log_entry['message'] for log_entry in self.deserialize(client.get('/api/log/'))['objects']]
             self.assertListEqual(self.messages, log_entries)
+
+
+class TestLogIngest(ChromaApiTestCase):
+    """Messages stored by the syslog service carry their substitutions, and can be searched by index"""
+
+    def setUp(self):
+        super(TestLogIngest, self).setUp()
+
+        self.host = synthetic_host('myserver-with-nids', [Nid.Nid('192.168.0.1', 'tcp', 0)])
+        self.create_simple_filesystem(self.host)
+
+        with mock.patch('chroma_core.services.syslog.AgentRxQueue'):
+            self.service = Service()
+        self.service.log = mock.Mock()
+
+    def _ingest(self, *messages):
+        self.service.on_data(self.host.fqdn, {'log_lines': [{'message': message,
+                                                             'severity': 5,
+                                                             'facility': 1,
+                                                             'source': 'kernel',
+                                                             'datetime': IMLDateTime.utcnow().isoformat()} for message in messages]})
+
+    def _get(self, **data):
+        response = self.api_client.get('/api/log/', data = data)
+        self.assertHttpOK(response)
+        return self.deserialize(response)['objects']
+
+    def test_substitutions(self):
+        self._ingest(' Lustre: connection from 192.168.0.1@tcp to testfs-MDT0000', 'nothing to see')
+
+        message = LogMessage.objects.get(message__contains = 'connection')
+        self.assertEqual(json.loads(message.substitutions), [['nid', '192.168.0.1@tcp0', 25, 40],
+                                                             ['target', 'testfs-MDT0000', 44, 58]])
+        self.assertEqual(LogMessage.objects.get(message = 'nothing to see').substitutions, '[]')
+
+        with mock.patch('chroma_core.models.LogMessage.find_substitutions') as find_substitutions:
+            objects = self._get(message__contains = 'connection')
+            self.assertFalse(find_substitutions.called)
+
+        self.assertEqual([(sub['start'], sub['end'], sub['resource_uri']) for sub in objects[0]['substitutions']],
+                         [(25, 40, '/api/host/%s/' % self.host.id),
+                          (44, 58, '/api/target/%s/' % self.mdt.id)])
+
+    def test_search(self):
+        self._ingest(' Lustre: connection from 192.168.0.1@tcp to testfs-MDT0000',
+                     ' Lustre: testfs-OST0000: evicting client',
+                     ' LustreError: lost connection to 192.168.0.2@tcp')
+
+        def messages(**data):
+            return [obj['message'] for obj in self._get(**data)]
+
+        self.assertEqual(messages(message__search = 'connection'), [' Lustre: connection from 192.168.0.1@tcp to testfs-MDT0000',
+                                                                   ' LustreError: lost connection to 192.168.0.2@tcp'])
+        self.assertEqual(messages(message__search = 'lost connection'), [' LustreError: lost connection to 192.168.0.2@tcp'])
+        self.assertEqual(messages(substitution_key = '192.168.0.1@tcp'), [' Lustre: connection from 192.168.0.1@tcp to testfs-MDT0000'])
+        self.assertEqual(messages(substitution_key = 'testfs-OST0000'), [' Lustre: testfs-OST0000: evicting client'])
+        self.assertEqual(messages(substitution_key = 'testfs-OST0001'), [])
@@ -11,8 +11,11 @@ from chroma_core.models import StepResult
 from chroma_core.models import ManagedTarget
 from tests.unit.chroma_api.chroma_api_test_case import ChromaApiTestCase
 from tests.unit.chroma_core.helpers import synthetic_host
+from tests.utils import patch
 from iml_common.lib.date_time import IMLDateTime
 
+import settings
+
 
 def _remove_host_resources(host_id):
     """
@@ -106,6 +109,27 @@ class TestMisc(ChromaApiTestCase):
         self.spider_api()
 
 
+class TestApiSchemaVersion(ChromaApiTestCase):
+    def test_top_level_etag(self):
+        """The top level of the API is tagged with the manager version, for clients which cache schemas"""
+        with patch(settings, VERSION = '4.0.0', BUILD = 12):
+            response = self.api_client.get("/api/")
+            self.assertHttpOK(response)
+            self.assertEqual(response['ETag'], '"4.0.0-12"')
+
+            response = self.api_client.get("/api/", HTTP_IF_NONE_MATCH = '"4.0.0-12"')
+            self.assertEqual(response.status_code, 304)
+
+            response = self.api_client.get("/api/", HTTP_IF_NONE_MATCH = '"4.0.0-11"')
+            self.assertHttpOK(response)
+
+    def test_development_untagged(self):
+        with patch(settings, VERSION = 'dev'):
+            response = self.api_client.get("/api/")
+            self.assertHttpOK(response)
+            self.assertFalse(response.has_header('ETag'))
+
+
 class TestJobLocksAPI(ChromaApiTestCase):
     def __init__(self, method, username='admin', **kwargs):
         ChromaApiTestCase.__init__(self, method, username=username, **kwargs)
@@ -24,12 +24,10 @@ OrderBad = namedtuple('OrderBad', [])
 # then think about whether you meant to do that, and grudgingly
 # update this number upwards if necessary, or go back and
 # revise the API change.
-QUERIES_PER_TARGET = 7  # queries per target accessing that resource directly
+QUERIES_PER_TARGET = 1  # queries per target accessing that resource directly (the available transitions)
 QUERIES_PER_FILESYSTEM_TARGET = 4  # queries per target when included in a filesystem resource
-QUERIES_PER_VOLUME = 1  # queries per volume object when reading volumes
-QUERIES_PER_VOLUME_HOST = 1  # additional queries per-volume per-host
+QUERIES_TOTAL_VOLUMES = 6  # total queries to get all volumes, with their volume nodes and hosts
 QUERIES_TOTAL_UNDECORATED_LOGS = 5  # total queries to get all log messages (when they don't have any NIDs or targets)
-PAGING_AND_AUTH_QUERIES = 5
 
 
 class TestQueryScaling(ChromaApiTestCase):
@@ -117,8 +115,8 @@ class TestQueryScaling(ChromaApiTestCase):
         decorated_scaling = self._measure_scaling(create_n_logs_decorated, LogResource)
         undecorated_scaling = self._measure_scaling(create_n_logs_undecorated, LogResource)
 
-        # FIXME: log decoration is O(N) because we issue a separate query for decorating each log message
-        self.assertIsInstance(decorated_scaling, OrderN)
+        # Substitutions are resolved once per distinct NID or target name, not per message
+        self.assertIsInstance(decorated_scaling, Order1)
 
         self.assertIsInstance(undecorated_scaling, Order1)
         self.assertEqual(undecorated_scaling.query_count, QUERIES_TOTAL_UNDECORATED_LOGS)
@@ -165,8 +163,8 @@ class TestQueryScaling(ChromaApiTestCase):
     def test_volumes(self):
         # Creating N volumes with a fixed number of volumes visible to each host
         host_pairs_scaling = self._measure_scaling(self._create_n_volumes_host_pairs, VolumeResource)
-        self.assertIsInstance(host_pairs_scaling, OrderN)
-        self.assertEqual(host_pairs_scaling.queries_per_object, QUERIES_PER_VOLUME)
+        self.assertIsInstance(host_pairs_scaling, Order1)
+        self.assertEqual(host_pairs_scaling.query_count, QUERIES_TOTAL_VOLUMES)
 
         # Creating N volumes with all volumes visible to a fixed number of hosts
         fixed_host_count = 8
@@ -174,15 +172,15 @@ class TestQueryScaling(ChromaApiTestCase):
         def create_n_volumes_fixed_hosts(N):
             self._create_san_volumes(fixed_host_count, N)
         fixed_hosts_scaling = self._measure_scaling(create_n_volumes_fixed_hosts, VolumeResource)
-        self.assertIsInstance(fixed_hosts_scaling, OrderN)
-        self.assertEqual(fixed_hosts_scaling.queries_per_object, QUERIES_PER_VOLUME_HOST)
+        self.assertIsInstance(fixed_hosts_scaling, Order1)
+        self.assertEqual(fixed_hosts_scaling.query_count, QUERIES_TOTAL_VOLUMES)
 
         # Creating N volumes with a proportional number of hosts, with all volumes visible to all hosts
         def create_n_volumes_proportional_hosts(N):
             self._create_san_volumes(N, N)
         proportional_hosts_scaling = self._measure_scaling(create_n_volumes_proportional_hosts, VolumeResource)
-        self.assertIsInstance(proportional_hosts_scaling, OrderN)
-        self.assertEqual(proportional_hosts_scaling.queries_per_object, QUERIES_PER_VOLUME_HOST)
+        self.assertIsInstance(proportional_hosts_scaling, Order1)
+        self.assertEqual(proportional_hosts_scaling.query_count, QUERIES_TOTAL_VOLUMES)
 
         # With a fixed number of volumes, increasing the number of hosts that can see the volumes
         fixed_volume_count = 8
@@ -192,7 +190,7 @@ class TestQueryScaling(ChromaApiTestCase):
         scaling_with_hosts = self._measure_scaling(create_n_hosts_fixed_volumes, VolumeResource, HostResource)
 
         self.assertIsInstance(scaling_with_hosts, Order1)
-        self.assertEqual(scaling_with_hosts.query_count, PAGING_AND_AUTH_QUERIES + QUERIES_PER_VOLUME + (fixed_volume_count * QUERIES_PER_VOLUME_HOST))
+        self.assertEqual(scaling_with_hosts.query_count, QUERIES_TOTAL_VOLUMES)
 
     def _create_filesystem_n_osts(self, n_targets):
         assert n_targets >= 3
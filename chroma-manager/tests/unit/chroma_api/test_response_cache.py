@@ -0,0 +1,127 @@
+import time
+from collections import defaultdict
+
+import mock
+
+from tastypie.resources import ModelResource
+
+from chroma_api.volume import VolumeResource
+from chroma_core.lib import util
+from chroma_core.lib.long_polling import long_polling
+from chroma_core.models import Volume, VolumeNode
+from chroma_core.services.job_scheduler.job_scheduler_client import JobSchedulerClient
+from chroma_core.services.notification_hub import client
+from tests.unit.chroma_api.chroma_api_test_case import ChromaApiTestCase
+from tests.unit.chroma_core.helpers import synthetic_host, synthetic_volume_full
+
+
+class TestResponseCache(ChromaApiTestCase):
+    RESOURCE_PATH = "/api/volume/"
+
+    def setUp(self):
+        super(TestResponseCache, self).setUp()
+
+        host = synthetic_host('myserver')
+        self.volumes = [synthetic_volume_full(host) for _ in range(2)]
+
+        self.get_list = mock.patch.object(ModelResource, 'get_list', autospec = True,
+                                          side_effect = ModelResource.get_list).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _get(self, **kwargs):
+        response = self.api_client.get(self.RESOURCE_PATH, **kwargs)
+        self.assertHttpOK(response)
+        return response
+
+    def test_cached(self):
+        """Repeated GETs are answered from the cache, with the same content"""
+        first = self._get()
+        second = self._get()
+
+        self.assertEqual(self.get_list.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_parameters(self):
+        """Requests with different parameters do not share entries"""
+        self.assertEqual(len(self.deserialize(self._get())['objects']), 2)
+        self.assertEqual(len(self.deserialize(self._get(data = {'id': self.volumes[0].id}))['objects']), 1)
+        self._get(data = {'id': self.volumes[0].id})
+
+        self.assertEqual(self.get_list.call_count, 2)
+
+    def test_table_change(self):
+        """A change to a table of the resource, recorded by long polling, invalidates the entry"""
+        self._get()
+        Volume.objects.filter(id = self.volumes[0].id).update(label = 'renamed')
+        self._get()
+        self.assertEqual(self.get_list.call_count, 1)
+
+        long_polling.tables_changed(int(time.time() * util.SECONDSTOMICROSECONDS), [Volume._meta.db_table])
+
+        data = self.deserialize(self._get())
+        self.assertEqual(self.get_list.call_count, 2)
+        self.assertIn('renamed', [volume['label'] for volume in data['objects']])
+
+    def test_local_change(self):
+        """A change saved in this process invalidates the entry before it reaches the notification hub"""
+        self._get()
+        VolumeNode.objects.filter(volume = self.volumes[0]).get().mark_deleted()
+
+        self.assertEqual(self.deserialize(self._get())['objects'][0]['volume_nodes'], [])
+        self.assertEqual(self.get_list.call_count, 2)
+
+    def test_not_modified(self):
+        etag = self._get()['ETag']
+
+        response = self.api_client.get(self.RESOURCE_PATH, HTTP_IF_NONE_MATCH = etag)
+        self.assertHttpNotModified(response)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.get_list.call_count, 1)
+
+        Volume.objects.filter(id = self.volumes[0].id).update(label = 'renamed')
+        long_polling.tables_changed(int(time.time() * util.SECONDSTOMICROSECONDS), [Volume._meta.db_table])
+
+        response = self._get(HTTP_IF_NONE_MATCH = etag)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_max_age(self):
+        with mock.patch.object(VolumeResource, 'cache_max_age', 10):
+            self._get()
+            self._get()
+            self.assertEqual(self.get_list.call_count, 1)
+
+            with mock.patch('chroma_api.response_cache.time.time', return_value = time.time() + 11):
+                self._get()
+            self.assertEqual(self.get_list.call_count, 2)
+
+    def test_timestamps_unavailable(self):
+        """Responses are not cached when the table timestamps cannot be had from the notification hub"""
+        with mock.patch.object(client.NotificationHubClient, 'table_timestamps',
+                               side_effect = RuntimeError("Not connected to the notification hub")):
+            self._get()
+            response = self._get()
+
+        self.assertEqual(self.get_list.call_count, 2)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_long_polling_resource(self):
+        """The ETags of resources which long poll are those of long polling"""
+        response = self.api_client.get("/api/host/")
+        self.assertHttpOK(response)
+        self.assertFalse(response.has_header('ETag'))
+
+        self.api_client.get("/api/host/")
+        self.assertEqual(self.get_list.call_count, 1)
+
+    def test_refreshed_fields(self):
+        """The available actions of stateful objects are brought up to date in cached responses"""
+        self.api_client.get("/api/host/")
+
+        job = {'verb': 'Do something', 'display_order': 1}
+        with mock.patch.object(JobSchedulerClient, 'available_jobs', return_value = defaultdict(lambda: [job])):
+            data = self.deserialize(self.api_client.get("/api/host/"))
+
+        self.assertEqual(self.get_list.call_count, 1)
+        self.assertEqual(data['objects'][0]['available_jobs'], [job])
+        self.assertIn(job, data['objects'][0]['available_actions'])
@@ -2,11 +2,14 @@ import os
 import json
 import collections
 import operator
+from datetime import datetime, timedelta
+
+import mock
 
 from chroma_core.lib.cache import ObjectCache
 from chroma_core.lib import metrics
 from chroma_core.models import ManagedTarget, ManagedTargetMount, ManagedMgs, ManagedMdt, ManagedOst, ManagedFilesystem
-from chroma_core.models import Stats
+from chroma_core.models import Series, Stats
 from .chroma_api_test_case import ChromaApiTestCase
 from tests.unit.chroma_core.helpers import synthetic_host, synthetic_volume_full
 
@@ -33,11 +36,13 @@ class TestStats(ChromaApiTestCase):
 
         self.osts = [ManagedOst.create_for_volume(synthetic_volume_full(self.hosts[1]).id, filesystem=self.fs)[0] for n in range(2)]
         # store fixture data with corresponding targets
+        self.samples = []
         for target, key in zip(self.hosts + [self.mdt] + self.osts, sorted(fixture)):
             store = metrics.MetricStore.new(target)
             kwargs = {'jobid_var': 'procname_uid'} if isinstance(target, ManagedOst) else {}
             for timestamp, value in fixture[key]:
-                Stats.insert(store.serialize(value, timestamp, **kwargs))
+                self.samples.append(store.serialize(value, timestamp, **kwargs))
+                Stats.insert(self.samples[-1])
         for model in Stats:
             model.cache.clear()
 
@@ -137,3 +142,48 @@ class TestStats(ChromaApiTestCase):
         for data, in content.values():
             prefixes = set(name.split('_')[0] for name in data['data'])
             self.assertEqual(prefixes, set(['mem', 'cpu']))
+
+    def test_filesystem_aggregates(self):
+        "Test filesystem capacity read from the aggregates maintained by the stats service."
+        fields = 'bytes_free', 'bytes_total', 'files_free', 'files_total'
+        path = 'filesystem/{0}/'.format(self.fs.id)
+        content = self.fetch(path)
+        expected = dict((field, content[field]) for field in fields)
+        self.assertEqual(metrics.FilesystemMetricStore(self.fs).fetch_aggregates(), {})
+
+        aggregates = metrics.FilesystemAggregates()
+        for samples in self.samples:
+            self.assertEqual(Stats.insert(aggregates.update(samples)), [])
+        self.assertEqual(set(metrics.FilesystemMetricStore(self.fs).fetch_aggregates()), set(metrics.FilesystemMetricStore.AGGREGATES))
+
+        content = self.fetch(path)
+        self.assertEqual(dict((field, content[field]) for field in fields), expected)
+        self.assertEqual(expected['bytes_free'], 1381963.5 * 2 * 1024)
+
+        # aggregates have history like any other series
+        content = self.fetch(path + 'metric/', metrics='kbytesfree,filesfree', begin='2013-04-19T20:33:00Z', end='2013-04-19T20:34:30Z')
+        self.assertGreater(len(content), 1)
+        self.assertEqual(content[-1]['data'], {'kbytesfree': expected['bytes_free'] / 1024, 'filesfree': expected['files_free']})
+
+    def test_filesystem_aggregates_flush(self):
+        "Test that a change from a target whose host's clock lags is flushed once no later sample carries it."
+        aggregates = metrics.FilesystemAggregates()
+        for samples in self.samples:
+            Stats.insert(aggregates.update(samples))
+        latest = aggregates._filesystems[self.fs.id]['latest']
+        kbytesfree = [Series.get(ost, 'kbytesfree').id for ost in self.osts]
+        aggregate = Series.get(self.fs, 'kbytesfree').id
+
+        ahead = latest + timedelta(hours=1)
+        self.assertIn(aggregate, [id for id, dt, value in aggregates.update([(kbytesfree[0], ahead, 1000000.0)])])
+        self.assertEqual(aggregates.update([(kbytesfree[1], latest + timedelta(minutes=1), 500000.0)]), [])
+        self.assertEqual(aggregates.update([]), [])
+
+        class later(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.now(tz) + metrics.FilesystemAggregates.FLUSH_INTERVAL
+
+        with mock.patch('chroma_core.lib.metrics.datetime', later):
+            self.assertIn((aggregate, ahead + timedelta(seconds=1), 1500000.0), aggregates.update([]))
+            self.assertEqual(aggregates.update([]), [])
@@ -2,7 +2,7 @@ import json
 
 import mock
 
-from chroma_core.models import Command, Nid
+from chroma_core.models import Command, ManagedTarget, ManagedTargetMount, Nid, OstConfParam
 from tests.unit.chroma_api.chroma_api_test_case import ChromaApiTestCase
 from tests.unit.chroma_core.helpers import fake_log_message, synthetic_host, synthetic_volume_full, create_targets_patch, create_filesystem_patch
 
@@ -158,3 +158,30 @@ class TestTargetResource(ChromaApiTestCase):
         self.assertHttpOK(response)
         content = json.loads(response.content)
         self.assertEqual(0, len(content['objects']))
+
+    @create_targets_patch
+    def test_list_matches_detail(self):
+        """Targets dehydrated as a page, with their related objects loaded in bulk, are the same as on their own"""
+        host = synthetic_host('myserver')
+        self.create_simple_filesystem(host)
+        ManagedTarget.objects.filter(id = self.ost.id).update(
+            active_mount = ManagedTargetMount.objects.get(target_id = self.ost.id))
+        OstConfParam.objects.create(ost = self.ost, mgs = self.mgt, key = 'osc.max_dirty_mb', value = '32', version = 1)
+
+        targets = self.api_get_list('/api/target/')
+        self.assertEqual(len(targets), 3)
+
+        for target in targets:
+            response = self.api_client.get(target['resource_uri'])
+            self.assertHttpOK(response)
+            self.assertEqual(self.deserialize(response), target)
+
+        targets = dict((target['id'], target) for target in targets)
+        ost = targets[self.ost.id]
+        self.assertEqual(ost['active_host_name'], host.get_label())
+        self.assertEqual(ost['conf_params']['osc.max_dirty_mb'], '32')
+        self.assertEqual(ost['filesystem_name'], self.fs.name)
+        self.assertEqual(ost['primary_server_name'], host.get_label())
+        self.assertEqual([node['host_label'] for node in ost['volume']['volume_nodes']], [host.get_label()])
+        self.assertEqual(targets[self.mgt.id]['filesystems'], [{'id': self.fs.id, 'name': self.fs.name}])
+        self.assertEqual(targets[self.mgt.id]['active_host_name'], '---')
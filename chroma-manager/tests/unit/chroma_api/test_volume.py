@@ -1,9 +1,10 @@
 import json
+import time
 
 from tests.unit.chroma_api.chroma_api_test_case import ChromaApiTestCase
 from tests.unit.chroma_core.helpers import synthetic_host, synthetic_volume_full
 from tests.unit.chroma_core.helpers import create_targets_patch
-from chroma_core.models import VolumeNode
+from chroma_core.models import Volume, VolumeNode, ManagedTarget
 
 
 class TestVolumeNodeDelete(ChromaApiTestCase):
@@ -112,3 +113,43 @@ class TestVolumeNodeDelete(ChromaApiTestCase):
         self.assertHttpOK(response)
         content = json.loads(response.content)
         self.assertEqual(1, len(content['objects']))
+
+
+class TestUnusedLunsScaling(ChromaApiTestCase):
+    """
+    Finding the unused LUNs must stay a single query, and fast, on servers with very many LUN paths.
+    """
+    VOLUME_COUNT = 10000
+    MAX_SECONDS = 5
+
+    def setUp(self):
+        super(TestUnusedLunsScaling, self).setUp()
+
+        self.hosts = [synthetic_host('host0'), synthetic_host('host1')]
+
+        Volume.objects.bulk_create([Volume(usable_for_lustre = True) for n in range(self.VOLUME_COUNT)])
+        volume_ids = Volume.objects.order_by('-id').values_list('id', flat = True)[:self.VOLUME_COUNT]
+        VolumeNode.objects.bulk_create([VolumeNode(volume_id = volume_id, host = host,
+                                                   path = "/dev/disk/by-id/lun_%s" % volume_id,
+                                                   primary = (host == self.hosts[0]))
+                                        for volume_id in volume_ids for host in self.hosts])
+
+    @create_targets_patch
+    def test_unused_luns(self):
+        self.create_simple_filesystem(self.hosts[0])
+        used_volume_ids = set()
+        for target in [self.mgt, self.mdt, self.ost]:
+            # Only the mounts of targets known to be mounted are considered to be using their volume
+            target = ManagedTarget.objects.get(id = target.id)
+            target.active_mount = target.managedtargetmount_set.get()
+            target.save()
+            used_volume_ids.add(target.volume_id)
+
+        for method in [Volume.get_unused_luns, Volume.get_usable_luns]:
+            start = time.time()
+            with self.assertNumQueries(1):
+                unused_volume_ids = set(method(Volume.objects.all()).values_list('id', flat = True))
+            self.assertLess(time.time() - start, self.MAX_SECONDS)
+
+            self.assertEqual(len(unused_volume_ids), self.VOLUME_COUNT)
+            self.assertFalse(unused_volume_ids & used_volume_ids)
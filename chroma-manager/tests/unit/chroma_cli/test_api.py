@@ -0,0 +1,185 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
+
+import mock
+
+from chroma_cli.api import ApiHandle, ChromaSessionClient, CommandMonitor
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+API_URL = "https://manager.mycompany.com/api/"
+
+
+def _response(status_code, content = None, headers = None, cookies = None):
+    return mock.Mock(status_code = status_code, content = json.dumps(content), headers = headers or {}, cookies = cookies or {})
+
+
+class CliTestCase(IMLUnitTestCase):
+    def setUp(self):
+        super(CliTestCase, self).setUp()
+
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+        for klass, attr in [(ChromaSessionClient, 'SESSION_FILE'), (ApiHandle, 'SCHEMA_CACHE_FILE')]:
+            patcher = mock.patch.object(klass, attr, os.path.join(self.folder, attr.lower()))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class TestSession(CliTestCase):
+    def _client(self, username = 'admin'):
+        client = ChromaSessionClient()
+        client.username = username
+        client.api_uri = API_URL
+        return client
+
+    def _login(self, client):
+        with mock.patch.object(client.session, 'get', return_value = _response(200, cookies = {'csrftoken': 'a', 'sessionid': '1'})):
+            with mock.patch.object(client.session, 'post', return_value = _response(201, cookies = {'csrftoken': 'b', 'sessionid': '2'})):
+                client.login(username = 'admin', password = 'secret')
+
+    def test_restore(self):
+        """The session of a login is carried on with by later clients of the same API and user"""
+        self._login(self._client())
+        self.assertEqual(stat.S_IMODE(os.stat(ChromaSessionClient.SESSION_FILE).st_mode), 0600)
+
+        client = self._client()
+        self.assertTrue(client.is_authenticated)
+        self.assertEqual(client.session_cookies, {'csrftoken': 'b', 'sessionid': '2'})
+        self.assertEqual(client.session.headers['X-CSRFToken'], 'b')
+
+        with mock.patch.object(client.session, 'post') as post:
+            self.assertTrue(client.login(username = 'admin', password = 'secret'))
+        self.assertFalse(post.called)
+
+        self.assertFalse(self._client('other').is_authenticated)
+
+    def test_logout(self):
+        client = self._client()
+        self._login(client)
+
+        with mock.patch.object(client.session, 'delete'):
+            client.logout()
+
+        self.assertFalse(self._client().is_authenticated)
+
+    def test_expired(self):
+        """A request refused as the saved session has expired logs in again and is retried"""
+        self._login(self._client())
+
+        handle = ApiHandle(api_uri = API_URL, authentication = {'username': 'admin', 'password': 'secret'})
+        client = handle.api_client.client
+        with mock.patch.object(client.session, 'get', side_effect = [_response(401), _response(200, {})]) as get:
+            with mock.patch.object(client.session, 'post', return_value = _response(201, cookies = {'csrftoken': 'c', 'sessionid': '3'})) as post:
+                self.assertEqual(handle.send_and_decode("get", "host/"), {})
+
+        self.assertEqual(get.call_count, 2)
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(self._client().session_cookies, {'csrftoken': 'c', 'sessionid': '3'})
+
+
+class TestSchemaCache(CliTestCase):
+    def setUp(self):
+        super(TestSchemaCache, self).setUp()
+
+        self.version = '1'
+        self.requests = []
+
+        def send(handle, method_name, relative_url, data = None, headers = None):
+            self.requests.append((relative_url, headers))
+            if relative_url == "":
+                if self.version and (headers or {}).get('If-None-Match') == self.version:
+                    return _response(304)
+                return _response(200, {'host': {'list_endpoint': '/api/host/', 'schema': '/api/host/schema/'}},
+                                 headers = {'ETag': self.version})
+            else:
+                return _response(200, {'fields': {'version': self.version}})
+
+        patcher = mock.patch.object(ApiHandle, 'send', autospec = True, side_effect = send)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _fields(self):
+        return ApiHandle(api_uri = API_URL).endpoints['host'].fields
+
+    def test_cached(self):
+        """Schemas are fetched once, then revalidated with one conditional request"""
+        self.assertEqual(self._fields(), {'version': '1'})
+        self.assertEqual(len(self.requests), 2)
+
+        self.requests = []
+        self.assertEqual(self._fields(), {'version': '1'})
+        self.assertEqual(self.requests, [("", {'If-None-Match': '1'})])
+
+    def test_invalidated(self):
+        """The cached schemas are replaced once the manager's version changes"""
+        self._fields()
+
+        self.version = '2'
+        self.requests = []
+        self.assertEqual(self._fields(), {'version': '2'})
+        self.assertEqual([url for url, headers in self.requests], ["", "/api/host/schema/"])
+
+        self.requests = []
+        self.assertEqual(self._fields(), {'version': '2'})
+        self.assertEqual(len(self.requests), 1)
+
+    def test_untagged(self):
+        """Schemas of an API which sends no tag (a development tree) are not cached"""
+        self.version = None
+        self._fields()
+        self._fields()
+
+        self.assertEqual(len(self.requests), 4)
+        self.assertFalse(os.path.exists(ApiHandle.SCHEMA_CACHE_FILE))
+
+
+class TestCommandMonitor(IMLUnitTestCase):
+    def setUp(self):
+        super(TestCommandMonitor, self).setUp()
+
+        self.api = mock.Mock()
+        self.api.endpoints = {'command': mock.Mock(resource_klass = dict), 'job': mock.Mock()}
+        self.api.decode.side_effect = lambda r: json.loads(r.content)
+        self.monitor = CommandMonitor(self.api, {'id': 1, 'complete': False, 'cancelled': False, 'errored': False, 'jobs': []})
+
+        self.sleep = mock.patch('chroma_cli.api.time.sleep').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _command(self, complete):
+        return {'id': 1, 'complete': complete, 'cancelled': False, 'errored': False, 'jobs': []}
+
+    def test_long_polling(self):
+        """The command is fetched once changed, without pausing between requests"""
+        self.api.send.side_effect = [_response(200, self._command(False), headers = {'ETag': '10'}),
+                                     _response(304),
+                                     _response(200, self._command(True), headers = {'ETag': '20'})]
+
+        self.assertEqual(self.monitor.wait_complete(), self._command(True))
+
+        self.assertEqual([kwargs['headers'] for args, kwargs in self.api.send.call_args_list],
+                         [{'If-None-Match': '0'}, {'If-None-Match': '10'}, {'If-None-Match': '10'}])
+        self.assertFalse(self.sleep.called)
+
+    def test_polling(self):
+        """Without long polling, the command is fetched after a pause"""
+        self.api.send.side_effect = [_response(200, self._command(False)),
+                                     _response(200, self._command(True))]
+
+        self.monitor.wait_complete()
+
+        self.sleep.assert_called_once_with(1)
+
+    def test_incomplete_jobs(self):
+        """The jobs of a command are listed in one request"""
+        self.monitor.cmd['jobs'] = ['/api/job/1/', '/api/job/2/', '/api/job/3/']
+        self.api.endpoints['job'].list.return_value = [{'id': '1', 'state': 'complete'},
+                                                       {'id': '3', 'state': 'tasked'},
+                                                       {'id': '2', 'state': 'pending'}]
+
+        self.assertEqual(self.monitor.incomplete_jobs, [2, 3])
+        self.api.endpoints['job'].list.assert_called_once_with(id__in = "1,2,3", limit = 0)
@@ -0,0 +1,50 @@
+import mock
+
+from chroma_cli.config import Configuration
+from chroma_cli.defaults import defaults
+from chroma_cli.exceptions import UserConfirmationRequired
+from chroma_cli.main import _run, _run_batch
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestBatch(IMLUnitTestCase):
+    def setUp(self):
+        super(TestBatch, self).setUp()
+
+        self.config = Configuration(defaults = defaults)
+        self.config.output = 'json'
+        self.run = mock.patch('chroma_cli.main._run', return_value = 0).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _configs(self):
+        return [args[1] for args, kwargs in self.run.call_args_list]
+
+    def test_lines(self):
+        """Each line is run with the options of the batch as defaults, skipping blank lines and comments"""
+        status = _run_batch(mock.Mock(), self.config, ["server list\n", "\n", "# a comment\n", "--nowait filesystem list\n"])
+
+        self.assertEqual(status, 0)
+        self.assertEqual([config.output for config in self._configs()], ['json', 'json'])
+        self.assertEqual([bool(config.nowait) for config in self._configs()], [False, True])
+        self.assertFalse(self.config.nowait)
+        for args, kwargs in self.run.call_args_list:
+            self.assertEqual(kwargs, {'batch': True})
+
+    def test_failure(self):
+        """A batch carries on after a command fails, and then fails itself"""
+        self.run.side_effect = [1, 0]
+
+        with mock.patch('sys.stderr'):
+            status = _run_batch(mock.Mock(), self.config, ["server list", "nonesuch list", "filesystem list"])
+
+        self.assertEqual(status, 1)
+        self.assertEqual(self.run.call_count, 2)
+
+    def test_confirmation(self):
+        """A command which needs confirmation fails in a batch, as stdin can't be prompted"""
+        ns = mock.Mock()
+        ns.handler.return_value.side_effect = UserConfirmationRequired()
+
+        with mock.patch('chroma_cli.main.raw_input', create = True) as raw_input:
+            self.assertEqual(_run(mock.Mock(), self.config, mock.Mock(), ns, [], batch = True), 1)
+        self.assertFalse(raw_input.called)
@@ -102,6 +102,24 @@ class MockAgentRpc(object):
             if db_disabled:
                 django.db.connection.connection = DISABLED_CONNECTION
 
+    @classmethod
+    def call_many(cls, calls, cancel_event):
+        from chroma_core.services.job_scheduler.agent_rpc import ActionInFlight, AgentException
+
+        rpcs = []
+        for fqdn, cmd, args in calls:
+            try:
+                result, rpc = cls.call(fqdn, cmd, args, cancel_event)
+                rpc.result = result
+            except AgentException as e:
+                rpc = ActionInFlight('foo', fqdn, cmd, args)
+                rpc.subprocesses = []
+                rpc.exception = e.backtrace
+            rpc.complete.set()
+            rpcs.append(rpc)
+
+        return rpcs
+
     @classmethod
     def _call(cls, host, cmd, args):
         cls.calls.append((cmd, args))
@@ -33,6 +33,7 @@ class TestJobs(IMLUnitTestCase):
         assert 'fake' not in str(Step.invoke_agent)
 
         mock.patch("chroma_core.lib.job.Step.invoke_agent", self._fake_invoke_agent).start()
+        mock.patch("chroma_core.lib.job.Step.invoke_agent_many", self._fake_invoke_agent_many).start()
 
         self.addCleanup(mock.patch.stopall)
 
@@ -65,6 +66,16 @@ class TestJobs(IMLUnitTestCase):
 
         return agent_result_ok
 
+    def _fake_invoke_agent_many(self, calls):
+        # Sequential, so that the order of invokes remains deterministic
+        rpcs = []
+        for host, invoke, args in calls:
+            rpc = mock.Mock()
+            rpc.get_result.return_value = self._fake_invoke_agent(host, invoke, args)
+            rpcs.append(rpc)
+
+        return rpcs
+
     def _get_executable_invoke(self, args):
         '''
         return the invoke whose args match those given. note that exact order match is needed
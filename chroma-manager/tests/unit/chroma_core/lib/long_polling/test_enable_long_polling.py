@@ -1,4 +1,5 @@
 import mock
+import threading
 from collections import defaultdict
 
 from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
@@ -18,7 +19,7 @@ class TestEnableLongPolling(IMLUnitTestCase):
         super(TestEnableLongPolling, self).setUp()
 
         self.mock_tables_changed = mock.Mock()
-        mock.patch('chroma_core.services.job_scheduler.job_scheduler_client.JobSchedulerClient',
+        mock.patch('chroma_core.services.notification_hub.client.NotificationHubClient',
                    self.mock_tables_changed).start()
 
         self.mock_propagate_table_change = mock.Mock()
@@ -65,7 +66,17 @@ class TestEnableLongPolling(IMLUnitTestCase):
 
         enable_long_polling.database_changed(self.mock_sender)
 
-        self.mock_propagate_table_change.assert_called_once_with([self.mock_sender._meta.db_table])
+        self.mock_propagate_table_change.assert_called_once_with([self.mock_sender._meta.db_table],
+                                                                 {self.mock_sender._meta.db_table: None})
+
+    def test_unmanaged_changes_propagate_ids(self):
+        """Unmanged changes should propagate the primary key of the instance changed"""
+        self.is_managed = False
+
+        enable_long_polling.database_changed(self.mock_sender, instance = mock.Mock(pk = 5))
+
+        self.mock_propagate_table_change.assert_called_once_with([self.mock_sender._meta.db_table],
+                                                                 {self.mock_sender._meta.db_table: set([5])})
 
     def test_managed_changes_batch(self):
         """Managed changes should propagate on commit"""
@@ -118,7 +129,30 @@ class TestEnableLongPolling(IMLUnitTestCase):
                              original_transaction_commit[test_connection_name])
 
             # We should have propagated the tables
-            self.mock_propagate_table_change.assert_called_with(list(set(self.test_chroma_table_names)))
+            self.mock_propagate_table_change.assert_called_with(list(set(self.test_chroma_table_names)),
+                                                                dict((table_name, None) for table_name in self.test_chroma_table_names))
+
+    def test_managed_changes_batch_ids(self):
+        """Managed changes should propagate the primary keys changed within the transaction on commit"""
+        for pk in [1, 2, 1]:
+            enable_long_polling.database_changed(self.mock_sender, using = 'ellen', instance = mock.Mock(pk = pk))
+
+        enable_long_polling.transaction.connections['ellen'].commit()
+
+        self.mock_propagate_table_change.assert_called_once_with([self.mock_sender._meta.db_table],
+                                                                 {self.mock_sender._meta.db_table: set([1, 2])})
+        self.assertTrue('ellen' not in enable_long_polling._pending_changed_ids)
+
+    def test_managed_changes_batch_unknown_ids(self):
+        """A change of unknown rows within a transaction makes all of the rows changed in its table unknown"""
+        enable_long_polling.database_changed(self.mock_sender, using = 'ellen', instance = mock.Mock(pk = 1))
+        enable_long_polling.database_changed(self.mock_sender, using = 'ellen')
+        enable_long_polling.database_changed(self.mock_sender, using = 'ellen', instance = mock.Mock(pk = 2))
+
+        enable_long_polling.transaction.connections['ellen'].commit()
+
+        self.mock_propagate_table_change.assert_called_once_with([self.mock_sender._meta.db_table],
+                                                                 {self.mock_sender._meta.db_table: None})
 
     def test_managed_changes_rollback(self):
         """Managed changes should not propagate on rollback"""
@@ -156,3 +190,62 @@ class TestEnableLongPolling(IMLUnitTestCase):
                              original_transaction_rollback[test_connection_name])
 
         self.assertEqual(self.mock_propagate_table_change.call_count, 0)
+
+
+class TestDatabaseChangedThread(IMLUnitTestCase):
+    def setUp(self):
+        super(TestDatabaseChangedThread, self).setUp()
+
+        self.sending = threading.Event()
+        self.sent = threading.Event()
+
+        def tables_changed(timestamp, changed_ids):
+            self.sending.set()
+            self.sent.wait(10)
+
+        self.mock_notification_hub_client = mock.Mock()
+        self.mock_notification_hub_client.tables_changed.side_effect = tables_changed
+        mock.patch('chroma_core.services.notification_hub.client.NotificationHubClient',
+                   self.mock_notification_hub_client).start()
+
+        self.addCleanup(mock.patch.stopall)
+        self.addCleanup(self.sent.set)
+
+    def test_changes_batch(self):
+        """Changes made whilst the notification hub is being sent others should be sent in a single message"""
+        thread = enable_long_polling.DatabaseChangedThread()
+        thread.start()
+
+        thread.add(1, {'chroma_core_leicester': set([1])})
+        self.assertTrue(self.sending.wait(10))
+
+        thread.add(2, {'chroma_core_leicester': set([2])})
+        thread.add(4, {'chroma_core_tottenham': None})
+        thread.add(3, {'chroma_core_leicester': set([1])})
+        self.sent.set()
+
+        # Stopping sends the changes still waiting
+        thread.stop()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+
+        self.assertEqual(self.mock_notification_hub_client.tables_changed.call_count, 2)
+        self.mock_notification_hub_client.tables_changed.assert_any_call(1, {'chroma_core_leicester': [1]})
+
+        timestamp, changed_ids = self.mock_notification_hub_client.tables_changed.call_args[0]
+        self.assertEqual(timestamp, 4)
+        self.assertEqual(changed_ids, {'chroma_core_leicester': [1, 2], 'chroma_core_tottenham': None})
+
+    def test_stop(self):
+        """The thread started on the first change is stopped, and started again by the next"""
+        self.sent.set()
+        enable_long_polling._propagate_table_change(['chroma_core_leicester'], {'chroma_core_leicester': set([1])})
+        thread = enable_long_polling._database_changed_thread
+
+        enable_long_polling.stop()
+        self.assertFalse(thread.is_alive())
+        self.mock_notification_hub_client.tables_changed.assert_called_once_with(mock.ANY, {'chroma_core_leicester': [1]})
+
+        enable_long_polling._propagate_table_change(['chroma_core_leicester'])
+        self.assertIsNot(enable_long_polling._database_changed_thread, thread)
+        enable_long_polling.stop()
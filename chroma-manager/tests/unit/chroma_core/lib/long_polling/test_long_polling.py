@@ -0,0 +1,84 @@
+import time
+
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+from chroma_core.lib import util
+from chroma_core.lib.long_polling import long_polling
+
+
+class TestLongPollingChanges(IMLUnitTestCase):
+    def setUp(self):
+        super(TestLongPollingChanges, self).setUp()
+
+        # The state of long polling is global, so each test uses tables of its own
+        self.table = 'chroma_core_%s' % self._testMethodName
+        self.other_table = '%s_other' % self.table
+        self.cursor = self._now() - 1
+
+    def _now(self):
+        return int(time.time() * util.SECONDSTOMICROSECONDS)
+
+    def _wait(self, cursor):
+        return long_polling.wait_table_change({'max_timestamp': cursor}, [self.table, self.other_table], 0, changed_ids = True)
+
+    def test_changed_ids(self):
+        long_polling.tables_changed(self._now(), [self.table], {self.table: [1, 2]})
+        long_polling.tables_changed(self._now(), [self.table], {self.table: [2, 3]})
+
+        self.assertEqual(long_polling.changed_since(self.table, self.cursor), set([1, 2, 3]))
+        self.assertEqual(long_polling.changed_since(self.other_table, self.cursor), set())
+
+        table_timestamps = self._wait(self.cursor)
+        self.assertEqual(table_timestamps['changed_ids'], {self.table: [1, 2, 3], self.other_table: []})
+
+        # Nothing more has changed since the timestamps returned
+        self.assertEqual(long_polling.changed_since(self.table, table_timestamps['max_timestamp']), set())
+
+    def test_unknown_ids(self):
+        long_polling.tables_changed(self._now(), [self.table], {self.table: [1]})
+        cursor = self._wait(self.cursor)['max_timestamp']
+        long_polling.tables_changed(self._now(), [self.table, self.other_table], {self.table: [2]})
+
+        self.assertEqual(long_polling.changed_since(self.table, cursor), set([2]))
+        self.assertEqual(long_polling.changed_since(self.other_table, cursor), None)
+        self.assertEqual(long_polling.changed_since(self.other_table, self.cursor), None)
+
+    def test_late_change(self):
+        """A change timestamped by another process before the last is still after any cursor given out"""
+        long_polling.tables_changed(self._now(), [self.table], {self.table: [1]})
+        cursor = self._wait(self.cursor)['max_timestamp']
+
+        long_polling.tables_changed(self.cursor, [self.table], {self.table: [2]})
+
+        table_timestamps = self._wait(cursor)
+        self.assertGreater(table_timestamps['max_timestamp'], cursor)
+        self.assertEqual(table_timestamps['changed_ids'][self.table], [2])
+
+    def test_late_change_other_table(self):
+        """A late change to one table is still after a cursor given out for a later change to another"""
+        long_polling.tables_changed(self._now(), [self.other_table], {self.other_table: [1]})
+        cursor = self._wait(self.cursor)['max_timestamp']
+
+        long_polling.tables_changed(self.cursor, [self.table], {self.table: [2]})
+
+        table_timestamps = self._wait(cursor)
+        self.assertGreater(table_timestamps[self.table], cursor)
+        self.assertEqual(table_timestamps['changed_ids'], {self.table: [2], self.other_table: []})
+
+    def test_ring_overflow(self):
+        for pk in range(long_polling.CHANGE_RING_SIZE):
+            long_polling.tables_changed(self._now(), [self.table], {self.table: [pk]})
+        self.assertEqual(len(long_polling.changed_since(self.table, self.cursor)), long_polling.CHANGE_RING_SIZE)
+
+        long_polling.tables_changed(self._now(), [self.table], {self.table: [long_polling.CHANGE_RING_SIZE]})
+
+        # The first change has fallen out of the ring
+        self.assertEqual(long_polling.changed_since(self.table, self.cursor), None)
+        self.assertEqual(self._wait(self.cursor)['changed_ids'][self.table], None)
+
+    def test_before_start(self):
+        """Changes from before the process started are not known"""
+        long_polling.tables_changed(self._now(), [self.table], {self.table: [1]})
+
+        self.assertEqual(long_polling.changed_since(self.table, 0), None)
+        self.assertEqual(long_polling.changed_since(self.table, long_polling.started - 1), None)
@@ -0,0 +1,78 @@
+import time
+
+from chroma_core.lib import util
+from chroma_core.lib.host_resolver import host_resolver
+from chroma_core.lib.long_polling import long_polling
+from chroma_core.models import ManagedHost, NetworkInterface, Nid
+from tests.unit.chroma_core.helpers import synthetic_host, load_default_profile
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestHostResolver(IMLUnitTestCase):
+    def setUp(self):
+        super(TestHostResolver, self).setUp()
+        load_default_profile()
+        self.host = synthetic_host('myserver', nids = [Nid.Nid('192.168.0.1', 'tcp', 0)])
+        self.other_host = synthetic_host('otherserver', nids = [Nid.Nid('192.168.0.2', 'tcp', 0)])
+
+    def test_resolve(self):
+        self.assertEqual(host_resolver.get(self.host.id), self.host)
+        self.assertEqual(host_resolver.get_by_fqdn(self.host.fqdn), self.host)
+        self.assertEqual(host_resolver.get_by_nodename(self.host.nodename), self.host)
+        self.assertEqual(host_resolver.get_by_nid('192.168.0.1@tcp0'), self.host)
+        self.assertEqual(host_resolver.get_by_nid('192.168.0.2@tcp'), self.other_host)
+
+        with self.assertRaises(ManagedHost.DoesNotExist):
+            host_resolver.get_by_fqdn('unknown')
+        with self.assertRaises(ManagedHost.DoesNotExist):
+            host_resolver.get_by_nid('192.168.0.1@o2ib0')
+        with self.assertRaises(ManagedHost.DoesNotExist):
+            host_resolver.get_by_nid('0')
+
+    def test_loaded_once(self):
+        """The tables are loaded in bulk on first use, and not queried again until they change"""
+        with self.assertNumQueries(2):
+            host_resolver.get_by_fqdn(self.host.fqdn)
+
+        with self.assertNumQueries(0):
+            for n in range(10):
+                host_resolver.get_by_fqdn(self.host.fqdn)
+                host_resolver.get_by_nid('192.168.0.2@tcp0')
+
+    def test_copies(self):
+        """Each lookup returns a host of its own, unaffected by what was done with others"""
+        host = host_resolver.get_by_fqdn(self.host.fqdn)
+        host.state = 'removed'
+
+        self.assertEqual(host_resolver.get(self.host.id).state, self.host.state)
+        self.assertIsNot(host_resolver.get_by_fqdn(self.host.fqdn), host)
+
+    def test_ambiguous_nid(self):
+        NetworkInterface.objects.create(host = self.other_host, name = 'eth1', type = 'tcp',
+                                        inet4_address = '192.168.0.1', inet4_prefix = 24, state_up = True)
+
+        with self.assertRaises(ManagedHost.MultipleObjectsReturned):
+            host_resolver.get_by_nid('192.168.0.1@tcp0')
+
+    def test_removed_host(self):
+        self.assertEqual(host_resolver.get_by_nid('192.168.0.1@tcp0'), self.host)
+
+        self.host.mark_deleted()
+
+        with self.assertRaises(ManagedHost.DoesNotExist):
+            host_resolver.get_by_fqdn(self.host.fqdn)
+        with self.assertRaises(ManagedHost.DoesNotExist):
+            host_resolver.get_by_nid('192.168.0.1@tcp0')
+
+    def test_table_change_notification(self):
+        """A change notified through long polling, e.g. made by another process, causes a reload"""
+        host_resolver.get_by_fqdn(self.host.fqdn)
+        ManagedHost.objects.filter(id = self.host.id).update(fqdn = 'renamed')
+
+        self.assertEqual(host_resolver.get_by_fqdn(self.host.fqdn), self.host)
+
+        long_polling.tables_changed(int(time.time() * util.SECONDSTOMICROSECONDS), [ManagedHost._meta.db_table])
+
+        self.assertEqual(host_resolver.get_by_fqdn('renamed').id, self.host.id)
+        with self.assertRaises(ManagedHost.DoesNotExist):
+            host_resolver.get_by_fqdn(self.host.fqdn)
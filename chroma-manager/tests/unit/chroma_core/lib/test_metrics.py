@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import mock
+from django.utils.timezone import utc
+
+from chroma_core.lib.metrics import TargetMetricStore
+from chroma_core.models import Point, Series, Stats
+from tests.unit.chroma_core.helpers import synthetic_host, load_default_profile
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestJobExpiry(IMLUnitTestCase):
+    """The series of jobs without recent samples are deleted, with their samples"""
+
+    def setUp(self):
+        super(TestJobExpiry, self).setUp()
+
+        Stats.delete_all()
+        for model in Stats:
+            model.cache.clear()
+        Series.cache.clear()
+        self.addCleanup(Stats.delete_all)
+        TargetMetricStore.next_job_expiry = datetime.fromtimestamp(0, utc)
+        self.addCleanup(setattr, TargetMetricStore, 'next_job_expiry', datetime.fromtimestamp(0, utc))
+        TargetMetricStore.serialized_jobs = set()
+        self.addCleanup(setattr, TargetMetricStore, 'serialized_jobs', set())
+
+        load_default_profile()
+        self.host = synthetic_host()
+        now = datetime.now(utc)
+        self.cold = Series.get(self.host, 'job_read_bytes_cp.0', 'procname_uid')
+        self.hot = Series.get(self.host, 'job_read_bytes_dd.0', 'procname_uid')
+        self.gauge = Series.get(self.host, 'cpu_total', 'Gauge')
+        old = now - TargetMetricStore.job_expiration - timedelta(minutes = 1)
+        for model in Stats:
+            model.insert({self.cold.id: [Point(model.floor(old), 1.0, 1)]})
+        Stats[0].insert({self.hot.id: [Point(old, 1.0, 1), Point(now, 2.0, 1)]})
+
+    def _expire(self):
+        TargetMetricStore.next_job_expiry = datetime.fromtimestamp(0, utc)
+        return TargetMetricStore.expire_jobs()
+
+    def test_expire_jobs(self):
+        self.assertEqual(TargetMetricStore.expire_jobs(), [])
+
+        # only the most granular samples go at first, rollups are kept for longer
+        self.assertEqual(list(Stats[0].select(self.cold.id)), [])
+        for model in Stats[1:]:
+            self.assertEqual(len(list(model.select(self.cold.id))), 1)
+        self.assertEqual(len(list(Stats[0].select(self.hot.id))), 2)
+        self.assertEqual(Series.objects.count(), 3)
+
+        with mock.patch.object(TargetMetricStore, 'job_rollup_expiration', TargetMetricStore.job_expiration):
+            self.assertEqual(self._expire(), [self.cold.id])
+
+        self.assertEqual(set(Series.objects.values_list('id', flat = True)), set([self.hot.id, self.gauge.id]))
+        for model in Stats:
+            self.assertEqual(list(model.select(self.cold.id)), [])
+        self.assertEqual(len(list(Stats[0].select(self.hot.id))), 2)
+        self.assertNotIn((self.host, 'job_read_bytes_cp.0'), Series.cache)
+        self.assertIn((self.host, 'job_read_bytes_dd.0'), Series.cache)
+
+    def test_flush_interval(self):
+        """Jobs are expired at most once a flush interval"""
+        with mock.patch.object(TargetMetricStore, 'job_rollup_expiration', TargetMetricStore.job_expiration):
+            self.assertEqual(TargetMetricStore.expire_jobs(), [self.cold.id])
+
+            Stats[0].objects.filter(id = self.hot.id).delete()
+            self.assertEqual(TargetMetricStore.expire_jobs(), [])
+            TargetMetricStore.next_job_expiry -= TargetMetricStore.job_expiration
+            self.assertEqual(TargetMetricStore.expire_jobs(), [self.hot.id])
+
+    def test_serialized_since_expiry(self):
+        """A job which recurs is kept while its new samples may still be queued"""
+        stat = {'job_id': 'cp.0', 'snapshot_time': 1, 'open': {'samples': 1},
+                'read': {'sum': 4096, 'samples': 1}, 'write': {'sum': 0, 'samples': 0}}
+        samples = TargetMetricStore(self.host).serialize({'job_stats': [stat]}, jobid_var='procname_uid')
+        self.assertIn(self.cold.id, [id for id, dt, value in samples])
+
+        with mock.patch.object(TargetMetricStore, 'job_rollup_expiration', TargetMetricStore.job_expiration):
+            self.assertEqual(TargetMetricStore.expire_jobs(), [])
+            self.assertEqual(len(list(Stats[0].select(self.cold.id))), 1)
+            self.assertTrue(Series.objects.filter(id = self.cold.id).exists())
+
+            # expired in the next round if the samples never arrive
+            self.assertIn(self.cold.id, self._expire())
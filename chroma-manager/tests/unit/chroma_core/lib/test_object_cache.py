@@ -0,0 +1,94 @@
+from chroma_core.lib.cache import ObjectCache
+from chroma_core.models import (ManagedMgs, ManagedFilesystem, ManagedMdt, ManagedOst, ManagedTarget,
+                                ManagedTargetMount, VolumeNode, LustreClientMount)
+from chroma_core.models.copytool import Copytool
+from tests.unit.chroma_core.helpers import synthetic_volume, synthetic_host, load_default_profile
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestObjectCacheIndexes(IMLUnitTestCase):
+    """The lookups by host, filesystem and target follow the objects added, updated and purged"""
+
+    def setUp(self):
+        super(TestObjectCacheIndexes, self).setUp()
+
+        load_default_profile()
+        self.hosts = [synthetic_host(), synthetic_host()]
+        self.volume = synthetic_volume(with_storage = False)
+        self.volume_nodes = [VolumeNode.objects.create(volume = self.volume, host = host, path = '/dev/sda')
+                             for host in self.hosts]
+
+        self.mgs = ManagedMgs.objects.create(volume = self.volume)
+        self.fs = ManagedFilesystem.objects.create(name = 'testfs', mgs = self.mgs)
+        self.mdt = ManagedMdt.objects.create(volume = self.volume, filesystem = self.fs, index = 0)
+        self.ost = ManagedOst.objects.create(volume = self.volume, filesystem = self.fs, index = 0)
+        self.mtm = self._mount(self.ost, 0)
+
+        ObjectCache.clear()
+        self.addCleanup(ObjectCache.clear)
+
+    def _mount(self, target, host_index):
+        return ManagedTargetMount.objects.create(target = target, host = self.hosts[host_index],
+                                                 volume_node = self.volume_nodes[host_index], primary = True)
+
+    def _ids(self, objects):
+        return [o.id for o in objects]
+
+    def test_loaded(self):
+        ObjectCache.getInstance()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._ids(ObjectCache.get_targets_by_filesystem(self.fs.id)),
+                             [self.mgs.id, self.mdt.id, self.ost.id])
+            self.assertEqual(self._ids(ObjectCache.host_targets(self.hosts[0].id)), [self.ost.id])
+            self.assertEqual(self._ids(ObjectCache.target_mounts(self.ost.id)), [self.mtm.id])
+            self.assertEqual(ObjectCache.target_filesystem_id(ObjectCache.get_by_id(ManagedTarget, self.ost.id)), self.fs.id)
+            self.assertEqual(ObjectCache.target_filesystem_id(ObjectCache.get_by_id(ManagedTarget, self.mgs.id)), None)
+
+        self.assertEqual(ObjectCache.target_primary_server(self.ost).id, self.hosts[0].id)
+
+    def test_add(self):
+        ObjectCache.getInstance()
+
+        ost = ManagedOst.objects.create(volume = self.volume, filesystem = self.fs, index = 1)
+        ObjectCache.add(ManagedTarget, ost.managedtarget_ptr)
+        mtm = self._mount(ost, 1)
+        ObjectCache.add(ManagedTargetMount, mtm)
+
+        self.assertEqual(self._ids(ObjectCache.fs_targets(self.fs.id)), [self.mdt.id, self.ost.id, ost.id])
+        self.assertEqual(self._ids(ObjectCache.host_targets(self.hosts[1].id)), [ost.id])
+        self.assertEqual(ObjectCache.mtm_targets(mtm.id)[0].id, ost.id)
+
+    def test_update(self):
+        ObjectCache.getInstance()
+
+        ManagedTargetMount.objects.filter(id = self.mtm.id).update(host = self.hosts[1], volume_node = self.volume_nodes[1])
+        ObjectCache.update(self.mtm)
+
+        self.assertEqual(ObjectCache.host_targets(self.hosts[0].id), [])
+        self.assertEqual(self._ids(ObjectCache.host_targets(self.hosts[1].id)), [self.ost.id])
+
+    def test_purge(self):
+        ObjectCache.getInstance()
+
+        ObjectCache.purge(ManagedTarget, lambda t: t.id == self.ost.id)
+        ObjectCache.purge(ManagedTargetMount, lambda mtm: mtm.target_id == self.ost.id)
+
+        self.assertEqual(self._ids(ObjectCache.fs_targets(self.fs.id)), [self.mdt.id])
+        self.assertEqual(ObjectCache.host_targets(self.hosts[0].id), [])
+        self.assertEqual(ObjectCache.target_mounts(self.ost.id), [])
+
+    def test_client_mounts(self):
+        client_mount = LustreClientMount.objects.create(host = self.hosts[1], filesystem = self.fs, mountpoint = '/mnt/testfs')
+        copytool = Copytool.objects.create(host = self.hosts[1], filesystem = self.fs, bin_path = '/usr/sbin/lhsmtool_posix',
+                                           mountpoint = '/mnt/testfs', client_mount = client_mount)
+        Copytool.objects.create(host = self.hosts[1], filesystem = self.fs, bin_path = '/usr/sbin/lhsmtool_posix',
+                                mountpoint = '/mnt/other', index = 1)
+
+        self.assertEqual(self._ids(ObjectCache.host_client_mounts(self.hosts[1].id)), [client_mount.id])
+        self.assertEqual(self._ids(ObjectCache.filesystem_client_mounts(self.fs.id)), [client_mount.id])
+        self.assertEqual(self._ids(ObjectCache.client_mount_copytools(client_mount.id)), [copytool.id])
+
+        ObjectCache.purge(LustreClientMount, lambda cm: cm.id == client_mount.id)
+        self.assertEqual(ObjectCache.host_client_mounts(self.hosts[1].id), [])
+        self.assertEqual(ObjectCache.client_mount_copytools(client_mount.id), [])
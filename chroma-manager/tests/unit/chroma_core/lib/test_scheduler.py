@@ -0,0 +1,51 @@
+import mock
+
+from chroma_core.lib import scheduler
+from chroma_core.lib.scheduler import procname_uid
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestMetadataCache(IMLUnitTestCase):
+    """Job metadata is fetched from the plugins in batches of the ids not cached"""
+
+    def setUp(self):
+        super(TestMetadataCache, self).setUp()
+
+        scheduler.cache.clear()
+        self.addCleanup(scheduler.cache.clear)
+
+        self.time = mock.patch('chroma_core.lib.scheduler.time.time', return_value = 1000.0).start()
+        self.fetch = mock.patch.object(procname_uid, 'fetch', side_effect = procname_uid.fetch).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _fetched(self):
+        return [sorted(call[0][0]) for call in self.fetch.call_args_list]
+
+    def test_batched(self):
+        self.assertEqual(scheduler.metadata('procname_uid', 'user', ['cp.0', 'dd.0']), {'cp.0': '0', 'dd.0': '0'})
+        self.assertEqual(scheduler.metadata('procname_uid', 'name', ['cp.0', 'dd.0', 'ls.500']),
+                         {'cp.0': 'cp', 'dd.0': 'dd', 'ls.500': 'ls'})
+        self.assertEqual(self._fetched(), [['cp.0', 'dd.0'], ['ls.500']])
+        self.assertEqual((scheduler.cache.hits, scheduler.cache.misses), (2, 3))
+        self.assertEqual(scheduler.cache.hit_rate, 0.4)
+
+    def test_unknown_ids(self):
+        self.fetch.side_effect = lambda ids: [{'name': 'cp'}]
+        self.assertEqual(scheduler.metadata('procname_uid', 'name', ['cp.0', 'bogus']).values(), ['cp'])
+        self.assertEqual(len(scheduler.metadata('procname_uid', 'name', ['cp.0', 'bogus'])), 1)
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_expiry(self):
+        scheduler.metadata('procname_uid', 'name', ['cp.0'])
+        self.time.return_value += scheduler.MetadataCache.MAX_AGE - 1
+        scheduler.metadata('procname_uid', 'name', ['cp.0'])
+        self.assertEqual(self.fetch.call_count, 1)
+        self.time.return_value += 1
+        scheduler.metadata('procname_uid', 'name', ['cp.0'])
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_unknown_plugin(self):
+        with mock.patch('chroma_core.lib.scheduler.importlib.import_module', side_effect = ImportError) as import_module:
+            self.assertEqual(scheduler.metadata('no_such_scheduler', 'name', ['cp.0']), {})
+            self.assertEqual(scheduler.metadata('no_such_scheduler', 'name', ['cp.0']), {})
+        self.assertEqual(import_module.call_count, 1)
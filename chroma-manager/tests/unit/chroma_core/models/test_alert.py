@@ -1,8 +1,13 @@
+import mock
+
 from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+from tests.unit.chroma_core.helpers import synthetic_host, load_default_profile
 
 from chroma_core.models import CommandRunningAlert
 from chroma_core.models import CommandCancelledAlert
 from chroma_core.models import AlertState
+from chroma_core.models import AlertEvent
+from chroma_core.models import HostOfflineAlert
 
 
 class TestAlert(IMLUnitTestCase):
@@ -25,3 +30,58 @@ class TestAlert(IMLUnitTestCase):
         alerts = AlertState.objects.all()
         self.assertEqual(len(alerts), 1)
         self.assertEqual(alerts[0].message(), 'Command Houston we have a problem cancelled')
+
+
+class TestNotifyMany(IMLUnitTestCase):
+    def setUp(self):
+        super(TestNotifyMany, self).setUp()
+
+        load_default_profile()
+        self.hosts = [synthetic_host() for _ in range(3)]
+
+    def _active(self):
+        return sorted(alert.alert_item_id for alert in HostOfflineAlert.objects.filter(active = True))
+
+    def test_raise_and_lower(self):
+        HostOfflineAlert.notify_many([(self.hosts[0], True), (self.hosts[1], True), (self.hosts[2], False)])
+        self.assertEqual(self._active(), [self.hosts[0].id, self.hosts[1].id])
+
+        HostOfflineAlert.notify_many([(self.hosts[0], False), (self.hosts[1], True), (self.hosts[2], True)])
+        self.assertEqual(self._active(), [self.hosts[1].id, self.hosts[2].id])
+
+        lowered = HostOfflineAlert.objects.get(alert_item_id = self.hosts[0].id)
+        self.assertEqual((lowered.active, lowered.end is not None), (None, True))
+        self.assertEqual(lowered.message(), "Host is offline %s" % self.hosts[0])
+
+        end_event = AlertEvent.objects.get()
+        self.assertEqual((end_event.alert_item, end_event.alert.id, end_event.active),
+                         (self.hosts[0], lowered.id, None))
+        self.assertEqual(end_event.message(), "Host is back online %s" % self.hosts[0])
+
+    def test_same_as_notify(self):
+        """The last notification of an item counts, as it would if each were notified in turn"""
+        HostOfflineAlert.notify_many([(self.hosts[0], False), (self.hosts[0], True)])
+        HostOfflineAlert.notify(self.hosts[1], True)
+        self.assertEqual(self._active(), [self.hosts[0].id, self.hosts[1].id])
+
+    def test_constant_queries(self):
+        def queries(active):
+            from django.db import connection, reset_queries
+            reset_queries()
+            with self.settings(DEBUG = True):
+                HostOfflineAlert.notify_many([(host, active) for host in hosts])
+                return len(connection.queries)
+
+        hosts = self.hosts[:1]
+        few = queries(True), queries(False)
+        hosts = self.hosts
+        self.assertEqual(few, (queries(True), queries(False)))
+
+    def test_integrity_error(self):
+        """An alert raised concurrently isn't raised again, but the others still are"""
+        HostOfflineAlert.notify(self.hosts[0], True)
+
+        with mock.patch.object(HostOfflineAlert, '_active_by_item', return_value = {}):
+            HostOfflineAlert.notify_many([(host, True) for host in self.hosts])
+
+        self.assertEqual(self._active(), [host.id for host in self.hosts])
@@ -43,6 +43,8 @@ def assertQueries(*prefixes):
     yield
     for prefix, query in itertools.izip_longest(prefixes, connection.queries[count:]):
         assert prefix and query and query['sql'].startswith(prefix), (prefix, query)
+        if prefix == 'COPY':  # can't be explained
+            continue
         cursor = connection.cursor()
         cursor.execute('EXPLAIN ' + query['sql'])
         plan = ''.join(row for row, in cursor)
@@ -93,7 +95,7 @@ class TestModels(IMLUnitTestCase):
 
         model.objects.all().delete()
 
-        with assertQueries('INSERT', 'SELECT'):
+        with assertQueries('COPY', 'SELECT'):
             model.insert({id: points})
             point = model.latest(id)
             model.cache.clear()
@@ -115,13 +117,26 @@ class TestModels(IMLUnitTestCase):
         self.assertListEqual(list(model.select(id)), [])
         self.assertTrue(Stats[-1].start(id))
 
+    def test_sample_prime(self):
+        model = Stats[0]
+        self.addCleanup(model.cache.clear)
+        model.insert({id: points})
+        model.cache.clear()
+
+        with assertQueries('SELECT'):
+            model.prime([id, id + 1])
+        with assertQueries():
+            self.assertEqual(model.latest(id), points[-1])
+            self.assertEqual(model.latest(id + 1), Point.zero)
+            model.prime([id, id + 1])
+
     def test_sample_simple_wipe(self):
         model = Stats[0]
         settings.STATS_SIMPLE_WIPE = True
 
         model.objects.all().delete()
 
-        with assertQueries('INSERT', 'SELECT'):
+        with assertQueries('COPY', 'SELECT'):
             model.insert({id: points})
             point = model.latest(id)
             model.cache.clear()
@@ -201,6 +216,30 @@ class TestModels(IMLUnitTestCase):
         for model in Stats:
             self.assertListEqual(list(model.select(id)), [])
 
+    def test_stats_select_many(self):
+        Stats.insert((series_id, point.dt, point.sum * series_id) for point in points for series_id in (id, id + 1))
+        for model in Stats:
+            model.cache.clear()
+        start, stop = points[0].dt, points[-1].dt
+        for kwargs in [{}, {'rate': True}, {'maxlen': 10}, {'fixed': 7}, {'rate': True, 'maxlen': 20, 'fixed': 5}]:
+            selected = Stats.select_many([id, id + 1, id + 2], start, stop, **kwargs)
+            for series_id in (id, id + 1, id + 2):
+                self.assertListEqual(selected[series_id], Stats.select(series_id, start, stop, **kwargs))
+        count = len(connection.queries)
+        Stats.select_many([id, id + 1, id + 2], start, stop)
+        self.assertEqual(len(connection.queries) - count, 2)
+
+    def test_stats_duplicates(self):
+        "Samples at the same time within a batch are skipped, rather than failing the insert."
+        for model in Stats:
+            model.cache.clear()
+        first, second = points[:2]
+        samples = [(id, first.dt, 1.0), (id, second.dt, 2.0), (id, first.dt, 3.0), (id + 1, first.dt, 4.0)]
+        self.assertEqual(Stats.insert(samples), [(id, first.dt, 3.0)])
+        Stats[0].cache.clear()
+        self.assertListEqual(list(Stats[0].select(id)), [Point(first.dt, 1.0, 1), Point(second.dt, 2.0, 1)])
+        self.assertListEqual(list(Stats[0].select(id + 1)), [Point(first.dt, 4.0, 1)])
+
 
 @skipIf(True, "Monster Data Tests Not Normally Run")
 class TestMonsterData(IMLUnitTestCase):
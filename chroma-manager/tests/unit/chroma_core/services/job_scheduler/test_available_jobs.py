@@ -137,7 +137,7 @@ class TestAvailableJobs(IMLUnitTestCase):
     def test_locks_query_count(self):
         """Check that query count to pull in available jobs hasn't changed"""
 
-        EXPECTED_QUERIES = 6  # but 3 are for setup
+        EXPECTED_QUERIES = 5  # but 3 are for setup
 
         host_ct_key = ContentType.objects.get_for_model(
             self.host.downcast()).natural_key()
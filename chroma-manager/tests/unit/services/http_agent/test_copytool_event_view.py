@@ -0,0 +1,128 @@
+import json
+
+import mock
+from django.test import Client
+
+from chroma_core.models import ManagedMgs, ManagedFilesystem, LogMessage
+from chroma_core.models.copytool import Copytool, CopytoolOperation, OP_STATES, UNKNOWN_UUID
+from chroma_core.services.job_scheduler.job_scheduler_client import JobSchedulerClient
+# The views can't be imported before the http_agent service, which imports them
+from chroma_core.services.http_agent import ValidatedClientView
+from tests.unit.chroma_core.helpers import synthetic_host, synthetic_volume, load_default_profile
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestCopytoolEventView(IMLUnitTestCase):
+    SERIAL = 'copytool_serial'
+
+    def setUp(self):
+        super(TestCopytoolEventView, self).setUp()
+
+        load_default_profile()
+        self.host = synthetic_host('myserver')
+        mgs = ManagedMgs.objects.create(volume = synthetic_volume(with_storage = False))
+        filesystem = ManagedFilesystem.objects.create(name = 'testfs', mgs = mgs)
+        self.copytool = Copytool.objects.create(host = self.host, filesystem = filesystem,
+                                                bin_path = '/usr/sbin/lhsmtool_posix', state = 'started')
+
+        ValidatedClientView.valid_certs = {self.SERIAL: self.host.fqdn}
+
+        self.register_copytool = mock.patch.object(JobSchedulerClient, 'register_copytool').start()
+        self.unregister_copytool = mock.patch.object(JobSchedulerClient, 'unregister_copytool').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _post(self, events):
+        response = Client().post('/agent/copytool_event/',
+                                 data = json.dumps({'fqdn': self.host.fqdn, 'copytool': self.copytool.id, 'events': events}),
+                                 content_type = 'application/json',
+                                 HTTP_X_SSL_CLIENT_SERIAL = self.SERIAL,
+                                 HTTP_X_SSL_CLIENT_NAME = self.host.fqdn)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['active_operations']
+
+    def _event(self, second, event_type, fid, **kwargs):
+        event = dict(event_time = '2017-01-01 00:00:%02d+00:00' % second,
+                     event_type = event_type,
+                     lustre_path = 'file_%s' % fid,
+                     source_fid = fid,
+                     data_fid = fid)
+        event.update(kwargs)
+        return event
+
+    def _archive(self, first_fid, count, second = 0):
+        """Events which start, progress and finish archiving some files, and start archiving as many more"""
+        events = []
+        for fid in range(first_fid, first_fid + count):
+            events.append(self._event(second, 'ARCHIVE_START', 'done_%s' % fid))
+            events.append(self._event(second + 1, 'ARCHIVE_RUNNING', 'done_%s' % fid, current_bytes = 10, total_bytes = 100))
+            events.append(self._event(second + 2, 'ARCHIVE_FINISH', 'done_%s' % fid, current_bytes = 100, total_bytes = 100))
+            events.append(self._event(second, 'ARCHIVE_START', 'active_%s' % fid))
+            events.append(dict(event_time = '2017-01-01 00:00:%02d+00:00' % second, event_type = 'LOGGED_MESSAGE',
+                               level = 'INFO', message = 'archiving %s' % fid))
+        return events
+
+    def test_operations(self):
+        """Operations are created, progressed and finished within a POST and across POSTs"""
+        active_operations = self._post(self._archive(0, 2))
+
+        self.assertEqual(set(active_operations.keys()), set(['active_0', 'active_1']))
+        for fid, id in active_operations.items():
+            operation = CopytoolOperation.objects.get(id = id)
+            self.assertEqual((operation.fid, operation.state), (fid, OP_STATES.STARTED))
+        for fid in ['done_0', 'done_1']:
+            operation = CopytoolOperation.objects.get(fid = fid)
+            self.assertEqual((operation.state, operation.processed_bytes), (OP_STATES.FINISHED, 10))
+        self.assertEqual(LogMessage.objects.filter(tag = str(self.copytool)).count(), 2)
+
+        self.assertEqual(self._post([self._event(10, 'ARCHIVE_RUNNING', 'active_0', current_bytes = 50, total_bytes = 100,
+                                                 active_operation = active_operations['active_0']),
+                                     self._event(11, 'ARCHIVE_RUNNING', 'active_0', current_bytes = 60, total_bytes = 100,
+                                                 active_operation = active_operations['active_0']),
+                                     self._event(12, 'ARCHIVE_ERROR', 'active_1', error = 'No space',
+                                                 active_operation = active_operations['active_1'])]),
+                         {'active_0': active_operations['active_0']})
+
+        running = CopytoolOperation.objects.get(id = active_operations['active_0'])
+        self.assertEqual((running.state, running.processed_bytes), (OP_STATES.RUNNING, 60))
+        failed = CopytoolOperation.objects.get(id = active_operations['active_1'])
+        self.assertEqual((failed.state, failed.info), (OP_STATES.ERRORED, 'No space'))
+
+    def test_constant_queries(self):
+        """The queries for a POST don't depend on how many events it has"""
+        def queries(events):
+            from django.db import connection, reset_queries
+            reset_queries()
+            with self.settings(DEBUG = True):
+                self._post(events)
+                return len(connection.queries)
+
+        # The first request loads the storage plugins
+        self._post([])
+
+        few = queries(self._archive(0, 1))
+        many = queries(self._archive(1, 50))
+        self.assertEqual(few, many)
+        self.assertEqual(CopytoolOperation.objects.count(), 102)
+
+        def progress(operations):
+            return [self._event(10, 'ARCHIVE_RUNNING', operation.fid, current_bytes = 50, total_bytes = 100,
+                                active_operation = operation.id)
+                    for operation in operations]
+
+        active = CopytoolOperation.objects.filter(state = OP_STATES.STARTED)
+        self.assertEqual(queries(progress(active[:1])), queries(progress(active)))
+        self.assertEqual(CopytoolOperation.objects.filter(state = OP_STATES.RUNNING).count(), 51)
+
+    def test_register(self):
+        """Registrations are made in order with the events, and a missed one is fixed up once"""
+        self.copytool.set_state('stopped')
+        self.copytool.save()
+
+        self._post(self._archive(0, 2) + [dict(event_time = '2017-01-01 00:00:30+00:00', event_type = 'REGISTER', uuid = 'new_uuid')])
+
+        self.assertEqual(self.register_copytool.call_args_list, [mock.call(self.copytool.id, UNKNOWN_UUID),
+                                                                 mock.call(self.copytool.id, 'new_uuid')])
+
+    def test_unknown_operation(self):
+        self.assertEqual(self._post([self._event(0, 'ARCHIVE_RUNNING', 'fid', current_bytes = 1, total_bytes = 2,
+                                                 active_operation = 12345)]), {})
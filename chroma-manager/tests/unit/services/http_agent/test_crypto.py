@@ -0,0 +1,52 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from multiprocessing.pool import ThreadPool
+
+import mock
+
+from chroma_core.services.http_agent.crypto import Crypto
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestCrypto(IMLUnitTestCase):
+    def setUp(self):
+        super(TestCrypto, self).setUp()
+
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+        for attr, filename in [('AUTHORITY_KEY_FILE', 'authority.pem'), ('AUTHORITY_CERT_FILE', 'authority.crt')]:
+            patcher = mock.patch.object(Crypto, attr, os.path.join(self.folder, filename))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.client_key = os.path.join(self.folder, 'client.pem')
+        subprocess.check_call(['openssl', 'genrsa', '-out', self.client_key, '2048'],
+                              stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+        # The authority key too, which Crypto would generate with arguments that not every openssl accepts
+        shutil.copy(self.client_key, Crypto.AUTHORITY_KEY_FILE)
+
+    def _csr(self, common_name):
+        return subprocess.Popen(['openssl', 'req', '-new', '-sha256', '-subj', '/CN=%s' % common_name, '-key', self.client_key],
+                                stdout = subprocess.PIPE, stderr = subprocess.PIPE).communicate()[0]
+
+    def test_concurrent_signing(self):
+        """Certificates signed at the same time all succeed, each with a serial of its own"""
+        csrs = [self._csr('oss%s.mycompany.com' % n) for n in range(16)]
+        Crypto().authority_cert
+
+        def sign(csr):
+            return Crypto().get_serial(Crypto().sign(csr))
+
+        pool = ThreadPool(8)
+        try:
+            serials = pool.map(sign, csrs)
+        finally:
+            pool.close()
+
+        self.assertEqual(len(set(serials)), len(csrs))
+        for serial in serials:
+            # The length of ClientCertificate.serial
+            self.assertLessEqual(len(serial), 16)
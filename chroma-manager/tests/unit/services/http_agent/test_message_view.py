@@ -0,0 +1,128 @@
+import json
+import mock
+
+from django.utils import unittest
+
+from chroma_core.services.http_agent.queues import HostQueues
+from chroma_agent_comms.views import MessageView
+from tests.utils import patch
+
+
+class TestMessageViewTx(unittest.TestCase):
+    CLIENT_START_TIME = '2017-01-01T00:00:00Z'
+
+    def setUp(self):
+        self.view = MessageView()
+        self.queues = HostQueues('myserver')
+        self.reader = self.queues.new_reader()
+
+    def _message(self, seq, body=None):
+        return {
+            'fqdn': 'myserver',
+            'type': 'DATA',
+            'plugin': 'action_runner',
+            'session_id': 'foo',
+            'session_seq': seq,
+            'body': body
+        }
+
+    def test_empty_queue(self):
+        messages, cancelled = self.view._receive_tx('myserver', self.queues, self.CLIENT_START_TIME, 0, self.reader)
+        self.assertEqual(messages, [])
+        self.assertFalse(cancelled)
+
+    def test_message_cap(self):
+        """Messages beyond MAX_MESSAGES_PER_RESPONSE stay queued for the next response"""
+        for seq in range(5):
+            self.queues.tx.put(self._message(seq))
+
+        with patch(MessageView, MAX_MESSAGES_PER_RESPONSE=3):
+            messages, cancelled = self.view._receive_tx('myserver', self.queues, self.CLIENT_START_TIME, 0, self.reader)
+            self.assertEqual([m['session_seq'] for m in messages], [0, 1, 2])
+            self.assertEqual(self.queues.tx.qsize(), 2)
+
+            messages, cancelled = self.view._receive_tx('myserver', self.queues, self.CLIENT_START_TIME, 0, self.reader)
+            self.assertEqual([m['session_seq'] for m in messages], [3, 4])
+            self.assertEqual(self.queues.tx.qsize(), 0)
+
+    def test_byte_cap(self):
+        """A response is cut at MAX_BYTES_PER_RESPONSE, but always carries at least one message"""
+        body = 'x' * 1024
+        for seq in range(3):
+            self.queues.tx.put(self._message(seq, body))
+
+        with patch(MessageView, MAX_BYTES_PER_RESPONSE=len(json.dumps(self._message(0, body))) + 1):
+            messages, cancelled = self.view._receive_tx('myserver', self.queues, self.CLIENT_START_TIME, 0, self.reader)
+            self.assertEqual(len(messages), 1)
+
+        with patch(MessageView, MAX_BYTES_PER_RESPONSE=1):
+            messages, cancelled = self.view._receive_tx('myserver', self.queues, self.CLIENT_START_TIME, 0, self.reader)
+            self.assertEqual(len(messages), 1)
+            self.assertEqual(self.queues.tx.qsize(), 1)
+
+    def test_barrier(self):
+        """A barrier from a different agent instance cancels the response"""
+        self.queues.tx.put(self._message(0))
+        self.queues.tx.put({'fqdn': 'myserver', 'type': 'TX_BARRIER', 'client_start_time': self.CLIENT_START_TIME})
+        self.queues.tx.put(self._message(1))
+
+        messages, cancelled = self.view._receive_tx('myserver', self.queues, self.CLIENT_START_TIME, 0, self.reader)
+        self.assertEqual([m['session_seq'] for m in messages], [0, 1])
+        self.assertFalse(cancelled)
+
+        self.queues.tx.put({'fqdn': 'myserver', 'type': 'TX_BARRIER', 'client_start_time': 'some other time'})
+        self.queues.tx.put(self._message(2))
+        messages, cancelled = self.view._receive_tx('myserver', self.queues, self.CLIENT_START_TIME, 0, self.reader)
+        self.assertEqual(messages, [])
+        self.assertTrue(cancelled)
+
+    def test_superseded(self):
+        """A GET superseded by a newer one from the host takes no more messages"""
+        self.queues.tx.put(self._message(0))
+        reader = self.queues.new_reader()
+
+        messages, cancelled = self.view._receive_tx('myserver', self.queues, self.CLIENT_START_TIME, 0, self.reader)
+        self.assertEqual(messages, [])
+        self.assertTrue(cancelled)
+
+        messages, cancelled = self.view._receive_tx('myserver', self.queues, self.CLIENT_START_TIME, 0, reader)
+        self.assertEqual([m['session_seq'] for m in messages], [0])
+
+    def test_stream_superseded(self):
+        """A stream ends, leaving the queue to the newer GET, once superseded"""
+        self.view.queues = mock.Mock(get=lambda fqdn: self.queues)
+        self.view.sessions = mock.Mock()
+        self.view.sessions.get.return_value.id = 'foo'
+        self.view.hosts = mock.Mock()
+
+        with patch(MessageView, LONG_POLL_TIMEOUT=0):
+            stream = self.view._stream('myserver', self.CLIENT_START_TIME, [], self.reader)
+            self.queues.tx.put(self._message(0))
+            self.assertEqual([m['session_seq'] for m in json.loads(next(stream))['messages']], [0])
+
+            self.queues.new_reader()
+            self.queues.tx.put(self._message(1))
+            self.assertRaises(StopIteration, next, stream)
+            self.assertEqual(self.queues.tx.qsize(), 1)
+
+    def test_stream_cleanup(self):
+        """A stream only records contact in memory, and logs its errors and closes its connection itself"""
+        self.view.queues = mock.Mock(get=lambda fqdn: self.queues)
+        self.view.sessions = mock.Mock()
+        self.view.sessions.get.side_effect = RuntimeError
+        self.view.hosts = mock.Mock()
+
+        with patch(MessageView, LONG_POLL_TIMEOUT=0):
+            with mock.patch('chroma_agent_comms.views.connection') as connection:
+                with mock.patch('chroma_agent_comms.views.log') as log:
+                    stream = self.view._stream('myserver', self.CLIENT_START_TIME, [], self.reader)
+                    self.assertEqual(json.loads(next(stream)), {'messages': []})
+                    self.assertFalse(connection.close.called)
+
+                    self.queues.tx.put(self._message(0))
+                    self.assertRaises(RuntimeError, next, stream)
+                    self.assertTrue(log.error.called)
+                    connection.close.assert_called_once_with()
+
+        self.view.hosts.contact.assert_called_once_with('myserver')
+        self.assertFalse(self.view.hosts.update.called)
@@ -3,6 +3,7 @@ import mock
 
 from django.test import Client
 
+from chroma_core.lib.util import CommandError
 from chroma_core.models import ManagedHost, ServerProfile, Nid
 from chroma_core.models.registration_token import RegistrationToken
 from chroma_core.services.http_agent.crypto import Crypto
@@ -73,6 +74,137 @@ class TestRegistration(IMLUnitTestCase):
             host = ManagedHost.objects.get(id=content['host_id'])
             self.assertEqual(host.fqdn, data['fqdn'])
 
+
+class FakeCrypto(object):
+    """Signs the 'CSRs' of TestRegisterMany, which are just the common name, without openssl"""
+    authority_cert = 'authority.crt'
+
+    def get_common_name(self, csr):
+        return csr
+
+    def sign(self, csr):
+        if csr.startswith('unsignable'):
+            raise CommandError(['openssl', 'x509'], 1, '', 'unable to load number from authority.srl')
+        return 'certificate:%s' % csr
+
+    def get_serial(self, certificate):
+        return certificate.split(':')[1].split('.')[0]
+
+
+class TestRegisterMany(IMLUnitTestCase):
+    def setUp(self):
+        super(TestRegisterMany, self).setUp()
+
+        load_default_profile()
+
+        self.old_create_hosts = JobSchedulerClient.create_hosts
+        JobSchedulerClient.create_hosts = mock.Mock(side_effect=lambda hosts, server_profile_id: [
+            (synthetic_host(host['address'], fqdn=host['fqdn'], nodename=host['nodename']), mock.Mock(id=n))
+            for n, host in enumerate(hosts)])
+        ValidatedClientView.valid_certs = {}
+
+    def tearDown(self):
+        JobSchedulerClient.create_hosts = self.old_create_hosts
+
+    def _host(self, name, version='1.0'):
+        return {
+            'fqdn': '%s.mycompany.com' % name,
+            'nodename': name,
+            'version': version,
+            'capabilities': ['manage_targets'],
+            'address': name,
+            'csr': '%s.mycompany.com' % name,
+        }
+
+    def _register_many(self, hosts, credits=10):
+        self.token = RegistrationToken.objects.create(profile=ServerProfile.objects.get(), credits=credits)
+        with mock.patch('chroma_agent_comms.views.Crypto', FakeCrypto), patch(settings, VERSION='1.1'):
+            return Client().post("/agent/register_many/%s/" % self.token.secret, data=json.dumps({'hosts': hosts}),
+                                 content_type="application/json")
+
+    def _credits(self):
+        return RegistrationToken.objects.get(id=self.token.id).credits
+
+    def test_register_many(self):
+        """Every good host is created in one call, and the others have an error each"""
+        synthetic_host('inuse', fqdn='inuse.mycompany.com')
+        mismatched = self._host('mismatched')
+        mismatched['csr'] = 'other.mycompany.com'
+        hosts = [self._host('oss0'), self._host('oldagent', version='2.0'), self._host('inuse'), mismatched,
+                 self._host('oss1'), self._host('oss0')]
+
+        response = self._register_many(hosts)
+        self.assertEqual(response.status_code, 201)
+        results = json.loads(response.content)['hosts']
+
+        self.assertEqual([result['fqdn'] for result in results], [host['fqdn'] for host in hosts])
+        self.assertEqual([result.get('error') for result in results[2:]], ["FQDN in use", "", None, "FQDN repeated"])
+        self.assertNotIn('error', results[0])
+        self.assertTrue(results[1]['error'].startswith("Version incompatibility"))
+
+        self.assertEqual(JobSchedulerClient.create_hosts.call_count, 1)
+        self.assertEqual([host['fqdn'] for host in JobSchedulerClient.create_hosts.call_args[0][0]],
+                         ['oss0.mycompany.com', 'oss1.mycompany.com'])
+        for result in (results[0], results[4]):
+            host = ManagedHost.objects.get(id=result['host_id'])
+            self.assertEqual(host.fqdn, result['fqdn'])
+            self.assertEqual(result['certificate'], 'certificate:%s' % result['fqdn'])
+            self.assertEqual(ValidatedClientView.valid_certs[host.nodename], host.fqdn)
+            self.assertEqual(host.clientcertificate_set.get().serial, host.nodename)
+
+        # Only the credits of the hosts registered are used
+        self.assertEqual(self._credits(), 8)
+
+    def test_signing_failure(self):
+        """A certificate which fails to be signed fails its host alone"""
+        unsignable = self._host('oss1')
+        unsignable['csr'] = unsignable['fqdn'] = 'unsignable.mycompany.com'
+        response = self._register_many([self._host('oss0'), unsignable])
+        self.assertEqual(response.status_code, 201)
+
+        results = json.loads(response.content)['hosts']
+        self.assertIn('host_id', results[0])
+        self.assertEqual(results[1]['error'], "Failed to sign certificate")
+        self.assertEqual(self._credits(), 9)
+
+    def test_create_hosts_failure(self):
+        """When the hosts can't be created, the credits are given back and no certificate is valid"""
+        JobSchedulerClient.create_hosts.side_effect = RuntimeError("job_scheduler unavailable")
+
+        with self.assertRaises(RuntimeError):
+            self._register_many([self._host('oss0'), self._host('oss1')])
+        self.assertEqual(self._credits(), 10)
+        self.assertEqual(ValidatedClientView.valid_certs, {})
+
+    def test_create_host_failure(self):
+        """A host which the job scheduler fails to create fails alone, and its credit is given back"""
+        created = JobSchedulerClient.create_hosts.side_effect
+        JobSchedulerClient.create_hosts.side_effect = lambda hosts, server_profile_id: \
+            [(None, "Failed to create host: Disk full") if host['nodename'] == 'oss1' else result
+             for host, result in zip(hosts, created(hosts, server_profile_id))]
+
+        response = self._register_many([self._host('oss0'), self._host('oss1'), self._host('oss2')])
+        self.assertEqual(response.status_code, 201)
+
+        results = json.loads(response.content)['hosts']
+        self.assertEqual(results[1], {'fqdn': 'oss1.mycompany.com', 'error': "Failed to create host: Disk full"})
+        for result in (results[0], results[2]):
+            host = ManagedHost.objects.get(id = result['host_id'])
+            self.assertEqual(host.clientcertificate_set.get().serial, host.nodename)
+        self.assertEqual(sorted(ValidatedClientView.valid_certs.values()), ['oss0.mycompany.com', 'oss2.mycompany.com'])
+        self.assertEqual(self._credits(), 8)
+
+    def test_credits(self):
+        """The token must have a credit for every host, and a limited number of hosts may be POSTed"""
+        response = self._register_many([self._host('oss%s' % n) for n in range(3)], credits=2)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(JobSchedulerClient.create_hosts.called)
+
+        with mock.patch('chroma_agent_comms.views.REGISTER_MANY_MAX_HOSTS', 2):
+            response = self._register_many([self._host('oss%s' % n) for n in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(JobSchedulerClient.create_hosts.called)
+
 # TOOD: reinstate selinux check, probably within the agent itself (it should fail
 # its own registration step without even talking to the manager)
 #    def test_selinux_detection(self):
@@ -0,0 +1,113 @@
+import threading
+
+import mock
+from django.utils import unittest
+
+from chroma_core.services.job_scheduler.agent_rpc import AgentRpcMessenger, AgentCancellation, AgentException
+
+
+class TestAgentRpcMessengerCallMany(unittest.TestCase):
+    def setUp(self):
+        mock.patch('chroma_core.services.job_scheduler.agent_rpc.AgentRxQueue').start()
+        self.tx_queue = mock.patch('chroma_core.services.job_scheduler.agent_rpc.AgentTxQueue').start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.messenger = AgentRpcMessenger()
+        self.messenger._sessions = {'host1': 'session1', 'host2': 'session2'}
+
+    @property
+    def sent(self):
+        return [call[0][0] for call in self.tx_queue.return_value.put.call_args_list]
+
+    def _complete(self, fqdn, session_id, rpc_id, result):
+        self.messenger.on_rx({
+            'fqdn': fqdn,
+            'session_id': session_id,
+            'type': 'DATA',
+            'body': {
+                'type': 'ACTION_COMPLETE',
+                'id': rpc_id,
+                'result': result,
+                'exception': None,
+                'subprocesses': []
+            }
+        })
+
+    def _capabilities(self, fqdn, session_id, capabilities):
+        self.messenger.on_rx({
+            'fqdn': fqdn,
+            'session_id': session_id,
+            'type': 'DATA',
+            'body': {'type': 'CAPABILITIES', 'capabilities': capabilities}
+        })
+
+    def test_send_without_batch_capability(self):
+        """Agents which have not advertised batching get one ACTION_START per action"""
+        self.messenger._send_requests('host1', [('action_a', {}), ('action_b', {})])
+
+        self.assertEqual([m['body']['type'] for m in self.sent], ['ACTION_START', 'ACTION_START'])
+
+    def test_send_with_batch_capability(self):
+        """Agents which have advertised batching get all the actions for them in one message"""
+        self._capabilities('host1', 'session1', [AgentRpcMessenger.BATCH_CAPABILITY])
+
+        rpcs = self.messenger._send_requests('host1', [('action_a', {'x': 1}), ('action_b', {})])
+
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0]['body']['type'], 'ACTION_BATCH_START')
+        self.assertEqual(self.sent[0]['body']['actions'], [{'id': rpcs[0].id, 'action': 'action_a', 'args': {'x': 1}},
+                                                           {'id': rpcs[1].id, 'action': 'action_b', 'args': {}}])
+
+    def test_capabilities_forgotten_with_session(self):
+        self._capabilities('host1', 'session1', [AgentRpcMessenger.BATCH_CAPABILITY])
+        self.messenger._abort_session('host1', "test", 'session1')
+
+        self.assertNotIn('session1', self.messenger._session_capabilities)
+
+    def test_call_many(self):
+        """Results come back in call order, whatever order the hosts complete in"""
+        self._capabilities('host2', 'session2', [AgentRpcMessenger.BATCH_CAPABILITY])
+
+        def complete_all():
+            for message in reversed(self.sent):
+                if message['body']['type'] == 'ACTION_BATCH_START':
+                    actions = message['body']['actions']
+                else:
+                    actions = [message['body']]
+                for action in actions:
+                    self._complete(message['fqdn'], message['session_id'], action['id'], action['action'])
+
+        def put(message):
+            # host1 gets two ACTION_STARTs and host2 one ACTION_BATCH_START: reply once they're all sent
+            if len(self.sent) == 3:
+                threading.Timer(0.1, complete_all).start()
+
+        self.tx_queue.return_value.put.side_effect = put
+
+        rpcs = self.messenger.call_many([('host1', 'a', {}), ('host2', 'b', {}), ('host1', 'c', {}), ('host2', 'd', {})],
+                                        threading.Event())
+
+        self.assertEqual([rpc.get_result() for rpc in rpcs], ['a', 'b', 'c', 'd'])
+
+    def test_call_many_no_session(self):
+        """Calls to a host without a session fail on their own without stopping the others"""
+        cancel_event = threading.Event()
+
+        with mock.patch.object(AgentRpcMessenger, 'SESSION_WAIT_TIMEOUT', 0):
+            with mock.patch.object(self.messenger, '_complete_many'):
+                rpcs = self.messenger.call_many([('host1', 'a', {}), ('host3', 'b', {})], cancel_event)
+
+        self.assertFalse(rpcs[0].complete.is_set())
+        self.assertTrue(rpcs[1].complete.is_set())
+        with self.assertRaises(AgentException):
+            rpcs[1].get_result()
+
+    def test_call_many_cancel(self):
+        """Cancelling the wait cancels every outstanding action"""
+        cancel_event = threading.Event()
+        cancel_event.set()
+
+        with self.assertRaises(AgentCancellation):
+            self.messenger.call_many([('host1', 'a', {}), ('host2', 'b', {})], cancel_event)
+
+        self.assertEqual([m['body']['type'] for m in self.sent[2:]], ['ACTION_CANCEL', 'ACTION_CANCEL'])
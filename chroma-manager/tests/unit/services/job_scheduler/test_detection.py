@@ -63,11 +63,16 @@ class TestDetection(IMLUnitTestCase):
 
             raise AgentException(host, command, args, "No device plugin data available in unit tests")
 
+        def _detect_scan_device_plugin_many(calls):
+            return [mock.Mock(get_result = mock.Mock(side_effect = lambda call = call: _detect_scan_device_plugin(*call)))
+                    for call in calls]
+
         job = DetectTargetsJob.objects.create()
 
         with mock.patch("chroma_core.lib.job.Step.invoke_agent", new = mock.Mock(side_effect = _detect_scan_device_plugin)):
-            with mock.patch("chroma_core.models.Volume.storage_resource"):
-                synchronous_run_job(job)
+            with mock.patch("chroma_core.lib.job.Step.invoke_agent_many", new = mock.Mock(side_effect = _detect_scan_device_plugin_many)):
+                with mock.patch("chroma_core.models.Volume.storage_resource"):
+                    synchronous_run_job(job)
 
         self.assertEqual(ManagedFilesystem.objects.count(), 1)
         self.assertEqual(ManagedFilesystem.objects.get().name, "test18fs")
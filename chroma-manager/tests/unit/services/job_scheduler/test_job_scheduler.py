@@ -1,4 +1,5 @@
 import datetime
+import threading
 
 import mock
 import django.utils.timezone
@@ -7,15 +8,57 @@ from chroma_core.lib.cache import ObjectCache
 from chroma_core.models.jobs import SchedulingError, Job
 from chroma_core.models.command import Command
 from chroma_core.models import ManagedMgs, ManagedTarget, ManagedTargetMount
-from chroma_core.models import LNetConfiguration
+from chroma_core.models import LNetConfiguration, ManagedHost, ServerProfile
 from chroma_core.services.job_scheduler.job_scheduler import RunJobThread
 from chroma_core.services.job_scheduler import job_scheduler_notify
 from chroma_core.services.job_scheduler.job_scheduler_client import JobSchedulerClient
 from chroma_core.services.job_scheduler.job_scheduler import JobScheduler
 from tests.unit.chroma_core.helpers import freshen
 from tests.unit.chroma_core.helpers import MockAgentRpc
+from tests.unit.chroma_core.helpers import load_default_profile
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
 from tests.unit.services.job_scheduler.job_test_case import JobTestCaseWithHost
 from chroma_api.urls import api
+from chroma_help.help import help_text
+
+
+class TestCreateHosts(IMLUnitTestCase):
+    def setUp(self):
+        super(TestCreateHosts, self).setUp()
+
+        load_default_profile()
+        ObjectCache.clear()
+        self.addCleanup(ObjectCache.clear)
+
+        # Without the dependencies of JobScheduler's __init__, which create_hosts doesn't need
+        with mock.patch.object(JobScheduler, '__init__', return_value = None):
+            self.job_scheduler = JobScheduler()
+        self.job_scheduler._lock = threading.RLock()
+        self.job_scheduler.progress = mock.Mock()
+
+    def test_failure(self):
+        """A host which fails to be created has an error of its own, and the others are still created"""
+        commands = []
+
+        def command_set_state(object_ids, message):
+            if 'oss1' in message:
+                raise RuntimeError("Disk full")
+            commands.append(mock.Mock(id = len(commands), message = message))
+            return commands[-1]
+
+        hosts = [{'fqdn': 'oss%s.mycompany.com' % n, 'nodename': 'oss%s' % n, 'address': 'oss%s' % n} for n in range(3)]
+        with mock.patch.object(JobScheduler, 'CommandPlan', mock.Mock(command_set_state = mock.Mock(side_effect = command_set_state))):
+            results = self.job_scheduler.create_hosts(hosts, ServerProfile.objects.get().id)
+
+        self.assertEqual(results[1], {'error': "Failed to create host: Disk full"})
+        for result, host in zip((results[0], results[2]), (hosts[0], hosts[2])):
+            created = ManagedHost.objects.get(id = result['host_id'])
+            self.assertEqual(created.fqdn, host['fqdn'])
+            self.assertEqual(commands[result['command_id']].message, help_text['deploying_host'] % created)
+
+        # The host which failed is rolled back, so mustn't be left in the cache
+        self.assertEqual(sorted(host.fqdn for host in ObjectCache.get(ManagedHost)), ['oss0.mycompany.com', 'oss2.mycompany.com'])
+        self.assertEqual(len(ObjectCache.get(LNetConfiguration)), 2)
 
 
 class TestTransitionsWithCommands(JobTestCaseWithHost):
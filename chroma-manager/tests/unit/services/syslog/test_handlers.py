@@ -1,4 +1,7 @@
+import mock
+
 from chroma_core.services.syslog.parser import admin_client_eviction_handler, client_connection_handler, server_security_flavor_handler, client_eviction_handler
+from chroma_core.services.syslog.parser import LogMessageParser
 from chroma_core.models.event import ClientConnectEvent
 from tests.unit.chroma_core.helpers import synthetic_host
 from tests.unit.chroma_core.helpers import load_default_profile
@@ -76,3 +79,46 @@ class TestHandlers(IMLUnitTestCase):
             client_eviction_handler(example['message'], self.host)
             event = ClientConnectEvent.objects.latest('id')
             self.assertEqual(event.lustre_pid, example['lustre_pid'])
+
+
+class TestParseBatch(IMLUnitTestCase):
+    def setUp(self):
+        super(TestParseBatch, self).setUp()
+        load_default_profile()
+        self.host = synthetic_host('myaddress')
+        self.messages = [{'message': " Lustre: Nothing to see here"}] + \
+            [dict(example) for handler in [client_connection_handler, client_eviction_handler] for example in examples[handler]]
+
+    def test_batch(self):
+        LogMessageParser().parse_batch(self.host.fqdn, self.messages)
+
+        # The MGS connection example is padded such that it does not match the selector
+        self.assertEqual([event.lustre_pid for event in ClientConnectEvent.objects.order_by('id')],
+                         [5629, 27559, 9150, 3636, 23056])
+
+    def test_unknown_host(self):
+        LogMessageParser().parse_batch('unknown', self.messages)
+
+        self.assertEqual(ClientConnectEvent.objects.count(), 0)
+
+    def test_handler_failure(self):
+        """A handler which fails does not prevent events being raised for the rest of the batch"""
+        def fail(message, host):
+            ClientConnectEvent.register_event(severity=0, alert_item=host, message_str="failed", lustre_pid=0)
+            raise RuntimeError("failed")
+
+        selectors = [(selector, fail if selector == ": connection from " else handler) for selector, handler in LogMessageParser.selectors]
+        with mock.patch.object(LogMessageParser, 'selectors', selectors):
+            LogMessageParser().parse_batch(self.host.fqdn, self.messages)
+
+        self.assertEqual([event.lustre_pid for event in ClientConnectEvent.objects.order_by('id')], [3636, 23056])
+
+    def test_precedence(self):
+        """A message which contains more than one selector is handled by the first, wherever they are in it"""
+        message = " LustreError: 0:0:(ldlm_lockd.c:356:waiting_locks_callback()) ### lock callback timer expired after 101s: connection from 0@lo: evicting client at 0@lo ns: mdt-ffff8801cd5be000 pid: 3636 timeout: 4389324308"
+
+        LogMessageParser().parse_batch(self.host.fqdn, [{'message': message}])
+
+        event = ClientConnectEvent.objects.get()
+        self.assertEqual(event.message_str, "client 0@lo evicted: lock callback timer expired after 101s: connection from 0@lo")
+        self.assertEqual(event.lustre_pid, 3636)
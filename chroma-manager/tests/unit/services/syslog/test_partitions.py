@@ -0,0 +1,179 @@
+import os
+import mock
+import gzip
+import shutil
+import calendar
+import tempfile
+from datetime import datetime, timedelta
+
+from django.db import connection, transaction
+from django.utils.timezone import utc
+
+from chroma_core.models import LogMessage
+from chroma_core.services.syslog.partitions import LogMessagePartitions
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestLogMessagePartitions(IMLUnitTestCase):
+    def setUp(self):
+        super(TestLogMessagePartitions, self).setUp()
+        self.archive_path = tempfile.mkdtemp()
+        self.partitions = LogMessagePartitions(partition_size=timedelta(days=1),
+                                               retention=timedelta(days=2),
+                                               archive_path=self.archive_path,
+                                               archive_retention=timedelta(days=10))
+        self.now = datetime(2017, 6, 10, 12, tzinfo=utc)
+
+    def tearDown(self):
+        shutil.rmtree(self.archive_path)
+
+    def _row(self, dt, message='message'):
+        return {'datetime': dt, 'fqdn': 'myserver', 'severity': 5, 'facility': 1, 'tag': 'kernel',
+                'message': message, 'message_class': 0}
+
+    def _insert(self, *days_ago):
+        "Insert messages as they arrive, dated the given number of days ago"
+        for days in days_ago:
+            row = self._row(self.now - timedelta(days=days), 'message %s' % days)
+            self.partitions.insert([row], row['datetime'])
+
+    def _explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        cursor = connection.cursor()
+        cursor.execute("EXPLAIN " + sql, params)
+        return "\n".join(row[0] for row in cursor.fetchall())
+
+    def test_insert(self):
+        self._insert(0, 0, 1, 3)
+
+        self.assertEqual(sorted(self.partitions.partitions.values()), ['chroma_core_logmessage_p2017060700',
+                                                                       'chroma_core_logmessage_p2017060900',
+                                                                       'chroma_core_logmessage_p2017061000'])
+        self.assertEqual(LogMessage.objects.count(), 4)
+        self.assertEqual(LogMessage.objects.filter(datetime__gte=self.now - timedelta(hours=1)).count(), 2)
+
+        # Partitions are found again by a new instance
+        partitions = LogMessagePartitions(partition_size=timedelta(days=1))
+        self.assertEqual(partitions.partitions, self.partitions.partitions)
+
+    def test_future(self):
+        "A message dated too far ahead of now is stored as of now"
+        self.partitions.insert([self._row(self.now + timedelta(days=days), 'message %s' % -days) for days in [0, 0.01, 2]], self.now)
+
+        self.assertEqual(self.partitions.partitions.values(), ['chroma_core_logmessage_p2017061000'])
+        self.assertEqual(LogMessage.objects.get(message='message -2').datetime, self.now)
+        self.assertEqual(LogMessage.objects.get(message='message -0.01').datetime, self.now + timedelta(days=0.01))
+
+    def test_past_retention(self):
+        "A message already past retention is stored outside the partitions, for the next expiry to archive"
+        self.partitions.insert([self._row(self.now - timedelta(days=5))], self.now)
+
+        self.assertEqual(self.partitions.partitions, {})
+        self.assertEqual(LogMessage.objects.count(), 1)
+
+        self.partitions.expire(self.now)
+        self.assertEqual(LogMessage.objects.count(), 0)
+        self.assertEqual(os.listdir(self.archive_path), ['db_log-20170608120000.gz'])
+
+    def test_rollback(self):
+        "A partition created by a transaction which is rolled back is created again once reset"
+        sid = transaction.savepoint()
+        self._insert(0)
+        transaction.savepoint_rollback(sid)
+        self.partitions.reset()
+
+        self.assertEqual(self.partitions.partitions, {})
+        self._insert(0)
+        self.assertEqual(LogMessage.objects.count(), 1)
+
+    def test_expire_failure(self):
+        "Partitions are loaded again after an expiry which fails, as its drops are rolled back"
+        self._insert(3)
+        self.partitions.partitions
+
+        with mock.patch.object(self.partitions, '_archive', side_effect=RuntimeError):
+            self.assertRaises(RuntimeError, self.partitions.expire, self.now)
+        self.assertIsNone(self.partitions._partitions)
+
+    def test_pruning(self):
+        "A query bounded by datetime only scans the partitions in range"
+        self._insert(0, 1, 3)
+
+        plan = self._explain(LogMessage.objects.filter(datetime__gte=self.now - timedelta(hours=1)))
+        self.assertIn('chroma_core_logmessage_p2017061000', plan)
+        self.assertNotIn('chroma_core_logmessage_p2017060900', plan)
+        self.assertNotIn('chroma_core_logmessage_p2017060700', plan)
+
+    def test_expire(self):
+        self._insert(0, 1, 3, 3)
+        LogMessage.objects.create(**self._row(self.now - timedelta(days=4), 'unpartitioned'))
+
+        self.assertEqual(self.partitions.expire(self.now), ['chroma_core_logmessage_p2017060700'])
+
+        self.assertEqual(sorted(LogMessage.objects.values_list('message', flat=True)), ['message 0', 'message 1'])
+        self.assertEqual(sorted(self.partitions.partitions.values()), ['chroma_core_logmessage_p2017060900',
+                                                                       'chroma_core_logmessage_p2017061000'])
+
+        archives = sorted(os.listdir(self.archive_path))
+        self.assertEqual(archives, ['db_log-20170608120000.gz', 'db_log-p2017060700.gz'])
+        lines = gzip.open(os.path.join(self.archive_path, 'db_log-p2017060700.gz')).read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith('kernel message 3'))
+
+        # Nothing more to do until time moves on
+        self.assertEqual(self.partitions.expire(self.now), [])
+
+    def test_archive_failure(self):
+        "Partitions which can't be archived are kept"
+        self._insert(3)
+        shutil.rmtree(self.archive_path)
+
+        self.assertEqual(self.partitions.expire(self.now), [])
+        self.assertEqual(LogMessage.objects.count(), 1)
+        os.mkdir(self.archive_path)
+
+    def test_prune_archives(self):
+        "Archives older than the archive retention are deleted, and other files left alone"
+        for filename, days_ago in [('db_log-p2017050100.gz', 11), ('db_log-p2017060100.gz', 9), ('other.gz', 11)]:
+            path = os.path.join(self.archive_path, filename)
+            open(path, 'w').close()
+            mtime = calendar.timegm((self.now - timedelta(days=days_ago)).utctimetuple())
+            os.utime(path, (mtime, mtime))
+
+        self.partitions.expire(self.now)
+
+        self.assertEqual(sorted(os.listdir(self.archive_path)), ['db_log-p2017060100.gz', 'other.gz'])
+
+
+class TestLogExpiry(IMLUnitTestCase):
+    def test_run(self):
+        "Expiry runs straight away and then every interval until stopped, carrying on after an error"
+        from chroma_core.services.syslog import LogExpiry
+
+        expiry = LogExpiry()
+        expiry._partitions = mock.Mock()
+        expiry._partitions.expire.side_effect = [RuntimeError, []]
+        expiry.stopping = mock.Mock()
+        expiry.stopping.is_set.side_effect = [False, False, True]
+
+        with mock.patch('django.db.connection') as db_connection:
+            expiry.run()
+        db_connection.close.assert_called_once_with()
+
+        self.assertEqual(expiry._partitions.expire.call_count, 2)
+        expiry.stopping.wait.assert_called_with(LogExpiry.EXPIRE_INTERVAL.total_seconds())
+
+
+class TestSyslogService(IMLUnitTestCase):
+    def test_batch_rolled_back(self):
+        "The partitions are reset when a batch fails, as its transaction is rolled back"
+        from chroma_core.services.syslog import Service
+
+        with mock.patch('chroma_core.services.syslog.AgentRxQueue'):
+            service = Service()
+        service._partitions = mock.Mock()
+        service._parser = mock.Mock()
+        service._parser.parse_batch.side_effect = RuntimeError
+
+        self.assertRaises(RuntimeError, service.on_data, 'myserver', {'log_lines': []})
+        service._partitions.reset.assert_called_once_with()
@@ -1,4 +1,5 @@
 import logging
+import time
 import mock
 
 from django.utils.timezone import now
@@ -348,3 +349,79 @@ class CorosyncTests(CorosyncTestCase):
 
         alerts_raised = StonithNotEnabledAlert.objects.count()
         self.assertEqual(alerts_raised, 1)
+
+    def test_unchanged_report_dropped(self):
+        """A report which changes nothing known of the cluster makes no queries or notifications"""
+
+        node1 = self.make_managed_host('node1')
+        node2 = self.make_managed_host('node2')
+        nodes = ((node1, ONLINE), (node2, ONLINE))
+        self.corosync_service.on_data(node1.fqdn, self.get_test_message("2013-01-11T19:04:07+00:00", nodes))
+        self.corosync_service.on_data(node2.fqdn, self.get_test_message("2013-01-11T19:04:08+00:00", nodes))
+
+        job_scheduler_notify.notify.reset_mock()
+        with self.assertNumQueries(0):
+            self.corosync_service.on_data(node1.fqdn, self.get_test_message("2013-01-11T19:04:17+00:00", nodes))
+            self.corosync_service.on_data(node2.fqdn, self.get_test_message("2013-01-11T19:04:18+00:00", nodes))
+        self.assertFalse(job_scheduler_notify.notify.called)
+
+        #  The dropped reports still moved the peers' times on, so an older report is ignored
+        self.corosync_service.on_data(node2.fqdn, self.get_test_message("2013-01-11T19:04:10+00:00",
+                                                                        ((node1, OFFLINE), (node2, ONLINE))))
+        self.assertEqual(HostOfflineAlert.objects.count(), 0)
+
+    def test_transition_after_unchanged_reports(self):
+        """A peer's transition is processed after reports which changed nothing"""
+
+        node1 = self.make_managed_host('node1')
+        node2 = self.make_managed_host('node2')
+        self.corosync_service.on_data(node1.fqdn, self.get_test_message("2013-01-11T19:04:07+00:00",
+                                                                        ((node1, ONLINE), (node2, ONLINE))))
+        self.corosync_service.on_data(node1.fqdn, self.get_test_message("2013-01-11T19:04:17+00:00",
+                                                                        ((node1, ONLINE), (node2, ONLINE))))
+
+        #  As job_scheduler would have recorded it
+        self._set_status(node2, True)
+        self.corosync_service.on_data(node1.fqdn, self.get_test_message("2013-01-11T19:04:27+00:00",
+                                                                        ((node1, ONLINE), (node2, OFFLINE))))
+        self.assertEqual(HostOfflineAlert.objects.filter(active = True).count(), 1)
+        job_scheduler_notify.notify.assert_any_call(CorosyncConfiguration.objects.get(host = node2),
+                                                    MOCKED_NOW_VALUE,
+                                                    {'corosync_reported_up': False})
+
+        self.corosync_service.on_data(node1.fqdn, self.get_test_message("2013-01-11T19:04:37+00:00",
+                                                                        ((node1, ONLINE), (node2, ONLINE))))
+        self.assertEqual(HostOfflineAlert.objects.filter(active = True).count(), 0)
+
+    def _report_twice(self):
+        node1 = self.make_managed_host('node1')
+        node2 = self.make_managed_host('node2')
+        nodes = ((node1, ONLINE), (node2, ONLINE))
+        self.corosync_service.on_data(node1.fqdn, self.get_test_message("2013-01-11T19:04:07+00:00", nodes))
+        job_scheduler_notify.notify.reset_mock()
+
+        return lambda: self.corosync_service.on_data(node1.fqdn, self.get_test_message("2013-01-11T19:04:17+00:00", nodes))
+
+    def test_unchanged_report_expired(self):
+        """An unchanged report is processed again once the last one processed is SNAPSHOT_MAX_AGE old"""
+
+        report = self._report_twice()
+        with mock.patch('time.time', return_value=time.time() + CorosyncService.SNAPSHOT_MAX_AGE):
+            report()
+        self.assertTrue(job_scheduler_notify.notify.called)
+
+    def test_unchanged_report_after_host_change(self):
+        """An unchanged report is processed again after a host or its corosync configuration is saved or deleted"""
+
+        report = self._report_twice()
+        ManagedHost.objects.get(nodename='node2').save()
+        report()
+        self.assertTrue(job_scheduler_notify.notify.called)
+
+        job_scheduler_notify.notify.reset_mock()
+        report()
+        self.assertFalse(job_scheduler_notify.notify.called)
+
+        CorosyncConfiguration.objects.get(host__nodename='node2').mark_deleted()
+        report()
+        self.assertTrue(job_scheduler_notify.notify.called)
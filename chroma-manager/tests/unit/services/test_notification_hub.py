@@ -0,0 +1,111 @@
+import time
+
+import mock
+
+from chroma_core.lib import util
+from chroma_core.lib.long_polling import long_polling
+from chroma_core.services.notification_hub.client import NotificationHubClient, TableChangeListener
+from chroma_core.services.notification_hub.hub import NotificationHub
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestNotificationHub(IMLUnitTestCase):
+    def setUp(self):
+        super(TestNotificationHub, self).setUp()
+
+        # The state of long polling is global, so each test uses tables of its own
+        self.table = 'chroma_core_%s' % self._testMethodName
+        self.other_table = '%s_other' % self.table
+
+        self.producer = mock.MagicMock()
+        mock.patch('chroma_core.services.notification_hub.hub.Producer', return_value = self.producer).start()
+        mock.patch('chroma_core.services.notification_hub.hub._amqp_connection', mock.MagicMock()).start()
+        mock.patch('chroma_core.services.notification_hub.hub.maybe_declare').start()
+        self.addCleanup(mock.patch.stopall)
+
+        self.hub = NotificationHub()
+
+    def _now(self):
+        return int(time.time() * util.SECONDSTOMICROSECONDS)
+
+    def _broadcasts(self):
+        return [call[0][0]['changes'] for call in self.producer.__enter__.return_value.publish.call_args_list]
+
+    def test_batch_coalesced(self):
+        """The changes of a batch of messages are recorded and broadcast together"""
+        cursor = self._now() - 1
+        self.hub.dispatch([{'timestamp': self._now(), 'changed_ids': {self.table: [1, 2]}},
+                           {'timestamp': self._now(), 'changed_ids': {self.table: [2, 3], self.other_table: None}}])
+
+        broadcasts = self._broadcasts()
+        self.assertEqual(len(broadcasts), 1)
+        self.assertEqual(broadcasts[0][self.table], [long_polling.timestamps[self.table], [1, 2, 3]])
+        self.assertEqual(broadcasts[0][self.other_table], [long_polling.timestamps[self.other_table], None])
+
+        self.assertEqual(long_polling.changed_since(self.table, cursor), set([1, 2, 3]))
+        self.assertEqual(long_polling.changed_since(self.other_table, cursor), None)
+
+    def test_table_timestamps(self):
+        self.hub.dispatch([{'timestamp': self._now(), 'changed_ids': {self.table: [1]}}])
+
+        self.assertEqual(self.hub.table_timestamps()[self.table], long_polling.timestamps[self.table])
+
+
+class TestTableChangeListener(IMLUnitTestCase):
+    def setUp(self):
+        super(TestTableChangeListener, self).setUp()
+
+        self.table = 'chroma_core_%s' % self._testMethodName
+        self.listener = TableChangeListener()
+        self.cursor = int(time.time() * util.SECONDSTOMICROSECONDS)
+
+    def _receive(self, timestamp, ids):
+        message = mock.Mock()
+        self.listener._receive({'changes': {self.table: [timestamp, ids]}}, message)
+        message.ack.assert_called_once_with()
+
+    def test_receive(self):
+        """Broadcast changes are recorded with the timestamps of the hub"""
+        self._receive(self.cursor + 10, [1, 2])
+
+        self.assertEqual(long_polling.timestamps[self.table], self.cursor + 10)
+        self.assertEqual(long_polling.changed_since(self.table, self.cursor), set([1, 2]))
+
+    def test_receive_tables(self):
+        """The tables of a broadcast keep the timestamp of the hub"""
+        other_table = '%s_other' % self.table
+        message = mock.Mock()
+        self.listener._receive({'changes': {self.table: [self.cursor + 10, [1]], other_table: [self.cursor + 10, [2]]}}, message)
+
+        self.assertEqual(long_polling.timestamps[self.table], self.cursor + 10)
+        self.assertEqual(long_polling.timestamps[other_table], self.cursor + 10)
+
+    def test_caught_up(self):
+        """Changes which were included in catching up with the hub are not recorded again"""
+        long_polling.catch_up({self.table: self.cursor + 10})
+        self.assertEqual(long_polling.changed_since(self.table, self.cursor), None)
+
+        self._receive(self.cursor + 10, [1])
+        self.assertEqual(long_polling.timestamps[self.table], self.cursor + 10)
+
+        self._receive(self.cursor + 20, [2])
+        self.assertEqual(long_polling.changed_since(self.table, self.cursor + 10), set([2]))
+
+    def test_malformed(self):
+        message = mock.Mock()
+        self.listener._receive({'unexpected': True}, message)
+        message.ack.assert_called_once_with()
+
+    def test_not_connected(self):
+        """Without the hub, requests fail after waiting for the listener to connect only briefly and only once"""
+        mock.patch('chroma_core.services.notification_hub.client._listener', None).start()
+        start = mock.patch.object(TableChangeListener, 'start').start()
+        self.addCleanup(mock.patch.stopall)
+
+        begun = time.time()
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                NotificationHubClient._connected()
+
+        self.assertLess(time.time() - begun, NotificationHubClient.FIRST_CONNECT_TIMEOUT + 1)
+        start.assert_called_once_with()
@@ -1,11 +1,12 @@
 import threading
+import time
 
 import mock
 
 from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
 from chroma_core.models.power_control import PowerControlType, PowerControlDevice, PowerControlDeviceOutlet
 from chroma_core.services.power_control.manager import PowerControlManager
-from chroma_core.services.power_control.monitor_daemon import PowerMonitorDaemon, PowerDeviceMonitor
+from chroma_core.services.power_control.monitor_daemon import PowerMonitorDaemon, MonitorSweep, MONITOR_WORKERS
 from tests.integration.core.constants import TEST_TIMEOUT
 
 
@@ -79,35 +80,52 @@ class PowerMonitoringTests(PowerControlTestCase):
         self.md_thread.stop()
         self.wait_for_assert(lambda: self.assertNotIn('MonitorDaemonThread', self.thread_class_names))
 
-    def test_pdu_add_remove_spawns_reaps_monitors(self, mocked):
-        self.assertNotIn('PowerDeviceMonitor', self.thread_class_names)
+    def test_workers_fixed(self, mocked):
+        """Devices are monitored by a fixed set of workers, not a thread each"""
+        self.wait_for_assert(lambda: self.assertEqual(self.thread_class_names.count('PowerMonitorWorker'), MONITOR_WORKERS))
 
-        pdu = PowerControlDevice.objects.create(device_type = self.fence_type,
-                                                address = 'localhost')
-        # This normally happens via a post_save signal
-        self.power_manager.register_device(pdu.id)
-        self.wait_for_assert(lambda: self.assertIn('PowerDeviceMonitor', self.thread_class_names))
+        with mock.patch.object(PowerControlManager, 'query_device_outlets') as query_device_outlets:
+            pdus = [PowerControlDevice.objects.create(device_type = self.fence_type, address = 'localhost', port = port)
+                    for port in range(23, 23 + MONITOR_WORKERS * 2)]
+            for pdu in pdus:
+                # This normally happens via a post_save signal
+                self.power_manager.register_device(pdu.id)
+
+            self.wait_for_assert(lambda: self.assertEqual(query_device_outlets.call_count, len(pdus)))
+
+        self.assertEqual(self.thread_class_names.count('PowerMonitorWorker'), MONITOR_WORKERS)
+
+    def test_pdu_add_remove_runs_tasks(self, mocked):
+        with mock.patch.object(PowerControlManager, 'query_device_outlets') as query_device_outlets:
+            pdu = PowerControlDevice.objects.create(device_type = self.fence_type,
+                                                    address = 'localhost')
+            # This normally happens via a post_save signal
+            self.power_manager.register_device(pdu.id)
+            self.wait_for_assert(lambda: query_device_outlets.assert_called_once_with(device_id = pdu.id))
 
         pdu.mark_deleted()
         # This normally happens via a post_delete signal
         self.power_manager.unregister_device(pdu.sockaddr)
-        self.wait_for_assert(lambda: self.assertNotIn('PowerDeviceMonitor', self.thread_class_names))
+        # Its task queue is dropped once the stop task has been taken from it
+        self.wait_for_assert(lambda: self.assertNotIn(pdu.sockaddr, self.power_manager.monitor_task_queue))
+        self.assertNotIn(pdu.sockaddr, self.power_manager.power_devices)
 
-    def test_pdu_update_respawns_monitors(self, mocked):
-        pdu = PowerControlDevice.objects.create(device_type = self.fence_type,
-                                                address = 'localhost')
-        # This normally happens via a post_save signal
-        self.power_manager.register_device(pdu.id)
-        self.wait_for_assert(lambda: self.assertIn('PowerDeviceMonitor', self.thread_class_names))
+    def test_pdu_update_requeries_outlets(self, mocked):
+        with mock.patch.object(PowerControlManager, 'query_device_outlets') as query_device_outlets:
+            pdu = PowerControlDevice.objects.create(device_type = self.fence_type,
+                                                    address = 'localhost')
+            # This normally happens via a post_save signal
+            self.power_manager.register_device(pdu.id)
+            self.wait_for_assert(lambda: self.assertEqual(query_device_outlets.call_count, 1))
 
-        start_threads = threading.enumerate()
-        pdu.address = '1.2.3.4'
-        pdu.username = 'bob'
-        pdu.save()
-        # This normally happens via a post_save signal
-        self.power_manager.reregister_device(pdu.id)
+            pdu.address = '1.2.3.4'
+            pdu.username = 'bob'
+            pdu.save()
+            # This normally happens via a post_save signal
+            self.power_manager.reregister_device(pdu.id)
 
-        self.wait_for_assert(lambda: self.assertNotEqual(start_threads, threading.enumerate()))
+            self.wait_for_assert(lambda: self.assertEqual(query_device_outlets.call_count, 2))
+            self.assertIn(('1.2.3.4', pdu.port), self.power_manager.power_devices)
 
 
 @mock.patch('chroma_core.services.power_control.rpc.PowerControlRpc')
@@ -131,25 +149,24 @@ class MonitorThreadCase(IMLUnitTestCase):
 
         self.addCleanup(mock.patch.stopall)
 
-    @mock.patch('chroma_core.models.power_control.PowerControlDeviceUnavailableAlert.notify')
+    @mock.patch('chroma_core.models.power_control.PowerControlDeviceUnavailableAlert.notify_many')
     def test_pdu_monitoring(self, mock_notify, mock_rpc):
         # Grab the first non-IPMI type
         type = PowerControlType.objects.filter(max_outlets__gt = 0)[0]
         device = PowerControlDevice.objects.create(device_type = type,
                                                    address = 'localhost')
         manager = PowerControlManager()
-        monitor = PowerDeviceMonitor(device, manager)
 
         # Check that an OK device notifies OK
-        monitor._check_monitored_device()
-        mock_notify.assert_called_with(device, True)
+        MonitorSweep([device]).check(manager, device)
+        mock_notify.assert_called_with([(device, True)])
 
         # Check that an unavailable device notifies not OK
         self.device_checks_should_fail = True
-        monitor._check_monitored_device()
-        mock_notify.assert_called_with(device, False)
+        MonitorSweep([device]).check(manager, device)
+        mock_notify.assert_called_with([(device, False)])
 
-    @mock.patch('chroma_core.models.power_control.IpmiBmcUnavailableAlert.notify')
+    @mock.patch('chroma_core.models.power_control.IpmiBmcUnavailableAlert.notify_many')
     def test_bmc_monitoring(self, mock_notify, mock_rpc):
         # Grab an IPMI-ish type
         type = PowerControlType.objects.filter(max_outlets = 0)[0]
@@ -158,17 +175,51 @@ class MonitorThreadCase(IMLUnitTestCase):
         bmc = PowerControlDeviceOutlet.objects.create(device = device,
                                                       identifier = "localhost")
         manager = PowerControlManager()
-        monitor = PowerDeviceMonitor(device, manager)
 
         # Check that an OK BMC notifies OK
-        monitor._check_monitored_device()
+        MonitorSweep([device]).check(manager, device)
         # Note that the notification goes to the BMC (PowerControlDeviceOutlet
         # instance), not the pseudo-PDU device
-        mock_notify.assert_called_with(bmc, True)
+        mock_notify.assert_called_with([(bmc, True)])
 
         # Check that an unavailable BMC notifies not OK
         self.device_checks_should_fail = True
-        monitor._check_monitored_device()
+        MonitorSweep([device]).check(manager, device)
         # Note that the notification goes to the BMC (PowerControlDeviceOutlet
         # instance), not the pseudo-PDU device
-        mock_notify.assert_called_with(bmc, False)
+        mock_notify.assert_called_with([(bmc, False)])
+
+    @mock.patch('chroma_core.models.power_control.PowerControlDeviceUnavailableAlert.notify_many')
+    def test_sweep_notifies_each_device(self, mock_notify, mock_rpc):
+        """The alerts of each device of a sweep are raised as soon as it is checked"""
+        type = PowerControlType.objects.filter(max_outlets__gt = 0)[0]
+        devices = [PowerControlDevice.objects.create(device_type = type, address = 'localhost', port = port)
+                   for port in range(23, 26)]
+        deleted = devices[-1]
+        deleted.mark_deleted()
+        manager = PowerControlManager()
+
+        # (_check_device_availability returns device_checks_should_fail, so these are all unavailable)
+        sweep = MonitorSweep(devices)
+        for device in devices[:-1]:
+            sweep.check(manager, device)
+            mock_notify.assert_called_with([(device, True)])
+        self.assertFalse(sweep.complete.is_set())
+
+        # An unavailable device which has been deleted meanwhile is not alerted on
+        sweep.check(manager, deleted)
+        self.assertEqual(mock_notify.call_count, 2)
+        self.assertTrue(sweep.complete.is_set())
+
+
+class TestProbe(IMLUnitTestCase):
+    def test_probe(self):
+        """Probes run concurrently, and those which miss the deadline are killed and have no result"""
+        started = time.time()
+        results = PowerControlManager.__new__(PowerControlManager).probe([['true'],
+                                                                          ['sh', '-c', 'echo out; exit 2'],
+                                                                          ['sleep', '10']],
+                                                                         timeout = 1)
+
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(results, [(0, '', ''), (2, 'out\n', ''), None])
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+
+import mock
+from django.utils.timezone import utc
+
+from chroma_core.lib.metrics import FilesystemAggregates
+from chroma_core.models import Point, Stats
+from chroma_core.services.stats import Service, StatsQueue
+from tests.unit.lib.iml_unit_test_case import IMLUnitTestCase
+
+
+class TestStatsService(IMLUnitTestCase):
+    def setUp(self):
+        super(TestStatsService, self).setUp()
+
+        Stats.delete_all()
+        for model in Stats:
+            model.cache.clear()
+        self.addCleanup(Stats.delete_all)
+
+        self.service = Service()
+        self.service.aggregates = FilesystemAggregates()
+
+        self.put = mock.patch('chroma_core.services.queue.ServiceQueue.put').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_encoding(self):
+        """Times are queued as integer microseconds, which decode to the same datetimes"""
+        dt = datetime(2017, 1, 1, 12, 30, 15, 123456, utc)
+        StatsQueue().put([(1, dt, 2.0)])
+        (queue, samples), _ = self.put.call_args
+        self.assertEqual(samples, [(1, 1483273815123456, 2.0)])
+        self.assertEqual(StatsQueue.decode(samples[0][1]), dt)
+
+    def test_insert_batch(self):
+        """The samples of a batch of messages are inserted together, skipping any duplicates"""
+        # recent enough not to be expired as they're inserted
+        first = datetime.now(utc).replace(microsecond = 0)
+        second = first + timedelta(seconds = 10)
+        messages = [[(1, StatsQueue.encode(first), 1.0), (2, StatsQueue.encode(first), 2.0)],
+                    [(1, StatsQueue.encode(second), 3.0)],
+                    [(1, StatsQueue.encode(second), 4.0)]]
+
+        with mock.patch('chroma_core.services.stats.log') as log:
+            self.service.insert_batch(messages)
+        self.assertFalse(log.error.called)
+        self.assertTrue(log.warn.called)
+
+        Stats[0].cache.clear()
+        self.assertEqual(list(Stats[0].select(1)), [Point(first, 1.0, 1), Point(second, 3.0, 1)])
+        self.assertEqual(list(Stats[0].select(2)), [Point(first, 2.0, 1)])
+
+    def test_insert_batch_failure(self):
+        """Should a batch fail to insert, its samples are inserted one by one, losing only those which fail"""
+        dt = datetime.now(utc).replace(microsecond = 0)
+        messages = [[(1, StatsQueue.encode(dt), 1.0), (2, None, 2.0)],
+                    [(3, StatsQueue.encode(dt), 3.0)]]
+
+        with mock.patch('chroma_core.services.stats.log') as log:
+            self.service.insert_batch(messages)
+        self.assertEqual(log.error.call_count, 2)
+
+        Stats[0].cache.clear()
+        self.assertEqual(list(Stats[0].select(1)), [Point(dt, 1.0, 1)])
+        self.assertEqual(list(Stats[0].select(2)), [])
+        self.assertEqual(list(Stats[0].select(3)), [Point(dt, 3.0, 1)])
+
+    def test_insert_batch_failure_aggregates(self):
+        """Filesystem aggregates are updated from the samples as they are inserted, not from a batch which fails"""
+        dt = datetime.now(utc).replace(microsecond = 0)
+        messages = [[(1, StatsQueue.encode(dt), 1.0), (2, None, 2.0)],
+                    [(3, StatsQueue.encode(dt), 3.0)]]
+        self.service.aggregates = mock.Mock()
+        self.service.aggregates.update.return_value = []
+
+        with mock.patch('chroma_core.services.stats.log'):
+            self.service.insert_batch(messages)
+
+        self.assertEqual([args[0] for args, kwargs in self.service.aggregates.update.call_args_list],
+                         [[(1, dt, 1.0)], [(3, dt, 3.0)]])
+
+    def test_serve_batches(self):
+        """Messages are acknowledged once handled, and those of a batch which fails are handled one by one"""
+        from Queue import Empty
+
+        queue = StatsQueue()
+        messages = [mock.Mock(), mock.Mock()]
+        for n, message in enumerate(messages):
+            message.decode.return_value = [(n, 0, 0.0)]
+        received = list(messages)
+
+        def get(*args, **kwargs):
+            if received:
+                return received.pop(0)
+            queue.stop()
+            raise Empty()
+
+        def callback(batch):
+            for message in messages:
+                self.assertFalse(message.ack.called)
+            if len(batch) > 1:
+                raise RuntimeError()
+            if batch == [[(1, 0, 0.0)]]:
+                raise ValueError()
+
+        callback = mock.Mock(side_effect = callback)
+        with mock.patch('chroma_core.services.queue._amqp_connection') as connection:
+            simple_queue = connection.return_value.__enter__.return_value.SimpleQueue.return_value
+            simple_queue.get.side_effect = simple_queue.get_nowait.side_effect = get
+            with mock.patch('chroma_core.services.queue.log'):
+                queue.serve_batches(callback)
+
+        self.assertEqual(callback.call_args_list, [mock.call([[(0, 0, 0.0)], [(1, 0, 0.0)]]),
+                                                   mock.call([[(0, 0, 0.0)]]),
+                                                   mock.call([[(1, 0, 0.0)]])])
+        for message in messages:
+            message.ack.assert_called_once_with()
@@ -439,6 +439,48 @@ class ConcurrentRegistrationLimit(Benchmark):
                 n += self.args.servers
 
 
+class RegistrationThroughput(Benchmark):
+    def run(self):
+        """
+        Measure the rate at which the manager registers servers, and completes their
+        setup commands, when many servers are provisioned at once: registering each with
+        a request of its own (concurrently), then with batched register_many requests.
+        """
+        SU_SIZE = 4
+
+        rates = {}
+        for n in [int(count) for count in self.args.counts.split(",")]:
+            for method in ['concurrent', 'batch']:
+                secret = self.get_registration_secret(n, duration = datetime.timedelta(seconds = 3600))
+
+                fqdns = []
+                for i in range(0, n, SU_SIZE):
+                    fqdns.extend(self.simulator.add_su(SU_SIZE, SU_SIZE * 2, 1)['fqdns'])
+                fqdns = fqdns[:n]
+
+                ts = time.time()
+                if method == 'batch':
+                    registration_results = self.simulator.register_batch(fqdns, secret, self.args.batch_size)
+                else:
+                    registration_results = self.simulator.register_many(fqdns, secret)
+                registered = time.time() - ts
+
+                command_uris = ["/api/command/%s/" % result['command_id'] for result in registration_results if result]
+                self._wait_for_commands(command_uris)
+                set_up = time.time() - ts
+
+                rates[(n, method)] = len(command_uris) * 60.0 / registered
+                log.info("%s servers, %s: %s registered in %.1fs (%.0f registrations/minute), set up in %.1fs (%.0f/minute)" % (
+                    n, method, len(command_uris), registered, rates[(n, method)], set_up, len(command_uris) * 60.0 / set_up))
+
+                self.reset()
+
+        log.info("%-8s %16s %16s %8s" % ("servers", "concurrent/min", "batch/min", "speedup"))
+        for n in [int(count) for count in self.args.counts.split(",")]:
+            log.info("%-8s %16.0f %16.0f %7.2fx" % (n, rates[(n, 'concurrent')], rates[(n, 'batch')],
+                                                   rates[(n, 'batch')] / rates[(n, 'concurrent')]))
+
+
 class ServerCountLimit(Benchmark):
     def run(self):
         """
@@ -531,8 +573,8 @@ class LogIngestRate(Benchmark):
                 log_rate *= 2
 
         log.debug("Stopping log generation")
-        for n in range(0, 8):
-            self.simulator.set_log_rate('test%.3d.localdomain' % n, 0)
+        for fqdn in server_fqdns:
+            self.simulator.set_log_rate(fqdn, 0)
 
         log.debug("Waiting for queue to drain")
         rate_samples = []
@@ -552,10 +594,15 @@ class LogIngestRate(Benchmark):
         std_dev = math.sqrt((sum([(s - avg) * (s - avg) for s in rate_samples]) / float(len(rate_samples))))
         std_err = std_dev / math.sqrt(len(rate_samples))
 
-        log.info("%s +/- %s" % (avg, std_err))
+        log.info("%.2f +/- %.2f messages per second" % (avg, std_err))
         # Convert message rate to log line rate
         from chroma_agent.device_plugins.systemd_journal import MAX_LOG_LINES_PER_MESSAGE
-        log.info("%s +/- %s" % (avg * MAX_LOG_LINES_PER_MESSAGE, std_err * MAX_LOG_LINES_PER_MESSAGE))
+        lines_per_second = avg * MAX_LOG_LINES_PER_MESSAGE
+        log.info("%.0f +/- %.0f log lines per second" % (lines_per_second, std_err * MAX_LOG_LINES_PER_MESSAGE))
+
+        if self.args.baseline:
+            log.info("%.0f log lines per second before, %.0f after: %.2fx" % (
+                self.args.baseline, lines_per_second, lines_per_second / self.args.baseline))
 
         # FIXME: try running this with systemd_journal DB writing disabled, such that rabbitmq is the bottleneck, and you
         # can get messages to back up on the agent side, using up unbounded memory: the rabbitmq part never backs up
@@ -564,6 +611,72 @@ class LogIngestRate(Benchmark):
         # FIXME: populate the db with some targets and NIDs and include them in the incoming log messages
 
 
+class AgentTransportCost(Benchmark):
+    # Manager processes which handle agent HTTPS traffic
+    MANAGER_PROCESSES = ['nginx', 'http_agent']
+
+    def run(self):
+        """Measure the manager CPU time spent per agent with and without agent
+        connection keep-alive (requires the manager on this host and the built-in simulator)"""
+        from chroma_agent.agent_client import CryptoClient
+
+        if self.args.remote_simulator:
+            raise RuntimeError("agent_transport_cost needs the built-in simulator to switch keep-alive")
+
+        server_count = self.args.servers
+        LOG_RATE = 10
+
+        registration_command_uris = []
+        for n in range(0, server_count):
+            fqdn = self.simulator.add_server(1)
+            self.simulator.set_log_rate(fqdn, LOG_RATE)
+            secret = self.get_registration_secret(1)
+            result = self.simulator.register(fqdn, secret)
+            registration_command_uris.append("/api/command/%s/" % (result['command_id']))
+
+        self._wait_for_commands(registration_command_uris)
+
+        results = {}
+        for keepalive in [False, True]:
+            CryptoClient.KEEPALIVE = keepalive
+
+            # Let the agents settle into the new mode before sampling
+            time.sleep(10)
+
+            cpu_before = self._manager_cpu_seconds()
+            time.sleep(self.args.duration)
+            cpu_used = self._manager_cpu_seconds() - cpu_before
+
+            results[keepalive] = cpu_used / server_count / (self.args.duration / 60.0)
+            log.info("keepalive=%s: %.3f manager CPU seconds per agent per minute" % (keepalive, results[keepalive]))
+
+        log.info("Keep-alive saves %.0f%% of manager CPU per agent" % (100.0 * (1 - results[True] / results[False])))
+
+    def _manager_cpu_seconds(self):
+        """Total user and system CPU time of the local manager processes which serve agents"""
+        clock_ticks = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
+        ticks = 0
+        pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+        for pid in pids:
+            try:
+                cmdline = open('/proc/%s/cmdline' % pid).read().replace('\0', ' ')
+                if not any(name in cmdline for name in self.MANAGER_PROCESSES):
+                    continue
+                stat = open('/proc/%s/stat' % pid).read()
+            except IOError:
+                # Process exited
+                continue
+
+            # Fields after the parenthesised command name, utime and stime are the 12th and 13th
+            fields = stat[stat.rindex(')') + 2:].split()
+            ticks += int(fields[11]) + int(fields[12])
+
+        if not ticks:
+            raise RuntimeError("No manager processes (%s) found on this host" % ", ".join(self.MANAGER_PROCESSES))
+
+        return ticks / float(clock_ticks)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Simulated benchmarks")
     parser.add_argument('--remote_simulator', required=False, help="Disable built-in simulator (run it separately)", default=False)
@@ -578,6 +691,8 @@ def main():
     log_ingest_parser.set_defaults(func=lambda args, simulator: Benchmark(args, simulator).reset())
 
     log_ingest_parser = subparsers.add_parser("log_ingest_rate")
+    log_ingest_parser.add_argument('--baseline', help="log lines per second measured before a change, to compare with",
+                                   default=None, type=float)
     log_ingest_parser.set_defaults(func=lambda args, simulator: LogIngestRate(args, simulator).run_benchmark())
 
     server_count_limit_parser = subparsers.add_parser("server_count_limit")
@@ -586,9 +701,20 @@ def main():
     server_count_limit_parser = subparsers.add_parser("concurrent_registration_limit")
     server_count_limit_parser.set_defaults(func=lambda args, simulator: ConcurrentRegistrationLimit(args, simulator).run_benchmark())
 
+    registration_throughput_parser = subparsers.add_parser("registration_throughput")
+    registration_throughput_parser.add_argument('--counts', help="comma separated server counts to register at once",
+                                                default="100,500,1000")
+    registration_throughput_parser.add_argument('--batch_size', help="servers per register_many request",
+                                                default=100, type=int)
+    registration_throughput_parser.set_defaults(func=lambda args, simulator: RegistrationThroughput(args, simulator).run_benchmark())
+
     server_count_limit_parser = subparsers.add_parser("filesystem_size_limit")
     server_count_limit_parser.set_defaults(func=lambda args, simulator: FilesystemSizeLimit(args, simulator).run_benchmark())
 
+    agent_transport_cost_parser = subparsers.add_parser("agent_transport_cost")
+    agent_transport_cost_parser.add_argument('--duration', help="seconds to sample each mode for", default=60, type=int)
+    agent_transport_cost_parser.set_defaults(func=lambda args, simulator: AgentTransportCost(args, simulator).run_benchmark())
+
     args = parser.parse_args()
 
     if args.debug:
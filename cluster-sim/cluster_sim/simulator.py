@@ -9,6 +9,7 @@ import traceback
 import os
 import threading
 import time
+from multiprocessing.pool import ThreadPool
 from requests import ConnectionError
 
 from chroma_agent.agent_client import CryptoClient, AgentClient, HttpError, Session
@@ -29,6 +30,7 @@ from cluster_sim.log import log
 
 # Ensure copytool logging goes to sim log
 from chroma_agent import copytool_monitor
+from chroma_agent import version as agent_version
 copytool_monitor.copytool_log = log
 
 
@@ -420,6 +422,60 @@ class ClusterSimulator(Persisted):
 
         return [t.result for t in threads]
 
+    def register_batch(self, fqdns, secret, batch_size = 100, csr_workers = 8):
+        """
+        Register many servers with the manager's register_many view, batch_size servers per
+        request, rather than with a register request each as register_many does.
+
+        :return: The registration result of each server, in the order of fqdns (None if it failed)
+        """
+        servers = []
+        for fqdn in fqdns:
+            server = self.servers[fqdn]
+            if server.agent_is_running:
+                server.shutdown_agent()
+            if not server.is_worker and not self.power.server_has_power(fqdn):
+                log.error("Not registering %s, none of its PSUs are powered" % fqdn)
+                continue
+            servers.append(server)
+
+        def host_attributes(server):
+            return {
+                'address': None,
+                'fqdn': server.fqdn,
+                'nodename': server.nodename,
+                'capabilities': FakeActionPlugins(self, server).capabilities,
+                'version': agent_version(),
+                'csr': server.crypto.generate_csr(server.fqdn)
+            }
+
+        # Generating the CSRs shells out to openssl, so is worth doing concurrently
+        pool = ThreadPool(csr_workers)
+        try:
+            hosts = pool.map(host_attributes, servers)
+        finally:
+            pool.close()
+
+        results = {}
+        for i in range(0, len(servers), batch_size):
+            client = CryptoClient(self.url + "register_many/%s/" % secret, servers[i].crypto)
+            try:
+                batch_results = client.post({'hosts': hosts[i:i + batch_size]})['hosts']
+            except (ConnectionError, HttpError) as e:
+                log.error("Registration request failed for %s servers: %s" % (len(hosts[i:i + batch_size]), e))
+                continue
+
+            for result in batch_results:
+                if 'error' in result:
+                    log.error("Registration failed for %s: %s" % (result['fqdn'], result['error']))
+                    continue
+                self.servers[result['fqdn']].crypto.install_certificate(result['certificate'])
+                self.start_server(result['fqdn'])
+                results[result['fqdn']] = result
+            log.debug("register_batch: %s/%s" % (min(i + batch_size, len(servers)), len(servers)))
+
+        return [results.get(fqdn) for fqdn in fqdns]
+
     def poweroff_server(self, fqdn):
         self.stop_server(fqdn, shutdown = True, simulate_shutdown = True)
 